@@ -2,6 +2,7 @@ import express from "express";
 import { protect } from "../middleware/auth.js";
 import Post from "../models/Post.js";
 import upload from "../middleware/upload.js";
+import { notifyPostEvent } from "../utils/aiWebhook.js";
 
 const router = express.Router();
 
@@ -39,6 +40,7 @@ router.post("/", protect, upload.array("images", 5), async (req, res) => {
       author: req.user._id,
     });
 
+    notifyPostEvent("created", newPost);
     res.status(201).json(newPost);
   } catch (error) {
     console.error("Error creating post:", error);
@@ -109,6 +111,7 @@ router.put("/:id", protect, upload.array("images", 5), async (req, res) => {
     }
 
     const updatedPost = await post.save();
+    notifyPostEvent("updated", updatedPost);
     res.json({ message: "Post updated successfully", post: updatedPost });
   } catch (error) {
     console.error("Error updating post:", error);
@@ -129,6 +132,7 @@ router.delete("/:id", protect, async (req, res) => {
         .status(404)
         .json({ message: "Post not found or not authorized" });
 
+    notifyPostEvent("deleted", post);
     res.json({ message: "Post deleted successfully" });
   } catch (error) {
     console.error("Error deleting post:", error);
@@ -0,0 +1,38 @@
+import crypto from "crypto";
+
+// Push post changes to the AI service's ingest webhook. The AI service debounces
+// and coalesces events per post, so every save (including autosaves) can be sent.
+// Does nothing unless AI_WEBHOOK_URL is set; failures never affect the request.
+export const notifyPostEvent = (event, post) => {
+  const url = process.env.AI_WEBHOOK_URL;
+  if (!url) return;
+
+  const payload = { event, post_id: post._id.toString() };
+  if (event !== "deleted") {
+    Object.assign(payload, {
+      title: post.title,
+      content: post.content,
+      author: post.author.toString(),
+      updated_at: (post.updatedAt || new Date()).toISOString(),
+    });
+  }
+
+  const body = JSON.stringify(payload);
+  const headers = { "Content-Type": "application/json" };
+  if (process.env.AI_WEBHOOK_SECRET) {
+    headers["X-Webhook-Signature"] =
+      "sha256=" +
+      crypto
+        .createHmac("sha256", process.env.AI_WEBHOOK_SECRET)
+        .update(body)
+        .digest("hex");
+  }
+
+  fetch(url, { method: "POST", headers, body })
+    .then((response) => {
+      if (!response.ok) {
+        console.error(`AI webhook rejected ${event} event:`, response.status);
+      }
+    })
+    .catch((error) => console.error("Error sending AI webhook:", error.message));
+};
@@ -0,0 +1,150 @@
+"""
+Pools of pre-built crew executors.
+Each executor is a private copy of an action's agent with its task and crew,
+built once and reused. A request checks an executor out, fills in the task
+description, runs the crew and returns it; the executor's per-run state is
+reset before the next request gets it. Concurrent requests (and the parallel
+calls of one request, see ai/fanout.py) therefore never share an agent.
+"""
+
+import os
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List
+
+from crewai import Agent, Crew, Task
+
+logger = logging.getLogger(__name__)
+
+
+class CrewExecutor:
+    """One agent copy with a single-task crew, used by one request at a time."""
+
+    def __init__(self, agent: Agent, task_config: Dict[str, str]):
+        self.agent = agent.copy()
+        self.description_template = task_config['description']
+        self.task = Task(
+            description=self.description_template,
+            expected_output=task_config['expected_output'],
+            agent=self.agent
+        )
+        self.crew = Crew(agents=[self.agent], tasks=[self.task])
+        self.runs = 0
+
+    def run(self, **inputs):
+        """Fill in the task description and run the crew."""
+        self.task.description = self.description_template.format(**inputs)
+        self.runs += 1
+        return self.crew.kickoff()
+
+    def reset(self):
+        """Clear what the last run left on the task and agent."""
+        self.task.output = None
+        self.task.description = self.description_template
+        self.task.used_tools = 0
+        self.task.tools_errors = 0
+        self.task.delegations = 0
+        self.task.retry_count = 0
+        self.task.processed_by_agents = set()
+        self.task.start_time = None
+        self.task.end_time = None
+        self.agent.tools_results = []
+        # Counts failed attempts against max_retry_limit; never reset by crewai itself
+        self.agent._times_executed = 0
+
+
+class ExecutorPool:
+    def __init__(self, name: str, agent: Agent, task_config: Dict[str, str], size: int = 4):
+        """
+        Initialize the pool and build its executors.
+
+        Args:
+            name: Pool name (the task it runs), used in logs and stats
+            agent: Agent the executors copy
+            task_config: The task's description template and expected output (tasks.yaml)
+            size: Executors kept per worker process
+        """
+        self.name = name
+        self.agent = agent
+        self.task_config = task_config
+        self.size = max(1, size)
+        self._lock = threading.Lock()
+        self._idle: List[CrewExecutor] = [CrewExecutor(agent, task_config) for _ in range(self.size)]
+
+        # Metrics (since startup)
+        self._checkouts = 0
+        self._overflows = 0
+        self._discarded = 0
+        self._in_use = 0
+        self._max_in_use = 0
+        self._wait_seconds = 0.0
+
+    @contextmanager
+    def checkout(self) -> Iterator[CrewExecutor]:
+        """
+        Check out an executor for one run.
+        When all executors are busy an extra one is built rather than waiting, so
+        nested and parallel calls cannot deadlock; only `size` are kept afterwards.
+        Executors whose run raised are discarded.
+        """
+        started = time.perf_counter()
+        with self._lock:
+            executor = self._idle.pop() if self._idle else None
+            self._checkouts += 1
+            self._in_use += 1
+            self._max_in_use = max(self._max_in_use, self._in_use)
+            if executor is None:
+                self._overflows += 1
+        if executor is None:
+            logger.debug(f"Executor pool {self.name} exhausted, building an extra executor")
+            executor = CrewExecutor(self.agent, self.task_config)
+        with self._lock:
+            self._wait_seconds += time.perf_counter() - started
+
+        failed = False
+        try:
+            yield executor
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            if not failed:
+                executor.reset()
+            with self._lock:
+                self._in_use -= 1
+                if failed:
+                    self._discarded += 1
+                elif len(self._idle) < self.size:
+                    self._idle.append(executor)
+
+    def run(self, **inputs):
+        """Run the pool's task with the given template inputs on a checked-out executor."""
+        with self.checkout() as executor:
+            return executor.run(**inputs)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "in_use": self._in_use,
+                "max_in_use": self._max_in_use,
+                "checkouts": self._checkouts,
+                "overflows": self._overflows,
+                "discarded": self._discarded,
+                "mean_checkout_ms": round(self._wait_seconds / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+            }
+
+
+def create_executor_pool(name: str, agent: Agent, task_config: Dict[str, str], size: int = 0) -> ExecutorPool:
+    """
+    Create a pool configured from environment variables.
+    AGENT_POOL_SIZE defaults to AI_MAX_CONCURRENCY, the number of actions a worker runs at once.
+
+    Args:
+        size: Minimum size, for tasks that one request runs several of in parallel
+    """
+    default_size = int(os.getenv("AGENT_POOL_SIZE", os.getenv("AI_MAX_CONCURRENCY", "4")))
+    return ExecutorPool(name, agent, task_config, size=max(size, default_size))
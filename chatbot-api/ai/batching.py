@@ -0,0 +1,187 @@
+"""
+Micro-batching for query embeddings.
+Concurrent searches each need a single query vector. Instead of one embedding
+request per search, queries arriving within a few milliseconds of each other
+are collected (up to a maximum batch size), embedded with one call, and the
+vectors are routed back to their callers.
+"""
+
+import os
+import queue
+import threading
+import time
+import logging
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ai.resilience import DeadlineExceededError, remaining_time
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    def __init__(self, embedding_function, max_batch_size: int = 32, max_wait_ms: float = 5.0,
+                 cache_size: int = 1024, timeout: Optional[float] = 30.0):
+        """
+        Initialize the batcher. The collector thread is started lazily on first use.
+
+        Args:
+            embedding_function: Chroma embedding function used for the batched calls
+            max_batch_size: Maximum number of queries per embedding call
+            max_wait_ms: How long to wait for more queries after the first one arrives
+            cache_size: Recently embedded queries kept, so repeats (e.g. the intent
+                gate, then retrieval) cost nothing
+            timeout: Longest a caller waits for its embedding, in seconds (None for no bound);
+                the current action's deadline shortens it
+        """
+        self.embedding_function = embedding_function
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000.0
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._cache_hits = 0
+
+        # Metrics
+        self._batch_sizes: Counter = Counter()
+        self._requests = 0
+        self._batches = 0
+        self._errors = 0
+        self._timeouts = 0
+        self._embed_seconds = 0.0
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._collect_loop, name="embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue a query and return a future resolving to its embedding vector."""
+        future: Future = Future()
+        with self._lock:
+            cached = self._cache.get(text)
+            if cached is not None:
+                self._cache.move_to_end(text)
+                self._cache_hits += 1
+        if cached is not None:
+            future.set_result(cached)
+            return future
+        self._ensure_started()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        """Embed one query, blocking until its batch has been processed."""
+        return self.embed_many([text], timeout=timeout)[0]
+
+    def embed_many(self, texts: List[str], timeout: Optional[float] = None) -> List[List[float]]:
+        """
+        Embed several queries (batched with everyone else's), blocking until all are done.
+
+        Args:
+            texts: Queries to embed
+            timeout: Seconds to wait; defaults to the configured timeout, and never
+                exceeds the time left before the current action's deadline
+
+        Raises:
+            DeadlineExceededError: If the embeddings are not ready in time
+        """
+        bounds = [bound for bound in (self.timeout if timeout is None else timeout, remaining_time())
+                  if bound is not None]
+        wait_until = time.monotonic() + min(bounds) if bounds else None
+        futures = [self.submit(text) for text in texts]
+        try:
+            return [future.result(timeout=None if wait_until is None else max(0.0, wait_until - time.monotonic()))
+                    for future in futures]
+        except TimeoutError:
+            # Still-queued queries are dropped by the collector
+            for future in futures:
+                future.cancel()
+            self._timeouts += 1
+            raise DeadlineExceededError(f"Query embedding did not complete within {min(bounds):.1f}s")
+
+    def _collect_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    def _embed_texts(self, texts: List[str]):
+        # Mirror Chroma: use the query-specific embedding when the function has one
+        if hasattr(self.embedding_function, "embed_query"):
+            return self.embedding_function.embed_query(input=texts)
+        return self.embedding_function(texts)
+
+    def _process(self, batch: List[Tuple[str, Future]]):
+        # Queries whose caller cancelled are dropped; the others can no longer be cancelled
+        batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        # Identical queries in the same batch are embedded once
+        unique_texts = list(dict.fromkeys(text for text, _ in batch))
+        started = time.monotonic()
+        try:
+            vectors = self._embed_texts(unique_texts)
+            if len(vectors) != len(unique_texts):
+                raise ValueError(f"Expected {len(unique_texts)} embeddings, got {len(vectors)}")
+            by_text = {text: np.asarray(vector, dtype=np.float32).tolist()
+                       for text, vector in zip(unique_texts, vectors)}
+        except Exception as e:
+            self._errors += 1
+            logger.error(f"Batched embedding of {len(unique_texts)} queries failed: {str(e)}")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        finally:
+            self._embed_seconds += time.monotonic() - started
+            self._batch_sizes[len(batch)] += 1
+            self._requests += len(batch)
+            self._batches += 1
+
+        with self._lock:
+            for text, vector in by_text.items():
+                self._cache[text] = vector
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        for text, future in batch:
+            future.set_result(by_text[text])
+
+    def stats(self) -> Dict[str, Any]:
+        """Batch size distribution and provider round-trips saved."""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queries": self._requests,
+            "embedding_calls": self._batches,
+            "round_trips_saved": self._requests - self._batches,
+            "mean_batch_size": round(self._requests / self._batches, 2) if self._batches else 0.0,
+            "batch_sizes": dict(sorted(self._batch_sizes.items())),
+            "mean_embed_ms": round(self._embed_seconds / self._batches * 1000, 2) if self._batches else 0.0,
+            "errors": self._errors,
+            "timeouts": self._timeouts,
+            "cache_hits": self._cache_hits,
+            "queued": self._queue.qsize(),
+        }
+
+
+def create_embedding_batcher(embedding_function) -> EmbeddingBatcher:
+    """Create a batcher configured from environment variables."""
+    return EmbeddingBatcher(
+        embedding_function,
+        max_batch_size=int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32")),
+        max_wait_ms=float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5")),
+        timeout=float(os.getenv("EMBEDDING_BATCH_TIMEOUT_SECONDS", "30")),
+    )
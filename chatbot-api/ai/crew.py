@@ -1,25 +1,25 @@
-from crewai import Agent, LLM, Crew, Task
-from crewai_tools import TavilySearchTool
+from crewai import Agent
 from dotenv import load_dotenv
 import yaml
 import os
 
 # Import our custom tools
 from ai.tools import get_blog_retrieval_tool
+from ai.resilience import ResilientTavilySearchTool
+from ai.model_router import ModelRouter, current_call_trace
+from ai.result_cache import cache_key, get_result_cache
+from ai.summarization import create_map_reduce_summarizer
+from ai.paragraph_edit import create_paragraph_editor
+from ai.trend_research import create_trend_researcher
+from ai.agent_pool import create_executor_pool
 
 # Load environment variables
 load_dotenv()
 
 # --- TOOL DEFINITION ---
-search_tool = TavilySearchTool()
+search_tool = ResilientTavilySearchTool()
 blog_retrieval_tool = get_blog_retrieval_tool()
 
-# Configure LLM
-llm = LLM(
-    model="gemini/gemini-2.0-flash",
-    temperature=0.7,
-)
-
 # Load configuration files
 def load_config():
     config_dir = os.path.join(os.path.dirname(__file__), 'config')
@@ -35,163 +35,168 @@ def load_config():
 # Load configurations
 agents_config, tasks_config = load_config()
 
+# Configure per-action model routing (each model wrapped with deadlines, retries,
+# hedging and a circuit breaker)
+model_router = ModelRouter(agents_config.get('model_routing', {}))
+
 # --- AGENT DEFINITIONS ---
+# Agent reasoning is no longer printed per request; sampled transcripts go to the
+# trace store instead (see ai/trace_store.py). AGENT_VERBOSE=true prints it for local debugging.
+agent_verbose = os.getenv("AGENT_VERBOSE", "false").lower() == "true"
+
 trend_spotter = Agent(
-    llm=llm,
+    llm=model_router.llm_for("discover_trends"),
     role=agents_config['trend_spotter']['role'],
     goal=agents_config['trend_spotter']['goal'],
     backstory=agents_config['trend_spotter']['backstory'],
     tools=[search_tool],
-    verbose=True,
+    verbose=agent_verbose,
     allow_delegation=False
 )
 
 content_summarizer = Agent(
-    llm=llm,
+    llm=model_router.llm_for("summarize"),
     role=agents_config['content_summarizer']['role'],
     goal=agents_config['content_summarizer']['goal'],
     backstory=agents_config['content_summarizer']['backstory'],
     tools=[],
-    verbose=True,
+    verbose=agent_verbose,
     allow_delegation=False
 )
 
 post_editor = Agent(
-    llm=llm,
+    llm=model_router.llm_for("edit"),
     role=agents_config['post_editor']['role'],
     goal=agents_config['post_editor']['goal'],
     backstory=agents_config['post_editor']['backstory'],
     tools=[],
-    verbose=True,
+    verbose=agent_verbose,
     allow_delegation=False
 )
 
 chat_agent = Agent(
-    llm=llm,
+    llm=model_router.llm_for("chat"),
     role=agents_config['chat_agent']['role'],
     goal=agents_config['chat_agent']['goal'],
     backstory=agents_config['chat_agent']['backstory'],
     tools=[blog_retrieval_tool],  # Now has access to the knowledge base!
-    verbose=True,
+    verbose=agent_verbose,
     allow_delegation=False
 )
 
 trend_based_writer = Agent(
-    llm=llm,
+    llm=model_router.llm_for("trend_based_write"),
     role=agents_config['trend_based_writer']['role'],
     goal=agents_config['trend_based_writer']['goal'],
     backstory=agents_config['trend_based_writer']['backstory'],
     tools=[search_tool],  # Has access to search tool for trend research
-    verbose=True,
+    verbose=agent_verbose,
     allow_delegation=False
 )
 
-# --- TASK CREATION FUNCTIONS ---
-def create_trend_discovery_task(topic: str, current_date: str):
-    return Task(
-        description=tasks_config['discover_trends']['description'].format(
-            topic=topic,
-            current_date=current_date
-        ),
-        expected_output=tasks_config['discover_trends']['expected_output'],
-        agent=trend_spotter
-    )
-
-def create_content_summary_task(original_content: str, desired_length: str = "one paragraph"):
-    return Task(
-        description=tasks_config['summarize_content']['description'].format(
-            original_content=original_content,
-            desired_length=desired_length
-        ),
-        expected_output=tasks_config['summarize_content']['expected_output'],
-        agent=content_summarizer
-    )
-
-def create_post_editing_task(draft_content: str, editing_goal: str):
-    return Task(
-        description=tasks_config['edit_post_draft']['description'].format(
-            draft_content=draft_content,
-            editing_goal=editing_goal
-        ),
-        expected_output=tasks_config['edit_post_draft']['expected_output'],
-        agent=post_editor
-    )
-
-def create_blog_generation_task(topic: str, keywords: str, target_audience: str):
-    return Task(
-        description=tasks_config['generate_blog_draft']['description'].format(
-            topic=topic,
-            keywords=keywords,
-            target_audience=target_audience
-        ),
-        expected_output=tasks_config['generate_blog_draft']['expected_output'],
-        agent=post_editor
-    )
-
-def create_chat_task(chat_history: str, retrieved_context: str, user_question: str):
-    return Task(
-        description=tasks_config['answer_from_knowledge_base']['description'].format(
-            chat_history=chat_history,
-            retrieved_context=retrieved_context,
-            user_question=user_question
-        ),
-        expected_output=tasks_config['answer_from_knowledge_base']['expected_output'],
-        agent=chat_agent
-    )
-
-def create_trend_based_writing_task(trend_topic: str, target_audience: str = "general readers", post_length: str = "medium-length"):
-    return Task(
-        description=tasks_config['research_and_write_from_trend']['description'].format(
-            trend_topic=trend_topic,
-            target_audience=target_audience,
-            post_length=post_length
-        ),
-        expected_output=tasks_config['research_and_write_from_trend']['expected_output'],
-        agent=trend_based_writer
-    )
+# Writes from a research brief gathered beforehand (see ai/trend_research.py), so it needs no tools
+trend_brief_writer = Agent(
+    llm=model_router.llm_for("trend_based_write"),
+    role=agents_config['trend_based_writer']['role'],
+    goal=agents_config['trend_based_writer']['goal'],
+    backstory=agents_config['trend_based_writer']['backstory'],
+    tools=[],
+    verbose=agent_verbose,
+    allow_delegation=False
+)
+
+# --- EXECUTOR POOLS ---
+# Each action runs on its own pre-built agent copy, task and crew (see ai/agent_pool.py),
+# so concurrent requests never share an agent and no crew is built per request
+trend_discovery_pool = create_executor_pool("discover_trends", trend_spotter, tasks_config['discover_trends'])
+content_summary_pool = create_executor_pool("summarize_content", content_summarizer, tasks_config['summarize_content'])
+combine_summaries_pool = create_executor_pool("combine_section_summaries", content_summarizer, tasks_config['combine_section_summaries'])
+post_editing_pool = create_executor_pool("edit_post_draft", post_editor, tasks_config['edit_post_draft'])
+blog_generation_pool = create_executor_pool("generate_blog_draft", post_editor, tasks_config['generate_blog_draft'])
+chat_pool = create_executor_pool("answer_from_knowledge_base", chat_agent, tasks_config['answer_from_knowledge_base'])
+trend_writing_pool = create_executor_pool("research_and_write_from_trend", trend_based_writer, tasks_config['research_and_write_from_trend'])
+brief_writing_pool = create_executor_pool("write_from_research_brief", trend_brief_writer, tasks_config['write_from_research_brief'])
 
 # --- CREW EXECUTION FUNCTIONS ---
 def execute_trend_discovery(topic: str):
     from datetime import datetime
     current_date = datetime.now().strftime("%Y-%m-%d")
     
-    task = create_trend_discovery_task(topic, current_date)
-    crew = Crew(agents=[trend_spotter], tasks=[task])
-    
-    result = crew.kickoff()
+    result = trend_discovery_pool.run(topic=topic, current_date=current_date)
     return result
 
+def summarize_section(section: str, index: int, total: int) -> str:
+    # Sections run concurrently, each on its own pooled executor
+    return str(section_summary_pool.run(section=section, section_number=index + 1, section_count=total)).strip()
+
+def combine_section_summaries(summaries: list, length: str = "one paragraph"):
+    section_summaries = "\n\n".join(f"Section {i + 1}: {summary}" for i, summary in enumerate(summaries))
+    return combine_summaries_pool.run(section_summaries=section_summaries, desired_length=length)
+
+# Long content is summarized section by section (cached), then combined.
+# The cache key covers the section prompt and the summarize model.
+map_reduce_summarizer = create_map_reduce_summarizer(
+    summarize_section,
+    combine_section_summaries,
+    cache=get_result_cache(),
+    cache_version=cache_key(str(tasks_config['summarize_section']), model_router.route_for("summarize").primary)
+)
+section_summary_pool = create_executor_pool("summarize_section", content_summarizer, tasks_config['summarize_section'],
+                                            size=map_reduce_summarizer.max_workers)
+
 def execute_content_summary(content: str, length: str = "one paragraph"):
-    task = create_content_summary_task(content, length)
-    crew = Crew(agents=[content_summarizer], tasks=[task])
+    if map_reduce_summarizer.needs_map_reduce(content):
+        # The combined result's token usage covers the section calls as well (same call trace)
+        return map_reduce_summarizer.summarize(content, length)
     
-    result = crew.kickoff()
+    result = content_summary_pool.run(original_content=content, desired_length=length)
     return result
 
 def execute_post_editing(draft: str, goal: str):
-    task = create_post_editing_task(draft, goal)
-    crew = Crew(agents=[post_editor], tasks=[task])
+    result = post_editing_pool.run(draft_content=draft, editing_goal=goal)
+    return result
+
+def edit_paragraph(paragraph: str, goal: str, draft_context: str) -> str:
+    # Paragraphs run concurrently, each on its own pooled executor
+    return str(paragraph_editing_pool.run(paragraph=paragraph, editing_goal=goal, draft_context=draft_context))
+
+# Paragraph-level edits are cached per (prompt, model, goal, paragraph)
+paragraph_editor = create_paragraph_editor(
+    edit_paragraph,
+    cache=get_result_cache(),
+    cache_version=cache_key(str(tasks_config['edit_paragraph']), model_router.route_for("edit").primary)
+)
+paragraph_editing_pool = create_executor_pool("edit_paragraph", post_editor, tasks_config['edit_paragraph'],
+                                              size=paragraph_editor.max_workers)
+
+def execute_paragraph_editing(draft: str, goal: str):
+    """
+    Edit a draft paragraph by paragraph, concurrently.
     
-    result = crew.kickoff()
+    Returns:
+        EditResult with the revised text and the changed spans
+    """
+    result = paragraph_editor.edit(draft, goal)
+    trace = current_call_trace()
+    result.token_usage = dict(trace.usage) if trace else None
     return result
 
 def execute_blog_generation(topic: str, keywords: str, audience: str):
-    task = create_blog_generation_task(topic, keywords, audience)
-    crew = Crew(agents=[post_editor], tasks=[task])
-    
-    result = crew.kickoff()
+    result = blog_generation_pool.run(topic=topic, keywords=keywords, target_audience=audience)
     return result
 
 def execute_chat_response(chat_history: str, retrieved_context: str, user_question: str):
-    task = create_chat_task(chat_history, retrieved_context, user_question)
-    crew = Crew(agents=[chat_agent], tasks=[task])
-    
-    result = crew.kickoff()
+    result = chat_pool.run(chat_history=chat_history, retrieved_context=retrieved_context, user_question=user_question)
     return result
 
+# Sub-query searches for trend-based writing run concurrently
+trend_researcher = create_trend_researcher(search_tool._run)
+
 def execute_trend_based_writing(trend_topic: str, target_audience: str = "general readers", post_length: str = "medium-length"):
     """
     Execute trend-based blog post creation.
+    By default, research runs as parallel searches condensed into a brief, followed
+    by one writing call. TREND_WRITE_MODE=agent lets the writer agent search itself.
     
     Args:
         trend_topic: The trending topic or keyword to research and write about
@@ -201,8 +206,21 @@ def execute_trend_based_writing(trend_topic: str, target_audience: str = "genera
     Returns:
         A complete blog post based on current trends
     """
-    task = create_trend_based_writing_task(trend_topic, target_audience, post_length)
-    crew = Crew(agents=[trend_based_writer], tasks=[task])
+    if os.getenv("TREND_WRITE_MODE", "pipeline").lower() != "agent":
+        research_brief = trend_researcher.research(trend_topic)
+        return brief_writing_pool.run(
+            trend_topic=trend_topic,
+            target_audience=target_audience,
+            post_length=post_length,
+            research_brief=research_brief or "No research results are available."
+        )
     
-    result = crew.kickoff()
-    return result
\ No newline at end of file
+    result = trend_writing_pool.run(trend_topic=trend_topic, target_audience=target_audience, post_length=post_length)
+    return result
+
+def executor_pool_stats():
+    """Checkouts, overflows and occupancy of each executor pool."""
+    pools = [trend_discovery_pool, content_summary_pool, section_summary_pool, combine_summaries_pool,
+             post_editing_pool, paragraph_editing_pool, blog_generation_pool, chat_pool,
+             trend_writing_pool, brief_writing_pool]
+    return {pool.name: pool.stats() for pool in pools}
\ No newline at end of file
@@ -0,0 +1,218 @@
+"""
+Near-duplicate detection for blog posts.
+Each post is reduced to a MinHash signature of its word shingles. Signatures
+are split into LSH bands stored in a SQLite index, so finding the candidates
+for a new post is a handful of indexed lookups instead of a scan over the
+corpus. Candidates are confirmed with the estimated Jaccard similarity.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import zlib
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEDUP_MODES = ("off", "flag", "merge")
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def shingle_hashes(text: str, size: int = 5) -> np.ndarray:
+    """32-bit hashes of the word shingles of a text (lowercased, punctuation ignored)."""
+    words = _TOKEN_PATTERN.findall(text.lower())
+    if len(words) < size:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64)
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        """Multiply-shift hash family; the same seed always produces comparable signatures."""
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str, shingle_size: int = 5) -> np.ndarray:
+        hashes = shingle_hashes(text, shingle_size)
+        with np.errstate(over="ignore"):
+            permuted = (self.a[:, None] * hashes[None, :] + self.b[:, None]) >> np.uint64(32)
+        return permuted.min(axis=1).astype(np.uint32)
+
+
+def estimate_similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two MinHash signatures."""
+    return float(np.mean(first == second))
+
+
+class DuplicateDetector:
+    def __init__(self, db_path: str = "./data/dedup.db", threshold: float = 0.8,
+                 num_perm: int = 128, bands: int = 16, shingle_size: int = 5):
+        """
+        Initialize the detector and its persistent LSH index.
+
+        Args:
+            db_path: SQLite file holding signatures and band buckets
+            threshold: Estimated Jaccard similarity above which posts are duplicates
+            num_perm: MinHash signature length
+            bands: LSH bands (num_perm / bands rows each); more bands find lower similarities
+            shingle_size: Words per shingle
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.db_path = db_path
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.hasher = MinHasher(num_perm)
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._init_db()
+
+    def _init_db(self):
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS signatures (post_id TEXT PRIMARY KEY, signature BLOB NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS lsh_buckets (band INTEGER NOT NULL, bucket INTEGER NOT NULL, "
+                "post_id TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_lsh_bucket ON lsh_buckets (band, bucket)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_lsh_post ON lsh_buckets (post_id)")
+
+    def signature(self, text: str) -> np.ndarray:
+        return self.hasher.signature(text, self.shingle_size)
+
+    def _buckets(self, signature: np.ndarray) -> List[Tuple[int, int]]:
+        buckets = []
+        for band in range(self.bands):
+            digest = hashlib.blake2b(signature[band * self.rows:(band + 1) * self.rows].tobytes(), digest_size=8)
+            buckets.append((band, int.from_bytes(digest.digest(), "big", signed=True)))
+        return buckets
+
+    def _load_signatures(self, post_ids: Iterable[str]) -> Dict[str, np.ndarray]:
+        post_ids = list(post_ids)
+        signatures = {}
+        for start in range(0, len(post_ids), 500):
+            chunk = post_ids[start:start + 500]
+            rows = self._conn.execute(
+                f"SELECT post_id, signature FROM signatures WHERE post_id IN ({','.join('?' * len(chunk))})", chunk
+            )
+            signatures.update({post_id: np.frombuffer(blob, dtype=np.uint32) for post_id, blob in rows})
+        return signatures
+
+    def find_duplicates(self, text: str, exclude: Optional[str] = None,
+                        signature: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """Indexed posts similar to `text`, as (post_id, similarity), most similar first."""
+        signature = self.signature(text) if signature is None else signature
+        with self._lock:
+            candidates = set()
+            for band, bucket in self._buckets(signature):
+                candidates.update(row[0] for row in self._conn.execute(
+                    "SELECT post_id FROM lsh_buckets WHERE band = ? AND bucket = ?", (band, bucket)
+                ))
+            candidates.discard(exclude)
+            stored = self._load_signatures(candidates)
+
+        matches = [(post_id, estimate_similarity(signature, other)) for post_id, other in stored.items()]
+        return sorted([match for match in matches if match[1] >= self.threshold], key=lambda match: -match[1])
+
+    def add(self, post_id: str, text: str, signature: Optional[np.ndarray] = None):
+        """Index (or re-index) a post."""
+        signature = self.signature(text) if signature is None else signature
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM lsh_buckets WHERE post_id = ?", (post_id,))
+            self._conn.execute("INSERT OR REPLACE INTO signatures (post_id, signature) VALUES (?, ?)",
+                               (post_id, signature.tobytes()))
+            self._conn.executemany("INSERT INTO lsh_buckets (band, bucket, post_id) VALUES (?, ?, ?)",
+                                   [(band, bucket, post_id) for band, bucket in self._buckets(signature)])
+
+    def remove(self, post_ids: Iterable[str]):
+        post_ids = [(post_id,) for post_id in post_ids]
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM lsh_buckets WHERE post_id = ?", post_ids)
+            self._conn.executemany("DELETE FROM signatures WHERE post_id = ?", post_ids)
+
+    def indexed_ids(self) -> set:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT post_id FROM signatures")}
+
+    def find_clusters(self, threshold: Optional[float] = None) -> List[Dict[str, object]]:
+        """
+        Groups of near-duplicate posts among everything indexed.
+        Only posts sharing an LSH bucket are compared, so this stays far below
+        the all-pairs cost.
+        """
+        threshold = self.threshold if threshold is None else threshold
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT b.band, b.bucket, b.post_id FROM lsh_buckets b JOIN "
+                "(SELECT band, bucket FROM lsh_buckets GROUP BY band, bucket HAVING COUNT(*) > 1) s "
+                "ON b.band = s.band AND b.bucket = s.bucket ORDER BY b.band, b.bucket"
+            ).fetchall()
+            buckets: Dict[Tuple[int, int], List[str]] = {}
+            for band, bucket, post_id in rows:
+                buckets.setdefault((band, bucket), []).append(post_id)
+            signatures = self._load_signatures({post_id for _, _, post_id in rows})
+
+        # Union-find over confirmed pairs
+        parent = {post_id: post_id for post_id in signatures}
+        def find(post_id):
+            while parent[post_id] != post_id:
+                parent[post_id] = parent[parent[post_id]]
+                post_id = parent[post_id]
+            return post_id
+
+        similarities: Dict[Tuple[str, str], float] = {}
+        for members in buckets.values():
+            for i, first in enumerate(members):
+                for second in members[i + 1:]:
+                    pair = (first, second) if first < second else (second, first)
+                    if pair in similarities:
+                        continue
+                    similarities[pair] = estimate_similarity(signatures[first], signatures[second])
+                    if similarities[pair] >= threshold:
+                        parent[find(first)] = find(second)
+
+        clusters: Dict[str, List[str]] = {}
+        for post_id in signatures:
+            clusters.setdefault(find(post_id), []).append(post_id)
+
+        report = []
+        for members in clusters.values():
+            if len(members) < 2:
+                continue
+            members.sort()
+            pairs = [{"post_ids": list(pair), "similarity": round(score, 3)}
+                     for pair, score in similarities.items()
+                     if score >= threshold and pair[0] in members and pair[1] in members]
+            report.append({"post_ids": members, "pairs": pairs})
+        return sorted(report, key=lambda cluster: -len(cluster["post_ids"]))
+
+
+# Global detector instance (lazy initialization)
+_detector = None
+
+def get_duplicate_detector() -> DuplicateDetector:
+    """Get the global duplicate detector configured from environment variables."""
+    global _detector
+    if _detector is None:
+        _detector = DuplicateDetector(
+            db_path=os.getenv("DEDUP_DB_PATH", "./data/dedup.db"),
+            threshold=float(os.getenv("DEDUP_THRESHOLD", "0.8")),
+        )
+    return _detector
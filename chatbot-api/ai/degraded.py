@@ -0,0 +1,100 @@
+"""
+Degraded serving mode for chat.
+When the LLM tier is saturated (deep chat queue) or down (every model's circuit
+breaker is open), chat answers are built directly from the best-matching blog
+passages, with no LLM call, and are clearly marked as degraded.
+"""
+
+import os
+import threading
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from ai.rerank import tokenize
+from ai.segmentation import split_sentences
+from ai.scheduler import ACTION_PRIORITIES
+
+logger = logging.getLogger(__name__)
+
+DEGRADED_NOTICE = ("[Degraded mode] The AI assistant is temporarily unavailable, "
+                   "so here are the most relevant passages from the blog:")
+NO_RESULTS_NOTICE = ("[Degraded mode] The AI assistant is temporarily unavailable and no blog posts "
+                     "matched your question. Please try again in a moment.")
+
+
+def best_sentences(question: str, content: str, count: int = 2) -> List[str]:
+    """The sentences of `content` sharing the most terms with the question, in original order."""
+    sentences = split_sentences(content)
+    query_terms = set(tokenize(question))
+    ranked = sorted(range(len(sentences)),
+                    key=lambda i: (-len(query_terms & set(tokenize(sentences[i]))), i))
+    return [sentences[i] for i in sorted(ranked[:count])]
+
+
+def build_extractive_answer(question: str, results: List[Dict[str, Any]], sentences_per_post: int = 2) -> str:
+    """Answer from search results alone: post titles and their best-matching sentences."""
+    if not results:
+        return NO_RESULTS_NOTICE
+
+    parts = [DEGRADED_NOTICE, ""]
+    for result in results:
+        title = (result.get("metadata") or {}).get("title", "Untitled")
+        content = result["content"]
+        if content.startswith("Title: "):
+            content = content.split("\n\nContent: ", 1)[-1]
+        passage = " ".join(best_sentences(question, content, sentences_per_post))
+        parts.append(f"- {title}: {passage}")
+    return "\n".join(parts)
+
+
+class DegradedModeController:
+    def __init__(self, scheduler, router, queue_depth_threshold: int = 20, enabled: bool = True):
+        """
+        Decide when to serve degraded answers.
+
+        Args:
+            scheduler: AIScheduler whose queue depth is watched
+            router: ModelRouter whose models' circuit breakers are watched
+            queue_depth_threshold: Queued jobs in the action's priority class that trigger degradation
+            enabled: Whether degraded answers may be served at all
+        """
+        self.scheduler = scheduler
+        self.router = router
+        self.queue_depth_threshold = queue_depth_threshold
+        self.enabled = enabled
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def reason(self, action: str = "chat") -> Optional[str]:
+        """Why the action should be served degraded right now, or None."""
+        if not self.enabled:
+            return None
+        if self.router.unavailable(action):
+            return "provider_unavailable"
+        if self.scheduler.queue_depth(ACTION_PRIORITIES.get(action)) >= self.queue_depth_threshold:
+            return "queue_saturated"
+        return None
+
+    def record(self, reason: str):
+        with self._lock:
+            self._counts[reason] += 1
+        logger.warning(f"Serving degraded chat answer ({reason})")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "queue_depth_threshold": self.queue_depth_threshold,
+            "current_reason": self.reason(),
+            "served": dict(self._counts),
+        }
+
+
+def create_degraded_mode_controller(scheduler, router) -> DegradedModeController:
+    """Create the controller configured from environment variables."""
+    return DegradedModeController(
+        scheduler,
+        router,
+        queue_depth_threshold=int(os.getenv("DEGRADED_QUEUE_DEPTH", "20")),
+        enabled=os.getenv("DEGRADED_MODE", "on").lower() != "off",
+    )
@@ -0,0 +1,179 @@
+"""
+Local embedding backend for fully offline operation.
+Runs all-MiniLM-L6-v2 (the same model as Chroma's default embedding function)
+with ONNX Runtime in a process pool sized to the machine, so embedding work
+never competes with request handling in the API worker. Inputs are batched by
+length with dynamic padding, and an int8-quantized model can be used instead
+of the float32 one.
+"""
+
+import multiprocessing
+import os
+import threading
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils.embedding_functions import ONNXMiniLM_L6_V2
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.path.join(str(ONNXMiniLM_L6_V2.DOWNLOAD_PATH), ONNXMiniLM_L6_V2.EXTRACTED_FOLDER_NAME)
+QUANTIZED_MODEL_FILE = "model_int8.onnx"
+EMBEDDING_DIM = 384
+
+
+def ensure_model_files(quantized: bool = False) -> str:
+    """Download the ONNX model if needed (and quantize it once). Returns the model path."""
+    ONNXMiniLM_L6_V2()._download_model_if_not_exists()
+    model_path = os.path.join(MODEL_DIR, "model.onnx")
+    if not quantized:
+        return model_path
+
+    quantized_path = os.path.join(MODEL_DIR, QUANTIZED_MODEL_FILE)
+    if not os.path.exists(quantized_path):
+        try:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+        except ImportError:
+            logger.warning("onnx is not installed, cannot quantize; using the float32 model")
+            return model_path
+        logger.info("Quantizing embedding model to int8 (one-time)")
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+    return quantized_path
+
+
+class _OnnxEncoder:
+    """Tokenizer + ONNX session living inside one worker process."""
+
+    def __init__(self, model_path: str, max_length: int = 256, threads: int = 1):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(MODEL_DIR, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        # Pad to the longest input of each batch rather than to max_length
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.log_severity_level = 3
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, sess_options=options,
+                                            providers=["CPUExecutionProvider"])
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+        outputs = self.session.run(None, {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": np.zeros_like(input_ids),
+        })
+
+        # Attention-weighted mean pooling, then L2 normalization
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (outputs[0] * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+
+# Per-process encoder, created by the pool initializer
+_worker_encoder: Optional[_OnnxEncoder] = None
+
+def _init_worker(model_path: str, max_length: int, threads: int):
+    global _worker_encoder
+    _worker_encoder = _OnnxEncoder(model_path, max_length=max_length, threads=threads)
+
+def _encode_batch(texts: List[str]) -> np.ndarray:
+    return _worker_encoder.encode(texts)
+
+
+class LocalEmbeddingFunction(EmbeddingFunction[Documents]):
+    def __init__(self, workers: Optional[int] = None, batch_size: int = 32,
+                 quantized: bool = False, max_length: int = 256):
+        """
+        Initialize the local embedding backend. The pool is started lazily on first use.
+
+        Args:
+            workers: Number of worker processes (defaults to the number of cores)
+            batch_size: Maximum number of texts per model invocation
+            quantized: Use the int8-quantized model (faster, slightly lower fidelity)
+            max_length: Maximum tokens per text; longer texts are truncated
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.quantized = quantized
+        self.max_length = max_length
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                model_path = ensure_model_files(self.quantized)
+                # Spawn (not fork): the API process has threads, and workers only need the model
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(model_path, self.max_length, 1),
+                )
+                logger.info(f"Started local embedding pool: {self.workers} workers, "
+                            f"{'int8' if self.quantized else 'float32'} model")
+            return self._pool
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        """Embed texts and return a (len(texts), dim) float32 matrix in input order."""
+        if not texts:
+            return np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+
+        # Group texts of similar length so each batch needs little padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batches = [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+
+        pool = self._get_pool()
+        results = pool.map(_encode_batch, [[texts[i] for i in batch] for batch in batches])
+
+        embeddings = np.empty((len(texts), EMBEDDING_DIM), dtype=np.float32)
+        for batch, vectors in zip(batches, results):
+            embeddings[batch] = vectors
+        return embeddings
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return [vector for vector in self.embed_array(list(input))]
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    @staticmethod
+    def name() -> str:
+        return "local_minilm"
+
+    def get_config(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "batch_size": self.batch_size,
+            "quantized": self.quantized,
+            "max_length": self.max_length,
+        }
+
+    @staticmethod
+    def build_from_config(config: Dict[str, Any]) -> "LocalEmbeddingFunction":
+        return LocalEmbeddingFunction(**config)
+
+
+def get_local_embedding_function() -> LocalEmbeddingFunction:
+    """Create the local embedding backend configured from environment variables."""
+    workers = os.getenv("LOCAL_EMBEDDING_WORKERS")
+    return LocalEmbeddingFunction(
+        workers=int(workers) if workers else None,
+        batch_size=int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "32")),
+        quantized=os.getenv("LOCAL_EMBEDDING_QUANTIZED", "false").lower() == "true",
+    )
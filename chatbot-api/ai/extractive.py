@@ -0,0 +1,176 @@
+"""
+Local extractive summarization.
+For short gists ("three bullet points", "one paragraph") of an existing post,
+the most central sentences are picked with TextRank instead of running an LLM
+agent. Sentences are TF-IDF vectors (or embeddings), the sentence similarity
+graph is one matrix product, and centrality is a PageRank power iteration.
+"""
+
+import os
+import re
+import logging
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from ai.rerank import tokenize
+from ai.segmentation import is_heading, split_sentences
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_MODES = ("llm", "extractive")
+_NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+                 "seven": 7, "eight": 8, "nine": 9, "ten": 10, "a single": 1, "a": 1}
+_COUNT_PATTERN = re.compile(r"\b(\d+|a single|one|two|three|four|five|six|seven|eight|nine|ten|a)\s+"
+                            r"(?:short\s+|key\s+|main\s+)?(bullet|point|sentence|paragraph|line)", re.IGNORECASE)
+_MIN_SENTENCE_WORDS = 4
+
+
+def parse_desired_length(desired_length: Optional[str]) -> Tuple[int, bool]:
+    """
+    Translate a desired length ("three bullet points", "one paragraph", "2 sentences")
+    into a sentence count and whether to format the result as bullets.
+    """
+    text = (desired_length or "one paragraph").lower()
+    match = _COUNT_PATTERN.search(text)
+    count = 1
+    if match:
+        number = match.group(1).lower()
+        count = int(number) if number.isdigit() else _NUMBER_WORDS[number]
+    unit = match.group(2).lower() if match else ""
+
+    if unit in ("bullet", "point", "line"):
+        return max(1, count), True
+    if unit == "sentence":
+        return max(1, count), False
+    if "short" in text or "brief" in text:
+        return 3, False
+    # Paragraphs, or anything we don't recognize: about four sentences each
+    return 4 * max(1, count), False
+
+
+def tfidf_vectors(sentences: List[str]) -> np.ndarray:
+    """L2-normalized TF-IDF vectors (one row per sentence), with a sublinear term frequency."""
+    tokenized = [tokenize(sentence) for sentence in sentences]
+    vocabulary = {}
+    for tokens in tokenized:
+        for token in tokens:
+            vocabulary.setdefault(token, len(vocabulary))
+
+    counts = np.zeros((len(sentences), max(1, len(vocabulary))), dtype=np.float32)
+    for row, tokens in enumerate(tokenized):
+        for token in tokens:
+            counts[row, vocabulary[token]] += 1
+
+    document_frequency = np.count_nonzero(counts, axis=0)
+    idf = np.log((1 + len(sentences)) / (1 + document_frequency)) + 1.0
+    weights = np.log1p(counts) * idf
+    return weights / np.clip(np.linalg.norm(weights, axis=1, keepdims=True), 1e-12, None)
+
+
+def textrank_scores(similarity: np.ndarray, damping: float = 0.85, iterations: int = 100,
+                    tolerance: float = 1e-6) -> np.ndarray:
+    """PageRank centrality over a sentence similarity matrix."""
+    n = similarity.shape[0]
+    weights = np.clip(similarity, 0.0, None)
+    np.fill_diagonal(weights, 0.0)
+    row_sums = weights.sum(axis=1, keepdims=True)
+    # Sentences sharing nothing with the rest spread their weight evenly
+    transition = np.where(row_sums > 0, weights / np.where(row_sums > 0, row_sums, 1.0), 1.0 / n)
+
+    scores = np.full(n, 1.0 / n)
+    for _ in range(iterations):
+        updated = (1 - damping) / n + damping * (transition.T @ scores)
+        if np.abs(updated - scores).sum() < tolerance:
+            return updated
+        scores = updated
+    return scores
+
+
+class ExtractiveSummarizer:
+    def __init__(self, embed_texts: Optional[Callable[[List[str]], List[List[float]]]] = None,
+                 lead_bias: float = 0.1, redundancy_threshold: float = 0.8):
+        """
+        Initialize the summarizer.
+
+        Args:
+            embed_texts: Callable embedding a list of sentences; None uses TF-IDF vectors
+            lead_bias: Extra weight for sentences near the start of the post, where
+                blog posts usually state their point
+            redundancy_threshold: Cosine similarity above which a sentence counts as a
+                repeat of one already in the summary
+        """
+        self.embed_texts = embed_texts
+        self.lead_bias = lead_bias
+        self.redundancy_threshold = redundancy_threshold
+
+    def _vectors(self, sentences: List[str]) -> np.ndarray:
+        if self.embed_texts is None:
+            return tfidf_vectors(sentences)
+        vectors = np.asarray(self.embed_texts(sentences), dtype=np.float32)
+        return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+    def select(self, sentences: List[str], count: int) -> List[int]:
+        """
+        Indices of the `count` best sentences, in original order. Sentences are
+        scored by TextRank centrality plus the lead bias; near-duplicates of an
+        already selected sentence are skipped.
+        """
+        vectors = self._vectors(sentences)
+        similarity = vectors @ vectors.T
+        scores = textrank_scores(similarity)
+        position = np.arange(len(sentences), dtype=np.float64)
+        scores = scores / scores.max() + self.lead_bias * np.exp(-position / 5.0)
+        # Fragments make poor summary sentences
+        word_counts = np.array([len(sentence.split()) for sentence in sentences])
+        scores = np.where(word_counts >= _MIN_SENTENCE_WORDS, scores, scores - 10.0)
+
+        selected: List[int] = []
+        for index in np.argsort(-scores, kind="stable"):
+            if len(selected) == count:
+                break
+            if selected and similarity[index, selected].max() > self.redundancy_threshold:
+                continue
+            selected.append(int(index))
+        return sorted(selected)
+
+    def summarize(self, content: str, desired_length: Optional[str] = "one paragraph") -> str:
+        """
+        Summarize content by selecting its most central sentences.
+
+        Args:
+            content: Text to summarize
+            desired_length: e.g. "three bullet points", "one paragraph", "2 sentences"
+
+        Returns:
+            The selected sentences in their original order, as a paragraph or bullets
+        """
+        count, bullets = parse_desired_length(desired_length)
+        # Headings are dropped; list markers are stripped so items read as sentences
+        sentences = [re.sub(r"^\s*([-*•]|\d+[.)])\s+", "", sentence)
+                     for sentence in split_sentences(content) if not is_heading(sentence)]
+        sentences = [sentence for sentence in sentences if sentence]
+        if len(sentences) > count:
+            sentences = [sentences[i] for i in self.select(sentences, count)]
+
+        if bullets:
+            return "\n".join(f"- {sentence}" for sentence in sentences)
+        return " ".join(sentences)
+
+
+# Global extractive summarizer (lazy initialization)
+_extractive_summarizer = None
+
+def get_extractive_summarizer(rag_system=None) -> ExtractiveSummarizer:
+    """
+    Get the global extractive summarizer. EXTRACTIVE_SUMMARY_VECTORS=embeddings scores
+    sentences with the knowledge base's embedding function instead of TF-IDF.
+    """
+    global _extractive_summarizer
+    if _extractive_summarizer is None:
+        embed_texts = None
+        if os.getenv("EXTRACTIVE_SUMMARY_VECTORS", "tfidf").lower() == "embeddings" and rag_system is not None:
+            embed_texts = rag_system.embedding_function
+        logger.info(f"Extractive summarizer using {'embeddings' if embed_texts else 'TF-IDF'} sentence vectors")
+        _extractive_summarizer = ExtractiveSummarizer(embed_texts=embed_texts)
+    return _extractive_summarizer
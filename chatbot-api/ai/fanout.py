@@ -0,0 +1,49 @@
+"""
+Bounded parallel fan-out for multi-call AI actions (map-reduce summaries,
+paragraph edits, parallel research). Each call runs in a copy of the caller's
+context, so the action deadline and the request's call trace carry over.
+"""
+
+import contextvars
+import logging
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable, List
+
+from ai.resilience import DeadlineExceededError, current_action, remaining_time
+
+logger = logging.getLogger(__name__)
+
+
+def fan_out(func: Callable[..., Any], items: Iterable[Any], max_workers: int = 4) -> List[Any]:
+    """
+    Call `func(item)` for every item with at most `max_workers` calls in flight.
+
+    Args:
+        func: Function to call for each item
+        items: Arguments, one call each
+        max_workers: Maximum number of concurrent calls
+
+    Returns:
+        Results in the order of `items`. The first failure (or the action deadline)
+        is raised right away: calls not yet started are cancelled, and running calls
+        are left to finish in the background.
+    """
+    items = list(items)
+    if len(items) <= 1 or max_workers <= 1:
+        return [func(item) for item in items]
+
+    # A dedicated pool per fan-out: calls may use the shared hedging executor themselves
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(items)), thread_name_prefix="fan-out")
+    futures = [executor.submit(contextvars.copy_context().run, func, item) for item in items]
+    done, pending = wait(futures, timeout=remaining_time(), return_when=FIRST_EXCEPTION)
+    failed = [future for future in done if future.exception() is not None]
+    if failed or pending:
+        # Don't wait for calls still running: their results are no longer needed
+        executor.shutdown(wait=False, cancel_futures=True)
+        if failed:
+            logger.warning(f"{len(failed)} of {len(items)} parallel calls failed: {str(failed[0].exception())}")
+            raise failed[0].exception()
+        raise DeadlineExceededError(f"{current_action() or 'Action'} deadline exceeded after "
+                                    f"{len(done)}/{len(items)} parallel calls")
+    executor.shutdown()
+    return [future.result() for future in futures]
@@ -0,0 +1,564 @@
+"""
+Memory-mapped flat vector index.
+A lightweight alternative to a Chroma PersistentClient for small and medium
+corpora: vectors live in float16 or int8 .npy matrices that every worker maps
+read-only (so they share pages through the OS page cache), next to an id
+table and a JSON-lines record sidecar. The sidecar is memory-mapped too and
+indexed by row offsets, so a search parses only the records it returns.
+Search is an exact, vectorized top-k.
+
+The index is a list of immutable segments. Every write appends one small
+segment holding the rows it wrote and the ids it deleted, so a write costs
+I/O proportional to its batch, not to the corpus. When segments are replayed
+in order, a later row for an id supersedes earlier ones and a deleted id
+tombstones them. Once there are too many segments, or too many dead rows,
+a background compaction merges the live rows into one segment.
+
+FlatCollection implements the subset of the Chroma Collection API used by
+BlogRAGSystem (add/upsert/update/delete/get/query/count), so the RAG system
+works unchanged on top of it.
+"""
+
+import json
+import mmap
+import os
+import threading
+import uuid
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_DTYPES = ("float16", "int8")
+SEARCH_CHUNK_ROWS = 4096
+
+
+def quantize_int8(vectors: np.ndarray):
+    """Symmetric per-row int8 quantization. Returns (int8 matrix, float32 scales)."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+@dataclass
+class Segment:
+    """Rows written (and ids deleted) by one write, or the output of a compaction."""
+    name: str
+    ids: List[str]
+    deleted: List[str]
+    vectors: Optional[np.ndarray] = None  # Stored dtype, memory-mapped
+    scales: Optional[np.ndarray] = None  # int8 only, memory-mapped
+    sq_norms: Optional[np.ndarray] = None  # Memory-mapped
+    lines: Optional[mmap.mmap] = None  # One JSON record per row
+    offsets: Optional[np.ndarray] = None  # Byte offset of each row's line and of the end, memory-mapped
+    legacy_records: Optional[List[Dict[str, Any]]] = None  # Segments written before the JSON-lines sidecar
+
+    def raw_records(self, rows: List[int]) -> List[bytes]:
+        """Encoded records (newline-terminated JSON) of some rows."""
+        if self.legacy_records is not None:
+            return [_encode(self.legacy_records[row]) for row in rows]
+        return [self.lines[int(self.offsets[row]):int(self.offsets[row + 1])] for row in rows]
+
+    def records(self, rows: List[int]) -> List[Dict[str, Any]]:
+        """Records ({"id", "document", "metadata"}) of some rows, parsed on demand."""
+        if self.legacy_records is not None:
+            return [self.legacy_records[row] for row in rows]
+        return [json.loads(line) for line in self.raw_records(rows)]
+
+
+def _encode(record: Dict[str, Any]) -> bytes:
+    return json.dumps(record).encode("utf-8") + b"\n"
+
+
+@dataclass
+class IndexState:
+    """Replayed view of the segments. Replaced, never modified, so readers can hold on to one."""
+    generation: Optional[int] = None
+    segments: List[Segment] = field(default_factory=list)
+    live: List[np.ndarray] = field(default_factory=list)  # Per segment: rows not superseded or deleted
+    positions: Dict[str, Tuple[int, int]] = field(default_factory=dict)  # id -> (segment, row)
+    dim: Optional[int] = None
+
+    @property
+    def stored_rows(self) -> int:
+        return sum(len(segment.ids) for segment in self.segments)
+
+    def ordered(self) -> List[Tuple[int, int]]:
+        """Live rows in the order they were written."""
+        return [(s, int(row)) for s, live in enumerate(self.live) for row in np.flatnonzero(live)]
+
+
+class FlatCollection:
+    def __init__(self, path: str, name: str = "blog_posts", embedding_function=None,
+                 dtype: str = "float16", max_segments: int = 8, max_dead_ratio: float = 0.3,
+                 background_compaction: bool = True):
+        """
+        Open (or create) a flat index stored under `path/name`.
+
+        Args:
+            path: Base directory for index files
+            name: Collection name
+            embedding_function: Chroma-style embedding function for documents and query texts
+            dtype: Storage type for vectors ("float16" or "int8")
+            max_segments: Compact once there are more segments than this
+            max_dead_ratio: Compact once this share of stored rows is superseded or deleted
+            background_compaction: Compact on a background thread after writes (otherwise call compact())
+        """
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"Unsupported dtype {dtype}, expected one of {SUPPORTED_DTYPES}")
+        self.name = name
+        self.directory = os.path.join(path, name)
+        self.embedding_function = embedding_function
+        self.dtype = dtype
+        self.max_segments = max_segments
+        self.max_dead_ratio = max_dead_ratio
+        self.background_compaction = background_compaction
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._compaction_lock = threading.Lock()
+        self._compaction_thread: Optional[threading.Thread] = None
+        self._state = IndexState()
+        self._refresh()
+
+    # --- FILES ---
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self._file("manifest.json")) as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return {"generation": 0, "segments": [], "dim": None, "dtype": self.dtype}
+        if "segments" not in manifest:
+            # Written before segments: one matrix per generation, which reads as a single segment
+            manifest["segments"] = [str(manifest["generation"])] if manifest.get("count") else []
+        return manifest
+
+    def _refresh(self):
+        """Load segments another process (or thread) has written since the last read."""
+        if self._read_manifest()["generation"] == self._state.generation:
+            return
+        with self._lock:
+            for attempt in range(3):
+                try:
+                    self._load(self._read_manifest())
+                    return
+                except FileNotFoundError:
+                    # A compaction removed segments we were loading; try again
+                    if attempt == 2:
+                        raise
+
+    def _load_segment(self, name: str) -> Segment:
+        try:
+            with open(self._file(f"ids.{name}.json")) as f:
+                data = json.load(f)
+            segment = Segment(name=name, ids=data["ids"], deleted=data["deleted"])
+        except FileNotFoundError:
+            # Written before the JSON-lines sidecar: every record in one JSON document
+            with open(self._file(f"records.{name}.json")) as f:
+                data = json.load(f)
+            if isinstance(data, list):
+                data = {"records": data, "deleted": []}
+            segment = Segment(name=name, ids=[record["id"] for record in data["records"]],
+                              deleted=data["deleted"], legacy_records=data["records"])
+        if segment.ids:
+            segment.vectors = np.load(self._file(f"vectors.{name}.npy"), mmap_mode="r")
+            segment.sq_norms = np.load(self._file(f"norms.{name}.npy"), mmap_mode="r")
+            if segment.vectors.dtype == np.int8:
+                segment.scales = np.load(self._file(f"scales.{name}.npy"), mmap_mode="r")
+            if segment.legacy_records is None:
+                segment.offsets = np.load(self._file(f"offsets.{name}.npy"), mmap_mode="r")
+                with open(self._file(f"records.{name}.jsonl"), "rb") as f:
+                    segment.lines = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return segment
+
+    def _load(self, manifest: Dict[str, Any]):
+        state = self._state
+        if manifest["generation"] == state.generation:
+            return
+        if manifest.get("dtype", self.dtype) != self.dtype:
+            logger.warning(f"Flat index {self.name} is stored as {manifest['dtype']}, "
+                           f"not {self.dtype}; using the stored type")
+            self.dtype = manifest["dtype"]
+
+        names = manifest["segments"]
+        loaded = [segment.name for segment in state.segments]
+        if names[:len(loaded)] == loaded:
+            # Only new segments were appended: replay just those
+            segments, live, positions = list(state.segments), list(state.live), dict(state.positions)
+        else:
+            segments, live, positions = [], [], {}
+        copied = set()
+
+        def kill(position: Tuple[int, int]):
+            index, row = position
+            if index not in copied:
+                live[index] = live[index].copy()
+                copied.add(index)
+            live[index][row] = False
+
+        for name in names[len(segments):]:
+            segment = self._load_segment(name)
+            index = len(segments)
+            segments.append(segment)
+            live.append(np.ones(len(segment.ids), dtype=bool))
+            copied.add(index)
+            for post_id in segment.deleted:
+                if post_id in positions:
+                    kill(positions.pop(post_id))
+            for row, post_id in enumerate(segment.ids):
+                if post_id in positions:
+                    kill(positions[post_id])
+                positions[post_id] = (index, row)
+
+        self._state = IndexState(generation=manifest["generation"], segments=segments, live=live,
+                                 positions=positions, dim=manifest.get("dim"))
+
+    @contextmanager
+    def _write_lock(self):
+        with self._lock:
+            lock_file = open(self._file(".lock"), "w")
+            try:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._refresh()
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+
+    def _store(self, vectors: np.ndarray):
+        """Vectors in the stored type, with int8 scales and the squared norms of the stored values."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dtype == "int8":
+            stored, scales = quantize_int8(vectors)
+            restored = stored.astype(np.float32) * scales[:, None]
+        else:
+            stored, scales = vectors.astype(np.float16), None
+            restored = stored.astype(np.float32)
+        # Norms of the stored (rounded) vectors keep L2 distances consistent
+        return stored, scales, np.einsum("ij,ij->i", restored, restored)
+
+    def _write_segment(self, ids: List[str], lines: List[bytes], deleted: List[str],
+                       stored: Optional[np.ndarray] = None, scales: Optional[np.ndarray] = None,
+                       sq_norms: Optional[np.ndarray] = None) -> str:
+        """
+        Write a segment's files (not yet referenced by the manifest) and return its name.
+        `lines` are the rows' encoded records; the ids file is written last, as it marks
+        the segment complete.
+        """
+        name = uuid.uuid4().hex[:16]
+        if ids:
+            np.save(self._file(f"vectors.{name}.npy"), stored)
+            np.save(self._file(f"norms.{name}.npy"), sq_norms)
+            if scales is not None:
+                np.save(self._file(f"scales.{name}.npy"), scales)
+            offsets = np.zeros(len(lines) + 1, dtype=np.uint64)
+            offsets[1:] = np.cumsum([len(line) for line in lines])
+            np.save(self._file(f"offsets.{name}.npy"), offsets)
+            with open(self._file(f"records.{name}.jsonl"), "wb") as f:
+                f.writelines(lines)
+        with open(self._file(f"ids.{name}.json"), "w") as f:
+            json.dump({"ids": ids, "deleted": deleted}, f)
+        return name
+
+    def _remove_segment_files(self, names: List[str]):
+        # Readers that still map a removed segment keep its pages until they reload
+        for name in names:
+            for file_name in (f"vectors.{name}.npy", f"norms.{name}.npy", f"scales.{name}.npy",
+                              f"ids.{name}.json", f"offsets.{name}.npy", f"records.{name}.jsonl",
+                              f"records.{name}.json"):
+                try:
+                    os.remove(self._file(file_name))
+                except OSError:
+                    pass
+
+    def _commit(self, segments: List[str], dim: Optional[int]):
+        """Atomically switch the manifest to a new segment list. Call with the write lock held."""
+        manifest = {"generation": (self._state.generation or 0) + 1, "segments": segments,
+                    "dim": dim, "dtype": self.dtype}
+        tmp_path = self._file("manifest.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._file("manifest.json"))
+        self._refresh()
+
+    def _append(self, records: List[Dict[str, Any]], deleted: List[str] = (), stored=None, scales=None,
+                sq_norms=None):
+        """Append one segment. Call with the write lock held."""
+        state = self._state
+        name = self._write_segment([record["id"] for record in records], [_encode(record) for record in records],
+                                   list(deleted), stored, scales, sq_norms)
+        dim = state.dim if state.dim is not None or stored is None else int(stored.shape[1])
+        self._commit([segment.name for segment in state.segments] + [name], dim)
+        self._maybe_compact()
+
+    # --- COMPACTION ---
+
+    def needs_compaction(self) -> bool:
+        state = self._state
+        stored = state.stored_rows
+        dead = stored - len(state.positions)
+        return (len(state.segments) > self.max_segments
+                or (stored > 0 and dead / stored > self.max_dead_ratio)
+                or (len(state.segments) > 1 and not state.positions))
+
+    def _maybe_compact(self):
+        if not self.background_compaction or not self.needs_compaction():
+            return
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(target=self.compact, name=f"flat-compact-{self.name}",
+                                                   daemon=True)
+        self._compaction_thread.start()
+
+    def wait_for_compaction(self, timeout: Optional[float] = None):
+        thread = self._compaction_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def compact(self) -> bool:
+        """
+        Merge the current segments into one holding only their live rows.
+        Writers are only blocked for the manifest switch: segments appended while
+        merging are kept after the merged one and replayed on top of it.
+
+        Returns:
+            False if there was nothing to merge or another compaction won
+        """
+        with self._compaction_lock:
+            self._refresh()
+            state = self._state
+            names = [segment.name for segment in state.segments]
+            if len(names) <= 1 and state.stored_rows == len(state.positions):
+                return False
+
+            # Stored rows and encoded records are copied as they are, so nothing is requantized or parsed
+            parts = [(segment, live) for segment, live in zip(state.segments, state.live) if live.any()]
+            ids = [post_id for segment, live in parts for post_id, keep in zip(segment.ids, live) if keep]
+            lines = [line for segment, live in parts for line in segment.raw_records(np.flatnonzero(live).tolist())]
+            stored = scales = sq_norms = None
+            if parts:
+                stored = np.concatenate([segment.vectors[live] for segment, live in parts])
+                sq_norms = np.concatenate([segment.sq_norms[live] for segment, live in parts])
+                if self.dtype == "int8":
+                    scales = np.concatenate([segment.scales[live] for segment, live in parts])
+            merged = self._write_segment(ids, lines, [], stored, scales, sq_norms)
+
+            with self._write_lock():
+                current = [segment.name for segment in self._state.segments]
+                if current[:len(names)] != names:
+                    # Another process compacted first
+                    self._remove_segment_files([merged])
+                    return False
+                self._commit([merged] + current[len(names):], self._state.dim)
+            self._remove_segment_files(names)
+            logger.info(f"Compacted flat index {self.name}: {len(names)} segments, "
+                        f"{state.stored_rows} rows -> {len(ids)} live rows")
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        self._refresh()
+        state = self._state
+        return {"segments": len(state.segments), "live_rows": len(state.positions),
+                "dead_rows": state.stored_rows - len(state.positions), "dtype": self.dtype}
+
+    # --- COLLECTION API ---
+
+    def _embed(self, documents: List[str], embeddings=None, is_query: bool = False) -> np.ndarray:
+        if embeddings is not None:
+            return np.asarray(embeddings, dtype=np.float32)
+        if self.embedding_function is None:
+            raise ValueError("No embedding function configured; pass embeddings explicitly")
+        if is_query and hasattr(self.embedding_function, "embed_query"):
+            return np.asarray(self.embedding_function.embed_query(input=documents), dtype=np.float32)
+        return np.asarray(self.embedding_function(documents), dtype=np.float32)
+
+    def _check_dim(self, vectors: np.ndarray):
+        dim = self._state.dim
+        if dim is not None and len(vectors) and vectors.shape[1] != dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {dim}")
+
+    def count(self) -> int:
+        self._refresh()
+        return len(self._state.positions)
+
+    def add(self, ids: List[str], documents: List[str] = None, metadatas: List[Dict[str, Any]] = None,
+            embeddings=None):
+        """Add new records. Ids that already exist are skipped, as in Chroma."""
+        self.upsert(ids, documents, metadatas, embeddings, overwrite=False)
+
+    def upsert(self, ids: List[str], documents: List[str] = None, metadatas: List[Dict[str, Any]] = None,
+               embeddings=None, overwrite: bool = True):
+        """Insert records, replacing existing ones with the same id."""
+        documents = documents or [""] * len(ids)
+        metadatas = metadatas or [{}] * len(ids)
+        new_vectors = self._embed(documents, embeddings)
+
+        with self._write_lock():
+            self._check_dim(new_vectors)
+            # Last occurrence wins if an id appears twice
+            rows = {}
+            for i, post_id in enumerate(ids):
+                if post_id in self._state.positions and not overwrite:
+                    logger.warning(f"Id {post_id} already exists in {self.name}, skipping add")
+                    continue
+                rows.pop(post_id, None)
+                rows[post_id] = i
+            if not rows:
+                return
+            # None values aren't stored, as in Chroma
+            records = [{"id": post_id, "document": documents[i],
+                        "metadata": {key: value for key, value in (metadatas[i] or {}).items() if value is not None}}
+                       for post_id, i in rows.items()]
+            self._append(records, (), *self._store(new_vectors[list(rows.values())]))
+
+    def update(self, ids: List[str], documents: List[str] = None, metadatas: List[Dict[str, Any]] = None,
+               embeddings=None):
+        """
+        Update existing records; unknown ids are ignored. As in Chroma, metadata is merged
+        into the stored metadata (a None value removes the key).
+        """
+        with self._write_lock():
+            state = self._state
+            known = [i for i, post_id in enumerate(ids) if post_id in state.positions]
+            if not known:
+                return
+            records = []
+            for i in known:
+                segment, row = state.positions[ids[i]]
+                record = dict(state.segments[segment].records([row])[0])
+                if documents is not None:
+                    record["document"] = documents[i]
+                if metadatas is not None and metadatas[i]:
+                    metadata = dict(record["metadata"])
+                    for key, value in metadatas[i].items():
+                        if value is None:
+                            metadata.pop(key, None)
+                        else:
+                            metadata[key] = value
+                    record["metadata"] = metadata
+                records.append(record)
+
+            if documents is not None or embeddings is not None:
+                new_vectors = self._embed([documents[i] for i in known] if documents is not None else None,
+                                          [embeddings[i] for i in known] if embeddings is not None else None)
+                self._check_dim(new_vectors)
+                self._append(records, (), *self._store(new_vectors))
+            else:
+                # Metadata only: carry the stored rows over as they are, without requantizing
+                positions = [state.positions[ids[i]] for i in known]
+                stored = np.stack([state.segments[s].vectors[row] for s, row in positions])
+                sq_norms = np.array([state.segments[s].sq_norms[row] for s, row in positions], dtype=np.float32)
+                scales = (np.array([state.segments[s].scales[row] for s, row in positions], dtype=np.float32)
+                          if self.dtype == "int8" else None)
+                self._append(records, (), stored, scales, sq_norms)
+
+    def delete(self, ids: List[str]):
+        with self._write_lock():
+            deleted = [post_id for post_id in dict.fromkeys(ids) if post_id in self._state.positions]
+            if deleted:
+                self._append([], deleted)
+
+    def _embeddings(self, state: IndexState, positions: List[Tuple[int, int]]) -> np.ndarray:
+        if not positions:
+            return np.zeros((0, state.dim or 0), dtype=np.float32)
+        rows = []
+        for s, row in positions:
+            segment = state.segments[s]
+            vector = np.asarray(segment.vectors[row], dtype=np.float32)
+            rows.append(vector * segment.scales[row] if segment.scales is not None else vector)
+        return np.stack(rows)
+
+    def get(self, ids: List[str] = None, include: List[str] = None, limit: int = None,
+            offset: int = 0) -> Dict[str, Any]:
+        include = include or ["documents", "metadatas"]
+        self._refresh()
+        state = self._state
+        if ids is None:
+            positions = state.ordered()[offset:offset + limit if limit else None]
+        else:
+            positions = [state.positions[post_id] for post_id in ids if post_id in state.positions]
+
+        records = self._records(state, positions, include)
+        return {
+            "ids": [state.segments[s].ids[row] for s, row in positions],
+            "documents": [record["document"] for record in records] if "documents" in include else None,
+            "metadatas": [record["metadata"] for record in records] if "metadatas" in include else None,
+            "embeddings": self._embeddings(state, positions) if "embeddings" in include else None,
+        }
+
+    @staticmethod
+    def _records(state: IndexState, positions: List[Tuple[int, int]], include: List[str]) -> List[Dict[str, Any]]:
+        """Records of some rows, read from the sidecars only if documents or metadata are wanted."""
+        if "documents" not in include and "metadatas" not in include:
+            return []
+        by_segment: Dict[int, List[int]] = {}
+        for s, row in positions:
+            by_segment.setdefault(s, []).append(row)
+        found = {}
+        for s, rows in by_segment.items():
+            for row, record in zip(rows, state.segments[s].records(rows)):
+                found[(s, row)] = record
+        return [found[position] for position in positions]
+
+    def query(self, query_texts: List[str] = None, query_embeddings=None, n_results: int = 10,
+              include: List[str] = None) -> Dict[str, Any]:
+        """Exact top-k by squared L2 distance (Chroma's default space)."""
+        include = include or ["documents", "metadatas", "distances"]
+        queries = self._embed(query_texts, query_embeddings, is_query=True)
+        self._refresh()
+        state = self._state
+
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for query in queries:
+            query_sq_norm = float(np.dot(query, query))
+            candidates, candidate_distances = [], []
+            for s, (segment, live) in enumerate(zip(state.segments, state.live)):
+                if segment.vectors is None or not live.any():
+                    continue
+                distances_all = segment.sq_norms - 2.0 * self._dot(segment.vectors, segment.scales, query) + query_sq_norm
+                distances_all[~live] = np.inf
+                k = min(n_results, int(live.sum()))
+                hits = np.argpartition(distances_all, k - 1)[:k]
+                candidates.extend((s, int(row)) for row in hits)
+                candidate_distances.append(distances_all[hits])
+
+            distances = np.concatenate(candidate_distances) if candidate_distances else np.zeros(0, dtype=np.float32)
+            best = np.argsort(distances, kind="stable")[:n_results]
+            positions = [candidates[i] for i in best]
+            records = self._records(state, positions, include)
+            result["ids"].append([state.segments[s].ids[row] for s, row in positions])
+            result["documents"].append([record["document"] for record in records])
+            result["metadatas"].append([record["metadata"] for record in records])
+            result["distances"].append([float(distances[i]) for i in best])
+
+        for key in ("documents", "metadatas", "distances"):
+            if key not in include:
+                result[key] = None
+        return result
+
+    @staticmethod
+    def _dot(vectors: np.ndarray, scales: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+        """Dot products against every stored vector, in chunks to bound temporary memory."""
+        scores = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), SEARCH_CHUNK_ROWS):
+            chunk = np.asarray(vectors[start:start + SEARCH_CHUNK_ROWS], dtype=np.float32)
+            scores[start:start + len(chunk)] = chunk @ query
+        if scales is not None:
+            scores *= scales
+        return scores
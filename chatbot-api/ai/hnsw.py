@@ -0,0 +1,175 @@
+"""
+HNSW index settings for Chroma collections.
+Space, M and ef_construction are fixed when a collection's index is built;
+ef_search can be changed at any time. Settings come from HNSW_* environment
+variables, with per-collection overrides (e.g. HNSW_BLOG_POSTS_M). A stored
+collection built with other fixed settings keeps serving as is until it is
+rebuilt: its embeddings are copied into a new collection, which is then
+swapped in under the same name (see BlogRAGSystem.rebuild_index).
+
+EfSearchAutotuner adjusts ef_search from live query latencies to hold a
+target p95: it lowers ef_search when queries are too slow and raises it
+(more recall) while there is headroom.
+"""
+
+import os
+import threading
+import logging
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+HNSW_SPACES = ("l2", "cosine", "ip")
+# Setting -> (legacy collection metadata key, key in Chroma's "hnsw" configuration)
+HNSW_KEYS = {
+    "space": ("hnsw:space", "space"),
+    "m": ("hnsw:M", "max_neighbors"),
+    "ef_construction": ("hnsw:construction_ef", "ef_construction"),
+    "ef_search": ("hnsw:search_ef", "ef_search"),
+}
+# Settings that only take effect when the index is rebuilt
+FIXED_SETTINGS = ("space", "m", "ef_construction")
+
+
+def hnsw_settings_from_env(collection_name: str) -> Dict[str, Any]:
+    """
+    Configured HNSW settings for a collection; unset ones are left to Chroma's defaults.
+    HNSW_<COLLECTION>_<SETTING> overrides HNSW_<SETTING>, e.g. HNSW_BLOG_POSTS_EF_SEARCH.
+    """
+    prefix = "HNSW_" + collection_name.upper().replace("-", "_") + "_"
+    settings = {}
+    for key in HNSW_KEYS:
+        value = os.getenv(prefix + key.upper()) or os.getenv("HNSW_" + key.upper())
+        if not value:
+            continue
+        if key == "space":
+            if value.lower() not in HNSW_SPACES:
+                logger.warning(f"Unknown HNSW space {value} for {collection_name}, using Chroma's default")
+                continue
+            settings[key] = value.lower()
+        else:
+            settings[key] = int(value)
+    return settings
+
+def hnsw_metadata(settings: Dict[str, Any]) -> Dict[str, Any]:
+    """Collection metadata that makes Chroma build its index with these settings."""
+    return {HNSW_KEYS[key][0]: value for key, value in settings.items()}
+
+def index_settings(collection) -> Dict[str, Any]:
+    """Settings the collection's index actually uses (configuration, else legacy metadata)."""
+    configuration = getattr(collection, "configuration", None) or {}
+    hnsw = configuration.get("hnsw") if isinstance(configuration, dict) else None
+    if hnsw:
+        return {key: hnsw.get(config_key) for key, (_, config_key) in HNSW_KEYS.items()}
+    metadata = collection.metadata or {}
+    return {key: metadata.get(metadata_key) for key, (metadata_key, _) in HNSW_KEYS.items()}
+
+def settings_requiring_rebuild(collection, settings: Dict[str, Any]) -> List[str]:
+    """Configured fixed settings the stored index was not built with."""
+    current = index_settings(collection)
+    return [key for key in FIXED_SETTINGS
+            if key in settings and current.get(key) is not None and current[key] != settings[key]]
+
+def set_ef_search(collection, ef_search: int):
+    """Change ef_search on a live collection (falls back to metadata on older Chroma versions)."""
+    try:
+        collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+    except TypeError:
+        collection.modify(metadata={**(collection.metadata or {}), "hnsw:search_ef": ef_search})
+
+
+class EfSearchAutotuner:
+    def __init__(self, apply: Callable[[int], None], ef_search: int, target_p95_ms: float,
+                 min_ef: int = 10, max_ef: int = 400, window: int = 200, adjust_every: int = 50,
+                 headroom: float = 0.7, step: float = 1.25):
+        """
+        Initialize the autotuner.
+
+        Args:
+            apply: Called with the new ef_search
+            ef_search: Current ef_search
+            target_p95_ms: p95 index query latency to hold
+            min_ef: Lowest ef_search it sets
+            max_ef: Highest ef_search it sets
+            window: Query latencies kept
+            adjust_every: Queries between adjustments (also the minimum samples)
+            headroom: ef_search is raised while p95 is below this share of the target
+            step: Factor ef_search is raised or lowered by
+        """
+        self.apply = apply
+        self.ef_search = ef_search
+        self.target_p95 = target_p95_ms / 1000.0
+        self.min_ef = min_ef
+        self.max_ef = max_ef
+        self.adjust_every = adjust_every
+        self.headroom = headroom
+        self.step = step
+        self._samples = deque(maxlen=window)
+        self._since_adjust = 0
+        self._lock = threading.Lock()
+        self._raised = 0
+        self._lowered = 0
+        self._errors = 0
+        self._last_p95: Optional[float] = None
+
+    def _p95(self) -> float:
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+
+    def record(self, seconds: float):
+        """Record one index query latency; adjusts ef_search every `adjust_every` queries."""
+        with self._lock:
+            self._samples.append(seconds)
+            self._since_adjust += 1
+            if self._since_adjust < self.adjust_every:
+                return
+            self._since_adjust = 0
+            p95 = self._last_p95 = self._p95()
+
+            if p95 > self.target_p95:
+                ef_search = max(self.min_ef, int(self.ef_search / self.step))
+            elif p95 < self.target_p95 * self.headroom:
+                ef_search = min(self.max_ef, int(self.ef_search * self.step) + 1)
+            else:
+                return
+            if ef_search == self.ef_search:
+                return
+            try:
+                self.apply(ef_search)
+            except Exception as e:
+                self._errors += 1
+                logger.error(f"Setting ef_search to {ef_search} failed: {str(e)}")
+                return
+
+            logger.info(f"Autotuner: p95 {p95 * 1000:.1f}ms (target {self.target_p95 * 1000:.1f}ms), "
+                        f"ef_search {self.ef_search} -> {ef_search}")
+            if ef_search > self.ef_search:
+                self._raised += 1
+            else:
+                self._lowered += 1
+            self.ef_search = ef_search
+            # Latencies measured with the old ef_search no longer apply
+            self._samples.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "ef_search": self.ef_search,
+                "target_p95_ms": self.target_p95 * 1000,
+                "last_p95_ms": round(self._last_p95 * 1000, 2) if self._last_p95 is not None else None,
+                "range": [self.min_ef, self.max_ef],
+                "raised": self._raised,
+                "lowered": self._lowered,
+                "errors": self._errors,
+            }
+
+
+def create_autotuner(apply: Callable[[int], None], ef_search: int) -> Optional[EfSearchAutotuner]:
+    """Create the ef_search autotuner when HNSW_TARGET_P95_MS is set (otherwise None)."""
+    target = float(os.getenv("HNSW_TARGET_P95_MS", "0") or 0)
+    if target <= 0:
+        return None
+    min_ef = int(os.getenv("HNSW_EF_SEARCH_MIN", "10"))
+    max_ef = int(os.getenv("HNSW_EF_SEARCH_MAX", "400"))
+    return EfSearchAutotuner(apply, ef_search, target, min_ef=min_ef, max_ef=max_ef)
@@ -0,0 +1,242 @@
+"""
+Write-behind queue for post change events pushed by the blog backend.
+Autosaves produce many updates of the same post within seconds. Events are
+stored in a SQLite queue keyed by post_id, so later events replace earlier
+ones: each post keeps only its latest state. A post is applied to the vector
+store once it has been quiet for the debounce window (or has waited
+`max_delay` seconds), in batches, by a background thread. Pending events
+survive restarts.
+Each post's newest accepted source timestamp is kept after its events are
+applied, so an event delivered late is ignored even when the newer state it
+lost to was flushed long ago.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+INGEST_EVENTS = ("created", "updated", "deleted")
+
+
+class WriteBehindQueue:
+    def __init__(self, rag_system, db_path: str = "./data/ingest_queue.db", debounce_seconds: float = 10.0,
+                 max_delay_seconds: float = 60.0, batch_size: int = 32, poll_interval: float = 1.0):
+        """
+        Initialize the queue. The worker thread is started with start().
+
+        Args:
+            rag_system: BlogRAGSystem the events are applied to
+            db_path: SQLite file holding pending events
+            debounce_seconds: Quiet time after a post's last event before it is applied
+            max_delay_seconds: Apply a post at the latest this long after its first pending
+                event, even if events keep arriving
+            batch_size: Posts applied per vector store write
+            poll_interval: Seconds between checks for posts that are due
+        """
+        self.rag_system = rag_system
+        self.db_path = db_path
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        # Metrics (since startup)
+        self._events_received = 0
+        self._events_stale = 0
+        self._events_applied = 0
+        self._writes = 0
+        self._batches = 0
+        self._failures = 0
+        self._lags: deque = deque(maxlen=1000)
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pending (post_id TEXT PRIMARY KEY, event TEXT NOT NULL, "
+                "payload TEXT, source_updated_at REAL, first_received REAL NOT NULL, "
+                "last_received REAL NOT NULL, events INTEGER NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                "not_before REAL NOT NULL DEFAULT 0)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_pending_due ON pending (last_received)")
+            # High-water mark of each post's accepted events, kept after they are applied
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS post_versions (post_id TEXT PRIMARY KEY, source_updated_at REAL NOT NULL)"
+            )
+
+    def enqueue(self, event: str, post_id: str, payload: Optional[Dict[str, Any]] = None,
+                source_updated_at: Optional[float] = None) -> bool:
+        """
+        Record a post event, replacing any pending event for the same post.
+
+        Args:
+            event: "created", "updated" or "deleted"
+            post_id: The post's ID
+            payload: Post fields (title, content, author, tags, metadata); unused for deletes
+            source_updated_at: When the backend saved this state; events older than the
+                newest one accepted for the post (delivered out of order) are ignored.
+                Deletes sent without one are stamped with the time they were received.
+
+        Returns:
+            False if the event was older than the newest accepted one and ignored
+        """
+        if event not in INGEST_EVENTS:
+            raise ValueError(f"Unknown ingest event: {event}")
+        now = time.time()
+        if event == "deleted" and source_updated_at is None:
+            # Otherwise any late update would bring the post back
+            source_updated_at = now
+        with self._lock, self._conn:
+            self._events_received += 1
+            row = self._conn.execute("SELECT source_updated_at FROM post_versions WHERE post_id = ?",
+                                     (post_id,)).fetchone()
+            if row and source_updated_at is not None and source_updated_at < row[0]:
+                self._events_stale += 1
+                return False
+            self._conn.execute(
+                "INSERT INTO pending (post_id, event, payload, source_updated_at, first_received, last_received, events) "
+                "VALUES (?, ?, ?, ?, ?, ?, 1) ON CONFLICT(post_id) DO UPDATE SET event = excluded.event, "
+                "payload = excluded.payload, "
+                "source_updated_at = MAX(COALESCE(excluded.source_updated_at, source_updated_at), "
+                "COALESCE(source_updated_at, excluded.source_updated_at)), "
+                "last_received = excluded.last_received, events = events + 1, attempts = 0, not_before = 0",
+                (post_id, event, json.dumps(payload) if payload is not None else None, source_updated_at, now, now),
+            )
+            if source_updated_at is not None:
+                self._conn.execute(
+                    "INSERT INTO post_versions (post_id, source_updated_at) VALUES (?, ?) ON CONFLICT(post_id) "
+                    "DO UPDATE SET source_updated_at = MAX(source_updated_at, excluded.source_updated_at)",
+                    (post_id, source_updated_at),
+                )
+        return True
+
+    def _due(self, now: float) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT post_id, event, payload, first_received, last_received, events FROM pending "
+                "WHERE (last_received <= ? OR first_received <= ?) AND not_before <= ? "
+                "ORDER BY first_received LIMIT ?",
+                (now - self.debounce_seconds, now - self.max_delay_seconds, now, self.batch_size),
+            ).fetchall()
+
+    def flush(self, force: bool = False) -> int:
+        """
+        Apply one batch of due posts to the vector store.
+
+        Args:
+            force: Apply pending posts regardless of the debounce window
+
+        Returns:
+            Number of posts applied
+        """
+        now = time.time()
+        rows = self._due(float("inf") if force else now)
+        if not rows:
+            return 0
+
+        upserts = [dict(json.loads(payload), post_id=post_id)
+                   for post_id, event, payload, *_ in rows if event != "deleted"]
+        deletes = [post_id for post_id, event, *_ in rows if event == "deleted"]
+        try:
+            if upserts:
+                self.rag_system.upsert_blog_posts(upserts)
+            if deletes:
+                self.rag_system.delete_blog_posts(deletes)
+        except Exception as e:
+            logger.error(f"Applying {len(rows)} queued post events failed, will retry: {str(e)}")
+            with self._lock, self._conn:
+                self._failures += 1
+                for post_id, *_ in rows:
+                    self._conn.execute(
+                        "UPDATE pending SET attempts = attempts + 1, "
+                        "not_before = ? + MIN(300, 1 << MIN(attempts, 8)) WHERE post_id = ?", (now, post_id))
+            return 0
+
+        applied_at = time.time()
+        with self._lock, self._conn:
+            for post_id, _, _, first_received, last_received, events in rows:
+                # Events that arrived while the batch was being applied stay queued
+                self._conn.execute("DELETE FROM pending WHERE post_id = ? AND last_received = ?",
+                                   (post_id, last_received))
+                self._lags.append(applied_at - first_received)
+                self._events_applied += events
+            self._writes += len(rows)
+            self._batches += 1
+        logger.info(f"Applied {len(rows)} queued posts ({len(upserts)} upserts, {len(deletes)} deletes)")
+        return len(rows)
+
+    # --- BACKGROUND JOB ---
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="ingest-queue", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        # Pending events are persisted and applied after the next start
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                while self.flush() == self.batch_size and not self._stop.is_set():
+                    pass  # More posts are due: keep going without waiting
+            except Exception as e:
+                logger.error(f"Ingest queue flush failed: {str(e)}")
+            self._stop.wait(self.poll_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and lag, and how many events were coalesced into each write."""
+        now = time.time()
+        with self._lock:
+            pending, pending_events, oldest = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(events), 0), MIN(first_received) FROM pending"
+            ).fetchone()
+            lags = sorted(self._lags)
+        return {
+            "pending_posts": pending,
+            "pending_events": pending_events,
+            "oldest_pending_seconds": round(now - oldest, 2) if oldest else 0.0,
+            "events_received": self._events_received,
+            "events_stale": self._events_stale,
+            "events_applied": self._events_applied,
+            "writes": self._writes,
+            "batches": self._batches,
+            "failures": self._failures,
+            "coalescing_ratio": round(self._events_applied / self._writes, 2) if self._writes else 0.0,
+            "lag_p50_seconds": round(lags[len(lags) // 2], 2) if lags else 0.0,
+            "lag_p95_seconds": round(lags[int(len(lags) * 0.95)], 2) if lags else 0.0,
+            "debounce_seconds": self.debounce_seconds,
+        }
+
+
+# Global ingest queue (lazy initialization)
+_ingest_queue = None
+
+def get_ingest_queue(rag_system) -> WriteBehindQueue:
+    """Get the global write-behind ingest queue, configured from environment variables."""
+    global _ingest_queue
+    if _ingest_queue is None:
+        _ingest_queue = WriteBehindQueue(
+            rag_system,
+            db_path=os.getenv("INGEST_QUEUE_PATH", "./data/ingest_queue.db"),
+            debounce_seconds=float(os.getenv("INGEST_DEBOUNCE_SECONDS", "10")),
+            max_delay_seconds=float(os.getenv("INGEST_MAX_DELAY_SECONDS", "60")),
+            batch_size=int(os.getenv("INGEST_BATCH_SIZE", "32")),
+        )
+    return _ingest_queue
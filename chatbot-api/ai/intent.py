@@ -0,0 +1,179 @@
+"""
+Pre-LLM intent gate for chat.
+Greetings, thanks and clearly off-topic messages don't need retrieval or an
+agent run. Short messages are checked against regex rules first; otherwise the
+message embedding is compared with per-intent exemplars (config/intents.yaml).
+Anything not confidently matched is treated as a regular question.
+Decisions are appended to a JSONL log for tuning the rules and thresholds.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import logging
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import yaml
+
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), "config", "intents.yaml")
+QUESTION = "question"
+FOLLOWUP = "followup"
+
+
+@dataclass
+class IntentDecision:
+    intent: str
+    method: str  # "rule", "embedding" or "default"
+    confidence: float
+    response: Optional[str] = None  # Template answer; None means the LLM is needed
+    needs_retrieval: bool = True
+    latency_ms: float = 0.0
+
+
+class IntentGate:
+    def __init__(self, embed_texts=None, config_path: str = CONFIG_PATH,
+                 log_path: Optional[str] = "./data/intent_decisions.jsonl"):
+        """
+        Initialize the gate.
+
+        Args:
+            embed_texts: Callable embedding a list of texts (None disables the embedding classifier)
+            config_path: Intent rules, exemplars and templates
+            log_path: JSONL file decisions are appended to (None to disable)
+        """
+        with open(config_path, "r") as f:
+            config = yaml.safe_load(f)
+        settings = config.pop("settings", {})
+        self.similarity_threshold = float(settings.get("similarity_threshold", 0.8))
+        self.margin = float(settings.get("margin", 0.05))
+        self.max_rule_words = int(settings.get("max_rule_words", 6))
+        self.intents: Dict[str, Dict[str, Any]] = config
+
+        self.rules = [(intent, re.compile(pattern, re.IGNORECASE))
+                      for intent, spec in config.items() for pattern in spec.get("rules", [])]
+        self.embed_texts = embed_texts
+        self.log_path = log_path
+        if log_path and os.path.dirname(log_path):
+            os.makedirs(os.path.dirname(log_path), exist_ok=True)
+
+        self._exemplar_vectors: Optional[np.ndarray] = None
+        self._exemplar_intents: List[str] = []
+        self._lock = threading.Lock()
+        self._counts: Counter = Counter()
+
+    def _exemplars(self):
+        """Embed all exemplars once, on first use."""
+        with self._lock:
+            if self._exemplar_vectors is None:
+                texts, intents = [], []
+                for intent, spec in self.intents.items():
+                    for exemplar in spec.get("exemplars", []):
+                        texts.append(exemplar)
+                        intents.append(intent)
+                vectors = np.asarray(self.embed_texts(texts), dtype=np.float32)
+                self._exemplar_vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+                self._exemplar_intents = intents
+            return self._exemplar_vectors, self._exemplar_intents
+
+    def _decide(self, intent: str, method: str, confidence: float, has_history: bool) -> IntentDecision:
+        if intent == FOLLOWUP:
+            # Without history there is nothing to follow up on
+            if has_history:
+                return IntentDecision(FOLLOWUP, method, confidence, needs_retrieval=False)
+            return IntentDecision(QUESTION, "default", confidence)
+        response = (self.intents.get(intent) or {}).get("response")
+        if intent == QUESTION or not response:
+            return IntentDecision(QUESTION, method, confidence)
+        return IntentDecision(intent, method, confidence, response=response.strip(), needs_retrieval=False)
+
+    def _classify(self, message: str, has_history: bool) -> IntentDecision:
+        text = " ".join(message.strip().split())
+        if not text:
+            return self._decide("greeting", "rule", 1.0, has_history)
+
+        if len(text.split()) <= self.max_rule_words:
+            for intent, pattern in self.rules:
+                if pattern.match(text):
+                    return self._decide(intent, "rule", 1.0, has_history)
+
+        if self.embed_texts is None:
+            return IntentDecision(QUESTION, "default", 0.0)
+
+        vectors, intents = self._exemplars()
+        # Embed the raw message, so retrieval afterwards hits the same cached vector
+        query = np.asarray(self.embed_texts([message])[0], dtype=np.float32)
+        similarities = vectors @ (query / max(float(np.linalg.norm(query)), 1e-12))
+
+        best_by_intent: Dict[str, float] = {}
+        for intent, similarity in zip(intents, similarities):
+            best_by_intent[intent] = max(best_by_intent.get(intent, -1.0), float(similarity))
+        best_intent = max(best_by_intent, key=best_by_intent.get)
+        best = best_by_intent[best_intent]
+        question_score = best_by_intent.get(QUESTION, -1.0)
+
+        if (best_intent != QUESTION and best >= self.similarity_threshold
+                and best - question_score >= self.margin):
+            return self._decide(best_intent, "embedding", round(best, 3), has_history)
+        return IntentDecision(QUESTION, "default", round(best_by_intent.get(QUESTION, 0.0), 3))
+
+    def classify(self, message: str, has_history: bool = False) -> IntentDecision:
+        """Classify a chat message. Falls back to "question" if classification fails."""
+        started = time.perf_counter()
+        try:
+            decision = self._classify(message, has_history)
+        except Exception as e:
+            logger.warning(f"Intent classification failed, treating as question: {str(e)}")
+            decision = IntentDecision(QUESTION, "error", 0.0)
+        decision.latency_ms = round((time.perf_counter() - started) * 1000, 2)
+        self._counts[decision.intent] += 1
+        self._log(message, decision)
+        return decision
+
+    def _log(self, message: str, decision: IntentDecision):
+        logger.info(f"Intent gate: {decision.intent} via {decision.method} "
+                    f"(confidence {decision.confidence}, {decision.latency_ms}ms)")
+        if not self.log_path:
+            return
+        entry = {"timestamp": time.time(), "message": message[:500],
+                 **{key: value for key, value in asdict(decision).items() if key != "response"}}
+        try:
+            with self._lock, open(self.log_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as e:
+            logger.warning(f"Could not write intent decision log: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        total = sum(self._counts.values())
+        return {
+            "decisions": dict(self._counts),
+            "short_circuited": total - self._counts[QUESTION] - self._counts[FOLLOWUP],
+            "total": total,
+        }
+
+
+# Global intent gate (lazy initialization)
+_intent_gate = None
+
+def get_intent_gate(rag_system) -> Optional[IntentGate]:
+    """Get the global intent gate, or None if INTENT_GATE=off."""
+    global _intent_gate
+    if os.getenv("INTENT_GATE", "on").lower() == "off":
+        return None
+    if _intent_gate is None:
+        def embed_texts(texts: List[str]):
+            # Query embeddings go through the batcher, whose cache also serves the retrieval that follows
+            return rag_system.embedding_batcher.embed_many(texts)
+
+        use_embeddings = os.getenv("INTENT_GATE_EMBEDDINGS", "on").lower() != "off"
+        _intent_gate = IntentGate(
+            embed_texts=embed_texts if use_embeddings else None,
+            log_path=os.getenv("INTENT_LOG_PATH", "./data/intent_decisions.jsonl"),
+        )
+    return _intent_gate
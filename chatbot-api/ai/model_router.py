@@ -0,0 +1,274 @@
+"""
+Latency-aware model router.
+Maps each action to a primary and fallback model (configured under
+`model_routing` in agents.yaml), routes very large prompts to a dedicated
+model, prefers the fallback while the primary is slow or down, and records
+which model served each call.
+"""
+
+import contextvars
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from crewai import LLM
+from crewai.llms.base_llm import BaseLLM
+from crewai.types.usage_metrics import UsageMetrics
+
+from ai.resilience import ResilientLLM, current_action, get_policy
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gemini/gemini-2.0-flash"
+USAGE_FIELDS = ("total_tokens", "prompt_tokens", "cached_prompt_tokens", "completion_tokens", "successful_requests")
+
+
+@dataclass
+class ModelRoute:
+    primary: str = DEFAULT_MODEL
+    fallback: Optional[str] = None
+    max_tokens: Optional[int] = None
+    temperature: float = 0.7
+    large_prompt_model: Optional[str] = None
+    large_prompt_chars: int = 0
+    latency_slo_seconds: Optional[float] = None
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "ModelRoute":
+        return cls(**{key: value for key, value in config.items() if key in cls.__dataclass_fields__})
+
+
+@dataclass
+class CallTrace:
+    """Models that served the calls of one request, and the tokens they used."""
+    models: List[str] = field(default_factory=list)
+    usage: Dict[str, int] = field(default_factory=lambda: dict.fromkeys(USAGE_FIELDS, 0))
+    # Prompts and responses of each call, kept only for sampled requests (see ai/trace_store.py)
+    transcript: Optional[List[Dict[str, Any]]] = None
+    # Parallel calls of one request (see ai/fanout.py) share the trace
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, model: str, usage: Dict[str, int]):
+        with self._lock:
+            self.models.append(model)
+            for key in USAGE_FIELDS:
+                self.usage[key] += usage.get(key, 0)
+
+    def record_call(self, action: str, model: str, messages: Any, elapsed: float,
+                    response: Any = None, error: Optional[str] = None):
+        if self.transcript is None:
+            return
+        # The agent keeps appending to its message list, so store a snapshot
+        messages = list(messages) if isinstance(messages, list) else messages
+        entry = {"action": action, "model": model, "elapsed_ms": round(elapsed * 1000, 1), "messages": messages}
+        entry.update({"error": error} if error is not None else {"response": response})
+        with self._lock:
+            self.transcript.append(entry)
+
+    @property
+    def served_by(self) -> Optional[str]:
+        """Distinct models in the order they first served a call."""
+        return ",".join(dict.fromkeys(self.models)) or None
+
+
+_call_trace: contextvars.ContextVar[Optional[CallTrace]] = contextvars.ContextVar("ai_call_trace", default=None)
+
+def start_call_trace(record_transcript: bool = False) -> CallTrace:
+    """
+    Start recording model usage for everything run from the current context.
+
+    Args:
+        record_transcript: Also keep the prompt and response of every call
+    """
+    trace = CallTrace(transcript=[] if record_transcript else None)
+    _call_trace.set(trace)
+    return trace
+
+def current_call_trace() -> Optional[CallTrace]:
+    return _call_trace.get()
+
+
+def _usage_dict(usage: Any) -> Dict[str, int]:
+    if usage is None:
+        return {}
+    if not isinstance(usage, dict):
+        usage = usage.model_dump() if hasattr(usage, "model_dump") else vars(usage)
+    return {key: int(usage.get(key) or 0) for key in USAGE_FIELDS}
+
+
+class ModelRouter:
+    def __init__(self, routes: Dict[str, Dict[str, Any]], default_action: str = "chat",
+                 llm_factory: Optional[Callable[..., Any]] = None):
+        """
+        Initialize the router.
+
+        Args:
+            routes: Per-action route config (the `model_routing` section of agents.yaml)
+            default_action: Route used when a call happens outside any action
+            llm_factory: Builds the underlying LLM for (model, temperature, max_tokens);
+                defaults to crewai's LLM
+        """
+        self.routes = {action: ModelRoute.from_config(config or {}) for action, config in routes.items()}
+        self.default_action = default_action
+        self.llm_factory = llm_factory or (lambda model, temperature, max_tokens: LLM(
+            model=model, temperature=temperature, max_tokens=max_tokens
+        ))
+        # A client serves one call at a time (see lease_llm); idle ones are kept per settings
+        self._idle_llms: Dict[tuple, List[ResilientLLM]] = {}
+        self._llms: List[ResilientLLM] = []
+        self._lock = threading.Lock()
+
+    def route_for(self, action: Optional[str]) -> ModelRoute:
+        return self.routes.get(action) or self.routes.get(self.default_action) or ModelRoute()
+
+    def select(self, action: Optional[str], prompt_chars: int = 0) -> List[str]:
+        """Ordered list of models to try for a call."""
+        route = self.route_for(action)
+        primary = route.primary
+        if route.large_prompt_model and route.large_prompt_chars and prompt_chars >= route.large_prompt_chars:
+            primary = route.large_prompt_model
+
+        candidates = [primary]
+        if route.fallback and route.fallback != primary:
+            candidates.append(route.fallback)
+
+        if len(candidates) > 1 and self._should_prefer_fallback(candidates[0], candidates[1], route):
+            candidates.reverse()
+
+        # Skip models whose circuit is open, unless nothing else is left
+        available = [model for model in candidates if not get_policy(f"llm:{model}").breaker.is_open]
+        return available or candidates
+
+    def _should_prefer_fallback(self, primary: str, fallback: str, route: ModelRoute) -> bool:
+        if route.latency_slo_seconds is None:
+            return False
+        primary_p95 = get_policy(f"llm:{primary}").latency.percentile(95)
+        if primary_p95 is None or primary_p95 <= route.latency_slo_seconds:
+            return False
+        fallback_p95 = get_policy(f"llm:{fallback}").latency.percentile(95)
+        return fallback_p95 is None or fallback_p95 < primary_p95
+
+    def unavailable(self, action: Optional[str]) -> bool:
+        """Whether every model for the action is inside its circuit breaker's recovery window."""
+        route = self.route_for(action)
+        models = [route.primary] + ([route.fallback] if route.fallback else [])
+        return all(get_policy(f"llm:{model}").breaker.retry_after() > 0 for model in models)
+
+    def _llm_key(self, action: Optional[str], model: str) -> tuple:
+        route = self.route_for(action)
+        return (model, route.temperature, route.max_tokens)
+
+    def _new_llm(self, key: tuple) -> ResilientLLM:
+        llm = ResilientLLM(self.llm_factory(*key))
+        with self._lock:
+            self._llms.append(llm)
+        return llm
+
+    def get_llm(self, action: Optional[str], model: str) -> ResilientLLM:
+        """Get an LLM client for a model with the action's generation settings, for capability checks."""
+        key = self._llm_key(action, model)
+        with self._lock:
+            idle = self._idle_llms.get(key)
+            if idle:
+                return idle[-1]
+        llm = self._new_llm(key)
+        with self._lock:
+            self._idle_llms.setdefault(key, []).append(llm)
+        return llm
+
+    @contextmanager
+    def lease_llm(self, action: Optional[str], model: str) -> Iterator[ResilientLLM]:
+        """
+        Check out an LLM client for one call. No other call uses it until it is returned,
+        so the change in its usage counters is this call's usage. Idle clients are reused,
+        and a new one is built when all are busy.
+        """
+        key = self._llm_key(action, model)
+        with self._lock:
+            idle = self._idle_llms.get(key)
+            llm = idle.pop() if idle else None
+        if llm is None:
+            llm = self._new_llm(key)
+        try:
+            yield llm
+        finally:
+            with self._lock:
+                self._idle_llms.setdefault(key, []).append(llm)
+
+    def llm_for(self, action: str) -> "RoutedLLM":
+        """Build the LLM to hand to an agent that serves `action`."""
+        return RoutedLLM(self, action)
+
+
+class RoutedLLM(BaseLLM):
+    """
+    CrewAI LLM that picks a model per call through the ModelRouter.
+    The action comes from the running request (see resilience.action_deadline),
+    falling back to the action the agent was built for.
+    """
+
+    def __init__(self, router: ModelRouter, action: str):
+        route = router.route_for(action)
+        super().__init__(model=route.primary, temperature=route.temperature)
+        self.router = router
+        self.action = action
+
+    def _prompt_chars(self, messages) -> int:
+        if isinstance(messages, str):
+            return len(messages)
+        return sum(len(str(message.get("content", ""))) for message in messages)
+
+    def call(self, messages, *args, **kwargs):
+        action = current_action() or self.action
+        candidates = self.router.select(action, self._prompt_chars(messages))
+
+        last_error = None
+        for model in candidates:
+            trace = current_call_trace()
+            with self.router.lease_llm(action, model) as llm:
+                llm.stop = list(self.stop) if self.stop else []
+                before = _usage_dict(llm.get_token_usage_summary())
+                started = time.monotonic()
+                try:
+                    result = llm.call(messages, *args, **kwargs)
+                except Exception as e:
+                    last_error = e
+                    logger.warning(f"Model {model} failed for {action}, trying next candidate: {str(e)}")
+                    if trace is not None:
+                        trace.record_call(action, model, messages, time.monotonic() - started, error=str(e))
+                    continue
+                # The client is leased to this call, so the delta of its cumulative counters is this call's usage
+                after = _usage_dict(llm.get_token_usage_summary())
+
+            if trace is not None:
+                trace.record_call(action, model, messages, time.monotonic() - started, response=result)
+                trace.add(model, {key: after.get(key, 0) - before.get(key, 0) for key in USAGE_FIELDS})
+            logger.debug(f"{action} served by {model}")
+            return result
+
+        if last_error is not None:
+            raise last_error
+        raise RuntimeError(f"No model available for {action}")
+
+    def supports_function_calling(self) -> bool:
+        return self.router.get_llm(self.action, self.model).supports_function_calling()
+
+    def supports_stop_words(self) -> bool:
+        return self.router.get_llm(self.action, self.model).supports_stop_words()
+
+    def get_context_window_size(self) -> int:
+        return self.router.get_llm(self.action, self.model).get_context_window_size()
+
+    def get_token_usage_summary(self) -> UsageMetrics:
+        """Usage of the current request when tracing, so CrewOutput.token_usage is per request."""
+        trace = current_call_trace()
+        if trace is not None:
+            return UsageMetrics(**trace.usage)
+
+        total = UsageMetrics()
+        for llm in list(self.router._llms):
+            total.add_usage_metrics(llm.get_token_usage_summary())
+        return total
@@ -0,0 +1,182 @@
+"""
+Paragraph-parallel editing for long drafts.
+Instead of sending the whole draft and getting the whole revised text back,
+each paragraph is edited on its own (concurrently), with the draft's opening
+as shared context for tone. Short paragraphs (transitions, one-line asides)
+also get the paragraphs around them, since on their own they give the editor
+little to work with. Only the changed spans are returned as a diff,
+along with the reassembled text. Edited paragraphs are cached, so repeating an
+edit on a revised draft only re-edits the paragraphs that changed.
+"""
+
+import difflib
+import os
+import re
+import threading
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from ai.fanout import fan_out
+from ai.result_cache import ResultCache, cache_key
+from ai.segmentation import is_heading, split_paragraphs
+
+logger = logging.getLogger(__name__)
+
+EDIT_MODES = ("full", "paragraphs")
+CACHE_NAMESPACE = "paragraph_edit"
+_TOKEN_PATTERN = re.compile(r"\S+\s*")
+_SHORT_PARAGRAPH_WORDS = 12
+
+
+@dataclass
+class EditResult:
+    text: str
+    changes: List[Dict[str, Any]]
+    paragraphs: int
+    paragraphs_edited: int
+    paragraphs_reused: int
+    token_usage: Optional[Dict[str, int]] = field(default=None, repr=False)
+
+    def __str__(self) -> str:
+        return self.text
+
+
+def diff_spans(original: str, revised: str) -> List[Dict[str, Any]]:
+    """
+    Word-level differences between two texts, as changed spans only.
+    Each span has the operation (replace, insert or delete), its character
+    offset in the original, and the original and revised text.
+    """
+    original_tokens = _TOKEN_PATTERN.findall(original)
+    revised_tokens = _TOKEN_PATTERN.findall(revised)
+    offsets = [0]
+    for token in original_tokens:
+        offsets.append(offsets[-1] + len(token))
+    leading = len(original) - len(original.lstrip())
+
+    spans = []
+    matcher = difflib.SequenceMatcher(a=original_tokens, b=revised_tokens, autojunk=False)
+    for op, a_start, a_end, b_start, b_end in matcher.get_opcodes():
+        if op == "equal":
+            continue
+        spans.append({
+            "op": op,
+            "offset": leading + offsets[a_start],
+            "original": "".join(original_tokens[a_start:a_end]),
+            "revised": "".join(revised_tokens[b_start:b_end]),
+        })
+    return spans
+
+
+class ParagraphEditor:
+    def __init__(self, edit_paragraph: Callable[[str, str, str], str], cache: Optional[ResultCache] = None,
+                 max_workers: int = 4, context_chars: int = 600, cache_version: str = ""):
+        """
+        Initialize the editor.
+
+        Args:
+            edit_paragraph: Edits one paragraph: (paragraph, editing_goal, draft_context) -> revised paragraph
+            cache: Where edited paragraphs are cached (None disables caching)
+            max_workers: Paragraphs edited concurrently
+            context_chars: Length of the draft opening passed to every call as tone context
+                (short paragraphs also get their neighbouring paragraphs)
+            cache_version: Mixed into cache keys; changes when the paragraph prompt or model changes
+        """
+        self.edit_paragraph = edit_paragraph
+        self.cache = cache
+        self.max_workers = max_workers
+        self.context_chars = context_chars
+        self.cache_version = cache_version
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._paragraphs_edited = 0
+        self._paragraphs_reused = 0
+
+    def _editable(self, paragraph: str) -> bool:
+        return not is_heading(paragraph)
+
+    @staticmethod
+    def _neighbours(paragraphs: List[str], index: int) -> List[str]:
+        """Paragraphs just before and after a short paragraph, which it is edited in light of."""
+        if len(paragraphs[index].split()) >= _SHORT_PARAGRAPH_WORDS:
+            return []
+        return [paragraphs[index - 1] if index > 0 else "", paragraphs[index + 1] if index + 1 < len(paragraphs) else ""]
+
+    def _context(self, opening: str, neighbours: List[str]) -> str:
+        if not neighbours:
+            return opening
+        before, after = neighbours
+        return "\n\n".join(part for part in (opening, "[...]", before, "[The paragraph being edited]", after) if part)
+
+    def edit(self, draft: str, editing_goal: str) -> EditResult:
+        """
+        Edit a draft paragraph by paragraph.
+
+        Args:
+            draft: The draft to edit
+            editing_goal: Instruction applied to every paragraph
+
+        Returns:
+            EditResult with the reassembled text and the changed spans per paragraph
+        """
+        paragraphs = split_paragraphs(draft)
+        context = draft.strip()[:self.context_chars]
+        neighbours = [self._neighbours(paragraphs, index) for index in range(len(paragraphs))]
+        # The tone context is not part of the key: a cached edit stays valid while the paragraph and goal
+        # are unchanged (and, for a short paragraph, the paragraphs around it)
+        keys = [cache_key(self.cache_version, editing_goal, paragraph, *around)
+                for paragraph, around in zip(paragraphs, neighbours)]
+        revised: List[Optional[str]] = [
+            (self.cache.get(CACHE_NAMESPACE, key) if self.cache else None) if self._editable(paragraph) else paragraph
+            for paragraph, key in zip(paragraphs, keys)
+        ]
+        missing = [i for i, paragraph in enumerate(revised) if paragraph is None]
+
+        def edit(index: int) -> str:
+            result = (self.edit_paragraph(paragraphs[index], editing_goal, self._context(context, neighbours[index])).strip()
+                      or paragraphs[index])
+            if self.cache:
+                self.cache.put(CACHE_NAMESPACE, keys[index], result)
+            return result
+
+        for index, paragraph in zip(missing, fan_out(edit, missing, self.max_workers)):
+            revised[index] = paragraph
+
+        changes = []
+        for index, (original, paragraph) in enumerate(zip(paragraphs, revised)):
+            if paragraph != original:
+                changes.append({"paragraph": index, "spans": diff_spans(original, paragraph)})
+
+        reused = sum(1 for paragraph in paragraphs if self._editable(paragraph)) - len(missing)
+        with self._lock:
+            self._runs += 1
+            self._paragraphs_edited += len(missing)
+            self._paragraphs_reused += reused
+        logger.info(f"Edited {len(missing)} of {len(paragraphs)} paragraphs ({reused} cached, {len(changes)} changed)")
+        return EditResult(
+            text="\n\n".join(revised),
+            changes=changes,
+            paragraphs=len(paragraphs),
+            paragraphs_edited=len(missing),
+            paragraphs_reused=reused,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "runs": self._runs,
+            "paragraphs_edited": self._paragraphs_edited,
+            "paragraphs_reused": self._paragraphs_reused,
+        }
+
+
+def create_paragraph_editor(edit_paragraph, cache: Optional[ResultCache], cache_version: str = "") -> ParagraphEditor:
+    """Create a paragraph editor configured from environment variables."""
+    return ParagraphEditor(
+        edit_paragraph,
+        cache=cache,
+        max_workers=int(os.getenv("EDIT_PARAGRAPH_CONCURRENCY", "4")),
+        context_chars=int(os.getenv("EDIT_CONTEXT_CHARS", "600")),
+        cache_version=cache_version,
+    )
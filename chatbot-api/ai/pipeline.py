@@ -0,0 +1,141 @@
+"""
+Server-side pipelines of AI actions.
+A pipeline is a small DAG of steps (e.g. trend_based_write -> edit -> summarize).
+A step's payload fields can be filled from the outputs of earlier steps, so
+intermediate text stays in memory instead of round-tripping through the
+client. Steps run as soon as their dependencies finish, independent branches
+concurrently, and each step's result is reported as it completes.
+"""
+
+import asyncio
+import time
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_ACTIONS = ("discover_trends", "trend_based_write", "edit", "summarize", "chat")
+
+
+class PipelineError(ValueError):
+    """Raised when a pipeline definition is invalid."""
+
+
+def validate_pipeline(steps: List[Dict[str, Any]], max_steps: int = 8) -> Dict[str, List[str]]:
+    """
+    Check a pipeline definition.
+
+    Args:
+        steps: Dicts with id, action, payload, inputs ({payload field: step id}) and depends_on
+        max_steps: Maximum number of steps
+
+    Returns:
+        The dependencies of each step
+    """
+    if not steps:
+        raise PipelineError("A pipeline needs at least one step")
+    if len(steps) > max_steps:
+        raise PipelineError(f"A pipeline can have at most {max_steps} steps")
+
+    ids = [step["id"] for step in steps]
+    duplicates = {step_id for step_id in ids if ids.count(step_id) > 1}
+    if duplicates:
+        raise PipelineError(f"Duplicate step ids: {', '.join(sorted(duplicates))}")
+
+    dependencies = {}
+    for step in steps:
+        if step["action"] not in PIPELINE_ACTIONS:
+            raise PipelineError(f"Step {step['id']}: unsupported action {step['action']} "
+                                f"(expected one of {', '.join(PIPELINE_ACTIONS)})")
+        needs = list(dict.fromkeys(list((step.get("inputs") or {}).values()) + list(step.get("depends_on") or [])))
+        unknown = [step_id for step_id in needs if step_id not in ids]
+        if unknown:
+            raise PipelineError(f"Step {step['id']} depends on unknown steps: {', '.join(unknown)}")
+        dependencies[step["id"]] = needs
+
+    # Kahn's algorithm: every step must become runnable
+    remaining = {step_id: set(needs) for step_id, needs in dependencies.items()}
+    while remaining:
+        ready = [step_id for step_id, needs in remaining.items() if not needs]
+        if not ready:
+            raise PipelineError(f"Pipeline has a cycle between steps: {', '.join(sorted(remaining))}")
+        for step_id in ready:
+            del remaining[step_id]
+        for needs in remaining.values():
+            needs.difference_update(ready)
+    return dependencies
+
+
+async def run_pipeline(steps: List[Dict[str, Any]], run_step: Callable[[Dict[str, Any], Dict[str, Any]], Awaitable[str]],
+                       max_steps: int = 8) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run a pipeline, yielding one event per step as it finishes.
+
+    Args:
+        steps: Pipeline definition (see validate_pipeline)
+        run_step: Runs one step: (step, payload with inputs filled in) -> output text
+        max_steps: Maximum number of steps
+
+    Yields:
+        {"step", "action", "status" ("completed", "failed" or "skipped"), "elapsed_ms",
+        and "response" or "error"}
+    """
+    dependencies = validate_pipeline(steps, max_steps)
+    by_id = {step["id"]: step for step in steps}
+    outputs: Dict[str, str] = {}
+    finished: Dict[str, str] = {}  # step id -> status
+    running: Dict[asyncio.Task, str] = {}
+    started_at: Dict[str, float] = {}
+
+    def start_ready():
+        for step_id, needs in dependencies.items():
+            if step_id in finished or step_id in started_at:
+                continue
+            if all(finished.get(need) == "completed" for need in needs):
+                step = by_id[step_id]
+                payload = dict(step.get("payload") or {})
+                payload.update({field: outputs[source] for field, source in (step.get("inputs") or {}).items()})
+                started_at[step_id] = time.monotonic()
+                running[asyncio.ensure_future(run_step(step, payload))] = step_id
+
+    def skip_blocked() -> List[Dict[str, Any]]:
+        events = []
+        changed = True
+        while changed:
+            changed = False
+            for step_id, needs in dependencies.items():
+                if step_id in finished or step_id in started_at:
+                    continue
+                failed = [need for need in needs if finished.get(need) in ("failed", "skipped")]
+                if failed:
+                    finished[step_id] = "skipped"
+                    changed = True
+                    events.append({"step": step_id, "action": by_id[step_id]["action"], "status": "skipped",
+                                   "elapsed_ms": 0.0, "error": f"Depends on unfinished steps: {', '.join(failed)}"})
+        return events
+
+    try:
+        start_ready()
+        while running:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                step_id = running.pop(task)
+                event = {"step": step_id, "action": by_id[step_id]["action"],
+                         "elapsed_ms": round((time.monotonic() - started_at[step_id]) * 1000, 1)}
+                if task.exception() is None:
+                    outputs[step_id] = task.result()
+                    finished[step_id] = "completed"
+                    event.update(status="completed", response=outputs[step_id])
+                else:
+                    error = task.exception()
+                    finished[step_id] = "failed"
+                    event.update(status="failed", error=str(getattr(error, "detail", None) or error))
+                    logger.warning(f"Pipeline step {step_id} failed: {event['error']}")
+                yield event
+            for event in skip_blocked():
+                yield event
+            start_ready()
+    finally:
+        # Client went away or the pipeline was cancelled: don't leave steps running
+        for task in running:
+            task.cancel()
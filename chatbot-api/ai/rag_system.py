@@ -5,13 +5,26 @@ This module handles the vector store, embeddings, and retrieval logic.
 
 import chromadb
 from chromadb.utils import embedding_functions
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable
 import os
 import json
+import hashlib
+import functools
+import shutil
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 import logging
 from dotenv import load_dotenv
 
+from ai.batching import create_embedding_batcher
+from ai.dedup import DEDUP_MODES, estimate_similarity, get_duplicate_detector
+from ai.hnsw import (create_autotuner, hnsw_metadata, hnsw_settings_from_env, index_settings, set_ef_search,
+                     settings_requiring_rebuild)
+from ai.rerank import create_reranking_stage
+from ai.sharding import ShardedCollection, create_sharding_strategy
+
 # Load environment variables
 load_dotenv()
 
@@ -19,83 +32,586 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class BlogRAGSystem:
-    def __init__(self, persist_directory: str = "./chroma_db"):
-        """Initialize the RAG system with ChromaDB and Google embeddings."""
-        self.persist_directory = persist_directory
-        
-        # Initialize ChromaDB client
-        self.client = chromadb.PersistentClient(path=persist_directory)
-        
-        # Use Google's embedding API
-        google_api_key = os.getenv("GOOGLE_API_KEY")
+REBUILD_BATCH_SIZE = 1000
+
+# Metadata set by duplicate detection rather than by the caller
+DUPLICATE_METADATA_KEYS = ("duplicate_of", "duplicate_similarity")
+# Metadata built by upsert_blog_posts from the post itself
+POST_FIELD_KEYS = ("post_id", "title", "author", "tags", "created_at", "content_hash", "updated_at")
+
+def compute_content_hash(document_text: str) -> str:
+    """Hash of the embedded document text, stored in metadata to detect real content changes."""
+    return hashlib.sha256(document_text.encode("utf-8")).hexdigest()
+
+def create_embedding_function():
+    """
+    Create the embedding function selected by EMBEDDING_BACKEND ("google" or "local").
+    Defaults to Google embeddings when GOOGLE_API_KEY is set, otherwise to the
+    local batched ONNX backend.
+    """
+    google_api_key = os.getenv("GOOGLE_API_KEY")
+    backend = os.getenv("EMBEDDING_BACKEND", "google" if google_api_key else "local").lower()
+    
+    if backend == "google":
         if not google_api_key:
             logger.warning("GOOGLE_API_KEY not found in environment variables")
-            logger.warning("Falling back to default embeddings (this will download a local model)")
-            self.embedding_function = embedding_functions.DefaultEmbeddingFunction()
         else:
             try:
-                logger.info(f"Attempting to initialize Google embeddings with API key: {google_api_key[:10]}...")
+                logger.info("Attempting to initialize Google embeddings")
                 # Use Google's text embedding model via API
-                self.embedding_function = embedding_functions.GoogleGenerativeAiEmbeddingFunction(
+                embedding_function = embedding_functions.GoogleGenerativeAiEmbeddingFunction(
                     api_key=google_api_key,
                     model_name="models/text-embedding-004"  # Latest Google embedding model
                 )
                 logger.info("Successfully initialized Google Generative AI embeddings (text-embedding-004)")
+                return embedding_function
             except Exception as e:
                 logger.error(f"Failed to initialize Google embeddings: {e}")
-                logger.warning("Falling back to default embeddings (this will download a local model)")
-                self.embedding_function = embedding_functions.DefaultEmbeddingFunction()
+        logger.warning("Falling back to local embeddings (this will download a local model)")
+    
+    from ai.embeddings import get_local_embedding_function
+    embedding_function = get_local_embedding_function()
+    logger.info(f"Using local embeddings ({embedding_function.workers} worker processes, "
+                f"quantized={embedding_function.quantized})")
+    return embedding_function
+
+def write_operation(method):
+    """Mark a BlogRAGSystem method that writes to the collection, so index rebuilds can pause it."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._write():
+            return method(self, *args, **kwargs)
+    return wrapper
+
+class BlogRAGSystem:
+    def __init__(self, persist_directory: str = "./chroma_db", vector_backend: str = None,
+                 collection_name: str = "blog_posts", collection_metadata: Dict[str, Any] = None,
+                 embedding_function=None, sharding=None):
+        """
+        Initialize the RAG system with the configured vector store and embeddings.
         
-        # Get or create collection
-        self.collection = self.client.get_or_create_collection(
-            name="blog_posts",
-            embedding_function=self.embedding_function
-        )
+        Args:
+            persist_directory: ChromaDB directory (used by the "chroma" backend)
+            vector_backend: "chroma" (default) or "flat" for the memory-mapped flat index;
+                defaults to the VECTOR_BACKEND environment variable
+            collection_name: Name of the collection holding the posts
+            collection_metadata: Chroma collection metadata used when the collection is
+                created (e.g. HNSW settings such as "hnsw:M"); defaults to the HNSW_*
+                environment variables
+            embedding_function: Embedding function to use instead of the configured one
+            sharding: HashSharding or TimeSharding to spread posts over several collections;
+                defaults to the KB_SHARDING environment variable (off)
+        """
+        self.persist_directory = persist_directory
+        
+        # Writes in progress; an index rebuild pauses new ones while it swaps collections
+        self._writes = threading.Condition()
+        self._active_writes = 0
+        self._writes_paused = False
+        self.vector_backend = (vector_backend or os.getenv("VECTOR_BACKEND", "chroma")).lower()
+        
+        # Use Google's embedding API, or the local backend when offline
+        self.embedding_function = embedding_function or create_embedding_function()
+        
+        # HNSW index settings (chroma only) and the optional ef_search autotuner
+        self.hnsw_settings: Dict[str, Any] = {}
+        self.autotuner = None
+        
+        if self.vector_backend == "flat":
+            from ai.flat_index import FlatCollection
+            self.client = None
+            flat_path = os.getenv("FLAT_INDEX_PATH", "./data/flat_index")
+            
+            def open_collection(name: str):
+                return FlatCollection(
+                    path=flat_path,
+                    name=name,
+                    embedding_function=self.embedding_function,
+                    dtype=os.getenv("FLAT_INDEX_DTYPE", "float16"),
+                    max_segments=int(os.getenv("FLAT_INDEX_MAX_SEGMENTS", "8")),
+                    max_dead_ratio=float(os.getenv("FLAT_INDEX_MAX_DEAD_RATIO", "0.3"))
+                )
+            def collection_names() -> List[str]:
+                return os.listdir(flat_path) if os.path.isdir(flat_path) else []
+            def drop_collection(name: str):
+                shutil.rmtree(os.path.join(flat_path, name), ignore_errors=True)
+        else:
+            # Initialize ChromaDB client
+            self.client = chromadb.PersistentClient(path=persist_directory)
+            
+            if collection_metadata is None:
+                self.hnsw_settings = hnsw_settings_from_env(collection_name)
+                collection_metadata = hnsw_metadata(self.hnsw_settings) or None
+            
+            def open_collection(name: str):
+                # Get or create collection (the metadata only applies when it is created)
+                return self.client.get_or_create_collection(
+                    name=name,
+                    embedding_function=self.embedding_function,
+                    metadata=collection_metadata
+                )
+            def collection_names() -> List[str]:
+                return [collection.name if hasattr(collection, "name") else collection
+                        for collection in self.client.list_collections()]
+            drop_collection = self.client.delete_collection
+        
+        # Optionally spread posts over several collections, queried in parallel
+        self.sharding = sharding or create_sharding_strategy()
+        if self.sharding is None:
+            self.collection = open_collection(collection_name)
+        else:
+            self.collection = ShardedCollection(
+                collection_name, self.sharding, open_collection, collection_names, drop_collection,
+                embedding_function=self.embedding_function,
+                max_workers=int(os.getenv("KB_SHARD_CONCURRENCY", "8"))
+            )
+        
+        # Coalesce concurrent query embeddings into batched calls
+        self.embedding_batcher = create_embedding_batcher(self.embedding_function)
+        
+        # Second-stage reranking over an over-fetched candidate set (None when disabled)
+        self.reranking_stage = create_reranking_stage()
+        
+        # Callbacks notified of knowledge base changes: callback(event, post_ids)
+        self._listeners: List[Callable[[str, List[str]], None]] = []
+        
+        # Near-duplicate detection at ingest: "flag" marks duplicates in metadata,
+        # "merge" doesn't store new posts that duplicate an existing one
+        self.dedup_mode = os.getenv("DEDUP_MODE", "flag").lower()
+        if self.dedup_mode not in DEDUP_MODES:
+            logger.warning(f"Unknown DEDUP_MODE {self.dedup_mode}, using 'flag'")
+            self.dedup_mode = "flag"
+        self.duplicate_detector = get_duplicate_detector() if self.dedup_mode != "off" else None
+        
+        if self.client is not None:
+            self._configure_index()
+        
+        # Cold start: fill an empty store from a snapshot instead of re-embedding
+        snapshot_path = os.getenv("KB_SNAPSHOT_PATH")
+        if snapshot_path and os.path.exists(snapshot_path) and self.collection.count() == 0:
+            try:
+                self.import_snapshot(snapshot_path)
+            except Exception as e:
+                logger.error(f"Failed to restore knowledge base snapshot {snapshot_path}: {str(e)}")
+        elif (self.duplicate_detector is not None
+              and len(self.duplicate_detector.indexed_ids()) < self.collection.count()):
+            # Posts stored before dedup was enabled would otherwise go unmatched at ingest
+            self._index_for_duplicates()
         
         logger.info(f"Initialized RAG system with collection: {self.collection.name}")
     
+    def _configure_index(self):
+        """Check the stored index against the HNSW settings, apply ef_search and start the autotuner."""
+        stale = settings_requiring_rebuild(self.collection, self.hnsw_settings)
+        if stale:
+            if os.getenv("HNSW_REBUILD_ON_START", "false").lower() == "true":
+                self.rebuild_index()
+            else:
+                logger.warning(f"Collection {self.collection.name} was built with different HNSW settings "
+                               f"({', '.join(stale)}); run scripts/rebuild_index.py to apply them")
+        
+        ef_search = self.hnsw_settings.get("ef_search")
+        if ef_search and index_settings(self.collection)["ef_search"] != ef_search:
+            set_ef_search(self.collection, ef_search)
+            logger.info(f"Set ef_search of {self.collection.name} to {ef_search}")
+        
+        self.autotuner = create_autotuner(lambda value: set_ef_search(self.collection, value),
+                                          index_settings(self.collection)["ef_search"] or 100)
+    
+    @contextmanager
+    def _write(self):
+        with self._writes:
+            while self._writes_paused:
+                self._writes.wait()
+            self._active_writes += 1
+        try:
+            yield
+        finally:
+            with self._writes:
+                self._active_writes -= 1
+                self._writes.notify_all()
+    
+    @contextmanager
+    def _pause_writes(self):
+        """Wait for writes in progress to finish and hold new ones until the block exits."""
+        with self._writes:
+            self._writes_paused = True
+            while self._active_writes:
+                self._writes.wait()
+        try:
+            yield
+        finally:
+            with self._writes:
+                self._writes_paused = False
+                self._writes.notify_all()
+    
+    def rebuild_index(self, settings: Dict[str, Any] = None, keep_previous: bool = False) -> Dict[str, Any]:
+        """
+        Rebuild the HNSW index with new settings, without re-embedding.
+        Embeddings are copied into a new collection, which then replaces the current one
+        under the same name (shard by shard for a sharded store). Writes continue during
+        the copy and are copied again; they are only paused for the final catch-up and
+        the swap.
+        
+        Args:
+            settings: HNSW settings (space, m, ef_construction, ef_search); defaults to the configured ones
+            keep_previous: Keep the old collections as "<name>_previous" for rollback
+        
+        Returns:
+            Collection name, post count, index settings before and after, and duration
+        """
+        if self.client is None:
+            raise ValueError("HNSW settings only apply to the chroma vector backend")
+        
+        started = time.monotonic()
+        settings = dict(self.hnsw_settings if settings is None else settings)
+        previous_settings = index_settings(self.collection)
+        
+        def replace_collection(target):
+            self.collection = target
+        if self.sharding is not None:
+            previous = [self._rebuild_collection(shard, settings, keep_previous,
+                                                 functools.partial(self.collection.replace_shard, key))
+                        for key, shard in self.collection.sorted_shards()]
+        else:
+            previous = [self._rebuild_collection(self.collection, settings, keep_previous, replace_collection)]
+        if self.autotuner is not None:
+            self.autotuner.ef_search = index_settings(self.collection)["ef_search"] or self.autotuner.ef_search
+        
+        duration = time.monotonic() - started
+        logger.info(f"Rebuilt HNSW index of {self.collection.name} ({self.collection.count()} posts) "
+                    f"in {duration:.2f}s")
+        return {
+            "collection": self.collection.name,
+            "count": self.collection.count(),
+            "previous_settings": previous_settings,
+            "settings": index_settings(self.collection),
+            "previous_collections": previous if keep_previous else [],
+            "duration_seconds": round(duration, 2),
+        }
+    
+    def _rebuild_collection(self, source, settings: Dict[str, Any], keep_previous: bool,
+                            replace: Callable[[Any], None]) -> str:
+        """Copy a collection into one built with `settings` and swap it in; returns the previous collection's name."""
+        name, staging_name, previous_name = source.name, f"{source.name}_rebuild", f"{source.name}_previous"
+        if "ef_search" not in settings:
+            # Keep the live value (e.g. set by the autotuner) rather than Chroma's default
+            settings = {**settings, "ef_search": index_settings(source)["ef_search"]}
+        
+        existing = {collection.name if hasattr(collection, "name") else collection
+                    for collection in self.client.list_collections()}
+        if staging_name in existing:
+            self.client.delete_collection(staging_name)  # Left over from an interrupted rebuild
+        metadata = {key: value for key, value in (source.metadata or {}).items() if not key.startswith("hnsw:")}
+        metadata.update(hnsw_metadata(settings))
+        target = self.client.create_collection(name=staging_name, embedding_function=self.embedding_function,
+                                               metadata=metadata or None)
+        
+        changed = set()
+        swapped = False
+        def track_changes(event: str, post_ids: List[str]):
+            changed.update(post_ids)
+        self.add_listener(track_changes)
+        try:
+            # Copied by id: paging with offsets is unreliable while posts are being deleted
+            self._copy_posts(source, target, set(source.get(include=[])['ids']))
+            # Catch up on writes made during the copy while writes continue, then once more with them paused
+            for _ in range(3):
+                self._copy_posts(source, target, changed)
+            with self._pause_writes():
+                # Posts deleted and re-added while their batch was copied are caught by comparing ids
+                changed.update(set(source.get(include=[])['ids']).symmetric_difference(
+                    target.get(include=[])['ids']))
+                self._copy_posts(source, target, changed)
+                if target.count() != source.count():
+                    raise RuntimeError(f"Rebuilt index has {target.count()} posts, expected {source.count()}")
+                
+                if previous_name in existing:
+                    self.client.delete_collection(previous_name)
+                source.modify(name=previous_name)
+                target.modify(name=name)
+                replace(target)
+                swapped = True
+        except Exception:
+            if not swapped:
+                if source.name != name:
+                    source.modify(name=name)
+                self.client.delete_collection(target.name)
+            raise
+        finally:
+            self._listeners.remove(track_changes)
+        
+        if not keep_previous:
+            self.client.delete_collection(previous_name)
+        return previous_name
+    
+    @staticmethod
+    def _copy_posts(source, target, post_ids: set):
+        """Copy posts from one collection to another, emptying `post_ids` (deleted posts are deleted)."""
+        while post_ids:
+            batch = [post_ids.pop() for _ in range(min(len(post_ids), REBUILD_BATCH_SIZE))]
+            result = source.get(ids=batch, include=['documents', 'metadatas', 'embeddings'])
+            if result['ids']:
+                # Chroma rejects empty metadata dicts
+                target.upsert(ids=result['ids'], documents=result['documents'],
+                              metadatas=[metadata or None for metadata in result['metadatas']],
+                              embeddings=result['embeddings'])
+            deleted = set(batch) - set(result['ids'])
+            if deleted:
+                target.delete(ids=list(deleted))
+    
+    def rebalance_shards(self) -> Dict[str, Any]:
+        """
+        Move posts to the shards the sharding strategy picks, e.g. after changing the
+        shard count or strategy, or after enabling sharding on an existing store.
+        Writes are paused only while each batch of posts is moved.
+        
+        Returns:
+            Posts moved, shards dropped, post count per shard and duration
+        """
+        if self.sharding is None:
+            raise ValueError("The knowledge base is not sharded (KB_SHARDING=off)")
+        started = time.monotonic()
+        result = self.collection.rebalance(pause_writes=self._pause_writes)
+        duration = time.monotonic() - started
+        logger.info(f"Rebalanced {self.collection.name}: moved {result['moved']} posts, "
+                    f"dropped {len(result['dropped'])} shards in {duration:.2f}s")
+        return {**result, "duration_seconds": round(duration, 2)}
+    
+    def index_stats(self) -> Dict[str, Any]:
+        """Vector index settings, shards, pending rebuilds and autotuner state."""
+        shards = self.collection.stats() if self.sharding is not None else None
+        if self.client is None:
+            return {"backend": self.vector_backend, "collection": self.collection.name, "sharding": shards}
+        return {
+            "backend": self.vector_backend,
+            "collection": self.collection.name,
+            "sharding": shards,
+            "settings": index_settings(self.collection),
+            "configured": self.hnsw_settings,
+            "rebuild_required": settings_requiring_rebuild(self.collection, self.hnsw_settings),
+            "autotuner": self.autotuner.stats() if self.autotuner else None,
+        }
+    
+    def export_snapshot(self, path: str, dtype: str = "float32") -> Dict[str, Any]:
+        """Write all posts, with their embeddings, to a binary snapshot file."""
+        from ai.snapshot import export_snapshot
+        return export_snapshot(self.collection, path, embedding_function=self.embedding_function, dtype=dtype)
+    
+    @write_operation
+    def import_snapshot(self, path: str, force: bool = False) -> Dict[str, Any]:
+        """Restore posts from a snapshot file without re-embedding them."""
+        from ai.snapshot import import_snapshot
+        header = import_snapshot(self.collection, path, embedding_function=self.embedding_function, force=force)
+        self._index_for_duplicates()
+        self._notify("reloaded", [])
+        return header
+    
+    def add_listener(self, callback: Callable[[str, List[str]], None]):
+        """
+        Register a callback for knowledge base changes.
+        Events: "upserted" (new or re-embedded posts), "metadata_updated", "deleted"
+        and "reloaded" (bulk change, e.g. snapshot import).
+        """
+        self._listeners.append(callback)
+    
+    def _notify(self, event: str, post_ids: List[str]):
+        for callback in list(self._listeners):
+            try:
+                callback(event, post_ids)
+            except Exception as e:
+                logger.error(f"Knowledge base listener failed on {event}: {str(e)}")
+    
+    def _query(self, query: str, n_results: int):
+        """Vector search for a query, feeding the index latency to the ef_search autotuner."""
+        query_embedding = self.embedding_batcher.embed(query)
+        started = time.perf_counter()
+        results = self.collection.query(
+            query_embeddings=[query_embedding],
+            n_results=n_results,
+            include=['documents', 'metadatas', 'distances']
+        )
+        if self.autotuner is not None:
+            self.autotuner.record(time.perf_counter() - started)
+        return results
+    
+    def get_all_embeddings(self):
+        """All post ids, metadata and embeddings as (ids, metadatas, float32 matrix)."""
+        from ai.snapshot import read_collection
+        ids, _, metadatas, vectors = read_collection(self.collection, include_documents=False)
+        return ids, metadatas, vectors
+    
     def add_blog_post(self, post_id: str, title: str, content: str, author: str, 
                      tags: List[str] = None, metadata: Dict[str, Any] = None):
-        """Add a blog post to the vector store."""
+        """Add a blog post to the vector store (replacing it if it already exists)."""
         try:
+            status = self.upsert_blog_post(post_id, title, content, author, tags, metadata)
+            logger.info(f"Added blog post {post_id} to vector store ({status})")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error adding blog post {post_id}: {str(e)}")
+            return False
+    
+    def upsert_blog_post(self, post_id: str, title: str, content: str, author: str,
+                         tags: List[str] = None, metadata: Dict[str, Any] = None) -> str:
+        """
+        Insert or update a blog post, re-embedding only if its text changed.
+        
+        Returns:
+            "created", "updated" (re-embedded), "metadata_updated", "unchanged"
+            or "duplicate" (not stored, DEDUP_MODE=merge)
+        """
+        return self.upsert_blog_posts([{
+            "post_id": post_id, "title": title, "content": content,
+            "author": author, "tags": tags, "metadata": metadata
+        }])[post_id]
+    
+    @write_operation
+    def upsert_blog_posts(self, posts: List[Dict[str, Any]]) -> Dict[str, str]:
+        """
+        Insert or update many blog posts at once.
+        Each post's content hash is compared with the stored one: only new or changed
+        documents are embedded, posts whose text is unchanged get a metadata-only update,
+        and posts that didn't change at all are skipped.
+        
+        Args:
+            posts: Dicts with post_id, title, content, author and optional tags and metadata
+        
+        Returns:
+            Status per post_id (see upsert_blog_post)
+        """
+        # Last occurrence wins if a post appears twice
+        posts_by_id = {post["post_id"]: post for post in posts}
+        if not posts_by_id:
+            return {}
+        
+        existing = self.collection.get(ids=list(posts_by_id), include=['metadatas'])
+        existing_metadata = dict(zip(existing['ids'], existing['metadatas'] or []))
+        now = datetime.now().isoformat()
+        
+        statuses = {}
+        embed_ids, embed_documents, embed_metadatas = [], [], []
+        metadata_ids, metadata_updates = [], []
+        new_signatures = {}
+        for post_id, post in posts_by_id.items():
             # Prepare document text (combine title and content for better retrieval)
-            document_text = f"Title: {title}\n\nContent: {content}"
+            document_text = f"Title: {post['title']}\n\nContent: {post['content']}"
+            content_hash = compute_content_hash(document_text)
+            previous = existing_metadata.get(post_id)
             
-            # Prepare metadata
             post_metadata = {
                 "post_id": post_id,
-                "title": title,
-                "author": author,
-                "tags": ", ".join(tags) if tags else "",  # Convert list to string
-                "created_at": datetime.now().isoformat(),
-                **(metadata or {})
+                "title": post["title"],
+                "author": post["author"],
+                "tags": ", ".join(post.get("tags") or []),  # Convert list to string
+                "created_at": (previous or {}).get("created_at", now),
+                **(post.get("metadata") or {}),
+                "content_hash": content_hash
             }
             
-            # Add to collection
-            self.collection.add(
-                documents=[document_text],
-                metadatas=[post_metadata],
-                ids=[post_id]
-            )
+            if previous is None:
+                statuses[post_id] = "created"
+            elif previous.get("content_hash") != content_hash:
+                statuses[post_id] = "updated"
+            else:
+                # Same text, so the duplicate flags set when it was stored still hold
+                post_metadata.update({key: previous[key] for key in DUPLICATE_METADATA_KEYS if key in previous})
+                unchanged = {key: value for key, value in previous.items() if key != "updated_at"}
+                if unchanged == post_metadata:
+                    statuses[post_id] = "unchanged"
+                    continue
+                statuses[post_id] = "metadata_updated"
             
-            logger.info(f"Added blog post {post_id} to vector store")
-            return True
+            if self.duplicate_detector is not None and statuses[post_id] != "metadata_updated":
+                # Check for near-duplicates before paying for the embedding
+                signature = self.duplicate_detector.signature(post["content"])
+                duplicates = self.duplicate_detector.find_duplicates(post["content"], exclude=post_id,
+                                                                     signature=signature)
+                duplicates += [(other_id, estimate_similarity(signature, other))
+                               for other_id, other in new_signatures.items()
+                               if estimate_similarity(signature, other) >= self.duplicate_detector.threshold]
+                if duplicates:
+                    original_id, similarity = max(duplicates, key=lambda match: match[1])
+                    if self.dedup_mode == "merge" and previous is None:
+                        logger.warning(f"Skipping post {post_id}: near-duplicate of {original_id} "
+                                       f"(similarity {similarity:.2f})")
+                        statuses[post_id] = "duplicate"
+                        continue
+                    post_metadata["duplicate_of"] = original_id
+                    post_metadata["duplicate_similarity"] = round(similarity, 3)
+                new_signatures[post_id] = signature
+            if statuses[post_id] == "updated" and "duplicate_of" not in post_metadata:
+                # The stored flags were for the old text; Chroma merges metadata, so None removes them
+                post_metadata.update({key: None for key in DUPLICATE_METADATA_KEYS if key in previous})
             
-        except Exception as e:
-            logger.error(f"Error adding blog post {post_id}: {str(e)}")
-            return False
+            if previous is not None:
+                post_metadata["updated_at"] = now
+            if statuses[post_id] == "metadata_updated":
+                metadata_ids.append(post_id)
+                metadata_updates.append(post_metadata)
+            else:
+                embed_ids.append(post_id)
+                embed_documents.append(document_text)
+                embed_metadatas.append(post_metadata)
+        
+        if embed_ids:
+            self.collection.upsert(ids=embed_ids, documents=embed_documents, metadatas=embed_metadatas)
+            for post_id, signature in new_signatures.items():
+                self.duplicate_detector.add(post_id, None, signature=signature)
+            self._notify("upserted", embed_ids)
+        if metadata_ids:
+            # No documents passed, so nothing is re-embedded
+            self.collection.update(ids=metadata_ids, metadatas=metadata_updates)
+            self._notify("metadata_updated", metadata_ids)
+        
+        logger.info(f"Upserted {len(posts_by_id)} blog posts: {len(embed_ids)} embedded, "
+                    f"{len(metadata_ids)} metadata-only, "
+                    f"{len(posts_by_id) - len(embed_ids) - len(metadata_ids)} unchanged or duplicate")
+        return statuses
+    
+    def _index_for_duplicates(self):
+        """Add posts missing from the duplicate index (restored from a snapshot or stored before dedup was on)."""
+        if self.duplicate_detector is None:
+            return
+        indexed = self.duplicate_detector.indexed_ids()
+        all_ids = self.collection.get(include=[])['ids']
+        missing = [post_id for post_id in all_ids if post_id not in indexed]
+        for start in range(0, len(missing), 500):
+            chunk = self.collection.get(ids=missing[start:start + 500], include=['documents'])
+            for post_id, document in zip(chunk['ids'], chunk['documents']):
+                self.duplicate_detector.add(post_id, document.split('\n\nContent: ', 1)[-1])
+        if missing:
+            logger.info(f"Indexed {len(missing)} existing posts for duplicate detection")
+    
+    def find_duplicate_posts(self, threshold: float = None) -> List[Dict[str, Any]]:
+        """
+        Report groups of near-duplicate posts already in the knowledge base.
+        Posts stored before duplicate detection was enabled are indexed first.
+        """
+        if self.duplicate_detector is None:
+            return []
+        
+        self._index_for_duplicates()
+        clusters = self.duplicate_detector.find_clusters(threshold)
+        titles = {}
+        if clusters:
+            member_ids = [post_id for cluster in clusters for post_id in cluster['post_ids']]
+            result = self.collection.get(ids=member_ids, include=['metadatas'])
+            titles = {post_id: (metadata or {}).get('title', '')
+                      for post_id, metadata in zip(result['ids'], result['metadatas'] or [])}
+        for cluster in clusters:
+            cluster['titles'] = {post_id: titles.get(post_id, '') for post_id in cluster['post_ids']}
+        return clusters
     
     def search_similar_posts(self, query: str, n_results: int = 5, 
-                           include_metadata: bool = True) -> List[Dict[str, Any]]:
-        """Search for similar blog posts based on query."""
+                           include_metadata: bool = True, rerank: bool = True) -> List[Dict[str, Any]]:
+        """Search for similar blog posts based on query, reranking an expanded candidate set."""
         try:
+            rerank = rerank and self.reranking_stage is not None
+            
             # Perform similarity search
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results,
-                include=['documents', 'metadatas', 'distances'] if include_metadata else ['documents']
-            )
+            results = self._query(query, max(n_results, self.reranking_stage.candidates) if rerank else n_results)
             
             # Format results
             formatted_results = []
@@ -106,11 +622,17 @@ class BlogRAGSystem:
                         'similarity_score': 1 - results['distances'][0][i],  # Convert distance to similarity
                     }
                     
-                    if include_metadata and results['metadatas'][0][i]:
+                    if results['metadatas'][0][i]:
                         result['metadata'] = results['metadatas'][0][i]
                     
                     formatted_results.append(result)
             
+            if rerank:
+                formatted_results = self.reranking_stage.rerank(query, formatted_results, n_results)
+            if not include_metadata:
+                for result in formatted_results:
+                    result.pop('metadata', None)
+            
             logger.info(f"Found {len(formatted_results)} similar posts for query: {query[:50]}...")
             return formatted_results
             
@@ -140,7 +662,7 @@ class BlogRAGSystem:
     
     def update_blog_post(self, post_id: str, title: str = None, content: str = None, 
                         metadata: Dict[str, Any] = None):
-        """Update an existing blog post."""
+        """Update an existing blog post (through upsert_blog_posts, so duplicate flags are re-checked)."""
         try:
             # Get existing post
             existing = self.get_post_by_id(post_id)
@@ -148,30 +670,22 @@ class BlogRAGSystem:
                 logger.warning(f"Post {post_id} not found for update")
                 return False
             
-            # Update document text if title or content provided
-            if title or content:
-                existing_metadata = existing.get('metadata', {})
-                new_title = title or existing_metadata.get('title', '')
-                new_content = content or existing['content'].split('\n\nContent: ', 1)[-1]
-                
-                document_text = f"Title: {new_title}\n\nContent: {new_content}"
-                
-                # Update metadata
-                updated_metadata = existing_metadata.copy()
-                if title:
-                    updated_metadata['title'] = title
-                if metadata:
-                    updated_metadata.update(metadata)
-                updated_metadata['updated_at'] = datetime.now().isoformat()
-                
-                # Update in collection
-                self.collection.update(
-                    ids=[post_id],
-                    documents=[document_text],
-                    metadatas=[updated_metadata]
-                )
+            existing_metadata = existing.get('metadata', {})
+            # Extra metadata is kept; fields rebuilt by upsert_blog_posts are left out
+            extra_metadata = {key: value for key, value in existing_metadata.items()
+                              if key not in POST_FIELD_KEYS and key not in DUPLICATE_METADATA_KEYS}
+            extra_metadata.update(metadata or {})
+            
+            status = self.upsert_blog_posts([{
+                "post_id": post_id,
+                "title": title or existing_metadata.get('title', ''),
+                "content": content or existing['content'].split('\n\nContent: ', 1)[-1],
+                "author": existing_metadata.get('author', ''),
+                "tags": [tag for tag in existing_metadata.get('tags', '').split(', ') if tag],
+                "metadata": extra_metadata
+            }])[post_id]
             
-            logger.info(f"Updated blog post {post_id}")
+            logger.info(f"Updated blog post {post_id} ({status})")
             return True
             
         except Exception as e:
@@ -181,14 +695,22 @@ class BlogRAGSystem:
     def delete_blog_post(self, post_id: str):
         """Delete a blog post from the vector store."""
         try:
-            self.collection.delete(ids=[post_id])
-            logger.info(f"Deleted blog post {post_id}")
+            self.delete_blog_posts([post_id])
             return True
             
         except Exception as e:
             logger.error(f"Error deleting post {post_id}: {str(e)}")
             return False
     
+    @write_operation
+    def delete_blog_posts(self, post_ids: List[str]):
+        """Delete many blog posts in one vector store write. Raises on failure."""
+        self.collection.delete(ids=list(post_ids))
+        if self.duplicate_detector is not None:
+            self.duplicate_detector.remove(post_ids)
+        self._notify("deleted", list(post_ids))
+        logger.info(f"Deleted {len(post_ids)} blog post(s)")
+    
     def get_all_posts_metadata(self) -> List[Dict[str, Any]]:
         """Get metadata for all posts in the collection."""
         try:
@@ -205,11 +727,7 @@ class BlogRAGSystem:
             # Create a query string from tags
             tag_query = " ".join(tags)
             
-            results = self.collection.query(
-                query_texts=[tag_query],
-                n_results=n_results,
-                include=['documents', 'metadatas', 'distances']
-            )
+            results = self._query(tag_query, n_results)
             
             # Filter results that actually contain the tags
             filtered_results = []
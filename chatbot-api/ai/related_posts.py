@@ -0,0 +1,329 @@
+"""
+Related posts.
+Keeps a precomputed top-k neighbour list for every post so the post page can
+show related posts with a dictionary lookup instead of a vector query per view.
+
+The full graph is rebuilt with blocked matrix products over the stored
+embeddings (no re-embedding). Between rebuilds it is maintained incrementally
+from the RAG system's change events, by a background thread.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Neighbour entry: (post_id, cosine similarity)
+Neighbour = Tuple[str, float]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.clip(norms, 1e-12, None)
+
+
+def top_k_neighbours(vectors: np.ndarray, k: int, block_size: int = 256) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact top-k cosine neighbours of every row (excluding itself).
+
+    Returns:
+        (indices, scores), both of shape (n, min(k, n - 1)), sorted by descending score
+    """
+    vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+    n = len(vectors)
+    k = min(k, n - 1)
+    indices = np.empty((n, max(k, 0)), dtype=np.int64)
+    scores = np.empty((n, max(k, 0)), dtype=np.float32)
+    if k <= 0:
+        return indices, scores
+
+    for start in range(0, n, block_size):
+        end = min(start + block_size, n)
+        block = vectors[start:end] @ vectors.T
+        block[np.arange(end - start), np.arange(start, end)] = -np.inf  # Exclude self
+        top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(block, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        indices[start:end] = np.take_along_axis(top, order, axis=1)
+        scores[start:end] = np.take_along_axis(top_scores, order, axis=1)
+    return indices, scores
+
+
+class RelatedPostsIndex:
+    def __init__(self, rag_system, k: int = 5, path: Optional[str] = "./data/related_posts.json",
+                 rebuild_interval: float = 6 * 3600, candidate_factor: int = 4):
+        """
+        Initialize the related-posts index.
+
+        Args:
+            rag_system: BlogRAGSystem whose stored embeddings are used
+            k: Neighbours kept per post
+            path: File the graph is persisted to (None to keep it in memory only)
+            rebuild_interval: Seconds between full rebuilds, which correct incremental drift
+            candidate_factor: An updated post is offered to the neighbour lists of its
+                k * candidate_factor nearest posts
+        """
+        self.rag_system = rag_system
+        self.k = k
+        self.path = path
+        self.rebuild_interval = rebuild_interval
+        self.candidate_factor = candidate_factor
+
+        self._neighbours: Dict[str, List[Neighbour]] = {}
+        self._titles: Dict[str, str] = {}
+        # Content hash of each post as of its neighbour list, to tell whether a saved graph is current
+        self._content_hashes: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+        self._events: "queue.Queue[Tuple[str, List[str]]]" = queue.Queue()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.ready = False
+        self.last_rebuild: Optional[float] = None
+        self.last_rebuild_seconds: Optional[float] = None
+
+        rag_system.add_listener(self._on_change)
+
+    # --- LOOKUP ---
+
+    def get_related(self, post_id: str, limit: Optional[int] = None) -> Optional[List[Dict[str, Any]]]:
+        """Related posts for a post, or None if the post is unknown."""
+        neighbours = self._neighbours.get(post_id)
+        if neighbours is None:
+            return None
+        return [
+            {"post_id": neighbour_id, "title": self._titles.get(neighbour_id, ""), "similarity_score": score}
+            for neighbour_id, score in neighbours[:limit or self.k]
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "posts": len(self._neighbours),
+            "k": self.k,
+            "pending_changes": self._events.qsize(),
+            "last_rebuild": self.last_rebuild,
+            "last_rebuild_seconds": self.last_rebuild_seconds,
+        }
+
+    # --- FULL REBUILD ---
+
+    def rebuild(self):
+        """Recompute every neighbour list from the stored embeddings."""
+        started = time.monotonic()
+        ids, metadatas, vectors = self.rag_system.get_all_embeddings()
+        indices, scores = top_k_neighbours(vectors, self.k) if ids else (np.zeros((0, 0), int), None)
+
+        neighbours = {
+            post_id: [(ids[j], round(float(scores[i, n]), 4)) for n, j in enumerate(indices[i])]
+            for i, post_id in enumerate(ids)
+        }
+        titles = {post_id: (metadatas[i] or {}).get("title", "") for i, post_id in enumerate(ids)}
+        content_hashes = {post_id: (metadatas[i] or {}).get("content_hash") for i, post_id in enumerate(ids)}
+        with self._lock:
+            self._neighbours, self._titles, self._content_hashes = neighbours, titles, content_hashes
+        self.ready = True
+        self.last_rebuild = time.time()
+        self.last_rebuild_seconds = round(time.monotonic() - started, 2)
+        logger.info(f"Rebuilt related posts for {len(ids)} posts in {self.last_rebuild_seconds}s")
+        self.save()
+
+    # --- INCREMENTAL MAINTENANCE ---
+
+    def _on_change(self, event: str, post_ids: List[str]):
+        self._events.put((event, list(post_ids)))
+
+    def _get_vectors(self, post_ids: List[str]) -> Dict[str, np.ndarray]:
+        if not post_ids:
+            return {}
+        result = self.rag_system.collection.get(ids=list(post_ids), include=["metadatas", "embeddings"])
+        vectors = _normalize(np.asarray(result["embeddings"], dtype=np.float32)) if result["ids"] else []
+        for post_id, metadata in zip(result["ids"], result["metadatas"] or []):
+            self._titles[post_id] = (metadata or {}).get("title", "")
+            self._content_hashes[post_id] = (metadata or {}).get("content_hash")
+        return dict(zip(result["ids"], vectors))
+
+    def _nearest(self, post_id: str, vector: np.ndarray, count: int) -> List[Neighbour]:
+        """Nearest posts to a vector, scored by exact cosine similarity."""
+        result = self.rag_system.collection.query(query_embeddings=[vector.tolist()], n_results=count + 1,
+                                                  include=["distances"])
+        candidates = [candidate for candidate in result["ids"][0] if candidate != post_id]
+        vectors = self._get_vectors(candidates)
+        scored = [(candidate, round(float(np.dot(vector, vectors[candidate])), 4))
+                  for candidate in candidates if candidate in vectors]
+        return sorted(scored, key=lambda item: -item[1])
+
+    def _offer(self, post_id: str, candidate: str, score: float):
+        """Insert `candidate` into `post_id`'s list if it ranks in the top k."""
+        neighbours = [item for item in self._neighbours.get(post_id, []) if item[0] != candidate]
+        if len(neighbours) < self.k or score > neighbours[-1][1]:
+            neighbours.append((candidate, score))
+            neighbours.sort(key=lambda item: -item[1])
+            self._neighbours[post_id] = neighbours[:self.k]
+
+    def _recompute(self, post_ids: List[str]):
+        for post_id, vector in self._get_vectors(post_ids).items():
+            # Rescored candidates, as the collection's own metric need not be cosine
+            self._neighbours[post_id] = self._nearest(post_id, vector, self.k * self.candidate_factor)[:self.k]
+
+    def _apply_upserts(self, post_ids: List[str]):
+        stale = set()
+        for post_id, vector in self._get_vectors(post_ids).items():
+            # Posts that listed this one may now rank it lower than their k-th neighbour
+            stale.update(other for other, neighbours in self._neighbours.items()
+                         if other != post_id and any(n[0] == post_id for n in neighbours))
+
+            candidates = self._nearest(post_id, vector, self.k * self.candidate_factor)
+            self._neighbours[post_id] = candidates[:self.k]
+            # Similarity is symmetric: offer this post to its nearest posts' lists
+            for other, score in candidates:
+                self._offer(other, post_id, score)
+        self._recompute(list(stale - set(post_ids)))
+
+    def _apply_deletes(self, post_ids: List[str]):
+        deleted = set(post_ids)
+        for post_id in deleted:
+            self._neighbours.pop(post_id, None)
+            self._titles.pop(post_id, None)
+            self._content_hashes.pop(post_id, None)
+        affected = [other for other, neighbours in self._neighbours.items()
+                    if any(n[0] in deleted for n in neighbours)]
+        self._recompute(affected)
+
+    def _drain_events(self, first: Tuple[str, List[str]]):
+        """Apply a batch of queued changes (coalesced per post) under the lock."""
+        events = [first]
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                break
+
+        if any(event == "reloaded" for event, _ in events):
+            self.rebuild()
+            return
+
+        # Latest event per post wins
+        latest: Dict[str, str] = {}
+        for event, post_ids in events:
+            for post_id in post_ids:
+                latest[post_id] = event
+
+        with self._lock:
+            deleted = [post_id for post_id, event in latest.items() if event == "deleted"]
+            upserted = [post_id for post_id, event in latest.items() if event == "upserted"]
+            renamed = [post_id for post_id, event in latest.items() if event == "metadata_updated"]
+            self._apply_deletes(deleted)
+            self._apply_upserts(upserted)
+            self._get_vectors(renamed)  # Refreshes titles
+        logger.info(f"Related posts updated: {len(upserted)} upserted, {len(deleted)} deleted, "
+                    f"{len(renamed)} renamed")
+        self.save()
+
+    # --- PERSISTENCE ---
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {"k": self.k, "saved_at": time.time(), "last_rebuild": self.last_rebuild,
+                    "neighbours": self._neighbours, "titles": self._titles,
+                    "content_hashes": self._content_hashes}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> bool:
+        """
+        Load a persisted graph if it matches the current knowledge base: the same posts,
+        with the same content (posts may have been added, edited or deleted while the
+        service was down).
+        """
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get("k") != self.k:
+                return False
+            current = self.rag_system.collection.get(include=["metadatas"])
+            metadatas = [metadata or {} for metadata in current["metadatas"] or []]
+            content_hashes = {post_id: metadata.get("content_hash")
+                              for post_id, metadata in zip(current["ids"], metadatas)}
+            if data.get("content_hashes") != content_hashes:
+                logger.info(f"Related posts in {self.path} are out of date, rebuilding")
+                return False
+            with self._lock:
+                self._neighbours = {post_id: [tuple(item) for item in items]
+                                    for post_id, items in data["neighbours"].items()}
+                # Titles may have changed without changing the content
+                self._titles = {post_id: metadata.get("title", "")
+                                for post_id, metadata in zip(current["ids"], metadatas)}
+                self._content_hashes = content_hashes
+            self.last_rebuild = data.get("last_rebuild")
+            self.ready = True
+            logger.info(f"Loaded related posts for {len(self._neighbours)} posts from {self.path}")
+            return True
+        except Exception as e:
+            logger.warning(f"Could not load related posts from {self.path}: {str(e)}")
+            return False
+
+    # --- BACKGROUND JOB ---
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="related-posts", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.save()
+
+    def _run(self):
+        try:
+            if not self.load():
+                self.rebuild()
+        except Exception as e:
+            logger.error(f"Initial related posts build failed: {str(e)}")
+
+        while not self._stop.is_set():
+            if self.last_rebuild and time.time() - self.last_rebuild >= self.rebuild_interval:
+                try:
+                    self.rebuild()
+                except Exception as e:
+                    logger.error(f"Related posts rebuild failed: {str(e)}")
+            try:
+                event = self._events.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            try:
+                self._drain_events(event)
+            except Exception as e:
+                logger.error(f"Related posts update failed: {str(e)}")
+
+
+# Global related-posts index (lazy initialization)
+_related_posts = None
+
+def get_related_posts_index(rag_system) -> RelatedPostsIndex:
+    """Get the global related-posts index, configured from environment variables."""
+    global _related_posts
+    if _related_posts is None:
+        _related_posts = RelatedPostsIndex(
+            rag_system,
+            k=int(os.getenv("RELATED_POSTS_K", "5")),
+            path=os.getenv("RELATED_POSTS_PATH", "./data/related_posts.json"),
+            rebuild_interval=float(os.getenv("RELATED_POSTS_REBUILD_INTERVAL_SECONDS", str(6 * 3600))),
+        )
+    return _related_posts
@@ -0,0 +1,278 @@
+"""
+Second-stage reranking for retrieval.
+The vector store over-fetches candidates; a reranker rescores them against the
+query in one batch and the best few are kept. Pairwise scores (cross-encoder)
+are cached per (query, document hash); BM25 scores depend on the whole
+candidate set, so the lexical reranker caches each document's term statistics
+instead and scores every candidate on each query. If scoring doesn't finish
+within the latency budget the vector order is used instead.
+"""
+
+import hashlib
+import math
+import os
+import re
+import threading
+import time
+import logging
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+_STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "i", "in", "is", "it",
+    "of", "on", "or", "that", "the", "this", "to", "was", "what", "when", "where", "which", "who",
+    "why", "with", "you", "your", "do", "does", "can", "about",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN_PATTERN.findall(text.lower()) if token not in _STOPWORDS]
+
+
+class LexicalReranker:
+    """BM25 over the candidate set, plus title and phrase-match bonuses. No model needed."""
+
+    name = "lexical"
+    vector_weight = 0.5  # Lexical scores are blended with the vector similarity
+    # idf and average length come from the candidate set, so a score only holds for that set
+    pairwise = False
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, title_boost: float = 0.5, bigram_boost: float = 0.3,
+                 cache_size: int = 10000):
+        self.k1 = k1
+        self.b = b
+        self.title_boost = title_boost
+        self.bigram_boost = bigram_boost
+        self.cache_size = cache_size
+        # Term statistics per (document key, title), which don't depend on the query or the other candidates
+        self._documents: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _analyze(self, key: Optional[str], document: str, title: str) -> tuple:
+        """Term counts, length, title terms and bigrams of a document."""
+        cache_key = (key, title)
+        if key is not None:
+            with self._lock:
+                stats = self._documents.get(cache_key)
+                if stats is not None:
+                    self._documents.move_to_end(cache_key)
+                    self.cache_hits += 1
+                    return stats
+
+        tokens = tokenize(document)
+        stats = (Counter(tokens), len(tokens), set(tokenize(title)), set(zip(tokens, tokens[1:])))
+        if key is not None:
+            with self._lock:
+                self.cache_misses += 1
+                self._documents[cache_key] = stats
+                while len(self._documents) > self.cache_size:
+                    self._documents.popitem(last=False)
+        return stats
+
+    def score(self, query: str, documents: List[str], titles: List[str],
+              keys: Optional[List[str]] = None) -> List[float]:
+        query_tokens = tokenize(query)
+        query_terms = set(query_tokens)
+        if not query_terms:
+            return [0.0] * len(documents)
+        query_bigrams = set(zip(query_tokens, query_tokens[1:]))
+        analyzed = [self._analyze(key, document, title)
+                    for key, document, title in zip(keys or [None] * len(documents), documents, titles)]
+        average_length = sum(length for _, length, _, _ in analyzed) / max(len(analyzed), 1) or 1.0
+        document_frequency = {term: sum(1 for counts, *_ in analyzed if counts[term]) for term in query_terms}
+
+        scores = []
+        for counts, length, title_terms, bigrams in analyzed:
+            score = 0.0
+            for term in query_terms:
+                tf = counts[term]
+                if not tf:
+                    continue
+                idf = math.log(1 + (len(documents) - document_frequency[term] + 0.5) / (document_frequency[term] + 0.5))
+                score += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / average_length))
+
+            score += self.title_boost * len(title_terms & query_terms)
+            if query_bigrams:
+                score += self.bigram_boost * len(query_bigrams & bigrams)
+            scores.append(score)
+        return scores
+
+
+class CrossEncoderReranker:
+    """Local cross-encoder (sentence-transformers) scoring (query, passage) pairs in one batch."""
+
+    name = "cross_encoder"
+    vector_weight = 0.0
+    pairwise = True  # Each score depends only on its (query, passage) pair
+
+    def __init__(self, model_name: str = "cross-encoder/ms-marco-MiniLM-L-6-v2", max_chars: int = 2000):
+        from sentence_transformers import CrossEncoder
+        self.model = CrossEncoder(model_name)
+        self.max_chars = max_chars
+
+    def score(self, query: str, documents: List[str], titles: List[str],
+              keys: Optional[List[str]] = None) -> List[float]:
+        pairs = [(query, document[:self.max_chars]) for document in documents]
+        return [float(score) for score in self.model.predict(pairs, batch_size=len(pairs) or 1)]
+
+
+class RerankingStage:
+    def __init__(self, reranker, candidates: int = 30, latency_budget_ms: float = 50.0,
+                 cache_size: int = 10000, vector_weight: Optional[float] = None):
+        """
+        Initialize the reranking stage.
+
+        Args:
+            reranker: Object with score(query, documents, titles, keys) -> List[float], and
+                `pairwise` telling whether a document's score is independent of the other candidates
+            candidates: How many results to fetch from the vector store before reranking
+            latency_budget_ms: Time allowed for scoring; past it the vector order is kept
+            cache_size: Number of (query, document) scores kept, for pairwise rerankers
+            vector_weight: Weight of the vector similarity in the final score
+                (defaults to the reranker's own preference)
+        """
+        self.reranker = reranker
+        self.candidates = candidates
+        self.latency_budget = latency_budget_ms / 1000.0
+        self.cache_size = cache_size
+        self.vector_weight = reranker.vector_weight if vector_weight is None else vector_weight
+        self._cache: "OrderedDict[tuple, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rerank")
+
+        # Metrics
+        self._calls = 0
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._timeouts = 0
+        self._errors = 0
+        self._total_seconds = 0.0
+
+    @staticmethod
+    def _document_key(result: Dict[str, Any]) -> str:
+        metadata = result.get("metadata") or {}
+        return metadata.get("content_hash") or hashlib.sha256(result["content"].encode("utf-8")).hexdigest()
+
+    def _cache_get(self, key: tuple) -> Optional[float]:
+        with self._lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _cache_put(self, scores: Dict[tuple, float]):
+        with self._lock:
+            for key, score in scores.items():
+                self._cache[key] = score
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _score_and_cache(self, query: str, keys: List[tuple], results: List[Dict[str, Any]]) -> Dict[tuple, float]:
+        titles = [(result.get("metadata") or {}).get("title", "") for result in results]
+        scores = dict(zip(keys, self.reranker.score(query, [result["content"] for result in results], titles,
+                                                    keys=[document_key for _, document_key in keys])))
+        if self.reranker.pairwise:
+            self._cache_put(scores)
+        return scores
+
+    def rerank(self, query: str, results: List[Dict[str, Any]], top_n: int) -> List[Dict[str, Any]]:
+        """Reorder vector search results by reranker score and keep the best `top_n`."""
+        if len(results) <= 1:
+            return results[:top_n]
+        started = time.monotonic()
+        self._calls += 1
+
+        query_key = " ".join(query.lower().split())
+        keys = [(query_key, self._document_key(result)) for result in results]
+        scores = {}
+        missing = []
+        if self.reranker.pairwise:
+            for key, result in zip(keys, results):
+                score = self._cache_get(key)
+                if score is None:
+                    missing.append((key, result))
+                else:
+                    scores[key] = score
+            self._cache_hits += len(results) - len(missing)
+            self._cache_misses += len(missing)
+        else:
+            # Set-dependent scores: always score the whole candidate set together
+            missing = list(zip(keys, results))
+
+        if missing:
+            # Score in one batch; late results still fill the cache
+            future = self._executor.submit(self._score_and_cache, query,
+                                           [key for key, _ in missing], [result for _, result in missing])
+            try:
+                scores.update(future.result(timeout=max(self.latency_budget - (time.monotonic() - started), 0.001)))
+            except FutureTimeoutError:
+                self._timeouts += 1
+                logger.warning(f"Reranking exceeded {self.latency_budget * 1000:.0f}ms budget, using vector order")
+                return results[:top_n]
+            except Exception as e:
+                self._errors += 1
+                logger.error(f"Reranking failed, using vector order: {str(e)}")
+                return results[:top_n]
+
+        # Normalize reranker scores over the candidate set before blending
+        raw = [scores[key] for key in keys]
+        low, high = min(raw), max(raw)
+        spread = (high - low) or 1.0
+        reranked = []
+        for key, result, score in zip(keys, results, raw):
+            final = (1 - self.vector_weight) * (score - low) / spread + self.vector_weight * result.get("similarity_score", 0.0)
+            reranked.append({**result, "rerank_score": round(final, 4)})
+        reranked.sort(key=lambda result: -result["rerank_score"])
+
+        self._total_seconds += time.monotonic() - started
+        return reranked[:top_n]
+
+    def stats(self) -> Dict[str, Any]:
+        if self.reranker.pairwise:
+            hits, misses, entries = self._cache_hits, self._cache_misses, len(self._cache)
+        else:
+            # Cached document statistics rather than scores
+            hits, misses, entries = self.reranker.cache_hits, self.reranker.cache_misses, len(self.reranker._documents)
+        lookups = hits + misses
+        return {
+            "reranker": self.reranker.name,
+            "candidates": self.candidates,
+            "latency_budget_ms": self.latency_budget * 1000,
+            "calls": self._calls,
+            "cache_hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            "cache_entries": entries,
+            "budget_exceeded": self._timeouts,
+            "errors": self._errors,
+            "mean_latency_ms": round(self._total_seconds / max(self._calls - self._timeouts - self._errors, 1) * 1000, 2),
+        }
+
+
+def create_reranking_stage() -> Optional[RerankingStage]:
+    """Create the reranking stage selected by RERANKER ("lexical", "cross_encoder" or "off")."""
+    backend = os.getenv("RERANKER", "lexical").lower()
+    if backend == "off":
+        return None
+
+    reranker = None
+    if backend == "cross_encoder":
+        try:
+            reranker = CrossEncoderReranker(os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"))
+        except Exception as e:
+            logger.warning(f"Cross-encoder reranker unavailable ({str(e)}), using lexical reranker")
+    cache_size = int(os.getenv("RERANK_CACHE_SIZE", "10000"))
+    if reranker is None:
+        reranker = LexicalReranker(cache_size=cache_size)
+
+    return RerankingStage(
+        reranker,
+        candidates=int(os.getenv("RERANK_CANDIDATES", "30")),
+        latency_budget_ms=float(os.getenv("RERANK_BUDGET_MS", "50")),
+        cache_size=cache_size,
+    )
@@ -0,0 +1,527 @@
+"""
+Resilience layer for calls to external AI providers (Gemini, Tavily).
+Provides per-action deadlines, retries bounded by a retry budget, hedged
+duplicate requests after a p95 delay and a circuit breaker that fails fast
+while a provider is down. Only transient errors (timeouts, connection errors,
+429 and 5xx) are retried, hedged and counted against the breaker; a rejected
+request (bad input, auth, context length) fails the same way every time and
+is raised immediately.
+"""
+
+import contextvars
+import os
+import random
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from crewai.llms.base_llm import BaseLLM
+from crewai_tools import TavilySearchTool
+
+logger = logging.getLogger(__name__)
+
+# Default end-to-end deadline per action, in seconds
+ACTION_DEADLINES = {
+    "chat": 30.0,
+    "summarize": 60.0,
+    "edit": 60.0,
+    "generate": 90.0,
+    "discover_trends": 120.0,
+    "trend_based_write": 180.0,
+}
+
+# Absolute (monotonic) deadline and name of the action currently running in this context
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("ai_deadline", default=None)
+_action: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("ai_action", default=None)
+
+
+class ResilienceError(Exception):
+    """Base class for failures produced by the resilience layer itself."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+class CircuitOpenError(ResilienceError):
+    """Raised when a provider's circuit breaker is open and the call was not attempted."""
+
+
+class DeadlineExceededError(ResilienceError):
+    """Raised when the action deadline expires before the provider answers."""
+
+
+# Type-name fragments of transient errors raised without an HTTP status (provider SDKs, httpx, litellm)
+_TRANSIENT_ERROR_NAMES = ("timeout", "connection", "connecterror", "ratelimit", "unavailable",
+                          "internalserver", "overloaded")
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    """HTTP status carried by a provider error, if any."""
+    for attribute in ("status_code", "code", "status"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int) and 100 <= value < 600:
+            return value
+    value = getattr(getattr(error, "response", None), "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Whether a failed call may succeed when repeated: timeouts, connection errors, 429 and 5xx."""
+    if isinstance(error, (ResilienceError, TimeoutError, ConnectionError)):
+        return True
+    status = _status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    name = type(error).__name__.lower()
+    if any(fragment in name for fragment in _TRANSIENT_ERROR_NAMES):
+        return True
+    # Wrapped provider errors (raise ... from e)
+    cause = error.__cause__
+    return cause is not None and is_transient_error(cause)
+
+
+def _load_action_deadlines() -> Dict[str, float]:
+    """Read overrides like AI_ACTION_DEADLINES="chat=20,summarize=45"."""
+    deadlines = dict(ACTION_DEADLINES)
+    for item in os.getenv("AI_ACTION_DEADLINES", "").split(","):
+        if "=" in item:
+            action, seconds = item.split("=", 1)
+            try:
+                deadlines[action.strip()] = float(seconds)
+            except ValueError:
+                logger.warning(f"Ignoring invalid deadline override: {item}")
+    return deadlines
+
+
+_action_deadlines = _load_action_deadlines()
+
+
+@contextmanager
+def action_deadline(action: str, seconds: Optional[float] = None):
+    """Set the deadline for everything called inside this block (defaults to the action's deadline)."""
+    seconds = seconds if seconds is not None else _action_deadlines.get(action)
+    token = _deadline.set(time.monotonic() + seconds if seconds else None)
+    action_token = _action.set(action)
+    try:
+        yield
+    finally:
+        _action.reset(action_token)
+        _deadline.reset(token)
+
+
+def run_with_deadline(action: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run `func` with the configured deadline of `action` in effect."""
+    with action_deadline(action):
+        return func(*args, **kwargs)
+
+
+def current_action() -> Optional[str]:
+    """Name of the action currently running in this context, if any."""
+    return _action.get()
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current action's deadline, or None if there is none."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        """Open after `failure_threshold` consecutive failures, probe again after `recovery_timeout`."""
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.recovery_timeout:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                # Let exactly one probe through
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """Let another probe through when the one allowed was never sent."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit breaker opened after {self.consecutive_failures} failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self.state != self.OPEN:
+                return 0.0
+            return max(0.0, self.recovery_timeout - (time.monotonic() - self.opened_at))
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state == self.OPEN
+
+
+class RetryBudget:
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1.0, max_tokens: float = 20.0):
+        """
+        Allow retries (and hedges) worth at most `ratio` of regular calls,
+        plus a small floor of `min_per_second` so low traffic can still retry.
+        """
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.max_tokens, self.tokens + (now - self.updated_at) * self.min_per_second)
+        self.updated_at = now
+
+    def record_call(self):
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return True
+            return False
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200):
+        """Keep the latencies of the last `window` successful calls."""
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+# Shared pool used to run provider calls so they can be timed out and hedged
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("RESILIENCE_MAX_WORKERS", "32")),
+                               thread_name_prefix="provider-call")
+
+
+class ResiliencePolicy:
+    def __init__(self, name: str, timeout: float = 60.0, max_attempts: int = 3,
+                 backoff_base: float = 0.5, hedge_percentile: float = 95.0,
+                 hedge_min_samples: int = 20, breaker: Optional[CircuitBreaker] = None,
+                 retry_budget: Optional[RetryBudget] = None):
+        """
+        Initialize a policy for one provider.
+
+        Args:
+            name: Provider name, used in logs and stats
+            timeout: Per-call timeout used when no action deadline is set
+            max_attempts: Maximum attempts per call, including the first
+            backoff_base: Base of the jittered exponential backoff between attempts
+            hedge_percentile: Latency percentile after which a duplicate request is sent
+            hedge_min_samples: Number of observed calls before hedging kicks in
+        """
+        self.name = name
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self.retry_budget = retry_budget or RetryBudget()
+        self.latency = LatencyTracker()
+
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.short_circuited = 0
+
+    def _time_left(self) -> float:
+        remaining = remaining_time()
+        return self.timeout if remaining is None else min(self.timeout, remaining)
+
+    def _hedge_delay(self) -> Optional[float]:
+        if len(self.latency) < self.hedge_min_samples:
+            return None
+        return self.latency.percentile(self.hedge_percentile)
+
+    def _attempt(self, func: Callable[..., Any], args, kwargs, time_left: float) -> Any:
+        """Run one attempt, sending a hedged duplicate if the primary is slower than p95."""
+        context = contextvars.copy_context()
+        started_at = time.monotonic()
+        primary = _executor.submit(context.run, func, *args, **kwargs)
+        pending = {primary}
+
+        hedge_delay = self._hedge_delay()
+        if hedge_delay is not None and hedge_delay < time_left:
+            done, _ = wait(pending, timeout=hedge_delay)
+            if not done and self.retry_budget.try_spend():
+                self.hedges += 1
+                logger.info(f"{self.name}: primary slower than p{self.hedge_percentile:.0f} "
+                            f"({hedge_delay:.2f}s), sending hedged request")
+                pending.add(_executor.submit(contextvars.copy_context().run, func, *args, **kwargs))
+
+        last_error = None
+        while pending:
+            time_left_now = time_left - (time.monotonic() - started_at)
+            if time_left_now <= 0:
+                break
+            done, pending = wait(pending, timeout=time_left_now, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        self.hedge_wins += 1
+                    self.latency.record(time.monotonic() - started_at)
+                    return future.result()
+                last_error = future.exception()
+                if not is_transient_error(last_error):
+                    # The other copy of the request will be rejected the same way
+                    raise last_error
+
+        if last_error is not None and not pending:
+            raise last_error
+        raise DeadlineExceededError(f"{self.name} did not respond within {time_left:.1f}s")
+
+    def call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """Call `func` with deadline, retry, hedging and circuit-breaker protection."""
+        if not self.breaker.allow():
+            self.short_circuited += 1
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open)",
+                                   retry_after=self.breaker.retry_after())
+
+        self.calls += 1
+        self.retry_budget.record_call()
+        attempt = 0
+        while True:
+            attempt += 1
+            time_left = self._time_left()
+            if time_left <= 0:
+                # The caller ran out of time (e.g. waiting in a queue); the provider wasn't called
+                self.breaker.release_probe()
+                raise DeadlineExceededError(f"Deadline exceeded before calling {self.name}")
+
+            try:
+                result = self._attempt(func, args, kwargs, time_left)
+                self.breaker.record_success()
+                return result
+            except Exception as e:
+                if not is_transient_error(e):
+                    # The provider answered: the request itself is at fault, so don't retry or trip the breaker
+                    self.rejected += 1
+                    self.breaker.record_success()
+                    raise
+                self.failures += 1
+                self.breaker.record_failure()
+                logger.warning(f"{self.name} call failed (attempt {attempt}/{self.max_attempts}): {str(e)}")
+
+                backoff = self.backoff_base * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+                can_retry = (
+                    attempt < self.max_attempts
+                    and not self.breaker.is_open
+                    and self._time_left() > backoff
+                    and self.retry_budget.try_spend()
+                )
+                if not can_retry:
+                    if isinstance(e, ResilienceError) or not self.breaker.is_open:
+                        raise
+                    raise CircuitOpenError(f"{self.name} is unavailable: {str(e)}",
+                                           retry_after=self.breaker.retry_after()) from e
+
+                self.retries += 1
+                time.sleep(backoff)
+
+    def stats(self) -> Dict[str, Any]:
+        p50 = self.latency.percentile(50)
+        p95 = self.latency.percentile(95)
+        return {
+            "breaker_state": self.breaker.state,
+            "calls": self.calls,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "short_circuited": self.short_circuited,
+            "latency_p50": round(p50, 3) if p50 is not None else None,
+            "latency_p95": round(p95, 3) if p95 is not None else None,
+        }
+
+
+_policies: Dict[str, ResiliencePolicy] = {}
+_policies_lock = threading.Lock()
+
+def get_policy(name: str) -> ResiliencePolicy:
+    """Get (or create) the shared resilience policy for a provider."""
+    with _policies_lock:
+        if name not in _policies:
+            _policies[name] = ResiliencePolicy(
+                name=name,
+                timeout=float(os.getenv("PROVIDER_TIMEOUT_SECONDS", "60")),
+                max_attempts=int(os.getenv("PROVIDER_MAX_ATTEMPTS", "3")),
+                hedge_percentile=float(os.getenv("HEDGE_PERCENTILE", "95")),
+                breaker=CircuitBreaker(
+                    failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+                    recovery_timeout=float(os.getenv("CIRCUIT_RECOVERY_SECONDS", "30")),
+                ),
+                retry_budget=RetryBudget(ratio=float(os.getenv("RETRY_BUDGET_RATIO", "0.2"))),
+            )
+        return _policies[name]
+
+def get_all_policy_stats() -> Dict[str, Dict[str, Any]]:
+    with _policies_lock:
+        policies = dict(_policies)
+    return {name: policy.stats() for name, policy in policies.items()}
+
+
+# --- CREWAI INTEGRATION ---
+
+class ResilientLLM(BaseLLM):
+    """
+    CrewAI LLM that forwards every call to an inner LLM through a resilience policy.
+    The policy is keyed by model name, so each model has its own circuit breaker.
+    """
+
+    def __init__(self, inner: Any, policy: Optional[ResiliencePolicy] = None):
+        super().__init__(model=inner.model, temperature=getattr(inner, "temperature", None))
+        self.inner = inner
+        self.policy = policy or get_policy(f"llm:{inner.model}")
+
+    def call(self, messages, *args, **kwargs):
+        if self.stop:
+            self.inner.stop = list(self.stop)
+        return self.policy.call(self.inner.call, messages, *args, **kwargs)
+
+    def supports_function_calling(self) -> bool:
+        return self.inner.supports_function_calling()
+
+    def supports_stop_words(self) -> bool:
+        return self.inner.supports_stop_words()
+
+    def get_context_window_size(self) -> int:
+        return self.inner.get_context_window_size()
+
+    def get_token_usage_summary(self):
+        return self.inner.get_token_usage_summary()
+
+
+class ResilientTavilySearchTool(TavilySearchTool):
+    """Tavily search tool that degrades to a notice instead of hanging when Tavily is down."""
+
+    def _run(self, *args, **kwargs):
+        try:
+            return get_policy("tavily").call(super()._run, *args, **kwargs)
+        except ResilienceError as e:
+            logger.warning(f"Web search unavailable: {str(e)}")
+            return ("Web search is temporarily unavailable. Continue with the information "
+                    "you already have and note that it may not reflect the very latest news.")
+
+
+# --- FAULT INJECTION ---
+
+class FaultInjector:
+    def __init__(self, func: Callable[..., Any], latency: float = 0.05, latency_jitter: float = 0.0,
+                 slow_rate: float = 0.0, slow_latency: float = 5.0, failure_rate: float = 0.0,
+                 seed: Optional[int] = None):
+        """
+        Local stand-in for a provider call with injected latency and failures.
+
+        Args:
+            func: Function producing the (fake) provider response
+            latency: Base latency of each call in seconds
+            latency_jitter: Uniform random extra latency in seconds
+            slow_rate: Probability that a call takes `slow_latency` instead (tail latency)
+            failure_rate: Probability that a call raises ConnectionError
+        """
+        self.func = func
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.failure_rate = failure_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self._lock:
+            self.calls += 1
+            slow = self._random.random() < self.slow_rate
+            fail = self._random.random() < self.failure_rate
+            jitter = self._random.uniform(0, self.latency_jitter)
+        time.sleep(self.slow_latency if slow else self.latency + jitter)
+        if fail:
+            raise ConnectionError("Injected provider failure")
+        return self.func(*args, **kwargs)
+
+
+class FaultInjectingLLM(BaseLLM):
+    """CrewAI LLM stand-in that returns a canned answer with injected latency and failures."""
+
+    def __init__(self, model: str = "fault-injecting-llm", response: str = "Final Answer: OK",
+                 **fault_options):
+        super().__init__(model=model, temperature=0.0)
+        self.injector = FaultInjector(lambda *args, **kwargs: response, **fault_options)
+
+    def call(self, messages, *args, **kwargs):
+        return self.injector(messages)
+
+    def supports_function_calling(self) -> bool:
+        return False
+
+    def supports_stop_words(self) -> bool:
+        return False
+
+    def get_context_window_size(self) -> int:
+        return 8192
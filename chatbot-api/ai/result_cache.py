@@ -0,0 +1,104 @@
+"""
+Persistent cache for intermediate LLM results (section summaries, paragraph
+edits), keyed by a hash of everything that determines the output. Re-running
+an action over a lightly edited document only recomputes the parts that changed.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import logging
+from collections import Counter
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(*parts: str) -> str:
+    """Stable key for a combination of inputs (prompt template, settings, content...)."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, db_path: str = "./data/result_cache.db", max_entries: int = 20000):
+        """
+        Initialize the cache.
+
+        Args:
+            db_path: SQLite file holding the cached results
+            max_entries: Entries kept per namespace; the least recently used are evicted
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._hits: Counter = Counter()
+        self._misses: Counter = Counter()
+        self._writes = 0
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS results (namespace TEXT NOT NULL, key TEXT NOT NULL, "
+                "value TEXT NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (namespace, key))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_results_lru ON results (namespace, last_used)")
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM results WHERE namespace = ? AND key = ?",
+                                     (namespace, key)).fetchone()
+            if row is None:
+                self._misses[namespace] += 1
+                return None
+            self._hits[namespace] += 1
+            with self._conn:
+                self._conn.execute("UPDATE results SET last_used = ? WHERE namespace = ? AND key = ?",
+                                   (time.time(), namespace, key))
+            return row[0]
+
+    def put(self, namespace: str, key: str, value: str):
+        with self._lock, self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO results (namespace, key, value, last_used) VALUES (?, ?, ?, ?)",
+                               (namespace, key, value, time.time()))
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._evict(namespace)
+
+    def _evict(self, namespace: str):
+        self._conn.execute(
+            "DELETE FROM results WHERE namespace = ? AND key IN (SELECT key FROM results WHERE namespace = ? "
+            "ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (namespace, namespace, self.max_entries),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            sizes = dict(self._conn.execute("SELECT namespace, COUNT(*) FROM results GROUP BY namespace").fetchall())
+        return {
+            namespace: {"entries": sizes.get(namespace, 0), "hits": self._hits[namespace],
+                        "misses": self._misses[namespace]}
+            for namespace in sorted(set(sizes) | set(self._hits) | set(self._misses))
+        }
+
+
+# Global result cache (lazy initialization)
+_result_cache = None
+
+def get_result_cache() -> ResultCache:
+    """Get the global result cache."""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache(
+            db_path=os.getenv("RESULT_CACHE_PATH", "./data/result_cache.db"),
+            max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "20000")),
+        )
+    return _result_cache
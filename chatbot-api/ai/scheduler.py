@@ -0,0 +1,295 @@
+"""
+Priority-aware scheduler for AI actions.
+Sits in front of the `execute_*` crew functions: interactive chat runs ahead of
+editing/summarizing, which runs ahead of trend research and generation. Within
+a priority class, clients are served with weighted fair queuing, and every
+client is rate limited with a token bucket.
+"""
+
+import asyncio
+import contextvars
+import functools
+import heapq
+import itertools
+import os
+import threading
+import time
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Lower number = higher priority
+PRIORITY_INTERACTIVE = 0
+PRIORITY_STANDARD = 1
+PRIORITY_BACKGROUND = 2
+
+ACTION_PRIORITIES = {
+    "chat": PRIORITY_INTERACTIVE,
+    "edit": PRIORITY_STANDARD,
+    "summarize": PRIORITY_STANDARD,
+    "generate": PRIORITY_STANDARD,
+    "discover_trends": PRIORITY_BACKGROUND,
+    "trend_based_write": PRIORITY_BACKGROUND,
+}
+
+# Relative cost of an action, used both for fair queuing and rate limiting
+ACTION_COSTS = {
+    "chat": 1.0,
+    "edit": 2.0,
+    "summarize": 2.0,
+    "generate": 3.0,
+    "discover_trends": 3.0,
+    "trend_based_write": 5.0,
+}
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a client has exhausted its request allowance."""
+
+    def __init__(self, client_id: str, retry_after: float):
+        self.client_id = client_id
+        self.retry_after = max(1, int(retry_after + 0.999))
+        super().__init__(f"Rate limit exceeded for client '{client_id}', retry after {self.retry_after}s")
+
+
+class SchedulerOverloadedError(Exception):
+    """Raised when the queue for a priority class is full."""
+
+    def __init__(self, priority: int, retry_after: float):
+        self.priority = priority
+        self.retry_after = max(1, int(retry_after + 0.999))
+        super().__init__(f"AI service is busy (priority class {priority} queue is full)")
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_rate: float):
+        """A bucket holding up to `capacity` tokens, refilled at `refill_rate` tokens per second."""
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_rate)
+        self.updated_at = now
+
+    def try_consume(self, cost: float = 1.0) -> Tuple[bool, float]:
+        """Consume `cost` tokens. Returns (allowed, seconds until enough tokens are available)."""
+        cost = min(cost, self.capacity)
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return True, 0.0
+        if self.refill_rate <= 0:
+            return False, float("inf")
+        return False, (cost - self.tokens) / self.refill_rate
+
+    def is_full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+class _Job:
+    __slots__ = ("action", "client_id", "priority", "func", "args", "kwargs", "future", "enqueued_at", "context")
+
+    def __init__(self, action, client_id, priority, func, args, kwargs, future):
+        self.action = action
+        self.client_id = client_id
+        self.priority = priority
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+        self.enqueued_at = time.monotonic()
+        # Run in the submitter's context, not the one of whichever job triggered dispatch
+        self.context = contextvars.copy_context()
+
+
+class AIScheduler:
+    def __init__(self, max_concurrency: int = 4, max_queue_depth: int = 100,
+                 rate_capacity: float = 20.0, rate_refill_per_second: float = 0.5,
+                 class_concurrency: Optional[Dict[int, int]] = None,
+                 client_weights: Optional[Dict[str, float]] = None):
+        """
+        Initialize the scheduler.
+
+        Args:
+            max_concurrency: Number of AI actions allowed to run at once
+            max_queue_depth: Maximum number of waiting jobs per priority class
+            rate_capacity: Token bucket burst size per client
+            rate_refill_per_second: Token bucket refill rate per client
+            class_concurrency: Optional cap on running jobs per priority class, so
+                background work can never occupy every worker
+            client_weights: Optional fair-queuing weight per client (default 1.0)
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue_depth = max_queue_depth
+        self.rate_capacity = rate_capacity
+        self.rate_refill_per_second = rate_refill_per_second
+        self.class_concurrency = class_concurrency if class_concurrency is not None else {
+            PRIORITY_BACKGROUND: max(1, max_concurrency // 2),
+        }
+        self.client_weights = client_weights or {}
+
+        self._lock = threading.Lock()
+        self._queues: Dict[int, List[Tuple[float, int, _Job]]] = {}
+        self._virtual_time: Dict[int, float] = {}
+        self._last_finish: Dict[Tuple[int, str], float] = {}
+        self._running: Dict[int, int] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._sequence = itertools.count()
+        self._avg_runtime: Dict[int, float] = {}
+
+        self._completed = 0
+        self._rejected = 0
+
+    # --- Rate limiting ---
+
+    def _check_rate_limit(self, client_id: str, cost: float):
+        bucket = self._buckets.get(client_id)
+        if bucket is None:
+            if len(self._buckets) > 10000:
+                self._prune_buckets()
+            bucket = TokenBucket(self.rate_capacity, self.rate_refill_per_second)
+            self._buckets[client_id] = bucket
+
+        allowed, retry_after = bucket.try_consume(cost)
+        if not allowed:
+            self._rejected += 1
+            raise RateLimitExceeded(client_id, retry_after)
+
+    def _prune_buckets(self):
+        """Drop buckets of idle clients (a full bucket carries no state)."""
+        for client_id in [cid for cid, bucket in self._buckets.items() if bucket.is_full()]:
+            del self._buckets[client_id]
+
+    # --- Queuing ---
+
+    def _finish_tag(self, priority: int, client_id: str, cost: float) -> float:
+        """Compute the weighted-fair-queuing virtual finish time for a new job."""
+        if len(self._last_finish) > 10000:
+            # Clients whose last job already finished in virtual time need no tag
+            self._last_finish = {
+                k: v for k, v in self._last_finish.items() if v > self._virtual_time.get(k[0], 0.0)
+            }
+
+        key = (priority, client_id)
+        start = max(self._virtual_time.get(priority, 0.0), self._last_finish.get(key, 0.0))
+        finish = start + cost / self.client_weights.get(client_id, 1.0)
+        self._last_finish[key] = finish
+        return finish
+
+    def _can_run(self, priority: int) -> bool:
+        limit = self.class_concurrency.get(priority)
+        return limit is None or self._running.get(priority, 0) < limit
+
+    def _next_job(self) -> Optional[_Job]:
+        if sum(self._running.values()) >= self.max_concurrency:
+            return None
+
+        for priority in sorted(self._queues):
+            queue = self._queues[priority]
+            while queue and self._can_run(priority):
+                finish, _, job = heapq.heappop(queue)
+                self._virtual_time[priority] = finish
+                if job.future.cancelled():
+                    continue
+                self._running[priority] = self._running.get(priority, 0) + 1
+                return job
+        return None
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                job = self._next_job()
+            if job is None:
+                return
+            asyncio.ensure_future(self._run(job))
+
+    async def _run(self, job: _Job):
+        started_at = time.monotonic()
+        try:
+            call = functools.partial(job.func, *job.args, **job.kwargs)
+            result = await asyncio.get_running_loop().run_in_executor(None, job.context.run, call)
+            if not job.future.done():
+                job.future.set_result(result)
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        finally:
+            runtime = time.monotonic() - started_at
+            with self._lock:
+                self._running[job.priority] -= 1
+                self._completed += 1
+                previous = self._avg_runtime.get(job.priority, runtime)
+                self._avg_runtime[job.priority] = 0.8 * previous + 0.2 * runtime
+            self._dispatch()
+
+    async def submit(self, action: str, client_id: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Queue `func(*args, **kwargs)` for execution on a worker thread and wait for its result.
+
+        Raises:
+            RateLimitExceeded: If the client's token bucket is empty
+            SchedulerOverloadedError: If the action's priority class queue is full
+        """
+        priority = ACTION_PRIORITIES.get(action, PRIORITY_STANDARD)
+        cost = ACTION_COSTS.get(action, 1.0)
+        future = asyncio.get_running_loop().create_future()
+
+        with self._lock:
+            queue = self._queues.setdefault(priority, [])
+            if len(queue) >= self.max_queue_depth:
+                self._rejected += 1
+                raise SchedulerOverloadedError(priority, self._estimated_wait(priority))
+            self._check_rate_limit(client_id, cost)
+
+            job = _Job(action, client_id, priority, func, args, kwargs, future)
+            heapq.heappush(queue, (self._finish_tag(priority, client_id, cost), next(self._sequence), job))
+
+        self._dispatch()
+        return await future
+
+    def _estimated_wait(self, priority: int) -> float:
+        queued = len(self._queues.get(priority, []))
+        avg_runtime = self._avg_runtime.get(priority, 10.0)
+        return queued * avg_runtime / max(1, self.max_concurrency)
+
+    # --- Introspection ---
+
+    def queue_depth(self, priority: Optional[int] = None) -> int:
+        """Number of jobs waiting, for one priority class or in total."""
+        with self._lock:
+            if priority is not None:
+                return len(self._queues.get(priority, []))
+            return sum(len(queue) for queue in self._queues.values())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "running": {str(p): n for p, n in self._running.items()},
+                "queued": {str(p): len(q) for p, q in self._queues.items()},
+                "avg_runtime_seconds": {str(p): round(t, 3) for p, t in self._avg_runtime.items()},
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "tracked_clients": len(self._buckets),
+            }
+
+
+# Global scheduler instance (lazy initialization)
+_scheduler = None
+
+def get_scheduler() -> AIScheduler:
+    """Get the global AI scheduler configured from environment variables."""
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = AIScheduler(
+            max_concurrency=int(os.getenv("AI_MAX_CONCURRENCY", "4")),
+            max_queue_depth=int(os.getenv("AI_MAX_QUEUE_DEPTH", "100")),
+            rate_capacity=float(os.getenv("RATE_LIMIT_BURST", "20")),
+            rate_refill_per_second=float(os.getenv("RATE_LIMIT_PER_MINUTE", "30")) / 60.0,
+        )
+    return _scheduler
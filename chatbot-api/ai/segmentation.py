@@ -0,0 +1,101 @@
+"""
+Text segmentation helpers shared by the local summarizer, map-reduce
+summarization and paragraph-level editing.
+"""
+
+import re
+import zlib
+from typing import List
+
+_ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "e.g", "i.e", "inc", "ltd", "fig"}
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])[\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_HEADING = re.compile(r"^#{1,6}\s")
+_LIST_ITEM = re.compile(r"^\s*([-*•]|\d+[.)])\s+")
+_NUMBERED_MARKER = re.compile(r"^\d+[.)]$")
+# On average one paragraph in this many ends a section (once the section is half full)
+_BOUNDARY_MODULUS = 4
+
+
+def is_heading(line: str) -> bool:
+    """Whether a line is a Markdown heading."""
+    return bool(_HEADING.match(line))
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """Paragraphs separated by blank lines, with surrounding whitespace removed."""
+    return [paragraph.strip() for paragraph in _PARAGRAPH_BREAK.split(text) if paragraph.strip()]
+
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences of a text. Line breaks inside lists and headings also end a sentence."""
+    sentences = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        start = 0
+        for match in _SENTENCE_BOUNDARY.finditer(line):
+            candidate = line[start:match.start()].strip()
+            last_word = candidate.rsplit(" ", 1)[-1].rstrip(".").lower()
+            if last_word in _ABBREVIATIONS:
+                continue  # "Dr. Smith" is not a boundary
+            if start == 0 and _NUMBERED_MARKER.match(candidate):
+                continue  # Nor is the "1." of a numbered list item
+            sentences.append(candidate)
+            start = match.end()
+        if line[start:].strip():
+            sentences.append(line[start:].strip())
+
+    # Join lines that were wrapped mid-sentence (no terminal punctuation, not a list item or heading)
+    merged: List[str] = []
+    for sentence in sentences:
+        if (merged and not re.search(r"[.!?:\"')\]]$", merged[-1]) and not _LIST_ITEM.match(sentence)
+                and not _LIST_ITEM.match(merged[-1]) and not _HEADING.match(merged[-1]) and sentence[:1].islower()):
+            merged[-1] = f"{merged[-1]} {sentence}"
+        else:
+            merged.append(sentence)
+    return merged
+
+
+def split_sections(text: str, max_chars: int = 6000) -> List[str]:
+    """
+    Split a long text into sections of at most `max_chars`, on paragraph boundaries.
+    Markdown headings start a new section; paragraphs longer than `max_chars` are
+    split on sentence boundaries.
+
+    Past half of `max_chars`, a section also ends after any paragraph whose hash
+    marks a boundary. Boundaries therefore depend on content rather than offsets,
+    so an edit early in a document leaves the later sections unchanged.
+    """
+    sections: List[str] = []
+    current: List[str] = []
+    size = 0
+
+    def flush():
+        nonlocal current, size
+        if current:
+            sections.append("\n\n".join(current))
+        current, size = [], 0
+
+    for paragraph in split_paragraphs(text):
+        pieces = [paragraph]
+        if len(paragraph) > max_chars:
+            pieces, piece = [], ""
+            for sentence in split_sentences(paragraph):
+                if piece and len(piece) + len(sentence) + 1 > max_chars:
+                    pieces.append(piece)
+                    piece = ""
+                piece = f"{piece} {sentence}".strip()
+            if piece:
+                pieces.append(piece)
+
+        for piece in pieces:
+            if is_heading(piece) or (current and size + len(piece) + 2 > max_chars):
+                flush()
+            current.append(piece)
+            size += len(piece) + 2
+            if size >= max_chars // 2 and zlib.crc32(piece.encode("utf-8")) % _BOUNDARY_MODULUS == 0:
+                flush()
+    flush()
+    return sections
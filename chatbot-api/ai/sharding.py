@@ -0,0 +1,366 @@
+"""
+Sharded knowledge base.
+ShardedCollection spreads posts over several collections (shards) named
+"<collection>_<key>" and implements the subset of the Chroma Collection API
+used by BlogRAGSystem, so the RAG system works unchanged on top of it. The
+sharding strategy picks a post's shard:
+- HashSharding: jump consistent hash of the post_id over a fixed number of
+  shards (adding shards moves only the posts the new ones take over)
+- TimeSharding: one shard per month, quarter or year of the post's created_at,
+  so new posts go to a small, recent index
+
+Writes for a post go to the shard that already holds it, otherwise to the
+shard the strategy picks. Queries run on all shards in parallel and the
+per-shard top-k are merged by distance. rebalance() moves posts to the shard
+the current strategy picks, e.g. after changing the shard count or strategy,
+or to move an unsharded store into shards.
+"""
+
+import hashlib
+import os
+import re
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Any, Callable, ContextManager, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Hash shards ("03") and time buckets ("2026", "2026-q4", "2026-10")
+SHARD_KEY_PATTERN = re.compile(r"^(\d{2,}|\d{4}-(q[1-4]|\d{2}))$")
+REBALANCE_BATCH_SIZE = 500
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash (Lamping & Veach): bucket in [0, buckets) for a 64-bit key."""
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) % 2 ** 64
+        j = int((b + 1) * (2 ** 31 / ((key >> 33) + 1)))
+    return b
+
+
+class HashSharding:
+    name = "hash"
+
+    def __init__(self, shards: int = 4):
+        self.shards = max(1, shards)
+
+    def shard_for(self, post_id: str, metadata: Optional[Dict[str, Any]]) -> str:
+        key = int.from_bytes(hashlib.sha256(post_id.encode("utf-8")).digest()[:8], "big")
+        return f"{jump_hash(key, self.shards):02d}"
+
+    def initial_shards(self) -> List[str]:
+        return [f"{shard:02d}" for shard in range(self.shards)]
+
+
+class TimeSharding:
+    name = "time"
+    PERIODS = ("month", "quarter", "year")
+
+    def __init__(self, period: str = "month"):
+        if period not in self.PERIODS:
+            raise ValueError(f"Unknown shard period {period}, expected one of {self.PERIODS}")
+        self.period = period
+
+    def shard_for(self, post_id: str, metadata: Optional[Dict[str, Any]]) -> str:
+        created_at = (metadata or {}).get("created_at")
+        try:
+            created = datetime.fromisoformat(str(created_at))
+        except ValueError:
+            created = datetime.now()
+        if self.period == "year":
+            return f"{created.year}"
+        if self.period == "quarter":
+            return f"{created.year}-q{(created.month - 1) // 3 + 1}"
+        return f"{created.year}-{created.month:02d}"
+
+    def initial_shards(self) -> List[str]:
+        return []
+
+
+class ShardedCollection:
+    def __init__(self, name: str, strategy, open_shard: Callable[[str], Any], shard_names: Callable[[], List[str]],
+                 drop_shard: Callable[[str], None], embedding_function=None, max_workers: int = 8):
+        """
+        Open the existing shards of a collection and create the strategy's initial ones.
+
+        Args:
+            name: Collection name; shards are named "<name>_<key>"
+            strategy: HashSharding or TimeSharding
+            open_shard: Opens (creating if needed) the collection with a given name
+            shard_names: Lists the names of existing collections
+            drop_shard: Deletes the collection with a given name
+            embedding_function: Embeds query_texts once for all shards
+            max_workers: Shards queried or written in parallel
+        """
+        self.name = name
+        self.strategy = strategy
+        self.embedding_function = embedding_function
+        self._open_shard = open_shard
+        self._drop_shard = drop_shard
+        self._lock = threading.Lock()
+        self._configuration = None
+        self.shards: Dict[str, Any] = {}
+
+        prefix = name + "_"
+        for shard_name in shard_names():
+            if shard_name == name:
+                # Unsharded store: served as a shard until rebalance() moves its posts
+                self.shards[""] = open_shard(shard_name)
+            elif shard_name.startswith(prefix) and SHARD_KEY_PATTERN.match(shard_name[len(prefix):]):
+                self.shards[shard_name[len(prefix):]] = open_shard(shard_name)
+        for key in strategy.initial_shards():
+            self._shard(key)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="kb-shard")
+
+    def shard_name(self, key: str) -> str:
+        return f"{self.name}_{key}" if key else self.name
+
+    def _shard(self, key: str):
+        with self._lock:
+            if key not in self.shards:
+                shard = self._open_shard(self.shard_name(key))
+                if self._configuration is not None:
+                    shard.modify(configuration=self._configuration)
+                self.shards[key] = shard
+                logger.info(f"Created knowledge base shard {self.shard_name(key)}")
+            return self.shards[key]
+
+    def replace_shard(self, key: str, collection):
+        """Serve a shard from another collection (e.g. its rebuilt index)."""
+        with self._lock:
+            self.shards[key] = collection
+
+    def _map(self, func: Callable[[Any], Any], items: List[Any]) -> List[Any]:
+        if len(items) <= 1:
+            return [func(item) for item in items]
+        return list(self._executor.map(func, items))
+
+    def sorted_shards(self) -> List[tuple]:
+        """(shard key, collection) pairs in key order; the unsharded collection has key ""."""
+        with self._lock:
+            return sorted(self.shards.items())
+
+    # --- ROUTING ---
+
+    def _locate(self, ids: List[str]) -> Dict[str, str]:
+        """Shard key currently holding each of `ids` (missing ids are left out)."""
+        shards = self.sorted_shards()
+        found = self._map(lambda item: item[1].get(ids=list(ids), include=[])["ids"], shards)
+        return {post_id: key for (key, _), shard_ids in zip(shards, found) for post_id in shard_ids}
+
+    def _route(self, ids: List[str], metadatas: Optional[List[Dict[str, Any]]],
+               new_posts: bool = True) -> Dict[str, List[int]]:
+        """Positions of `ids` grouped by shard key: the shard holding the post, else the strategy's."""
+        located = self._locate(ids)
+        groups: Dict[str, List[int]] = {}
+        for i, post_id in enumerate(ids):
+            key = located.get(post_id)
+            if key is None:
+                if not new_posts:
+                    continue
+                key = self.strategy.shard_for(post_id, metadatas[i] if metadatas else None)
+            groups.setdefault(key, []).append(i)
+        return groups
+
+    def _write(self, method: str, ids: List[str], documents=None, metadatas=None, embeddings=None,
+               new_posts: bool = True):
+        groups = self._route(ids, metadatas, new_posts)
+
+        def write(item):
+            key, positions = item
+            getattr(self._shard(key), method)(
+                ids=[ids[i] for i in positions],
+                documents=[documents[i] for i in positions] if documents is not None else None,
+                metadatas=[metadatas[i] for i in positions] if metadatas is not None else None,
+                embeddings=[embeddings[i] for i in positions] if embeddings is not None else None,
+            )
+        self._map(write, list(groups.items()))
+
+    def add(self, ids: List[str], documents: List[str] = None, metadatas: List[Dict[str, Any]] = None,
+            embeddings=None):
+        self._write("add", ids, documents, metadatas, embeddings)
+
+    def upsert(self, ids: List[str], documents: List[str] = None, metadatas: List[Dict[str, Any]] = None,
+               embeddings=None):
+        self._write("upsert", ids, documents, metadatas, embeddings)
+
+    def update(self, ids: List[str], documents: List[str] = None, metadatas: List[Dict[str, Any]] = None,
+               embeddings=None):
+        """Update existing records; unknown ids are ignored."""
+        self._write("update", ids, documents, metadatas, embeddings, new_posts=False)
+
+    def delete(self, ids: List[str]):
+        located = self._locate(ids)
+        groups: Dict[str, List[str]] = {}
+        for post_id, key in located.items():
+            groups.setdefault(key, []).append(post_id)
+        self._map(lambda item: self.shards[item[0]].delete(ids=item[1]), list(groups.items()))
+
+    # --- READS ---
+
+    def count(self) -> int:
+        return sum(shard.count() for _, shard in self.sorted_shards())
+
+    def get(self, ids: List[str] = None, include: List[str] = None, limit: int = None,
+            offset: int = 0) -> Dict[str, Any]:
+        include = ["documents", "metadatas"] if include is None else include
+        pages = []
+        if ids is not None:
+            pages = self._map(lambda item: item[1].get(ids=list(ids), include=include), self.sorted_shards())
+        else:
+            # Pages run through the shards in key order
+            offset = offset or 0
+            for _, shard in self.sorted_shards():
+                if limit is not None and limit <= 0:
+                    break
+                count = shard.count()
+                if offset >= count:
+                    offset -= count
+                    continue
+                page = shard.get(include=include, limit=limit, offset=offset)
+                pages.append(page)
+                offset = 0
+                if limit is not None:
+                    limit -= len(page["ids"])
+
+        records = {}
+        for page in pages:
+            for i, post_id in enumerate(page["ids"]):
+                records[post_id] = {key: page[key][i] for key in ("documents", "metadatas", "embeddings")
+                                    if key in include}
+        order = [post_id for post_id in ids if post_id in records] if ids is not None else list(records)
+        result = {"ids": order}
+        for key in ("documents", "metadatas", "embeddings"):
+            result[key] = [records[post_id][key] for post_id in order] if key in include else None
+        if result["embeddings"] is not None:
+            result["embeddings"] = np.asarray(result["embeddings"], dtype=np.float32)
+        return result
+
+    def query(self, query_texts: List[str] = None, query_embeddings=None, n_results: int = 10,
+              include: List[str] = None) -> Dict[str, Any]:
+        """Query every shard in parallel and merge the per-shard top-k by distance."""
+        include = include or ["documents", "metadatas", "distances"]
+        if query_embeddings is None:
+            query_embeddings = self.embedding_function(query_texts)
+        fields = [key for key in ("documents", "metadatas") if key in include]
+        shard_results = self._map(
+            lambda item: item[1].query(query_embeddings=query_embeddings, n_results=n_results,
+                                       include=fields + ["distances"]),
+            self.sorted_shards())
+
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for q in range(len(query_embeddings)):
+            hits = [(distance, shard, i)
+                    for shard, shard_result in enumerate(shard_results)
+                    for i, distance in enumerate(shard_result["distances"][q])]
+            hits.sort(key=lambda hit: hit[0])
+            hits = hits[:n_results]
+            result["ids"].append([shard_results[shard]["ids"][q][i] for _, shard, i in hits])
+            result["distances"].append([distance for distance, _, _ in hits])
+            for key in fields:
+                result[key].append([shard_results[shard][key][q][i] for _, shard, i in hits])
+
+        for key in ("documents", "metadatas", "distances"):
+            if key not in include:
+                result[key] = None
+        return result
+
+    # --- INDEX SETTINGS ---
+
+    @property
+    def configuration(self) -> Dict[str, Any]:
+        """Index configuration of the shards (they are created with the same settings)."""
+        shards = self.sorted_shards()
+        if not shards:
+            return {}
+        return getattr(shards[0][1], "configuration", None) or {}
+
+    @property
+    def metadata(self) -> Optional[Dict[str, Any]]:
+        shards = self.sorted_shards()
+        return shards[0][1].metadata if shards else None
+
+    def modify(self, metadata: Dict[str, Any] = None, configuration: Dict[str, Any] = None):
+        """Apply a metadata or configuration change (e.g. ef_search) to every shard, including later ones."""
+        if configuration is not None:
+            with self._lock:
+                self._configuration = configuration
+        for _, shard in self.sorted_shards():
+            if configuration is not None:
+                shard.modify(configuration=configuration)
+            if metadata is not None:
+                shard.modify(metadata=metadata)
+
+    # --- REBALANCING ---
+
+    def rebalance(self, pause_writes: Callable[[], ContextManager] = nullcontext) -> Dict[str, Any]:
+        """
+        Move every post to the shard the current strategy picks, then drop emptied
+        shards the strategy doesn't use.
+
+        Args:
+            pause_writes: Context manager holding writes while a batch of posts is moved
+
+        Returns:
+            Posts moved, shards dropped and post count per shard
+        """
+        moved = 0
+        for key, shard in self.sorted_shards():
+            listing = shard.get(include=["metadatas"])
+            misplaced: Dict[str, List[str]] = {}
+            for post_id, metadata in zip(listing["ids"], listing["metadatas"] or []):
+                target = self.strategy.shard_for(post_id, metadata)
+                if target != key:
+                    misplaced.setdefault(target, []).append(post_id)
+
+            for target, post_ids in misplaced.items():
+                for start in range(0, len(post_ids), REBALANCE_BATCH_SIZE):
+                    with pause_writes():
+                        batch = shard.get(ids=post_ids[start:start + REBALANCE_BATCH_SIZE],
+                                          include=["documents", "metadatas", "embeddings"])
+                        if not batch["ids"]:
+                            continue
+                        # Chroma rejects empty metadata dicts
+                        self._shard(target).upsert(ids=batch["ids"], documents=batch["documents"],
+                                                   metadatas=[metadata or None for metadata in batch["metadatas"]],
+                                                   embeddings=batch["embeddings"])
+                        shard.delete(ids=batch["ids"])
+                        moved += len(batch["ids"])
+            if misplaced:
+                logger.info(f"Moved {sum(len(ids) for ids in misplaced.values())} posts out of shard "
+                            f"{self.shard_name(key)}")
+
+        dropped = []
+        keep = set(self.strategy.initial_shards())
+        for key, shard in self.sorted_shards():
+            if key not in keep and shard.count() == 0:
+                with self._lock:
+                    del self.shards[key]
+                self._drop_shard(self.shard_name(key))
+                dropped.append(self.shard_name(key))
+        return {"moved": moved, "dropped": dropped, "shards": self.stats()["shards"]}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "strategy": self.strategy.name,
+            "shards": {self.shard_name(key): shard.count() for key, shard in self.sorted_shards()},
+        }
+
+
+def create_sharding_strategy():
+    """Create the strategy selected by KB_SHARDING ("hash", "time" or "off"); None when off."""
+    mode = os.getenv("KB_SHARDING", "off").lower()
+    if mode == "hash":
+        return HashSharding(int(os.getenv("KB_SHARDS", "4")))
+    if mode == "time":
+        return TimeSharding(os.getenv("KB_SHARD_PERIOD", "month").lower())
+    if mode != "off":
+        logger.warning(f"Unknown KB_SHARDING {mode}, knowledge base is not sharded")
+    return None
@@ -0,0 +1,235 @@
+"""
+Binary snapshots of the knowledge base.
+A snapshot holds ids, documents, metadata and the precomputed embeddings in
+one versioned file, so a fresh store (e.g. a new container) can be filled in
+bulk without re-embedding anything.
+
+File layout (little-endian):
+    MAGIC (8 bytes) | format version (uint16) | header length (uint32) | JSON header
+    | records section (zlib-compressed JSON) | vectors section (raw float32/float16 matrix)
+
+The header describes the embedding model, counts, dimensions and the offset,
+length and SHA-256 of each section, which are verified on import.
+"""
+
+import hashlib
+import json
+import os
+import struct
+import time
+import zlib
+import logging
+from datetime import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"BLOGSNAP"
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct("<8sHI")
+EXPORT_PAGE_SIZE = 1000
+
+
+class SnapshotError(ValueError):
+    """Raised when a snapshot file is malformed, corrupted or incompatible."""
+
+
+def embedding_name(embedding_function) -> str:
+    """Stable identifier of the embedding model, used to reject incompatible snapshots."""
+    if embedding_function is None:
+        return "none"
+    try:
+        name = embedding_function.name()
+    except Exception:
+        name = type(embedding_function).__name__
+    model = getattr(embedding_function, "model_name", None) or getattr(embedding_function, "_model_name", None)
+    return f"{name}:{model}" if model else name
+
+
+def read_collection(collection, include_documents: bool = True):
+    """Page through a collection and return (ids, documents, metadatas, embeddings)."""
+    ids, documents, metadatas, vectors = [], [], [], []
+    include = ["documents", "metadatas", "embeddings"] if include_documents else ["metadatas", "embeddings"]
+    offset = 0
+    while True:
+        page = collection.get(include=include, limit=EXPORT_PAGE_SIZE, offset=offset)
+        if not page["ids"]:
+            break
+        ids.extend(page["ids"])
+        documents.extend(page["documents"] or [])
+        metadatas.extend(page["metadatas"])
+        vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+        offset += len(page["ids"])
+    matrix = np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+    return ids, documents, metadatas, matrix
+
+
+def export_snapshot(collection, path: str, embedding_function=None, dtype: str = "float32") -> Dict[str, Any]:
+    """
+    Write every record of a collection (with its embeddings) to a snapshot file.
+
+    Args:
+        collection: Chroma collection or FlatCollection to export
+        path: Destination file; written to a temporary file and renamed when complete
+        embedding_function: Embedding function the vectors were produced with
+        dtype: Vector storage type ("float32", or "float16" for half the size)
+
+    Returns:
+        The snapshot header
+    """
+    if dtype not in ("float32", "float16"):
+        raise SnapshotError(f"Unsupported snapshot dtype {dtype}")
+    started = time.monotonic()
+    ids, documents, metadatas, vectors = read_collection(collection)
+
+    records = zlib.compress(json.dumps(
+        [{"id": post_id, "document": documents[i], "metadata": metadatas[i] or {}} for i, post_id in enumerate(ids)]
+    ).encode("utf-8"), 6)
+    vector_bytes = np.ascontiguousarray(vectors, dtype=np.dtype(dtype).newbyteorder("<")).tobytes()
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "collection": collection.name,
+        "embedding_function": embedding_name(embedding_function),
+        "count": len(ids),
+        "dim": int(vectors.shape[1]) if len(ids) else 0,
+        "dtype": dtype,
+        "sections": {
+            "records": {"offset": 0, "length": len(records), "sha256": hashlib.sha256(records).hexdigest()},
+            "vectors": {"offset": len(records), "length": len(vector_bytes),
+                        "sha256": hashlib.sha256(vector_bytes).hexdigest()},
+        },
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(records)
+        f.write(vector_bytes)
+    os.replace(tmp_path, path)
+
+    logger.info(f"Exported {len(ids)} posts to snapshot {path} in {time.monotonic() - started:.2f}s")
+    return header
+
+
+def _validate_header(header: Any):
+    """Check the header fields read_snapshot relies on, so a bad header is a SnapshotError."""
+    if not isinstance(header, dict):
+        raise SnapshotError("Corrupted snapshot header: not an object")
+    missing = [key for key in ("embedding_function", "count", "dim", "dtype", "sections") if key not in header]
+    if missing:
+        raise SnapshotError(f"Corrupted snapshot header: missing {', '.join(missing)}")
+    if header["dtype"] not in ("float32", "float16"):
+        raise SnapshotError(f"Unsupported snapshot dtype {header['dtype']}")
+    for key in ("count", "dim"):
+        if not isinstance(header[key], int) or isinstance(header[key], bool) or header[key] < 0:
+            raise SnapshotError(f"Corrupted snapshot header: invalid {key}")
+    sections = header["sections"]
+    if not isinstance(sections, dict) or set(sections) != {"records", "vectors"}:
+        raise SnapshotError("Corrupted snapshot header: sections must be records and vectors")
+    for name, section in sections.items():
+        if not (isinstance(section, dict) and isinstance(section.get("offset"), int)
+                and isinstance(section.get("length"), int) and isinstance(section.get("sha256"), str)):
+            raise SnapshotError(f"Corrupted snapshot header: invalid section {name}")
+
+
+def read_snapshot(path: str) -> Dict[str, Any]:
+    """
+    Read and verify a snapshot file.
+
+    Returns:
+        Dict with header, ids, documents, metadatas and embeddings (float32 matrix)
+    """
+    with open(path, "rb") as f:
+        preamble = f.read(PREAMBLE.size)
+        if len(preamble) != PREAMBLE.size:
+            raise SnapshotError("Snapshot file is truncated")
+        magic, version, header_length = PREAMBLE.unpack(preamble)
+        if magic != MAGIC:
+            raise SnapshotError("Not a knowledge base snapshot")
+        if version > FORMAT_VERSION:
+            raise SnapshotError(f"Snapshot format version {version} is newer than supported ({FORMAT_VERSION})")
+        try:
+            header = json.loads(f.read(header_length))
+        except ValueError as e:
+            raise SnapshotError(f"Corrupted snapshot header: {str(e)}")
+        body = f.read()
+    _validate_header(header)
+
+    sections = {}
+    for name, section in header["sections"].items():
+        data = body[section["offset"]:section["offset"] + section["length"]]
+        if len(data) != section["length"]:
+            raise SnapshotError(f"Snapshot section {name} is truncated")
+        if hashlib.sha256(data).hexdigest() != section["sha256"]:
+            raise SnapshotError(f"Checksum mismatch in snapshot section {name}")
+        sections[name] = data
+
+    try:
+        records = json.loads(zlib.decompress(sections["records"]))
+        vectors = np.frombuffer(sections["vectors"], dtype=np.dtype(header["dtype"]).newbyteorder("<"))
+        vectors = vectors.reshape(header["count"], header["dim"]).astype(np.float32)
+    except (zlib.error, ValueError) as e:
+        raise SnapshotError(f"Corrupted snapshot body: {str(e)}")
+    if not isinstance(records, list) or len(records) != header["count"]:
+        raise SnapshotError(f"Snapshot records do not match the header count {header['count']}")
+
+    try:
+        return {
+            "header": header,
+            "ids": [record["id"] for record in records],
+            "documents": [record["document"] for record in records],
+            "metadatas": [record["metadata"] for record in records],
+            "embeddings": vectors,
+        }
+    except (KeyError, TypeError) as e:
+        raise SnapshotError(f"Corrupted snapshot records: {str(e)}")
+
+
+def import_snapshot(collection, path: str, embedding_function=None, batch_size: int = 1000,
+                    force: bool = False) -> Dict[str, Any]:
+    """
+    Restore a snapshot into a collection in bulk, without re-embedding.
+    Existing records with the same ids are replaced.
+
+    Args:
+        collection: Target Chroma collection or FlatCollection
+        path: Snapshot file
+        embedding_function: Embedding function of the target store, checked against the snapshot
+        batch_size: Records per write (Chroma limits the size of a single write)
+        force: Import even if the snapshot was made with a different embedding model
+
+    Returns:
+        The snapshot header
+    """
+    started = time.monotonic()
+    snapshot = read_snapshot(path)
+    header = snapshot["header"]
+
+    expected = embedding_name(embedding_function)
+    if embedding_function is not None and header["embedding_function"] != expected and not force:
+        raise SnapshotError(f"Snapshot was made with {header['embedding_function']} embeddings, "
+                            f"but this store uses {expected}")
+
+    from ai.flat_index import FlatCollection
+    if isinstance(collection, FlatCollection):
+        # One flat index segment instead of one per batch
+        batch_size = max(batch_size, header["count"])
+
+    ids, documents, vectors = snapshot["ids"], snapshot["documents"], snapshot["embeddings"]
+    # Chroma rejects empty metadata dicts
+    metadatas = [metadata or None for metadata in snapshot["metadatas"]]
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        collection.upsert(ids=ids[start:end], documents=documents[start:end],
+                          metadatas=metadatas[start:end], embeddings=vectors[start:end])
+
+    logger.info(f"Imported {header['count']} posts from snapshot {path} in {time.monotonic() - started:.2f}s")
+    return header
@@ -0,0 +1,195 @@
+"""
+Structured, sampled, non-blocking logging.
+Log records are put on a bounded in-memory queue and written to stderr by a
+background thread, so request threads never wait on log I/O (records are
+dropped and counted when the queue is full). Records are emitted as one JSON
+object per line, tagged with the request ID and action.
+
+Records logged while serving a request are sampled per level: each request
+draws once, so a sampled request keeps all of its records at that level.
+Warnings and errors, and records outside requests (startup, background
+jobs), are always kept.
+"""
+
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from ai.resilience import current_action
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_RATES = "DEBUG=0.1,INFO=0.2"
+
+
+@dataclass
+class RequestLogContext:
+    request_id: str
+    sample: float = field(default_factory=random.random)
+
+    def sampled(self, rate: float) -> bool:
+        return self.sample < rate
+
+
+_request_log_context: contextvars.ContextVar[Optional[RequestLogContext]] = contextvars.ContextVar(
+    "request_log_context", default=None)
+
+def start_request_log(request_id: Optional[str] = None) -> RequestLogContext:
+    """Tag everything logged from the current context with a request ID and one sampling draw."""
+    context = RequestLogContext(request_id=request_id or uuid.uuid4().hex[:16])
+    _request_log_context.set(context)
+    return context
+
+def current_request_id() -> Optional[str]:
+    context = _request_log_context.get()
+    return context.request_id if context else None
+
+def request_sampled(rate: float) -> bool:
+    """Whether the current request falls within `rate` (e.g. to keep its agent transcript)."""
+    context = _request_log_context.get()
+    return (context.sample if context else random.random()) < rate
+
+
+def parse_sample_rates(spec: str) -> Dict[int, float]:
+    """Parse "DEBUG=0.1,INFO=0.2" into {level number: rate}."""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, rate = item.partition("=")
+        level = logging.getLevelName(name.strip().upper())
+        if not isinstance(level, int):
+            raise ValueError(f"Unknown log level in LOG_SAMPLE_RATES: {name}")
+        rates[level] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Drops in-request records by level, per request; tags kept records with the request context."""
+
+    def __init__(self, rates: Dict[int, float]):
+        super().__init__()
+        self.rates = rates
+        self._lock = threading.Lock()
+        self.sampled_out: Dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = _request_log_context.get()
+        if context is not None and record.levelno < logging.WARNING:
+            rate = self.rates.get(record.levelno, 1.0)
+            if not context.sampled(rate):
+                with self._lock:
+                    self.sampled_out[record.levelname] = self.sampled_out.get(record.levelname, 0) + 1
+                return False
+        record.request_id = context.request_id if context else None
+        record.action = current_action()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in ("request_id", "action"):
+            if getattr(record, key, None):
+                entry[key] = getattr(record, key)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only resolve what can't cross threads (args, exception); formatting happens on the listener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LoggingPipeline:
+    def __init__(self, level: int = logging.INFO, log_format: str = "json", queue_size: int = 10000,
+                 sample_rates: Optional[Dict[int, float]] = None):
+        """
+        Initialize the pipeline. Call start() to install it on the root logger.
+
+        Args:
+            level: Root log level
+            log_format: "json" (one object per line) or "text"
+            queue_size: Records buffered before new ones are dropped
+            sample_rates: In-request sampling rate per level below WARNING (default: keep all)
+        """
+        self.level = level
+        self.log_format = log_format
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.handler = NonBlockingQueueHandler(self.queue)
+        self.sampling = SamplingFilter(sample_rates or {})
+        self.handler.addFilter(self.sampling)
+
+        output = logging.StreamHandler(sys.stderr)
+        output.setFormatter(JsonFormatter() if log_format == "json"
+                            else logging.Formatter("%(levelname)s:%(name)s:%(message)s"))
+        self.listener = logging.handlers.QueueListener(self.queue, output, respect_handler_level=True)
+
+    def start(self):
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        root.setLevel(self.level)
+        self.listener.start()
+
+    def stop(self):
+        # Writes out whatever is still queued
+        self.listener.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "format": self.log_format,
+            "queue_depth": self.queue.qsize(),
+            "dropped_queue_full": self.handler.dropped,
+            "sampled_out": dict(self.sampling.sampled_out),
+            "sample_rates": {logging.getLevelName(level): rate for level, rate in self.sampling.rates.items()},
+        }
+
+
+def setup_logging() -> LoggingPipeline:
+    """Install the logging pipeline on the root logger, configured from environment variables."""
+    pipeline = LoggingPipeline(
+        level=logging.getLevelName(os.getenv("LOG_LEVEL", "INFO").upper()),
+        log_format=os.getenv("LOG_FORMAT", "json").lower(),
+        queue_size=int(os.getenv("LOG_QUEUE_SIZE", "10000")),
+        sample_rates=parse_sample_rates(os.getenv("LOG_SAMPLE_RATES", DEFAULT_SAMPLE_RATES)),
+    )
+    pipeline.start()
+    return pipeline
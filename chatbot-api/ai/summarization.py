@@ -0,0 +1,115 @@
+"""
+Map-reduce summarization for long content.
+Instead of one huge prompt, the content is split into sections that are
+summarized concurrently (map), then the section summaries are combined into
+the final summary in one more call (reduce). Section summaries are cached by
+content hash, so re-summarizing an edited document only recomputes the
+sections that changed.
+"""
+
+import os
+import threading
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from ai.fanout import fan_out
+from ai.result_cache import ResultCache, cache_key
+from ai.segmentation import split_sections
+
+logger = logging.getLogger(__name__)
+
+CACHE_NAMESPACE = "section_summary"
+
+
+class MapReduceSummarizer:
+    def __init__(self, summarize_section: Callable[[str, int, int], str],
+                 combine: Callable[[List[str], str], Any], cache: Optional[ResultCache] = None,
+                 threshold_chars: int = 12000, section_chars: int = 6000, max_workers: int = 4,
+                 cache_version: str = "", max_levels: int = 3):
+        """
+        Initialize the summarizer.
+
+        Args:
+            summarize_section: Summarizes one section: (section, index, total) -> summary text
+            combine: Combines section summaries into the final result: (summaries, desired_length) -> result
+            cache: Where section summaries are cached (None disables caching)
+            threshold_chars: Content longer than this is summarized with map-reduce
+            section_chars: Maximum section size
+            max_workers: Sections summarized concurrently
+            cache_version: Mixed into cache keys; changes when the section prompt or model changes
+            max_levels: Map passes before the reduce step is run on whatever is left
+        """
+        self.summarize_section = summarize_section
+        self.combine = combine
+        self.cache = cache
+        self.threshold_chars = threshold_chars
+        self.section_chars = section_chars
+        self.max_workers = max_workers
+        self.cache_version = cache_version
+        self.max_levels = max_levels
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._sections = 0
+        self._sections_reused = 0
+
+    def needs_map_reduce(self, content: str) -> bool:
+        return len(content) > self.threshold_chars
+
+    def _summarize_sections(self, sections: List[str]) -> List[str]:
+        keys = [cache_key(self.cache_version, section) for section in sections]
+        summaries: List[Optional[str]] = [self.cache.get(CACHE_NAMESPACE, key) if self.cache else None for key in keys]
+        missing = [i for i, summary in enumerate(summaries) if summary is None]
+
+        def summarize(index: int) -> str:
+            summary = self.summarize_section(sections[index], index, len(sections))
+            if self.cache:
+                self.cache.put(CACHE_NAMESPACE, keys[index], summary)
+            return summary
+
+        for index, summary in zip(missing, fan_out(summarize, missing, self.max_workers)):
+            summaries[index] = summary
+
+        with self._lock:
+            self._sections += len(sections)
+            self._sections_reused += len(sections) - len(missing)
+        logger.info(f"Summarized {len(missing)} of {len(sections)} sections ({len(sections) - len(missing)} cached)")
+        return summaries
+
+    def summarize(self, content: str, desired_length: str = "one paragraph") -> Any:
+        """
+        Summarize long content: summarize its sections, then combine the section summaries.
+        If the section summaries are still too long, they are summarized again.
+        """
+        with self._lock:
+            self._runs += 1
+        summaries = self._summarize_sections(split_sections(content, self.section_chars))
+        for _ in range(self.max_levels - 1):
+            combined = "\n\n".join(summaries)
+            if len(combined) <= self.threshold_chars or len(summaries) <= 1:
+                break
+            summaries = self._summarize_sections(split_sections(combined, self.section_chars))
+        return self.combine(summaries, desired_length)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threshold_chars": self.threshold_chars,
+            "section_chars": self.section_chars,
+            "max_workers": self.max_workers,
+            "runs": self._runs,
+            "sections": self._sections,
+            "sections_reused": self._sections_reused,
+        }
+
+
+def create_map_reduce_summarizer(summarize_section, combine, cache: Optional[ResultCache],
+                                 cache_version: str = "") -> MapReduceSummarizer:
+    """Create a map-reduce summarizer configured from environment variables."""
+    return MapReduceSummarizer(
+        summarize_section,
+        combine,
+        cache=cache,
+        threshold_chars=int(os.getenv("SUMMARY_MAP_REDUCE_CHARS", "12000")),
+        section_chars=int(os.getenv("SUMMARY_SECTION_CHARS", "6000")),
+        max_workers=int(os.getenv("SUMMARY_MAP_CONCURRENCY", "4")),
+        cache_version=cache_version,
+    )
@@ -0,0 +1,106 @@
+"""
+Store for sampled agent transcripts.
+Agents no longer print their reasoning to stdout. Instead, for a sampled
+fraction of requests the prompts and responses of every model call are kept
+(see CallTrace in ai/model_router.py) and saved here, keyed by request ID.
+Writes happen on a background thread; the oldest transcripts are pruned.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TraceStore:
+    def __init__(self, db_path: str = "./data/traces.db", max_traces: int = 5000, queue_size: int = 1000):
+        """
+        Initialize the store and start its writer thread.
+
+        Args:
+            db_path: SQLite file holding transcripts
+            max_traces: Transcripts kept; older ones are pruned
+            queue_size: Transcripts waiting to be written before new ones are dropped
+        """
+        self.db_path = db_path
+        self.max_traces = max_traces
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._saved = 0
+        self._dropped = 0
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS traces (id INTEGER PRIMARY KEY AUTOINCREMENT, request_id TEXT NOT NULL, "
+                "action TEXT NOT NULL, models TEXT, created_at REAL NOT NULL, transcript TEXT NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_traces_request ON traces (request_id)")
+
+        self._thread = threading.Thread(target=self._run, name="trace-store", daemon=True)
+        self._thread.start()
+
+    def add(self, request_id: str, action: str, models: Optional[str], transcript: List[Dict[str, Any]]):
+        """Queue a transcript for saving; never blocks the caller."""
+        try:
+            self._queue.put_nowait((request_id, action, models, time.time(), json.dumps(transcript, default=str)))
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+
+    def _run(self):
+        while True:
+            rows = [self._queue.get()]
+            while len(rows) < 100:
+                try:
+                    rows.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with self._lock, self._conn:
+                    self._conn.executemany(
+                        "INSERT INTO traces (request_id, action, models, created_at, transcript) VALUES (?, ?, ?, ?, ?)",
+                        rows)
+                    self._conn.execute("DELETE FROM traces WHERE id <= (SELECT MAX(id) FROM traces) - ?",
+                                       (self.max_traces,))
+                    self._saved += len(rows)
+            except Exception as e:
+                logger.error(f"Saving {len(rows)} agent transcripts failed: {str(e)}")
+
+    def get(self, request_id: str) -> List[Dict[str, Any]]:
+        """Transcripts saved for a request (one per action it ran), oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT action, models, created_at, transcript FROM traces WHERE request_id = ? ORDER BY id",
+                (request_id,)).fetchall()
+        return [{"action": action, "models": models, "created_at": created_at, "calls": json.loads(transcript)}
+                for action, models, created_at, transcript in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stored = self._conn.execute("SELECT COUNT(*) FROM traces").fetchone()[0]
+            return {"stored": stored, "saved": self._saved, "dropped": self._dropped,
+                    "pending": self._queue.qsize()}
+
+
+# Global trace store (lazy initialization)
+_trace_store = None
+
+def get_trace_store() -> TraceStore:
+    """Get the global agent transcript store."""
+    global _trace_store
+    if _trace_store is None:
+        _trace_store = TraceStore(
+            db_path=os.getenv("AGENT_TRACE_PATH", "./data/traces.db"),
+            max_traces=int(os.getenv("AGENT_TRACE_MAX", "5000")),
+        )
+    return _trace_store
@@ -0,0 +1,152 @@
+"""
+Parallel research for trend-based writing.
+Instead of an agent that searches and writes in one ReAct loop (one search
+after another), the topic is expanded into sub-queries, the searches run
+concurrently, and the deduplicated, condensed results are handed to a single
+writing call as a research brief. Research takes about as long as the slowest
+search rather than the sum of all of them.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from ai.degraded import best_sentences
+from ai.fanout import fan_out
+
+logger = logging.getLogger(__name__)
+
+# Each angle becomes one search; {topic} and {year} are filled in
+SUBQUERY_TEMPLATES = [
+    "{topic} latest news",
+    "{topic} trends {year}",
+    "{topic} statistics and data {year}",
+    "{topic} expert opinions and predictions",
+    "{topic} challenges and criticism",
+    "{topic} practical tips and examples",
+]
+
+
+def _normalize_url(url: str) -> str:
+    url = re.sub(r"^https?://(www\.)?", "", (url or "").strip().lower())
+    return url.split("#")[0].split("?")[0].rstrip("/")
+
+
+def parse_search_results(raw: Any) -> List[Dict[str, Any]]:
+    """Search results as dicts (title, url, content, score). Non-JSON output (e.g. an outage notice) yields none."""
+    if isinstance(raw, str):
+        try:
+            raw = json.loads(raw)
+        except ValueError:
+            return []
+    results = raw.get("results") if isinstance(raw, dict) else raw
+    return [result for result in results or [] if isinstance(result, dict) and result.get("content")]
+
+
+class TrendResearcher:
+    def __init__(self, search: Callable[[str], Any], num_queries: int = 4, max_workers: int = 4,
+                 sentences_per_result: int = 3, brief_chars: int = 6000):
+        """
+        Initialize the researcher.
+
+        Args:
+            search: Runs one web search: query -> results (JSON string or dict)
+            num_queries: Sub-queries per topic
+            max_workers: Searches run concurrently
+            sentences_per_result: Sentences kept from each result for the brief
+            brief_chars: Maximum size of the research brief
+        """
+        self.search = search
+        self.num_queries = max(1, min(num_queries, len(SUBQUERY_TEMPLATES)))
+        self.max_workers = max_workers
+        self.sentences_per_result = sentences_per_result
+        self.brief_chars = brief_chars
+        self._lock = threading.Lock()
+        self._runs = 0
+        self._searches = 0
+        self._failed_searches = 0
+        self._results = 0
+        self._duplicates = 0
+        self._research_seconds = 0.0
+
+    def subqueries(self, topic: str) -> List[str]:
+        year = datetime.now().year
+        return [template.format(topic=topic, year=year) for template in SUBQUERY_TEMPLATES[:self.num_queries]]
+
+    def _search(self, query: str) -> List[Dict[str, Any]]:
+        try:
+            results = parse_search_results(self.search(query))
+        except Exception as e:
+            # One failed angle shouldn't sink the whole post
+            logger.warning(f"Search for '{query}' failed: {str(e)}")
+            with self._lock:
+                self._failed_searches += 1
+            return []
+        return [dict(result, query=query) for result in results]
+
+    def research(self, topic: str) -> str:
+        """
+        Run the sub-query searches concurrently and condense the results into a brief.
+
+        Returns:
+            The research brief (empty if no search returned anything)
+        """
+        started = time.monotonic()
+        queries = self.subqueries(topic)
+        result_lists = fan_out(self._search, queries, self.max_workers)
+
+        # Deduplicate by URL (and title), keeping the best-scored copy
+        unique: Dict[str, Dict[str, Any]] = {}
+        total = 0
+        for result in (result for results in result_lists for result in results):
+            total += 1
+            key = _normalize_url(result.get("url", "")) or result.get("title", "").strip().lower()
+            if key not in unique or (result.get("score") or 0) > (unique[key].get("score") or 0):
+                unique[key] = result
+        ranked = sorted(unique.values(), key=lambda result: -(result.get("score") or 0))
+
+        entries, size = [], 0
+        for result in ranked:
+            summary = " ".join(best_sentences(f"{topic} {result['query']}", result["content"],
+                                              self.sentences_per_result))
+            entry = f"- {result.get('title', 'Untitled')} ({result.get('url', 'no url')}): {summary}"
+            if size + len(entry) > self.brief_chars:
+                break
+            entries.append(entry)
+            size += len(entry) + 1
+
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._runs += 1
+            self._searches += len(queries)
+            self._results += total
+            self._duplicates += total - len(unique)
+            self._research_seconds += elapsed
+        logger.info(f"Researched '{topic}': {len(queries)} searches, {total} results, "
+                    f"{len(entries)} in the brief, {elapsed:.2f}s")
+        return "\n".join(entries)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "runs": self._runs,
+            "searches": self._searches,
+            "failed_searches": self._failed_searches,
+            "results": self._results,
+            "duplicates_removed": self._duplicates,
+            "mean_research_seconds": round(self._research_seconds / self._runs, 2) if self._runs else 0.0,
+        }
+
+
+def create_trend_researcher(search) -> TrendResearcher:
+    """Create a researcher configured from environment variables."""
+    return TrendResearcher(
+        search,
+        num_queries=int(os.getenv("TREND_RESEARCH_QUERIES", "4")),
+        max_workers=int(os.getenv("TREND_RESEARCH_CONCURRENCY", "4")),
+        brief_chars=int(os.getenv("TREND_BRIEF_CHARS", "6000")),
+    )
@@ -0,0 +1,310 @@
+"""
+Token usage ledger for AI actions.
+Records prompt and completion tokens per call, aggregates them in memory,
+flushes them to a local SQLite database in batches and enforces token budgets.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BudgetExceededError(Exception):
+    """Raised when a conversation or client has used up its token budget."""
+
+    def __init__(self, scope: str, key: str, used: int, limit: int, retry_after: Optional[int] = None):
+        self.scope = scope
+        self.key = key
+        self.used = used
+        self.limit = limit
+        self.retry_after = retry_after
+        super().__init__(f"Token budget exceeded for {scope} '{key}': {used}/{limit} tokens used")
+
+
+@dataclass
+class UsageRecord:
+    action: str
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    successful_requests: int
+    timestamp: float
+    conversation_id: Optional[str] = None
+    client_id: Optional[str] = None
+    model: Optional[str] = None
+
+
+def extract_token_usage(result: Any) -> Dict[str, int]:
+    """Read token counts from a CrewOutput (or anything exposing `token_usage`)."""
+    return normalize_token_usage(getattr(result, "token_usage", None))
+
+
+def normalize_token_usage(usage: Any) -> Dict[str, int]:
+    """Token counts from a usage dict or UsageMetrics, with missing fields as 0."""
+    if usage is None:
+        return {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0, "successful_requests": 0}
+
+    if not isinstance(usage, dict):
+        usage = usage.model_dump() if hasattr(usage, "model_dump") else vars(usage)
+
+    prompt_tokens = int(usage.get("prompt_tokens") or 0)
+    completion_tokens = int(usage.get("completion_tokens") or 0)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": int(usage.get("total_tokens") or prompt_tokens + completion_tokens),
+        "successful_requests": int(usage.get("successful_requests") or 0),
+    }
+
+
+class UsageLedger:
+    def __init__(self, db_path: str = "./data/usage.db", flush_batch_size: int = 50,
+                 flush_interval: float = 5.0, conversation_budget: int = 0,
+                 client_budget: int = 0, client_window_seconds: int = 86400):
+        """Initialize the ledger. A budget of 0 means unlimited."""
+        self.db_path = db_path
+        self.flush_batch_size = flush_batch_size
+        self.flush_interval = flush_interval
+        self.conversation_budget = conversation_budget
+        self.client_budget = client_budget
+        self.client_window_seconds = client_window_seconds
+
+        self._lock = threading.Lock()
+        self._pending: List[UsageRecord] = []
+        self._stop_event = threading.Event()
+        self._flush_requested = threading.Event()
+        self._flush_thread: Optional[threading.Thread] = None
+
+        # In-memory aggregates used for budget checks
+        self._conversation_totals: Dict[str, int] = {}
+        self._client_windows: Dict[str, Dict[str, float]] = {}
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._init_db()
+        self._load_aggregates()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path)
+
+    def _init_db(self):
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS token_usage (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp REAL NOT NULL,
+                    action TEXT NOT NULL,
+                    conversation_id TEXT,
+                    client_id TEXT,
+                    model TEXT,
+                    prompt_tokens INTEGER NOT NULL,
+                    completion_tokens INTEGER NOT NULL,
+                    total_tokens INTEGER NOT NULL,
+                    successful_requests INTEGER NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_conversation ON token_usage (conversation_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_usage_client ON token_usage (client_id, timestamp)")
+
+    def _load_aggregates(self):
+        """Restore budget counters from persisted records so budgets survive restarts."""
+        window_start = time.time() - self.client_window_seconds
+        with self._connect() as conn:
+            for conversation_id, total in conn.execute(
+                "SELECT conversation_id, SUM(total_tokens) FROM token_usage "
+                "WHERE conversation_id IS NOT NULL GROUP BY conversation_id"
+            ):
+                self._conversation_totals[conversation_id] = int(total or 0)
+
+            for client_id, total, first_seen in conn.execute(
+                "SELECT client_id, SUM(total_tokens), MIN(timestamp) FROM token_usage "
+                "WHERE client_id IS NOT NULL AND timestamp >= ? GROUP BY client_id",
+                (window_start,)
+            ):
+                self._client_windows[client_id] = {"start": first_seen, "tokens": int(total or 0)}
+
+    def _client_window(self, client_id: str, now: float) -> Dict[str, float]:
+        window = self._client_windows.get(client_id)
+        if window is None or now - window["start"] >= self.client_window_seconds:
+            window = {"start": now, "tokens": 0}
+            self._client_windows[client_id] = window
+        return window
+
+    def check_budget(self, conversation_id: Optional[str] = None, client_id: Optional[str] = None):
+        """Raise BudgetExceededError if the conversation or client is over budget."""
+        with self._lock:
+            if self.conversation_budget and conversation_id:
+                used = self._conversation_totals.get(conversation_id, 0)
+                if used >= self.conversation_budget:
+                    raise BudgetExceededError("conversation", conversation_id, used, self.conversation_budget)
+
+            if self.client_budget and client_id:
+                now = time.time()
+                window = self._client_window(client_id, now)
+                if window["tokens"] >= self.client_budget:
+                    retry_after = int(window["start"] + self.client_window_seconds - now) + 1
+                    raise BudgetExceededError("client", client_id, int(window["tokens"]),
+                                              self.client_budget, retry_after=retry_after)
+
+    def record(self, action: str, result: Any, conversation_id: Optional[str] = None,
+               client_id: Optional[str] = None, model: Optional[str] = None,
+               usage: Optional[Dict[str, int]] = None) -> UsageRecord:
+        """
+        Record the token usage of one AI call.
+
+        Args:
+            usage: Token counts of the call; read from the result's `token_usage` if not given
+        """
+        usage = extract_token_usage(result) if usage is None else normalize_token_usage(usage)
+        record = UsageRecord(
+            action=action,
+            timestamp=time.time(),
+            conversation_id=conversation_id,
+            client_id=client_id,
+            model=model,
+            **usage
+        )
+
+        with self._lock:
+            self._pending.append(record)
+            if conversation_id:
+                self._conversation_totals[conversation_id] = (
+                    self._conversation_totals.get(conversation_id, 0) + record.total_tokens
+                )
+            if client_id:
+                self._client_window(client_id, record.timestamp)["tokens"] += record.total_tokens
+
+            should_flush = len(self._pending) >= self.flush_batch_size
+
+        if should_flush:
+            # Written by the background thread: record() runs on the event loop and must not do I/O
+            self._flush_requested.set()
+        return record
+
+    def flush(self) -> int:
+        """Write pending records to storage in one batch."""
+        with self._lock:
+            batch, self._pending = self._pending, []
+
+        if not batch:
+            return 0
+
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT INTO token_usage (timestamp, action, conversation_id, client_id, model, "
+                    "prompt_tokens, completion_tokens, total_tokens, successful_requests) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (r.timestamp, r.action, r.conversation_id, r.client_id, r.model,
+                         r.prompt_tokens, r.completion_tokens, r.total_tokens, r.successful_requests)
+                        for r in batch
+                    ]
+                )
+            return len(batch)
+        except Exception as e:
+            logger.error(f"Error flushing {len(batch)} usage records: {str(e)}")
+            with self._lock:
+                self._pending = batch + self._pending
+            return 0
+
+    def start(self):
+        """Start the background thread that writes buffered records (on an interval, or when a batch fills up)."""
+        if self._flush_thread and self._flush_thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._flush_thread = threading.Thread(target=self._flush_loop, name="usage-ledger-flush", daemon=True)
+        self._flush_thread.start()
+
+    def stop(self):
+        """Stop the background thread and flush anything still buffered."""
+        self._stop_event.set()
+        self._flush_requested.set()
+        if self._flush_thread:
+            self._flush_thread.join(timeout=self.flush_interval + 1)
+        self.flush()
+
+    def _flush_loop(self):
+        while not self._stop_event.is_set():
+            # Every flush_interval, or sooner once a full batch is buffered
+            self._flush_requested.wait(self.flush_interval)
+            self._flush_requested.clear()
+            if not self._stop_event.is_set():
+                self.flush()
+
+    def summarize(self, group_by: str = "action", since: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Aggregate persisted usage grouped by action, conversation_id, client_id or model."""
+        if group_by not in ("action", "conversation_id", "client_id", "model"):
+            raise ValueError(f"Unsupported group_by: {group_by}")
+
+        self.flush()
+        query = (
+            f"SELECT {group_by}, COUNT(*), SUM(prompt_tokens), SUM(completion_tokens), SUM(total_tokens) "
+            "FROM token_usage WHERE timestamp >= ? "
+            f"GROUP BY {group_by} ORDER BY SUM(total_tokens) DESC"
+        )
+        with self._connect() as conn:
+            rows = conn.execute(query, (since or 0,)).fetchall()
+
+        return [
+            {
+                group_by: key,
+                "calls": calls,
+                "prompt_tokens": prompt or 0,
+                "completion_tokens": completion or 0,
+                "total_tokens": total or 0,
+            }
+            for key, calls, prompt, completion, total in rows
+        ]
+
+    def get_conversation_usage(self, conversation_id: str, limit: int = 100) -> Dict[str, Any]:
+        """Get totals and the most recent records for one conversation."""
+        self.flush()
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(
+                "SELECT * FROM token_usage WHERE conversation_id = ? ORDER BY timestamp DESC LIMIT ?",
+                (conversation_id, limit)
+            ).fetchall()
+
+        records = [dict(row) for row in rows]
+        for record in records:
+            record["timestamp"] = datetime.fromtimestamp(record["timestamp"]).isoformat()
+
+        with self._lock:
+            total_tokens = self._conversation_totals.get(conversation_id, 0)
+
+        return {
+            "conversation_id": conversation_id,
+            "total_tokens": total_tokens,
+            "budget": self.conversation_budget or None,
+            "records": records,
+        }
+
+
+# Global ledger instance (lazy initialization)
+_usage_ledger = None
+
+def get_usage_ledger() -> UsageLedger:
+    """Get the global usage ledger configured from environment variables."""
+    global _usage_ledger
+    if _usage_ledger is None:
+        _usage_ledger = UsageLedger(
+            db_path=os.getenv("USAGE_DB_PATH", "./data/usage.db"),
+            flush_batch_size=int(os.getenv("USAGE_FLUSH_BATCH_SIZE", "50")),
+            flush_interval=float(os.getenv("USAGE_FLUSH_INTERVAL_SECONDS", "5")),
+            conversation_budget=int(os.getenv("CONVERSATION_TOKEN_BUDGET", "0")),
+            client_budget=int(os.getenv("CLIENT_TOKEN_BUDGET", "0")),
+            client_window_seconds=int(os.getenv("CLIENT_BUDGET_WINDOW_SECONDS", "86400")),
+        )
+    return _usage_ledger
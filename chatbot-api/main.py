@@ -1,9 +1,15 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
+import asyncio
+import json
 import logging
 from datetime import datetime
+import hashlib
+import hmac
+import time
 import os
 
 # Import our AI modules
@@ -11,14 +17,34 @@ from ai.crew import (
     execute_trend_discovery,
     execute_content_summary,
     execute_post_editing,
+    execute_paragraph_editing,
     execute_blog_generation,
     execute_chat_response,
-    execute_trend_based_writing
+    execute_trend_based_writing,
+    map_reduce_summarizer,
+    paragraph_editor,
+    trend_researcher,
+    executor_pool_stats,
+    model_router
 )
 from ai.rag_system import get_rag_system
+from ai.related_posts import get_related_posts_index
+from ai.intent import get_intent_gate
+from ai.degraded import build_extractive_answer, create_degraded_mode_controller
+from ai.extractive import SUMMARY_MODES, get_extractive_summarizer
+from ai.result_cache import get_result_cache
+from ai.paragraph_edit import EDIT_MODES
+from ai.ingest_queue import INGEST_EVENTS, get_ingest_queue
+from ai.pipeline import PipelineError, run_pipeline, validate_pipeline
+from ai.usage import get_usage_ledger, BudgetExceededError
+from ai.scheduler import get_scheduler, RateLimitExceeded, SchedulerOverloadedError
+from ai.resilience import run_with_deadline, get_all_policy_stats, ResilienceError
+from ai.model_router import CallTrace, start_call_trace
+from ai.structured_logging import setup_logging, start_request_log, current_request_id, request_sampled
+from ai.trace_store import get_trace_store
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+# Set up logging (structured, sampled per request, written by a background thread)
+log_pipeline = setup_logging()
 logger = logging.getLogger(__name__)
 
 app = FastAPI(
@@ -36,9 +62,55 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def tag_request_logs(request: Request, call_next):
+    """Give each request an ID (X-Request-ID) and one sampling draw for its logs and agent transcripts."""
+    context = start_request_log((request.headers.get("x-request-id") or "")[:64] or None)
+    response = await call_next(request)
+    response.headers["X-Request-ID"] = context.request_id
+    return response
+
 # Initialize RAG system
 rag_system = get_rag_system()
 
+# Initialize token usage ledger
+usage_ledger = get_usage_ledger()
+
+# Initialize AI action scheduler
+scheduler = get_scheduler()
+
+# Initialize related-posts graph (built and maintained in the background)
+related_posts = get_related_posts_index(rag_system)
+
+# Initialize the chat intent gate (None when disabled)
+intent_gate = get_intent_gate(rag_system)
+
+# Serve extractive answers when the LLM tier is saturated or down
+degraded_mode = create_degraded_mode_controller(scheduler, model_router)
+
+# Local summarizer for summarize requests with mode="extractive"
+extractive_summarizer = get_extractive_summarizer(rag_system)
+
+# Debounced write-behind queue for post events pushed by the blog backend
+ingest_queue = get_ingest_queue(rag_system)
+
+# Agent transcripts (model prompts and responses) of a sample of requests
+trace_store = get_trace_store()
+AGENT_TRACE_SAMPLE_RATE = float(os.getenv("AGENT_TRACE_SAMPLE_RATE", "0.01"))
+
+@app.on_event("startup")
+def start_background_services():
+    usage_ledger.start()
+    related_posts.start()
+    ingest_queue.start()
+
+@app.on_event("shutdown")
+def stop_background_services():
+    usage_ledger.stop()
+    related_posts.stop()
+    ingest_queue.stop()
+    log_pipeline.stop()
+
 # --- PYDANTIC MODELS ---
 
 class TrendRequest(BaseModel):
@@ -47,10 +119,12 @@ class TrendRequest(BaseModel):
 class SummarizeRequest(BaseModel):
     content: str
     desired_length: Optional[str] = "one paragraph"
+    mode: Optional[str] = "llm"  # "llm" or "extractive" (local, no LLM call)
 
 class EditPostRequest(BaseModel):
     draft_content: str
     editing_goal: str
+    mode: Optional[str] = "full"  # "full" or "paragraphs" (parallel, returns a diff)
 
 class GenerateBlogRequest(BaseModel):
     topic: str
@@ -72,15 +146,25 @@ class InvokePayload(BaseModel):
     content_to_summarize: Optional[str] = None
     editing_goal: Optional[str] = None
     draft_content: Optional[str] = None
+    mode: Optional[str] = None  # Summarize: "llm" (default) or "extractive"; edit: "full" (default) or "paragraphs"
+
+class PipelineStep(BaseModel):
+    id: str
+    action: str
+    payload: Optional[InvokePayload] = None
+    inputs: Optional[Dict[str, str]] = {}  # Payload field -> id of the step whose output fills it
+    depends_on: Optional[List[str]] = []  # Extra ordering constraints
 
 class InvokeRequest(BaseModel):
     action: str
-    payload: InvokePayload
+    payload: InvokePayload = InvokePayload()
     conversation_id: Optional[str] = None
+    steps: Optional[List[PipelineStep]] = None  # For action="pipeline"
 
 class InvokeResponse(BaseModel):
     response: str
     conversation_id: str
+    degraded: bool = False
 
 class BlogPostData(BaseModel):
     post_id: str
@@ -90,6 +174,19 @@ class BlogPostData(BaseModel):
     tags: Optional[List[str]] = []
     metadata: Optional[Dict[str, Any]] = {}
 
+class BlogPostBatchRequest(BaseModel):
+    posts: List[BlogPostData]
+
+class PostWebhookEvent(BaseModel):
+    event: str  # "created", "updated" or "deleted"
+    post_id: str
+    title: Optional[str] = None
+    content: Optional[str] = None
+    author: Optional[str] = None
+    tags: Optional[List[str]] = []
+    metadata: Optional[Dict[str, Any]] = {}
+    updated_at: Optional[str] = None  # ISO timestamp of the saved state, used to drop out-of-order events
+
 class APIResponse(BaseModel):
     success: bool
     data: Any
@@ -98,8 +195,10 @@ class APIResponse(BaseModel):
 # --- SESSION MANAGEMENT ---
 # Simple in-memory session storage (in production, use Redis or database)
 chat_sessions: Dict[str, List[Dict[str, str]]] = {}
+# Session shared by every caller of /api/ai/chat, which has no session ids yet
+DEFAULT_SESSION_ID = "default"
 
-def get_or_create_session(session_id: str = "default") -> List[Dict[str, str]]:
+def get_or_create_session(session_id: str = DEFAULT_SESSION_ID) -> List[Dict[str, str]]:
     """Get or create a chat session."""
     if session_id not in chat_sessions:
         chat_sessions[session_id] = []
@@ -130,6 +229,151 @@ def format_chat_history(session: List[Dict[str, str]]) -> str:
     
     return "\n".join(history_parts)
 
+# --- USAGE TRACKING ---
+
+def get_client_id(http_request: Request) -> str:
+    """Identify the calling client by API key (hashed) or IP address."""
+    api_key = http_request.headers.get("x-api-key")
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:16]
+    return "ip:" + (http_request.client.host if http_request.client else "unknown")
+
+def budget_conversation(conversation_id: Optional[str]) -> Optional[str]:
+    """Conversation to charge, if any: the shared default session of /api/ai/chat is not one."""
+    return None if conversation_id == DEFAULT_SESSION_ID else conversation_id
+
+def enforce_token_budget(client_id: str, conversation_id: Optional[str] = None):
+    """Reject the request with a 429 if the client or conversation is over budget."""
+    try:
+        usage_ledger.check_budget(conversation_id=budget_conversation(conversation_id), client_id=client_id)
+    except BudgetExceededError as e:
+        logger.warning(str(e))
+        headers = {"Retry-After": str(e.retry_after)} if e.retry_after else None
+        raise HTTPException(status_code=429, detail=str(e), headers=headers)
+
+def record_usage(action: str, trace: CallTrace, client_id: str, conversation_id: Optional[str] = None):
+    """Record token usage of the current request, tagged with the model(s) that served it."""
+    # The trace holds only this request's calls; the result's usage can be summed over shared LLM clients
+    usage_ledger.record(action, None, conversation_id=budget_conversation(conversation_id), client_id=client_id,
+                        model=trace.served_by, usage=trace.usage)
+
+async def run_scheduled(action: str, client_id: str, func, *args, conversation_id: Optional[str] = None, **kwargs):
+    """
+    Run an AI action through the priority scheduler, mapping limit hits to HTTP errors,
+    and record its token usage against the client's and conversation's budgets.
+    """
+    trace = start_call_trace(record_transcript=request_sampled(AGENT_TRACE_SAMPLE_RATE))
+    completed = False
+    try:
+        result = await scheduler.submit(action, client_id, run_with_deadline, action, func, *args, **kwargs)
+        completed = True
+        return result
+    except RateLimitExceeded as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except SchedulerOverloadedError as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except ResilienceError as e:
+        # Provider down or too slow: fail fast instead of hanging the request
+        logger.warning(f"AI provider unavailable for {action}: {str(e)}")
+        headers = {"Retry-After": str(int(e.retry_after) + 1)} if e.retry_after else None
+        raise HTTPException(status_code=503, detail=f"AI provider temporarily unavailable: {str(e)}", headers=headers)
+    finally:
+        if trace.transcript:
+            trace_store.add(current_request_id() or "unknown", action, trace.served_by, trace.transcript)
+        # Calls that failed or timed out after using tokens are charged too
+        if completed or trace.usage["total_tokens"]:
+            record_usage(action, trace, client_id, conversation_id)
+
+# --- CHAT ---
+
+NO_RETRIEVAL_CONTEXT = "No new blog content was retrieved; answer from the chat history."
+
+async def run_chat(question: str, conversation_id: str, client_id: str) -> Dict[str, Any]:
+    """
+    Answer a chat message. The intent gate answers greetings, thanks and off-topic
+    messages from templates, and skips retrieval for follow-ups; everything else
+    gets retrieval plus a chat agent run.
+    """
+    session = get_or_create_session(conversation_id)
+    chat_history = format_chat_history(session)
+    
+    decision = await asyncio.to_thread(intent_gate.classify, question, bool(session)) if intent_gate else None
+    if decision is not None and decision.response is not None:
+        add_to_session(conversation_id, question, decision.response)
+        return {"response": decision.response, "context_used": False, "intent": decision.intent, "degraded": False}
+    
+    intent = decision.intent if decision else "question"
+    degraded_reason = degraded_mode.reason("chat")
+    if degraded_reason:
+        return await run_degraded_chat(question, intent, degraded_reason)
+    
+    # Get relevant context from RAG system
+    if decision is None or decision.needs_retrieval:
+        retrieved_context = await asyncio.to_thread(rag_system.get_context_for_chat, question)
+    else:
+        retrieved_context = NO_RETRIEVAL_CONTEXT
+    
+    # Execute chat response
+    try:
+        result = await run_scheduled(
+            "chat",
+            client_id,
+            execute_chat_response,
+            chat_history=chat_history,
+            retrieved_context=retrieved_context,
+            user_question=question,
+            conversation_id=conversation_id
+        )
+    except HTTPException as e:
+        # Queue full or provider down: answer from the knowledge base instead of failing
+        if e.status_code == 503 and degraded_mode.enabled:
+            return await run_degraded_chat(question, intent, "provider_error")
+        raise
+    
+    ai_response = str(result)
+    add_to_session(conversation_id, question, ai_response)
+    return {
+        "response": ai_response,
+        "context_used": len(retrieved_context) > 50 and retrieved_context != NO_RETRIEVAL_CONTEXT,
+        "intent": intent,
+        "degraded": False
+    }
+
+async def run_degraded_chat(question: str, intent: str, reason: str) -> Dict[str, Any]:
+    """Answer from the best-matching passages only, without an LLM call."""
+    degraded_mode.record(reason)
+    results = await asyncio.to_thread(rag_system.search_similar_posts, question, 3)
+    return {
+        "response": build_extractive_answer(question, results),
+        "context_used": bool(results),
+        "intent": intent,
+        "degraded": True,
+        "degraded_reason": reason
+    }
+
+# --- SUMMARIZATION AND EDITING ---
+
+def check_summary_mode(mode: Optional[str]) -> str:
+    mode = (mode or "llm").lower()
+    if mode not in SUMMARY_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown summary mode: {mode} (expected one of {', '.join(SUMMARY_MODES)})")
+    return mode
+
+def check_edit_mode(mode: Optional[str]) -> str:
+    mode = (mode or "full").lower()
+    if mode not in EDIT_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown edit mode: {mode} (expected one of {', '.join(EDIT_MODES)})")
+    return mode
+
+async def run_extractive_summary(content: str, desired_length: Optional[str]) -> str:
+    """Local extractive summary: no LLM call, scheduler slot or token budget."""
+    started = time.perf_counter()
+    summary = await asyncio.to_thread(extractive_summarizer.summarize, content, desired_length)
+    logger.info(f"Extractive summary of {len(content)} chars in {(time.perf_counter() - started) * 1000:.1f}ms")
+    return summary
+
 # --- API ENDPOINTS ---
 
 @app.get("/")
@@ -142,12 +386,14 @@ def home():
     }
 
 @app.post("/api/ai/trends", response_model=APIResponse)
-async def get_trends(request: TrendRequest):
+async def get_trends(request: TrendRequest, http_request: Request):
     """Get trending topics for a given subject."""
+    client_id = get_client_id(http_request)
+    enforce_token_budget(client_id)
     try:
         logger.info(f"Getting trends for topic: {request.topic}")
         
-        result = execute_trend_discovery(request.topic)
+        result = await run_scheduled("discover_trends", client_id, execute_trend_discovery, request.topic)
         
         return APIResponse(
             success=True,
@@ -155,6 +401,8 @@ async def get_trends(request: TrendRequest):
             message=f"Successfully retrieved trends for '{request.topic}'"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting trends: {str(e)}")
         raise HTTPException(
@@ -163,19 +411,28 @@ async def get_trends(request: TrendRequest):
         )
 
 @app.post("/api/ai/summarize", response_model=APIResponse)
-async def summarize_content(request: SummarizeRequest):
+async def summarize_content(request: SummarizeRequest, http_request: Request):
     """Summarize blog content."""
+    mode = check_summary_mode(request.mode)
+    client_id = get_client_id(http_request)
+    if mode == "llm":
+        enforce_token_budget(client_id)
     try:
-        logger.info(f"Summarizing content of length: {len(request.content)}")
+        logger.info(f"Summarizing content of length: {len(request.content)} ({mode})")
         
-        result = execute_content_summary(request.content, request.desired_length)
+        if mode == "extractive":
+            result = await run_extractive_summary(request.content, request.desired_length)
+        else:
+            result = await run_scheduled("summarize", client_id, execute_content_summary, request.content, request.desired_length)
         
         return APIResponse(
             success=True,
-            data={"summary": str(result)},
+            data={"summary": str(result), "mode": mode},
             message="Content summarized successfully"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error summarizing content: {str(e)}")
         raise HTTPException(
@@ -184,19 +441,36 @@ async def summarize_content(request: SummarizeRequest):
         )
 
 @app.post("/api/ai/edit", response_model=APIResponse)
-async def edit_post(request: EditPostRequest):
+async def edit_post(request: EditPostRequest, http_request: Request):
     """Edit blog post content based on instructions."""
+    mode = check_edit_mode(request.mode)
+    client_id = get_client_id(http_request)
+    enforce_token_budget(client_id)
     try:
-        logger.info(f"Editing post with goal: {request.editing_goal}")
+        logger.info(f"Editing post with goal: {request.editing_goal} ({mode})")
         
-        result = execute_post_editing(request.draft_content, request.editing_goal)
+        if mode == "paragraphs":
+            result = await run_scheduled("edit", client_id, execute_paragraph_editing, request.draft_content, request.editing_goal)
+            data = {
+                "edited_content": result.text,
+                "mode": mode,
+                "changes": result.changes,
+                "paragraphs": result.paragraphs,
+                "paragraphs_edited": result.paragraphs_edited,
+                "paragraphs_reused": result.paragraphs_reused
+            }
+        else:
+            result = await run_scheduled("edit", client_id, execute_post_editing, request.draft_content, request.editing_goal)
+            data = {"edited_content": str(result), "mode": mode}
         
         return APIResponse(
             success=True,
-            data={"edited_content": str(result)},
+            data=data,
             message="Post edited successfully"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error editing post: {str(e)}")
         raise HTTPException(
@@ -205,12 +479,17 @@ async def edit_post(request: EditPostRequest):
         )
 
 @app.post("/api/ai/generate", response_model=APIResponse)
-async def generate_blog(request: GenerateBlogRequest):
+async def generate_blog(request: GenerateBlogRequest, http_request: Request):
     """Generate a new blog post draft."""
+    client_id = get_client_id(http_request)
+    enforce_token_budget(client_id)
     try:
         logger.info(f"Generating blog for topic: {request.topic}")
         
-        result = execute_blog_generation(
+        result = await run_scheduled(
+            "generate",
+            client_id,
+            execute_blog_generation,
             request.topic,
             request.keywords,
             request.target_audience
@@ -222,6 +501,8 @@ async def generate_blog(request: GenerateBlogRequest):
             message="Blog post generated successfully"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error generating blog: {str(e)}")
         raise HTTPException(
@@ -230,40 +511,25 @@ async def generate_blog(request: GenerateBlogRequest):
         )
 
 @app.post("/api/ai/chat", response_model=APIResponse)
-async def chat_with_ai(request: ChatRequest):
+async def chat_with_ai(request: ChatRequest, http_request: Request):
     """Chat with AI assistant (scoped to blog content)."""
+    session_id = DEFAULT_SESSION_ID  # In production, get from auth token or session
+    client_id = get_client_id(http_request)
+    enforce_token_budget(client_id, session_id)
     try:
-        session_id = "default"  # In production, get from auth token or session
         logger.info(f"Processing chat message: {request.message[:50]}...")
         
-        # Get chat history
-        session = get_or_create_session(session_id)
-        chat_history = format_chat_history(session)
-        
-        # Get relevant context from RAG system
-        retrieved_context = rag_system.get_context_for_chat(request.message)
-        
-        # Execute chat response
-        result = execute_chat_response(
-            chat_history=chat_history,
-            retrieved_context=retrieved_context,
-            user_question=request.message
-        )
-        
-        ai_response = str(result)
-        
-        # Add to session
-        add_to_session(session_id, request.message, ai_response)
+        chat = await run_chat(request.message, session_id, client_id)
         
         return APIResponse(
             success=True,
-            data={
-                "response": ai_response,
-                "context_used": len(retrieved_context) > 50  # Indicate if context was found
-            },
-            message="Chat response generated successfully"
+            data=chat,
+            message="Degraded chat response served from the knowledge base" if chat.get("degraded", False)
+            else "Chat response generated successfully"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in chat: {str(e)}")
         raise HTTPException(
@@ -272,13 +538,18 @@ async def chat_with_ai(request: ChatRequest):
         )
 
 @app.post("/api/ai/trend-write", response_model=APIResponse)
-async def trend_based_writing(request: TrendBasedWritingRequest):
+async def trend_based_writing(request: TrendBasedWritingRequest, http_request: Request):
     """Research trends and write a blog post based on a trending topic."""
+    client_id = get_client_id(http_request)
+    enforce_token_budget(client_id)
     try:
         logger.info(f"Processing trend-based writing for: {request.trend_topic}")
         
         # Execute trend-based writing (research + write in one step)
-        result = execute_trend_based_writing(
+        result = await run_scheduled(
+            "trend_based_write",
+            client_id,
+            execute_trend_based_writing,
             trend_topic=request.trend_topic,
             target_audience=request.target_audience,
             post_length=request.post_length
@@ -297,6 +568,8 @@ async def trend_based_writing(request: TrendBasedWritingRequest):
             message="Trend-based blog post generated successfully"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in trend-based writing: {str(e)}")
         raise HTTPException(
@@ -306,83 +579,150 @@ async def trend_based_writing(request: TrendBasedWritingRequest):
 
 # --- UNIFIED INVOKE ENDPOINT ---
 
-@app.post("/api/v1/invoke", response_model=InvokeResponse)
-async def unified_invoke(request: InvokeRequest):
-    """Unified AI endpoint that routes to different AI functions based on action."""
+async def run_invoke_action(action: str, payload: InvokePayload, conversation_id: str, client_id: str) -> Dict[str, Any]:
+    """Run one action of the unified endpoint (or one pipeline step) and record its token usage."""
+    if action == "chat":
+        if not payload.question:
+            raise HTTPException(status_code=400, detail="Question is required for chat action")
+        
+        # Chat history is kept per conversation (simplified - in production use proper session storage)
+        chat = await run_chat(payload.question, conversation_id, client_id)
+        return {"response": chat["response"], "degraded": chat.get("degraded", False)}
+        
+    elif action == "discover_trends":
+        if not payload.topic:
+            raise HTTPException(status_code=400, detail="Topic is required for discover_trends action")
+        
+        result = await run_scheduled("discover_trends", client_id, execute_trend_discovery, payload.topic,
+                                     conversation_id=conversation_id)
+        
+    elif action == "trend_based_write":
+        if not payload.topic:
+            raise HTTPException(status_code=400, detail="Topic is required for trend_based_write action")
+        
+        result = await run_scheduled(
+            "trend_based_write",
+            client_id,
+            execute_trend_based_writing,
+            trend_topic=payload.topic,
+            target_audience="general readers",
+            post_length="medium-length",
+            conversation_id=conversation_id
+        )
+        
+    elif action == "summarize":
+        if not payload.content_to_summarize:
+            raise HTTPException(status_code=400, detail="Content is required for summarize action")
+        
+        if check_summary_mode(payload.mode) == "extractive":
+            summary = await run_extractive_summary(payload.content_to_summarize, "one paragraph")
+            return {"response": summary, "degraded": False}
+        
+        result = await run_scheduled(
+            "summarize",
+            client_id,
+            execute_content_summary,
+            payload.content_to_summarize,
+            "one paragraph",
+            conversation_id=conversation_id
+        )
+        
+    elif action == "edit":
+        if not payload.editing_goal or not payload.draft_content:
+            raise HTTPException(status_code=400, detail="Both editing_goal and draft_content are required for edit action")
+        
+        result = await run_scheduled(
+            "edit",
+            client_id,
+            execute_paragraph_editing if check_edit_mode(payload.mode) == "paragraphs" else execute_post_editing,
+            payload.draft_content,
+            payload.editing_goal,
+            conversation_id=conversation_id
+        )
+        
+    else:
+        raise HTTPException(status_code=400, detail=f"Unknown action: {action}")
+    
+    return {"response": str(result), "degraded": False}
+
+# action="pipeline" streams NDJSON events instead of returning an InvokeResponse
+PIPELINE_STREAM_RESPONSE = {
+    200: {
+        "description": "InvokeResponse, or for action=\"pipeline\" an NDJSON stream with one line per finished "
+                       "step ({step, action, status, elapsed_ms, response or error}) and a final "
+                       "{status: \"done\", conversation_id, completed, failed, skipped, elapsed_ms} line",
+        "content": {
+            "application/x-ndjson": {
+                "schema": {"type": "string"},
+                "example": '{"step": "draft", "action": "trend_based_write", "status": "completed", '
+                           '"elapsed_ms": 5120.4, "response": "..."}\n'
+                           '{"status": "done", "conversation_id": "conv_1", "completed": 1, "failed": 0, '
+                           '"skipped": 0, "elapsed_ms": 5121.0}\n'
+            }
+        }
+    }
+}
+
+def stream_pipeline(steps: List[PipelineStep], conversation_id: str, client_id: str) -> StreamingResponse:
+    """
+    Run a pipeline of actions server-side, streaming one JSON line per finished step
+    and a final summary line.
+    """
+    definition = [step.model_dump(exclude_none=True) for step in steps or []]
+    max_steps = int(os.getenv("PIPELINE_MAX_STEPS", "8"))
+    try:
+        validate_pipeline(definition, max_steps)
+    except PipelineError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    for step in definition:
+        unknown_fields = set(step.get("inputs") or {}) - set(InvokePayload.model_fields)
+        if unknown_fields:
+            raise HTTPException(status_code=400, detail=f"Step {step['id']}: unknown input fields: {', '.join(sorted(unknown_fields))}")
+    
+    async def run_step(step: Dict[str, Any], payload: Dict[str, Any]) -> str:
+        result = await run_invoke_action(step["action"], InvokePayload(**payload), conversation_id, client_id)
+        return result["response"]
+    
+    async def events():
+        started = time.perf_counter()
+        statuses = {"completed": 0, "failed": 0, "skipped": 0}
+        async for event in run_pipeline(definition, run_step, max_steps):
+            statuses[event["status"]] += 1
+            yield json.dumps(event) + "\n"
+        yield json.dumps({
+            "status": "done",
+            "conversation_id": conversation_id,
+            **statuses,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+        }) + "\n"
+    
+    logger.info(f"Running pipeline of {len(definition)} steps for conversation: {conversation_id}")
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+@app.post("/api/v1/invoke", response_model=InvokeResponse, responses=PIPELINE_STREAM_RESPONSE)
+async def unified_invoke(request: InvokeRequest, http_request: Request):
+    """
+    Unified AI endpoint that routes to different AI functions based on action.
+    action="pipeline" runs `steps` server-side and streams each step's result (NDJSON).
+    """
     try:
         # Generate or use existing conversation ID
         conversation_id = request.conversation_id or f"conv_{datetime.now().timestamp()}"
+        client_id = get_client_id(http_request)
+        enforce_token_budget(client_id, conversation_id)
         
         logger.info(f"Processing action: {request.action} for conversation: {conversation_id}")
         
+        if request.action == "pipeline":
+            return stream_pipeline(request.steps, conversation_id, client_id)
+        
         # Route to appropriate function based on action
-        if request.action == "chat":
-            if not request.payload.question:
-                raise HTTPException(status_code=400, detail="Question is required for chat action")
-            
-            # Get chat history for this conversation (simplified - in production use proper session storage)
-            session = get_or_create_session(conversation_id)
-            chat_history = format_chat_history(session)
-            
-            # Get relevant context from RAG system
-            retrieved_context = rag_system.get_context_for_chat(request.payload.question)
-            
-            # Execute chat response
-            result = execute_chat_response(
-                chat_history=chat_history,
-                retrieved_context=retrieved_context,
-                user_question=request.payload.question
-            )
-            
-            # Add to session
-            add_to_session(conversation_id, request.payload.question, str(result))
-            
-            response_text = str(result)
-            
-        elif request.action == "discover_trends":
-            if not request.payload.topic:
-                raise HTTPException(status_code=400, detail="Topic is required for discover_trends action")
-            
-            result = execute_trend_discovery(request.payload.topic)
-            response_text = str(result)
-            
-        elif request.action == "trend_based_write":
-            if not request.payload.topic:
-                raise HTTPException(status_code=400, detail="Topic is required for trend_based_write action")
-            
-            result = execute_trend_based_writing(
-                trend_topic=request.payload.topic,
-                target_audience="general readers",
-                post_length="medium-length"
-            )
-            response_text = str(result)
-            
-        elif request.action == "summarize":
-            if not request.payload.content_to_summarize:
-                raise HTTPException(status_code=400, detail="Content is required for summarize action")
-            
-            result = execute_content_summary(
-                request.payload.content_to_summarize,
-                "one paragraph"
-            )
-            response_text = str(result)
-            
-        elif request.action == "edit":
-            if not request.payload.editing_goal or not request.payload.draft_content:
-                raise HTTPException(status_code=400, detail="Both editing_goal and draft_content are required for edit action")
-            
-            result = execute_post_editing(
-                request.payload.draft_content,
-                request.payload.editing_goal
-            )
-            response_text = str(result)
-            
-        else:
-            raise HTTPException(status_code=400, detail=f"Unknown action: {request.action}")
+        result = await run_invoke_action(request.action, request.payload, conversation_id, client_id)
         
         return InvokeResponse(
-            response=response_text,
-            conversation_id=conversation_id
+            response=result["response"],
+            conversation_id=conversation_id,
+            degraded=result["degraded"]
         )
         
     except HTTPException:
@@ -396,6 +736,59 @@ async def unified_invoke(request: InvokeRequest):
 
 # --- BLOG POST MANAGEMENT ENDPOINTS ---
 
+def verify_webhook_signature(body: bytes, signature: Optional[str]):
+    """Check the X-Webhook-Signature header (sha256=<HMAC of the body>) when INGEST_WEBHOOK_SECRET is set."""
+    secret = os.getenv("INGEST_WEBHOOK_SECRET")
+    if not secret:
+        return
+    expected = "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    if not signature or not hmac.compare_digest(expected, signature):
+        raise HTTPException(status_code=401, detail="Invalid webhook signature")
+
+def parse_timestamp(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        logger.warning(f"Ignoring invalid webhook timestamp: {value}")
+        return None
+
+@app.post("/api/ai/webhooks/posts", response_model=APIResponse, status_code=202)
+async def post_webhook(event: PostWebhookEvent, http_request: Request):
+    """
+    Receive a post create/update/delete event from the blog backend.
+    Events are queued and coalesced per post; the latest state is applied to the
+    knowledge base once the post has been quiet for the debounce window.
+    """
+    verify_webhook_signature(await http_request.body(), http_request.headers.get("x-webhook-signature"))
+    if event.event not in INGEST_EVENTS:
+        raise HTTPException(status_code=400, detail=f"Unknown event: {event.event} (expected one of {', '.join(INGEST_EVENTS)})")
+    if event.event != "deleted" and not (event.title and event.content and event.author):
+        raise HTTPException(status_code=400, detail="title, content and author are required for created and updated events")
+    
+    try:
+        payload = None
+        if event.event != "deleted":
+            payload = {"title": event.title, "content": event.content, "author": event.author,
+                       "tags": event.tags, "metadata": event.metadata}
+        queued = await asyncio.to_thread(
+            ingest_queue.enqueue, event.event, event.post_id, payload, parse_timestamp(event.updated_at)
+        )
+        
+        return APIResponse(
+            success=True,
+            data={"post_id": event.post_id, "queued": queued},
+            message="Event queued" if queued else "Event is older than the pending one and was ignored"
+        )
+        
+    except Exception as e:
+        logger.error(f"Error queueing post event: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to queue post event: {str(e)}"
+        )
+
 @app.post("/api/ai/blog-posts", response_model=APIResponse)
 async def add_blog_post(request: BlogPostData):
     """Add a blog post to the knowledge base."""
@@ -430,6 +823,67 @@ async def add_blog_post(request: BlogPostData):
             detail=f"Failed to add blog post: {str(e)}"
         )
 
+@app.put("/api/ai/blog-posts/{post_id}", response_model=APIResponse)
+async def upsert_blog_post(post_id: str, request: BlogPostData):
+    """Create or update a blog post, re-embedding only if its text changed."""
+    try:
+        if request.post_id != post_id:
+            raise HTTPException(
+                status_code=400,
+                detail="post_id in the body does not match the URL"
+            )
+        
+        status = await asyncio.to_thread(
+            rag_system.upsert_blog_post,
+            post_id=post_id,
+            title=request.title,
+            content=request.content,
+            author=request.author,
+            tags=request.tags,
+            metadata=request.metadata
+        )
+        
+        return APIResponse(
+            success=True,
+            data={"post_id": post_id, "status": status},
+            message=f"Blog post {status.replace('_', ' ')}"
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error upserting blog post {post_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to upsert blog post: {str(e)}"
+        )
+
+@app.post("/api/ai/blog-posts/batch", response_model=APIResponse)
+async def upsert_blog_posts(request: BlogPostBatchRequest):
+    """Create or update many blog posts; only new or changed text is embedded."""
+    try:
+        statuses = await asyncio.to_thread(
+            rag_system.upsert_blog_posts,
+            [post.model_dump() for post in request.posts]
+        )
+        
+        counts = {}
+        for status in statuses.values():
+            counts[status] = counts.get(status, 0) + 1
+        
+        return APIResponse(
+            success=True,
+            data={"statuses": statuses, "counts": counts},
+            message=f"Upserted {len(statuses)} blog posts"
+        )
+        
+    except Exception as e:
+        logger.error(f"Error upserting blog posts: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to upsert blog posts: {str(e)}"
+        )
+
 @app.get("/api/ai/blog-posts", response_model=APIResponse)
 async def get_all_blog_posts():
     """Get all blog posts metadata from knowledge base."""
@@ -449,6 +903,36 @@ async def get_all_blog_posts():
             detail=f"Failed to get blog posts: {str(e)}"
         )
 
+@app.get("/api/ai/blog-posts/duplicates", response_model=APIResponse)
+async def get_duplicate_posts(threshold: Optional[float] = None):
+    """Report groups of near-duplicate posts in the knowledge base."""
+    try:
+        if rag_system.duplicate_detector is None:
+            raise HTTPException(
+                status_code=400,
+                detail="Duplicate detection is disabled (DEDUP_MODE=off)"
+            )
+        
+        clusters = await asyncio.to_thread(rag_system.find_duplicate_posts, threshold)
+        
+        return APIResponse(
+            success=True,
+            data={
+                "clusters": clusters,
+                "duplicate_posts": sum(len(cluster["post_ids"]) - 1 for cluster in clusters)
+            },
+            message=f"Found {len(clusters)} groups of near-duplicate posts"
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error finding duplicate posts: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to find duplicate posts: {str(e)}"
+        )
+
 @app.get("/api/ai/blog-posts/{post_id}", response_model=APIResponse)
 async def get_blog_post(post_id: str):
     """Get a specific blog post by ID."""
@@ -476,6 +960,39 @@ async def get_blog_post(post_id: str):
             detail=f"Failed to get blog post: {str(e)}"
         )
 
+@app.get("/api/ai/blog-posts/{post_id}/related", response_model=APIResponse)
+async def get_related_posts(post_id: str, limit: Optional[int] = None):
+    """Get precomputed related posts for a blog post."""
+    try:
+        related = related_posts.get_related(post_id, limit)
+        
+        if related is None:
+            if not related_posts.ready:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Related posts are still being computed",
+                    headers={"Retry-After": "5"}
+                )
+            raise HTTPException(
+                status_code=404,
+                detail=f"Blog post {post_id} not found"
+            )
+        
+        return APIResponse(
+            success=True,
+            data={"post_id": post_id, "related": related},
+            message=f"Found {len(related)} related posts"
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting related posts for {post_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get related posts: {str(e)}"
+        )
+
 @app.delete("/api/ai/blog-posts/{post_id}", response_model=APIResponse)
 async def delete_blog_post(post_id: str):
     """Delete a blog post from knowledge base."""
@@ -518,7 +1035,8 @@ async def health_check():
             "components": {
                 "rag_system": "operational",
                 "vector_store": "operational",
-                "knowledge_base_posts": posts_count
+                "knowledge_base_posts": posts_count,
+                "providers": get_all_policy_stats()
             },
             "version": "1.0.0"
         }
@@ -543,7 +1061,22 @@ async def get_stats():
             data={
                 "knowledge_base_posts": posts_count,
                 "active_chat_sessions": sessions_count,
-                "total_exchanges": sum(len(session) for session in chat_sessions.values())
+                "total_exchanges": sum(len(session) for session in chat_sessions.values()),
+                "scheduler": scheduler.stats(),
+                "embedding_batcher": rag_system.embedding_batcher.stats(),
+                "vector_index": rag_system.index_stats(),
+                "related_posts": related_posts.stats(),
+                "reranker": rag_system.reranking_stage.stats() if rag_system.reranking_stage else None,
+                "intent_gate": intent_gate.stats() if intent_gate else None,
+                "degraded_mode": degraded_mode.stats(),
+                "map_reduce_summaries": map_reduce_summarizer.stats(),
+                "paragraph_edits": paragraph_editor.stats(),
+                "ingest_queue": ingest_queue.stats(),
+                "trend_research": trend_researcher.stats(),
+                "executor_pools": executor_pool_stats(),
+                "logging": log_pipeline.stats(),
+                "agent_traces": trace_store.stats(),
+                "result_cache": get_result_cache().stats()
             },
             message="Statistics retrieved successfully"
         )
@@ -555,6 +1088,74 @@ async def get_stats():
             detail=f"Failed to get stats: {str(e)}"
         )
 
+@app.get("/api/ai/usage", response_model=APIResponse)
+async def get_usage(group_by: str = "action", since_hours: Optional[float] = None):
+    """Get aggregated token usage grouped by action, conversation_id, client_id or model."""
+    try:
+        since = time.time() - since_hours * 3600 if since_hours else None
+        usage = await asyncio.to_thread(usage_ledger.summarize, group_by=group_by, since=since)
+        
+        return APIResponse(
+            success=True,
+            data={
+                "group_by": group_by,
+                "usage": usage,
+                "total_tokens": sum(row["total_tokens"] for row in usage)
+            },
+            message="Token usage retrieved successfully"
+        )
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error getting usage: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get usage: {str(e)}"
+        )
+
+@app.get("/api/ai/usage/conversations/{conversation_id}", response_model=APIResponse)
+async def get_conversation_usage(conversation_id: str, limit: int = 100):
+    """Get token usage for a single conversation."""
+    try:
+        usage = await asyncio.to_thread(usage_ledger.get_conversation_usage, conversation_id, limit=limit)
+        
+        return APIResponse(
+            success=True,
+            data=usage,
+            message=f"Token usage for conversation {conversation_id} retrieved successfully"
+        )
+        
+    except Exception as e:
+        logger.error(f"Error getting usage for conversation {conversation_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get conversation usage: {str(e)}"
+        )
+
+@app.get("/api/ai/traces/{request_id}", response_model=APIResponse)
+async def get_request_traces(request_id: str):
+    """Get the sampled agent transcripts of a request (see the X-Request-ID response header)."""
+    try:
+        traces = await asyncio.to_thread(trace_store.get, request_id)
+        if not traces:
+            raise HTTPException(status_code=404, detail=f"No transcripts saved for request {request_id}")
+        
+        return APIResponse(
+            success=True,
+            data={"request_id": request_id, "traces": traces},
+            message=f"Transcripts for request {request_id} retrieved successfully"
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting transcripts for request {request_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to get transcripts: {str(e)}"
+        )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
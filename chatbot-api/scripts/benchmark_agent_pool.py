@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark for pooled crew executors.
+Compares building a Task and Crew per call (the previous approach) with checking
+out a pre-built executor from an ExecutorPool, for each task in tasks.yaml. The
+agents use an instant local LLM, so only CrewAI's own overhead is measured; no
+API calls are made.
+
+Usage: python scripts/benchmark_agent_pool.py [runs] [threads]
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("CREWAI_TRACING_ENABLED", "false")
+
+import yaml
+from crewai import Agent, Crew, Task
+from crewai.llms.base_llm import BaseLLM
+
+from ai.agent_pool import ExecutorPool
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ai", "config")
+SAMPLE_INPUTS = {
+    "topic": "remote work", "current_date": "2025-01-01", "original_content": "A post. " * 200,
+    "desired_length": "one paragraph", "section": "A section. " * 100, "section_number": 1, "section_count": 3,
+    "section_summaries": "Section 1: a summary.", "draft_content": "A draft. " * 200, "editing_goal": "be concise",
+    "draft_context": "An opening.", "paragraph": "A paragraph. " * 20, "keywords": "remote, work",
+    "target_audience": "general readers", "chat_history": "", "retrieved_context": "Some context.",
+    "user_question": "What is new?", "trend_topic": "remote work", "post_length": "short",
+    "research_brief": "- A result.",
+}
+
+class InstantLLM(BaseLLM):
+    """Answers immediately, so timings show framework overhead only."""
+
+    def call(self, messages, *args, **kwargs):
+        return "Final Answer: done"
+
+    def supports_function_calling(self) -> bool:
+        return False
+
+    def supports_stop_words(self) -> bool:
+        return True
+
+    def get_context_window_size(self) -> int:
+        return 32000
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    return latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99)]
+
+def per_call(agent, task_config, inputs, run: bool):
+    started = time.perf_counter()
+    task = Task(description=task_config["description"].format(**inputs),
+                expected_output=task_config["expected_output"], agent=agent)
+    crew = Crew(agents=[agent], tasks=[task])
+    if run:
+        crew.kickoff()
+    return (time.perf_counter() - started) * 1000
+
+def attempt(function, *args) -> bool:
+    try:
+        function(*args)
+        return True
+    except Exception:
+        return False
+
+def pooled(pool, inputs, run: bool):
+    started = time.perf_counter()
+    with pool.checkout() as executor:
+        if run:
+            executor.run(**inputs)
+    return (time.perf_counter() - started) * 1000
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    with open(os.path.join(CONFIG_DIR, "tasks.yaml")) as f:
+        tasks_config = yaml.safe_load(f)
+
+    agent = Agent(llm=InstantLLM(model="instant"), role="Benchmark agent", goal="Answer",
+                  backstory="Answers immediately.", tools=[], verbose=False, allow_delegation=False)
+
+    print("=== Agent Pool Benchmark ===")
+    print(f"Runs per task: {runs}, concurrent threads: {threads}")
+    print()
+
+    for name, task_config in tasks_config.items():
+        inputs = {key: SAMPLE_INPUTS[key] for key in SAMPLE_INPUTS if "{" + key + "}" in task_config["description"]}
+        started = time.perf_counter()
+        pool = ExecutorPool(name, agent, task_config, size=threads)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        construct = percentiles([per_call(agent, task_config, inputs, run=False) for _ in range(runs)])
+        checkout = percentiles([pooled(pool, inputs, run=False) for _ in range(runs)])
+        before = percentiles([per_call(agent, task_config, inputs, run=True) for _ in range(runs)])
+        after = percentiles([pooled(pool, inputs, run=True) for _ in range(runs)])
+        print(f"{name} (pool of {threads} built in {build_ms:.1f}ms):")
+        print(f"   setup per call:  construct p50={construct[0]:.3f}ms p99={construct[1]:.3f}ms | "
+              f"checkout p50={checkout[0]:.3f}ms p99={checkout[1]:.3f}ms")
+        print(f"   end to end:      construct p50={before[0]:.2f}ms p99={before[1]:.2f}ms | "
+              f"pooled p50={after[0]:.2f}ms p99={after[1]:.2f}ms")
+
+    # Concurrent callers: per-call construction shares one agent between threads
+    # (CrewAI rejects overlapping runs of one agent), the pool gives each thread its own
+    name, task_config = "summarize_content", tasks_config["summarize_content"]
+    inputs = {"original_content": SAMPLE_INPUTS["original_content"], "desired_length": "one paragraph"}
+    pool = ExecutorPool(name, agent, task_config, size=threads)
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        started = time.perf_counter()
+        before_ok = sum(executor.map(lambda _: attempt(per_call, agent, task_config, inputs, True), range(runs)))
+        before_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        after_ok = sum(executor.map(lambda _: attempt(pooled, pool, inputs, True), range(runs)))
+        after_seconds = time.perf_counter() - started
+    print()
+    print(f"{name} with {threads} threads:")
+    print(f"   shared agent: {before_ok / before_seconds:.0f} calls/s, {runs - before_ok} of {runs} failed")
+    print(f"   pooled:       {after_ok / after_seconds:.0f} calls/s, {runs - after_ok} of {runs} failed")
+    print(f"   pool: {pool.stats()}")
+    print()
+    print("=== Benchmark Complete ===")
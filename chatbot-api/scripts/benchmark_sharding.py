@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the sharded knowledge base.
+Compares one Chroma collection with hash-sharded ones (ai/sharding.py) on
+concurrent write throughput, fan-out query latency and recall@k of the merged
+top-k against exact search. Uses random vectors, so no embedding calls are
+made.
+
+Usage: python scripts/benchmark_sharding.py [num_vectors] [dim]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chromadb
+import numpy as np
+
+from ai.sharding import HashSharding, ShardedCollection
+
+SHARD_COUNTS = (1, 2, 4, 8)
+WRITERS = 4
+BATCH_SIZE = 100
+NUM_QUERIES = 200
+TOP_K = 5
+
+def make_vectors(count: int, dim: int, seed: int) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def open_store(path: str, shards: int):
+    client = chromadb.PersistentClient(path=path)
+    if shards == 1:
+        return client.get_or_create_collection("blog_posts", embedding_function=None)
+    return ShardedCollection(
+        "blog_posts", HashSharding(shards),
+        open_shard=lambda name: client.get_or_create_collection(name, embedding_function=None),
+        shard_names=lambda: [collection.name for collection in client.list_collections()],
+        drop_shard=client.delete_collection,
+        max_workers=shards,
+    )
+
+def write(collection, vectors: np.ndarray) -> float:
+    """Concurrent batched writes, as from several API workers; returns posts per second."""
+    batches = [list(range(start, min(start + BATCH_SIZE, len(vectors)))) for start in range(0, len(vectors), BATCH_SIZE)]
+
+    def write_batch(batch):
+        collection.add(ids=[f"post-{i}" for i in batch],
+                       documents=[f"Title: Post {i}\n\nContent: benchmark document {i}" for i in batch],
+                       metadatas=[{"post_id": f"post-{i}", "title": f"Post {i}"} for i in batch],
+                       embeddings=vectors[batch])
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=WRITERS) as executor:
+        list(executor.map(write_batch, batches))
+    return len(vectors) / (time.perf_counter() - started)
+
+def query(collection, queries: np.ndarray):
+    """Query latencies (ms) and the top-k ids of every query."""
+    latencies, results = [], []
+    for q in queries:
+        started = time.perf_counter()
+        result = collection.query(query_embeddings=[q], n_results=TOP_K, include=["distances"])
+        latencies.append((time.perf_counter() - started) * 1000)
+        results.append(result["ids"][0])
+    return latencies, results
+
+if __name__ == "__main__":
+    num_vectors = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 384
+    vectors = make_vectors(num_vectors, dim, seed=0)
+    queries = make_vectors(NUM_QUERIES, dim, seed=1)
+
+    print("=== Knowledge Base Sharding Benchmark ===")
+    print(f"Vectors: {num_vectors} x {dim}, {WRITERS} concurrent writers, {NUM_QUERIES} queries, top-{TOP_K}")
+    print()
+    print(f"{'shards':>6} {'writes/s':>9} {'p50 ms':>7} {'p99 ms':>7} {'recall':>8}")
+
+    # Exact top-k (vectors are normalized, so the nearest by L2 have the highest dot product)
+    exact = [set(f"post-{i}" for i in np.argsort(-(vectors @ q))[:TOP_K]) for q in queries]
+    with tempfile.TemporaryDirectory() as workdir:
+        for shards in SHARD_COUNTS:
+            collection = open_store(os.path.join(workdir, f"shards-{shards}"), shards)
+            throughput = write(collection, vectors)
+            query(collection, queries[:10])  # Warm up
+            latencies, results = query(collection, queries)
+            recall = np.mean([len(truth.intersection(ids)) / TOP_K for truth, ids in zip(exact, results)])
+            print(f"{shards:>6} {throughput:>9.0f} {np.percentile(latencies, 50):>7.2f} "
+                  f"{np.percentile(latencies, 99):>7.2f} {recall:>8.3f}")
+
+    print()
+    print("=== Benchmark Complete ===")
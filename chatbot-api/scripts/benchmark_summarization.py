@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark for summarization modes.
+Measures the local extractive summarizer (TF-IDF TextRank) on posts of several
+sizes and, when GOOGLE_API_KEY is set, the LLM summarizer agent on the same
+posts, reporting latency and the unigram overlap between the two summaries.
+
+Usage: python scripts/benchmark_summarization.py [runs] [--llm]
+"""
+
+import os
+import sys
+import random
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.extractive import ExtractiveSummarizer
+from ai.rerank import tokenize
+
+SUBJECTS = ["React hooks", "Our travel photography kit", "Remote work", "Sourdough baking",
+            "The new database index", "Marathon training", "Static site generators", "Budget travel"]
+CLAIMS = [
+    "{s} changed how we approach the problem.",
+    "Most readers asked how {s} fits into a normal week.",
+    "The biggest lesson from {s} is that small habits compound.",
+    "We measured {s} for three months before drawing conclusions.",
+    "Critics argue that {s} is overrated, but the numbers say otherwise.",
+    "In practice, {s} works best when you start with a clear goal.",
+    "A common mistake with {s} is trying to do everything at once.",
+    "The cost of {s} dropped sharply after the first month.",
+]
+LENGTHS = ["three bullet points", "one paragraph", "2 sentences"]
+
+def make_post(num_chars: int, seed: int) -> str:
+    rng = random.Random(seed)
+    subject = rng.choice(SUBJECTS)
+    paragraphs, size = [], 0
+    while size < num_chars:
+        paragraph = " ".join(rng.choice(CLAIMS).format(s=rng.choice([subject, rng.choice(SUBJECTS)]))
+                             for _ in range(rng.randint(3, 6)))
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+def overlap(candidate: str, reference: str) -> float:
+    """Share of the reference's distinct terms that appear in the candidate (ROUGE-1 recall, roughly)."""
+    reference_terms = set(tokenize(reference))
+    return len(reference_terms & set(tokenize(candidate))) / len(reference_terms) if reference_terms else 0.0
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return str(result), (time.perf_counter() - started) * 1000
+
+if __name__ == "__main__":
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 50
+    run_llm = "--llm" in sys.argv or bool(os.getenv("GOOGLE_API_KEY"))
+    summarizer = ExtractiveSummarizer()
+
+    print("=== Summarization Benchmark ===")
+    print(f"Extractive runs per size: {runs}, LLM path: {'on' if run_llm else 'off (set GOOGLE_API_KEY)'}")
+    print()
+
+    for num_chars in (2000, 10000, 50000):
+        posts = [make_post(num_chars, seed) for seed in range(runs)]
+        latencies = sorted(timed(summarizer.summarize, post, LENGTHS[i % len(LENGTHS)])[1]
+                           for i, post in enumerate(posts))
+        print(f"~{num_chars} chars:")
+        print(f"   extractive: p50={latencies[len(latencies) // 2]:.2f}ms "
+              f"p99={latencies[int(len(latencies) * 0.99)]:.2f}ms")
+
+        if run_llm:
+            from ai.crew import execute_content_summary
+            llm_summary, llm_ms = timed(execute_content_summary, posts[0], "one paragraph")
+            extractive_summary, extractive_ms = timed(summarizer.summarize, posts[0], "one paragraph")
+            print(f"   llm: {llm_ms:.0f}ms ({llm_ms / max(extractive_ms, 1e-3):.0f}x the extractive time)")
+            print(f"   term overlap with the LLM summary: {overlap(extractive_summary, llm_summary):.2f}")
+        print()
+
+    sample = make_post(2000, seed=0)
+    print("Sample (three bullet points):")
+    print(summarizer.summarize(sample, "three bullet points"))
+    print()
+    print("=== Benchmark Complete ===")
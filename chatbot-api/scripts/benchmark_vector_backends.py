@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the vector store backends.
+Compares the Chroma PersistentClient path with the memory-mapped flat index
+(float16 and int8) on startup time, resident memory and query latency.
+Each backend is opened in a fresh process so startup and RSS are measured cold.
+
+Usage: python scripts/benchmark_vector_backends.py [num_vectors] [dim]
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+NUM_QUERIES = 200
+TOP_K = 5
+
+def rss_mb() -> float:
+    """Resident set size of this process in MB (Linux)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def make_vectors(count: int, dim: int, seed: int) -> np.ndarray:
+    vectors = np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def open_collection(backend: str, path: str):
+    if backend == "chroma":
+        import chromadb
+        return chromadb.PersistentClient(path=path).get_collection("blog_posts")
+    from ai.flat_index import FlatCollection
+    return FlatCollection(path, name="blog_posts", dtype=backend.split("-")[1])
+
+def build(backend: str, path: str, vectors: np.ndarray):
+    ids = [f"post-{i}" for i in range(len(vectors))]
+    documents = [f"Title: Post {i}\n\nContent: benchmark document {i}" for i in range(len(vectors))]
+    metadatas = [{"post_id": ids[i], "title": f"Post {i}"} for i in range(len(vectors))]
+
+    started = time.perf_counter()
+    if backend == "chroma":
+        import chromadb
+        collection = chromadb.PersistentClient(path=path).get_or_create_collection("blog_posts", embedding_function=None)
+        for start in range(0, len(vectors), 1000):
+            end = start + 1000
+            collection.add(ids=ids[start:end], documents=documents[start:end],
+                           metadatas=metadatas[start:end], embeddings=vectors[start:end])
+    else:
+        from ai.flat_index import FlatCollection
+        FlatCollection(path, name="blog_posts", dtype=backend.split("-")[1]).add(
+            ids=ids, documents=documents, metadatas=metadatas, embeddings=vectors)
+    return time.perf_counter() - started
+
+def measure(backend: str, path: str, dim: int) -> dict:
+    """Runs in a child process: open the store and query it."""
+    baseline_rss = rss_mb()
+    started = time.perf_counter()
+    collection = open_collection(backend, path)
+    queries = make_vectors(NUM_QUERIES, dim, seed=1)
+    collection.query(query_embeddings=[queries[0]], n_results=TOP_K)
+    startup = time.perf_counter() - started
+
+    latencies, hits = [], []
+    for query in queries:
+        query_started = time.perf_counter()
+        result = collection.query(query_embeddings=[query], n_results=TOP_K)
+        latencies.append(time.perf_counter() - query_started)
+        hits.append(result["ids"][0])
+    latencies.sort()
+    return {
+        "startup_s": startup,
+        "rss_mb": rss_mb() - baseline_rss,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "hits": hits,
+    }
+
+def exact_hits(vectors: np.ndarray, dim: int):
+    queries = make_vectors(NUM_QUERIES, dim, seed=1)
+    scores = queries @ vectors.T
+    return [[f"post-{i}" for i in np.argsort(-row)[:TOP_K]] for row in scores]
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--measure":
+        print(json.dumps(measure(sys.argv[2], sys.argv[3], int(sys.argv[4]))))
+        sys.exit(0)
+
+    num_vectors = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 768
+    vectors = make_vectors(num_vectors, dim, seed=0)
+    truth = exact_hits(vectors, dim)
+
+    print("=== Vector Backend Benchmark ===")
+    print(f"Vectors: {num_vectors} x {dim}, top-{TOP_K}, {NUM_QUERIES} queries")
+    print()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for backend in ("chroma", "flat-float16", "flat-int8"):
+            path = os.path.join(workdir, backend)
+            build_time = build(backend, path, vectors)
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), "--measure", backend, path, str(dim)],
+                                    capture_output=True, text=True, check=True).stdout
+            stats = json.loads(output.strip().splitlines()[-1])
+            recall = np.mean([len(set(got) & set(want)) / TOP_K for got, want in zip(stats["hits"], truth)])
+            size_mb = sum(os.path.getsize(os.path.join(root, name))
+                          for root, _, names in os.walk(path) for name in names) / 1024 / 1024
+
+            print(f"{backend}:")
+            print(f"   build: {build_time:.2f}s, on disk: {size_mb:.1f}MB")
+            print(f"   startup (open + first query): {stats['startup_s'] * 1000:.1f}ms")
+            print(f"   RSS added by the store: {stats['rss_mb']:.1f}MB")
+            print(f"   query latency: p50={stats['p50_ms']:.2f}ms p99={stats['p99_ms']:.2f}ms")
+            print(f"   recall@{TOP_K} vs exact: {recall:.3f}")
+            print()
+
+    print("=== Benchmark Complete ===")
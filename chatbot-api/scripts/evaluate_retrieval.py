@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Offline retrieval evaluation for BlogRAGSystem.
+Loads a labelled set of posts and queries (query -> relevant post IDs), builds
+the knowledge base once per index configuration and sweeps the retrieval
+settings we usually pick by feel:
+- k (n_results)
+- HNSW M and ef_search (ef_construction is fixed)
+- chunking: posts indexed whole, or split into sections (hits mapped back to posts)
+- hybrid: vector similarity blended with the lexical reranking stage, or vector only
+
+For every configuration it reports recall@k, MRR, p50/p99 query latency and
+estimated index memory, then the Pareto front for each k (best recall for
+the latency and memory). Runs fully offline with the local embedding model; embeddings are
+computed once and cached, so latencies reflect the index and reranking only.
+
+Dataset format (JSON):
+    {"posts": [{"post_id", "title", "content", "author", "tags"}],
+     "queries": [{"query": "...", "relevant": ["post_id", ...]}]}
+Without --dataset a synthetic labelled set is generated (--variants posts per
+subject and angle; raise it to see HNSW settings matter).
+
+Usage: python scripts/evaluate_retrieval.py [--dataset path.json] [--variants N] [--quick] [--output results.json]
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Offline, no ingest side effects, no batching wait on query embeddings
+os.environ["EMBEDDING_BACKEND"] = "local"
+os.environ["DEDUP_MODE"] = "off"
+os.environ["EMBEDDING_BATCH_MAX_WAIT_MS"] = "0"
+os.environ.pop("KB_SNAPSHOT_PATH", None)
+os.environ.setdefault("RERANKER", "lexical")
+
+import numpy as np
+
+from ai.embeddings import EMBEDDING_DIM, LocalEmbeddingFunction
+from ai.rag_system import BlogRAGSystem
+from ai.segmentation import split_sections
+
+K_VALUES = (3, 5, 10)
+M_VALUES = (8, 16, 32)
+EF_SEARCH_VALUES = (10, 40, 100)
+EF_CONSTRUCTION = 100
+CHUNK_CHARS = 800
+CHUNK_OVERFETCH = 3  # Chunks fetched per wanted post, so k distinct posts remain after merging
+
+SUBJECTS = ["sourdough baking", "marathon training", "React hooks", "budget travel in Europe", "remote work",
+            "street photography", "container gardening", "personal finance", "home espresso", "PostgreSQL indexing",
+            "mechanical keyboards", "bird watching"]
+ANGLES = {
+    "beginners": ("A Beginner's Guide to {s}", "what should a complete beginner know before starting {s}",
+                  ["If you are new to {s}, start small and keep notes.", "Every beginner in {s} struggles at first.",
+                   "The first month of {s} is about learning the basics."]),
+    "mistakes": ("Common Mistakes in {s}", "which errors do people usually make with {s}",
+                 ["The most common mistake in {s} is rushing.", "Many people get {s} wrong by skipping the fundamentals.",
+                  "Avoid these pitfalls of {s} and you will save time."]),
+    "tools": ("The Best Tools for {s}", "what equipment or software do I need for {s}",
+              ["Good tools make {s} far easier.", "You don't need expensive gear for {s}.",
+               "This is the kit I use for {s} every day."]),
+    "cost": ("How Much Does {s} Really Cost", "is {s} expensive and how can I spend less",
+             ["The budget for {s} adds up quickly.", "You can do {s} cheaply if you plan.",
+              "Here is a breakdown of what {s} costs per month."]),
+    "future": ("The Future of {s}", "where is {s} heading in the next few years",
+               ["The next decade will change {s}.", "New trends are reshaping {s}.",
+                "Experts predict {s} will look very different soon."]),
+}
+FILLER = ["We tested this for several weeks.", "Results varied from person to person.",
+          "Readers have asked about this a lot.", "There is no single right answer.",
+          "Consistency matters more than intensity.", "Measure before you change anything."]
+
+
+class CachedEmbeddingFunction(LocalEmbeddingFunction):
+    """Local embeddings computed once per text, so every index build and query reuses them."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.cache = {}
+
+    def embed_array(self, texts):
+        missing = list(dict.fromkeys(text for text in texts if text not in self.cache))
+        if missing:
+            for text, vector in zip(missing, super().embed_array(missing)):
+                self.cache[text] = vector
+        return np.array([self.cache[text] for text in texts], dtype=np.float32).reshape(len(texts), EMBEDDING_DIM)
+
+
+def make_dataset(variants: int = 2, seed: int = 0):
+    """Synthetic posts (subject x angle x variant) and one query per subject and angle."""
+    rng = random.Random(seed)
+    posts, queries = [], []
+    for subject, (angle, (title, question, claims)) in itertools.product(SUBJECTS, ANGLES.items()):
+        relevant = []
+        for variant in range(variants):
+            post_id = f"{subject.replace(' ', '-').lower()}-{angle}-{variant}"
+            paragraphs = []
+            for _ in range(rng.randint(3, 6)):
+                sentences = [rng.choice(claims).format(s=subject)] + rng.sample(FILLER, 2)
+                rng.shuffle(sentences)
+                paragraphs.append(" ".join(sentences))
+            posts.append({"post_id": post_id, "title": title.format(s=subject), "content": "\n\n".join(paragraphs),
+                          "author": "eval", "tags": [subject, angle]})
+            relevant.append(post_id)
+        queries.append({"query": question.format(s=subject), "relevant": relevant})
+    return posts, queries
+
+def chunk_posts(posts):
+    """Split posts into sections indexed as separate documents pointing at their post."""
+    chunks = []
+    for post in posts:
+        for index, section in enumerate(split_sections(post["content"], max_chars=CHUNK_CHARS)):
+            chunks.append(dict(post, post_id=f"{post['post_id']}#{index}", content=section,
+                               metadata={"parent_id": post["post_id"]}))
+    return chunks
+
+def percentile(values, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+def build(workdir: str, embedding_function, posts, m: int, ef_search: int, chunking: bool):
+    name = f"eval-m{m}-ef{ef_search}-{'chunks' if chunking else 'posts'}"
+    rag = BlogRAGSystem(
+        persist_directory=os.path.join(workdir, name),
+        vector_backend="chroma",
+        collection_name=name,
+        collection_metadata={"hnsw:space": "cosine", "hnsw:M": m, "hnsw:construction_ef": EF_CONSTRUCTION,
+                             "hnsw:search_ef": ef_search},
+        embedding_function=embedding_function,
+    )
+    documents = chunk_posts(posts) if chunking else posts
+    for start in range(0, len(documents), 500):
+        rag.upsert_blog_posts(documents[start:start + 500])
+    return rag, len(documents)
+
+def evaluate(rag, queries, k: int, chunking: bool, hybrid: bool):
+    recalls, reciprocal_ranks, latencies = [], [], []
+    rag.search_similar_posts(queries[0]["query"], n_results=k, rerank=hybrid)  # Warm up
+    for item in queries:
+        started = time.perf_counter()
+        results = rag.search_similar_posts(item["query"], n_results=k * CHUNK_OVERFETCH if chunking else k,
+                                           rerank=hybrid)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        # Best-scoring chunk stands for its post
+        ranked = list(dict.fromkeys(result["metadata"].get("parent_id") or result["metadata"]["post_id"]
+                                    for result in results))[:k]
+        relevant = set(item["relevant"])
+        recalls.append(len(relevant.intersection(ranked)) / len(relevant))
+        reciprocal_ranks.append(next((1 / rank for rank, post_id in enumerate(ranked, 1) if post_id in relevant), 0.0))
+    return {
+        "recall": float(np.mean(recalls)),
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "p50_ms": percentile(latencies, 0.5),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+def index_memory_mb(count: int, m: int) -> float:
+    """hnswlib footprint: float32 vector, 2*M level-0 links, link count and label per element."""
+    return count * (EMBEDDING_DIM * 4 + 2 * m * 4 + 4 + 8) / 1024 / 1024
+
+def pareto_front(rows):
+    """Rows no other row with the same k beats on recall, p50 latency and memory at once."""
+    def dominates(a, b):
+        no_worse = a["recall"] >= b["recall"] and a["p50_ms"] <= b["p50_ms"] and a["memory_mb"] <= b["memory_mb"]
+        better = a["recall"] > b["recall"] or a["p50_ms"] < b["p50_ms"] or a["memory_mb"] < b["memory_mb"]
+        return no_worse and better
+    return [row for row in rows if not any(other["k"] == row["k"] and dominates(other, row) for other in rows)]
+
+def print_table(rows):
+    print(f"{'k':>3} {'M':>3} {'ef':>4} {'chunks':>6} {'hybrid':>6} {'docs':>6} {'recall@k':>8} {'MRR':>6} "
+          f"{'p50 ms':>7} {'p99 ms':>7} {'mem MB':>7}")
+    for row in rows:
+        print(f"{row['k']:>3} {row['m']:>3} {row['ef_search']:>4} {'on' if row['chunking'] else 'off':>6} "
+              f"{'on' if row['hybrid'] else 'off':>6} {row['documents']:>6} {row['recall']:>8.3f} {row['mrr']:>6.3f} "
+              f"{row['p50_ms']:>7.2f} {row['p99_ms']:>7.2f} {row['memory_mb']:>7.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep retrieval settings against a labelled query set")
+    parser.add_argument("--dataset", help="JSON file with posts and labelled queries (default: synthetic)")
+    parser.add_argument("--variants", type=int, default=2, help="Synthetic posts per subject and angle")
+    parser.add_argument("--quick", action="store_true", help="Smaller sweep (M=16, ef_search 10 and 100)")
+    parser.add_argument("--output", help="Write all results to this JSON file")
+    args = parser.parse_args()
+    logging.getLogger().setLevel(logging.WARNING)  # Per-query INFO logs would skew latencies
+
+    if args.dataset:
+        with open(args.dataset) as f:
+            dataset = json.load(f)
+        posts, queries = dataset["posts"], dataset["queries"]
+    else:
+        posts, queries = make_dataset(args.variants)
+    m_values, ef_values = ((16,), (10, 100)) if args.quick else (M_VALUES, EF_SEARCH_VALUES)
+
+    print("=== Retrieval Evaluation ===")
+    print(f"Posts: {len(posts)}, labelled queries: {len(queries)}")
+    print()
+
+    embedding_function = CachedEmbeddingFunction()
+    started = time.perf_counter()
+    embedding_function([f"Title: {post['title']}\n\nContent: {post['content']}" for post in posts + chunk_posts(posts)]
+                       + [item["query"] for item in queries])
+    print(f"Embedded posts, chunks and queries in {time.perf_counter() - started:.1f}s")
+
+    rows = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for m, ef_search, chunking in itertools.product(m_values, ef_values, (False, True)):
+            rag, documents = build(workdir, embedding_function, posts, m, ef_search, chunking)
+            for k, hybrid in itertools.product(K_VALUES, (False, True)):
+                row = {"k": k, "m": m, "ef_search": ef_search, "chunking": chunking, "hybrid": hybrid,
+                       "documents": documents, "memory_mb": index_memory_mb(documents, m)}
+                row.update(evaluate(rag, queries, k, chunking, hybrid))
+                rows.append(row)
+    embedding_function.shutdown()
+
+    print()
+    print("All configurations:")
+    print_table(rows)
+    print()
+    # A larger k always recalls more but costs prompt tokens, so each k gets its own front
+    print("Pareto front per k (recall@k vs. p50 latency vs. index memory):")
+    print_table(sorted(pareto_front(rows), key=lambda row: (row["k"], row["p50_ms"])))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(rows, f, indent=2)
+        print()
+        print(f"Results written to {args.output}")
+    print()
+    print("=== Evaluation Complete ===")
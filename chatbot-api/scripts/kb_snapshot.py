@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Export or restore a binary snapshot of the knowledge base.
+
+Usage:
+    python scripts/kb_snapshot.py export <path> [--float16]
+    python scripts/kb_snapshot.py import <path> [--force]
+    python scripts/kb_snapshot.py inspect <path>
+"""
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from ai.snapshot import SnapshotError, read_snapshot
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ("export", "import", "inspect"):
+        print(__doc__)
+        sys.exit(1)
+
+    command, path = sys.argv[1], sys.argv[2]
+    started = time.monotonic()
+    try:
+        if command == "inspect":
+            header = read_snapshot(path)["header"]
+        else:
+            from ai.rag_system import get_rag_system
+            rag_system = get_rag_system()
+            if command == "export":
+                header = rag_system.export_snapshot(path, dtype="float16" if "--float16" in sys.argv else "float32")
+            else:
+                header = rag_system.import_snapshot(path, force="--force" in sys.argv)
+    except (SnapshotError, OSError) as e:
+        print(f"❌ {command} failed: {e}")
+        sys.exit(1)
+
+    print(f"✅ {command} complete in {time.monotonic() - started:.2f}s")
+    print(f"   Posts: {header['count']}, dimensions: {header['dim']} ({header['dtype']})")
+    print(f"   Embeddings: {header['embedding_function']}")
+    print(f"   Created: {header['created_at']}")
+    if command != "inspect":
+        print(f"   Size: {os.path.getsize(path) / 1024 / 1024:.2f}MB")
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Move knowledge base posts to the shards the configured strategy picks
+(KB_SHARDING, KB_SHARDS, KB_SHARD_PERIOD). Run it after enabling sharding on
+an existing store or changing the shard count or strategy. Posts are moved
+with their embeddings, nothing is re-embedded. Stop the API first.
+
+Usage:
+    python scripts/rebalance_shards.py [--status]
+"""
+
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+if __name__ == "__main__":
+    from ai.rag_system import get_rag_system
+    rag_system = get_rag_system()
+    if rag_system.sharding is None:
+        print("❌ The knowledge base is not sharded; set KB_SHARDING=hash or KB_SHARDING=time")
+        sys.exit(1)
+    if "--status" in sys.argv:
+        print(json.dumps(rag_system.collection.stats(), indent=2))
+        sys.exit(0)
+
+    result = rag_system.rebalance_shards()
+    print(f"✅ Rebalance complete in {result['duration_seconds']:.2f}s")
+    print(f"   Posts moved: {result['moved']}")
+    if result["dropped"]:
+        print(f"   Empty shards dropped: {', '.join(result['dropped'])}")
+    for name, count in result["shards"].items():
+        print(f"   {name}: {count} posts")
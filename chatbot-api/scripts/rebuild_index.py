@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Rebuild the knowledge base's HNSW index with new settings, without re-embedding.
+Space, M and ef_construction only take effect on a rebuild; settings default to
+the HNSW_* environment variables. Stop the API first (or set
+HNSW_REBUILD_ON_START=true to rebuild when it starts).
+
+Usage:
+    python scripts/rebuild_index.py [--space cosine] [--m 32] [--ef-construction 200] [--ef-search 100] [--keep-previous]
+    python scripts/rebuild_index.py --status
+"""
+
+import argparse
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Rebuilt explicitly below, not when the knowledge base opens
+os.environ["HNSW_REBUILD_ON_START"] = "false"
+
+from ai.hnsw import HNSW_SPACES
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the knowledge base's HNSW index")
+    parser.add_argument("--space", choices=HNSW_SPACES, help="Distance function")
+    parser.add_argument("--m", type=int, help="Links per node")
+    parser.add_argument("--ef-construction", type=int, help="Candidate list size while building")
+    parser.add_argument("--ef-search", type=int, help="Candidate list size while querying")
+    parser.add_argument("--keep-previous", action="store_true", help="Keep the old collection for rollback")
+    parser.add_argument("--status", action="store_true", help="Show the current index settings only")
+    args = parser.parse_args()
+
+    from ai.rag_system import get_rag_system
+    rag_system = get_rag_system()
+    if rag_system.client is None:
+        print("❌ HNSW settings only apply to VECTOR_BACKEND=chroma")
+        sys.exit(1)
+    if args.status:
+        print(json.dumps(rag_system.index_stats(), indent=2))
+        sys.exit(0)
+
+    settings = dict(rag_system.hnsw_settings)
+    for key in ("space", "m", "ef_construction", "ef_search"):
+        if getattr(args, key) is not None:
+            settings[key] = getattr(args, key)
+
+    print(f"Rebuilding {rag_system.collection.name} ({rag_system.collection.count()} posts) with {settings or 'Chroma defaults'}")
+    result = rag_system.rebuild_index(settings, keep_previous=args.keep_previous)
+    print(f"✅ Rebuild complete in {result['duration_seconds']:.2f}s")
+    print(f"   Posts: {result['count']}")
+    print(f"   Before: {result['previous_settings']}")
+    print(f"   After:  {result['settings']}")
+    if result["previous_collections"]:
+        print(f"   Previous index kept as {', '.join(result['previous_collections'])}")
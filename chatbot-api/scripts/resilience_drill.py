@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Fault-injection drill for the provider resilience layer.
+Runs the policies against local stand-ins (no API keys needed) and shows
+how deadlines, retries, hedging and the circuit breaker behave.
+"""
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.resilience import (
+    ResiliencePolicy,
+    CircuitBreaker,
+    FaultInjector,
+    ResilienceError,
+    action_deadline,
+)
+
+def run_scenario(name: str, injector: FaultInjector, calls: int = 50, deadline: float = 30.0):
+    policy = ResiliencePolicy(
+        name=name,
+        backoff_base=0.05,
+        breaker=CircuitBreaker(failure_threshold=5, recovery_timeout=1.0),
+    )
+
+    ok, failed = 0, 0
+    latencies = []
+    for _ in range(calls):
+        started = time.monotonic()
+        try:
+            with action_deadline("chat", seconds=deadline):
+                policy.call(injector)
+            ok += 1
+        except (ResilienceError, ConnectionError):
+            failed += 1
+        latencies.append(time.monotonic() - started)
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"   {ok} ok / {failed} failed, provider calls: {injector.calls}")
+    print(f"   client latency p50={p50:.3f}s p99={p99:.3f}s")
+    print(f"   policy stats: {policy.stats()}")
+    print()
+
+print("=== Provider Resilience Drill ===")
+print()
+
+print("1. Healthy provider with a slow tail (3% of calls take 2s):")
+run_scenario("tail-latency", FaultInjector(lambda: "ok", latency=0.02, latency_jitter=0.02,
+                                           slow_rate=0.03, slow_latency=2.0, seed=7), calls=200)
+
+print("2. Flaky provider (20% of calls fail):")
+run_scenario("flaky", FaultInjector(lambda: "ok", latency=0.02, failure_rate=0.2, seed=7))
+
+print("3. Provider outage (every call fails) - breaker should fail fast:")
+run_scenario("outage", FaultInjector(lambda: "ok", latency=0.05, failure_rate=1.0, seed=7))
+
+print("4. Hung provider (every call takes 60s) - deadline should cut it off:")
+run_scenario("hung", FaultInjector(lambda: "ok", latency=60.0), calls=3, deadline=0.5)
+
+print("=== Drill Complete ===")
+os._exit(0)  # Don't wait for abandoned (hung) provider threads
@@ -17,13 +17,13 @@ print()
 print("1. Environment Variables:")
 google_key = os.getenv('GOOGLE_API_KEY')
 if google_key:
-    print(f"✅ GOOGLE_API_KEY found: {google_key[:10]}...")
+    print("✅ GOOGLE_API_KEY found")
 else:
     print("❌ GOOGLE_API_KEY not found - will use local embeddings")
 
 tavily_key = os.getenv('TAVILY_API_KEY') 
 if tavily_key:
-    print(f"✅ TAVILY_API_KEY found: {tavily_key[:10]}...")
+    print("✅ TAVILY_API_KEY found")
 else:
     print("❌ TAVILY_API_KEY not found")
 print()
@@ -0,0 +1,73 @@
+"""
+Shared test setup. The app is configured from the environment at import time,
+so defaults are set here before any test imports main, and the working
+directory is moved to a scratch directory so ./data and ./chroma_db stay out
+of the repo.
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pytest
+from chromadb import EmbeddingFunction
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+os.environ.setdefault("TAVILY_API_KEY", "test-key")
+os.environ.setdefault("EMBEDDING_BACKEND", "local")
+os.environ.setdefault("INTENT_GATE_EMBEDDINGS", "off")
+os.environ.setdefault("CREWAI_TRACING_ENABLED", "false")
+
+os.chdir(tempfile.mkdtemp(prefix="social-bot-tests-"))
+
+
+@pytest.fixture(scope="session")
+def client():
+    """Test client for the app; startup and shutdown run once for the whole session."""
+    from fastapi.testclient import TestClient
+
+    import main
+    with TestClient(main.app) as client:
+        yield client
+
+
+class HashEmbeddingFunction(EmbeddingFunction):
+    """Deterministic offline embeddings: the same text always gets the same vector."""
+
+    def __init__(self):
+        pass
+
+    def __call__(self, input):
+        return [np.frombuffer(hashlib.sha256(text.encode("utf-8")).digest(), dtype=np.uint8)[:16].astype(np.float32)
+                for text in input]
+
+    @staticmethod
+    def name():
+        return "test-hash"
+
+    def get_config(self):
+        return {}
+
+    @staticmethod
+    def build_from_config(config):
+        return HashEmbeddingFunction()
+
+
+@pytest.fixture
+def make_rag_system(tmp_path):
+    """Build knowledge bases in a scratch directory, with offline embeddings and its own dedup index."""
+    from ai.dedup import DuplicateDetector
+    from ai.rag_system import BlogRAGSystem
+
+    def make(directory: str = "", **kwargs):
+        kwargs.setdefault("vector_backend", "chroma")
+        base = tmp_path / directory
+        rag_system = BlogRAGSystem(str(base / "chroma_db"), embedding_function=HashEmbeddingFunction(), **kwargs)
+        if rag_system.duplicate_detector is not None:
+            rag_system.duplicate_detector = DuplicateDetector(db_path=str(base / "dedup.db"))
+        return rag_system
+    return make
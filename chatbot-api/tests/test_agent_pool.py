@@ -0,0 +1,92 @@
+"""Pools of pre-built crew executors (ai/agent_pool.py)."""
+
+import threading
+
+import pytest
+from crewai import Crew
+
+from ai.agent_pool import ExecutorPool
+
+TASK = {"description": "Summarize {text}", "expected_output": "A summary"}
+
+
+@pytest.fixture
+def agent():
+    from ai.crew import content_summarizer
+    return content_summarizer
+
+
+@pytest.fixture
+def fake_kickoff(monkeypatch):
+    """Crew.kickoff that leaves per-run state behind instead of calling a model."""
+    def kickoff(crew, *args, **kwargs):
+        task, agent = crew.tasks[0], crew.agents[0]
+        task.output = f"summary of: {task.description}"
+        task.used_tools = 2
+        task.tools_errors = 1
+        task.retry_count = 1
+        task.processed_by_agents = {agent.role}
+        agent.tools_results = [{"result": "stale"}]
+        agent._times_executed = 1
+        return task.output
+    monkeypatch.setattr(Crew, "kickoff", kickoff)
+
+
+def test_executor_state_is_reset_between_checkouts(agent, fake_kickoff):
+    pool = ExecutorPool("summarize", agent, TASK, size=1)
+    assert pool.run(text="first post") == "summary of: Summarize first post"
+
+    with pool.checkout() as executor:
+        task = executor.task
+        assert executor.runs == 1
+        assert (task.output, task.description, task.used_tools, task.tools_errors, task.retry_count) == \
+            (None, "Summarize {text}", 0, 0, 0)
+        assert task.processed_by_agents == set()
+        assert executor.agent.tools_results == [] and executor.agent._times_executed == 0
+        # Executors have their own agent copy
+        assert executor.agent is not agent
+
+
+def test_busy_pool_builds_extra_executors_and_keeps_only_its_size(agent):
+    pool = ExecutorPool("summarize", agent, TASK, size=1)
+    with pool.checkout() as first, pool.checkout() as second:
+        assert first is not second
+        assert pool.stats()["in_use"] == 2
+
+    stats = pool.stats()
+    assert (stats["overflows"], stats["max_in_use"], stats["in_use"], stats["idle"]) == (1, 2, 0, 1)
+
+
+def test_concurrent_checkouts_never_share_an_executor(agent):
+    pool = ExecutorPool("summarize", agent, TASK, size=2)
+    barrier = threading.Barrier(4)
+    seen = []
+
+    def worker():
+        with pool.checkout() as executor:
+            barrier.wait(timeout=5)
+            seen.append(executor)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(map(id, seen))) == 4
+    assert pool.stats()["idle"] == 2
+
+
+def test_failed_executor_is_discarded_and_the_pool_refills(agent):
+    pool = ExecutorPool("summarize", agent, TASK, size=1)
+    with pytest.raises(RuntimeError):
+        with pool.checkout() as failed:
+            raise RuntimeError("provider down")
+
+    stats = pool.stats()
+    assert (stats["discarded"], stats["in_use"], stats["idle"]) == (1, 0, 0)
+
+    with pool.checkout() as replacement:
+        assert replacement is not failed
+    assert pool.stats()["idle"] == 1
+    with pool.checkout() as reused:
+        assert reused is replacement
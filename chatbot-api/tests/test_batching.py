@@ -0,0 +1,75 @@
+"""Query embedding micro-batching (ai/batching.py)."""
+
+import threading
+import time
+
+import pytest
+
+from ai.batching import EmbeddingBatcher
+from ai.resilience import DeadlineExceededError, action_deadline
+
+
+class CountingEmbedding:
+    def __init__(self, fail=False, release=None):
+        self.batches = []
+        self.fail = fail
+        self.release = release
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        if self.release is not None:
+            self.release.wait(5)
+        if self.fail:
+            raise RuntimeError("embedding backend down")
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+def test_concurrent_queries_share_one_call():
+    embedding = CountingEmbedding()
+    batcher = EmbeddingBatcher(embedding, max_wait_ms=100)
+    futures = [batcher.submit(text) for text in ("a", "bb", "a")]
+    assert [future.result(timeout=2) for future in futures] == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0]]
+    assert embedding.batches == [["a", "bb"]]
+    assert batcher.embed("bb") == [2.0, 1.0] and len(embedding.batches) == 1  # Cached
+
+
+def test_cancelled_query_does_not_fail_the_rest_of_its_batch():
+    embedding = CountingEmbedding()
+    batcher = EmbeddingBatcher(embedding, max_wait_ms=100)
+    kept = batcher.submit("kept")
+    cancelled = batcher.submit("cancelled")
+    assert cancelled.cancel()
+
+    assert kept.result(timeout=2) == [4.0, 1.0]
+    assert embedding.batches == [["kept"]]
+    assert batcher.stats()["errors"] == 0
+
+
+def test_embedding_failure_reaches_every_caller():
+    batcher = EmbeddingBatcher(CountingEmbedding(fail=True), max_wait_ms=50)
+    futures = [batcher.submit(text) for text in ("a", "b")]
+    for future in futures:
+        with pytest.raises(RuntimeError, match="backend down"):
+            future.result(timeout=2)
+    assert batcher.stats()["errors"] == 1
+
+
+def test_waiting_is_bounded_by_the_configured_timeout():
+    release = threading.Event()
+    batcher = EmbeddingBatcher(CountingEmbedding(release=release), max_wait_ms=0, timeout=0.1)
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceededError, match="within 0.1s"):
+        batcher.embed("slow")
+    assert time.monotonic() - started < 1
+    assert batcher.stats()["timeouts"] == 1
+    release.set()
+
+
+def test_waiting_is_bounded_by_the_action_deadline():
+    release = threading.Event()
+    batcher = EmbeddingBatcher(CountingEmbedding(release=release), max_wait_ms=0, timeout=30)
+    started = time.monotonic()
+    with action_deadline("chat", seconds=0.1), pytest.raises(DeadlineExceededError):
+        batcher.embed_many(["a", "b"])
+    assert time.monotonic() - started < 1
+    release.set()
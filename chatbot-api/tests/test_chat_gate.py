@@ -0,0 +1,18 @@
+"""Chat messages the intent gate answers from templates, without an agent run."""
+
+
+def test_chat_greeting_is_answered_by_the_gate(client):
+    response = client.post("/api/ai/chat", json={"message": "hi"})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["data"]["intent"] == "greeting"
+    assert body["data"]["degraded"] is False
+    assert body["message"] == "Chat response generated successfully"
+
+
+def test_invoke_chat_thanks_is_answered_by_the_gate(client):
+    response = client.post("/api/v1/invoke", json={"action": "chat", "payload": {"question": "thanks"}})
+    assert response.status_code == 200
+    body = response.json()
+    assert body["response"]
+    assert body["degraded"] is False
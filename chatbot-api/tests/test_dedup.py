@@ -0,0 +1,123 @@
+"""MinHash LSH near-duplicate detection (ai/dedup.py) and how ingest applies it."""
+
+import pytest
+
+from ai.dedup import DuplicateDetector, MinHasher, estimate_similarity
+
+BASE = ("Vector databases store embeddings and answer nearest neighbour queries quickly. "
+        "Most of them build an approximate index such as HNSW, trading a little recall for speed. "
+        "Choosing the index parameters is a matter of measuring recall and latency on real queries. ")
+NEAR_COPY = BASE + "A short closing remark."
+UNRELATED = ("Sourdough bread needs a lively starter, a long cold proof and a very hot oven. "
+             "Score the loaf just before baking so it can rise evenly. ")
+
+
+@pytest.fixture
+def detector(tmp_path):
+    return DuplicateDetector(db_path=str(tmp_path / "dedup.db"), threshold=0.7)
+
+
+def test_minhash_estimates_jaccard_similarity():
+    hasher = MinHasher()
+    assert estimate_similarity(hasher.signature(BASE), hasher.signature(BASE)) == 1.0
+    assert estimate_similarity(hasher.signature(BASE), hasher.signature(NEAR_COPY)) > 0.7
+    assert estimate_similarity(hasher.signature(BASE), hasher.signature(UNRELATED)) < 0.1
+
+
+def test_signatures_are_stable_across_instances():
+    assert (MinHasher().signature(BASE) == MinHasher().signature(BASE)).all()
+
+
+def test_finds_near_duplicates_through_lsh_buckets(detector):
+    detector.add("original", BASE)
+    detector.add("other", UNRELATED)
+    matches = detector.find_duplicates(NEAR_COPY)
+    assert [post_id for post_id, _ in matches] == ["original"]
+    assert detector.find_duplicates(BASE, exclude="original") == []
+
+
+def test_removed_posts_are_not_matched(detector):
+    detector.add("original", BASE)
+    detector.remove(["original"])
+    assert detector.find_duplicates(NEAR_COPY) == []
+    assert detector.indexed_ids() == set()
+
+
+def test_clusters(detector):
+    detector.add("a", BASE)
+    detector.add("b", NEAR_COPY)
+    detector.add("c", UNRELATED)
+    clusters = detector.find_clusters()
+    assert [cluster["post_ids"] for cluster in clusters] == [["a", "b"]]
+
+
+def test_reingesting_a_flagged_duplicate_is_unchanged(make_rag_system):
+    rag_system = make_rag_system()
+    events = []
+    rag_system.add_listener(lambda event, post_ids: events.append(event))
+    posts = [{"post_id": "original", "title": "Indexes", "content": BASE, "author": "a"},
+             {"post_id": "copy", "title": "Indexes again", "content": NEAR_COPY, "author": "a"}]
+
+    assert rag_system.upsert_blog_posts(posts) == {"original": "created", "copy": "created"}
+    metadata = rag_system.collection.get(ids=["copy"], include=["metadatas"])["metadatas"][0]
+    assert metadata["duplicate_of"] == "original"
+
+    events.clear()
+    assert rag_system.upsert_blog_posts(posts) == {"original": "unchanged", "copy": "unchanged"}
+    assert events == []
+
+
+def duplicate_flags(rag_system, post_id):
+    metadata = rag_system.collection.get(ids=[post_id], include=["metadatas"])["metadatas"][0]
+    return {key: metadata[key] for key in ("duplicate_of", "duplicate_similarity") if key in metadata}
+
+
+def test_editing_a_flagged_post_to_unique_text_clears_its_flags(make_rag_system):
+    rag_system = make_rag_system()
+    rag_system.upsert_blog_posts([{"post_id": "original", "title": "Indexes", "content": BASE, "author": "a"},
+                                  {"post_id": "copy", "title": "Copy", "content": NEAR_COPY, "author": "a"}])
+    assert duplicate_flags(rag_system, "copy")["duplicate_of"] == "original"
+
+    assert rag_system.upsert_blog_post("copy", "Copy", UNRELATED, "a") == "updated"
+    assert duplicate_flags(rag_system, "copy") == {}
+
+
+def test_update_blog_post_rechecks_duplicate_flags(make_rag_system):
+    rag_system = make_rag_system()
+    rag_system.upsert_blog_posts([{"post_id": "original", "title": "Indexes", "content": BASE, "author": "a"},
+                                  {"post_id": "other", "title": "Bread", "content": UNRELATED, "author": "a",
+                                   "tags": ["baking"], "metadata": {"category": "food"}}])
+    assert duplicate_flags(rag_system, "other") == {}
+
+    assert rag_system.update_blog_post("other", content=NEAR_COPY)
+    assert duplicate_flags(rag_system, "other")["duplicate_of"] == "original"
+    metadata = rag_system.get_post_by_id("other")["metadata"]
+    assert metadata["tags"] == "baking" and metadata["category"] == "food" and metadata["title"] == "Bread"
+
+    assert rag_system.update_blog_post("other", content=UNRELATED)
+    assert duplicate_flags(rag_system, "other") == {}
+
+
+def test_snapshot_import_indexes_posts_for_duplicate_detection(make_rag_system, tmp_path):
+    source = make_rag_system("source")
+    source.upsert_blog_post("original", "Indexes", BASE, "a")
+    source.export_snapshot(str(tmp_path / "kb.snapshot"))
+
+    restored = make_rag_system("restored")
+    restored.import_snapshot(str(tmp_path / "kb.snapshot"))
+    assert restored.duplicate_detector.indexed_ids() == {"original"}
+    restored.upsert_blog_post("copy", "Copy", NEAR_COPY, "a")
+    assert duplicate_flags(restored, "copy")["duplicate_of"] == "original"
+
+
+def test_posts_stored_before_dedup_are_indexed_at_startup(make_rag_system, tmp_path, monkeypatch):
+    monkeypatch.setenv("DEDUP_MODE", "off")
+    make_rag_system().upsert_blog_post("original", "Indexes", BASE, "a")
+
+    detector = DuplicateDetector(db_path=str(tmp_path / "dedup.db"))
+    monkeypatch.setattr("ai.rag_system.get_duplicate_detector", lambda: detector)
+    monkeypatch.setenv("DEDUP_MODE", "flag")
+    rag_system = make_rag_system()
+    assert rag_system.duplicate_detector.indexed_ids() == {"original"}
+    rag_system.upsert_blog_post("copy", "Copy", NEAR_COPY, "a")
+    assert duplicate_flags(rag_system, "copy")["duplicate_of"] == "original"
@@ -0,0 +1,128 @@
+"""Local embedding backend (ai/embeddings.py), with a stub model in place of the ONNX one."""
+
+import os
+import sys
+import threading
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import ai.embeddings as embeddings
+from ai.embeddings import EMBEDDING_DIM, LocalEmbeddingFunction, ensure_model_files
+
+
+class StubEncoder:
+    """Encodes a text as [len(text), 0, ...] and records the batches it was given."""
+    batches = []
+    model_paths = []
+
+    def __init__(self, model_path, max_length=256, threads=1):
+        StubEncoder.model_paths.append(model_path)
+
+    def encode(self, texts):
+        StubEncoder.batches.append(list(texts))
+        vectors = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+        vectors[:, 0] = [len(text) for text in texts]
+        return vectors
+
+
+class StubPool(ThreadPoolExecutor):
+    """Stands in for the spawned process pool: same initializer and shutdown, in threads."""
+    instances = []
+
+    def __init__(self, max_workers, mp_context=None, initializer=None, initargs=()):
+        super().__init__(max_workers=max_workers, initializer=initializer, initargs=initargs)
+        self.shutdown_calls = []
+        StubPool.instances.append(self)
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shutdown_calls.append((wait, cancel_futures))
+        super().shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+@pytest.fixture
+def stub_model(monkeypatch, tmp_path):
+    StubEncoder.batches, StubEncoder.model_paths, StubPool.instances = [], [], []
+    monkeypatch.setattr(embeddings, "_OnnxEncoder", StubEncoder)
+    monkeypatch.setattr(embeddings, "ProcessPoolExecutor", StubPool)
+    monkeypatch.setattr(embeddings, "MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(embeddings.ONNXMiniLM_L6_V2, "_download_model_if_not_exists", lambda self: None)
+    (tmp_path / "model.onnx").write_bytes(b"float32 model")
+    return tmp_path
+
+
+def test_length_sorted_batches_keep_input_order(stub_model):
+    texts = [f"text {'x' * length}" for length in (30, 2, 17, 9, 25, 1, 12)]
+    function = LocalEmbeddingFunction(workers=2, batch_size=3)
+    vectors = function.embed_array(texts)
+    function.shutdown()
+
+    assert vectors.shape == (len(texts), EMBEDDING_DIM)
+    assert vectors[:, 0].tolist() == [len(text) for text in texts]
+    # Batches hold texts of similar length, at most batch_size of them
+    assert sorted([len(text) for text in batch] for batch in StubEncoder.batches) == \
+        [[6, 7, 14], [17, 22, 30], [35]]
+
+
+def test_call_returns_one_vector_per_input(stub_model):
+    function = LocalEmbeddingFunction(workers=1)
+    result = function(["ab", "abcd"])
+    assert [vector[0] for vector in result] == [2.0, 4.0]
+    assert function.embed_array([]).shape == (0, EMBEDDING_DIM)
+    function.shutdown()
+
+
+def test_pool_is_started_once_and_shut_down(stub_model):
+    function = LocalEmbeddingFunction(workers=2)
+    assert StubPool.instances == []  # Started lazily
+
+    threads = [threading.Thread(target=function.embed_array, args=(["some text"],)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(StubPool.instances) == 1
+
+    function.shutdown()
+    assert StubPool.instances[0].shutdown_calls == [(False, True)]
+    function.shutdown()  # Idempotent
+
+    # Used again after shutdown: a new pool is started
+    function.embed_array(["again"])
+    assert len(StubPool.instances) == 2
+    function.shutdown()
+
+
+@pytest.fixture
+def stub_quantizer(monkeypatch):
+    calls = []
+
+    def quantize_dynamic(model_path, quantized_path, weight_type):
+        calls.append((os.path.basename(model_path), weight_type))
+        with open(quantized_path, "wb") as f:
+            f.write(b"int8 model")
+
+    module = types.SimpleNamespace(quantize_dynamic=quantize_dynamic, QuantType=types.SimpleNamespace(QInt8="QInt8"))
+    monkeypatch.setitem(sys.modules, "onnxruntime.quantization", module)
+    return calls
+
+
+def test_int8_model_is_quantized_once_and_used_by_the_workers(stub_model, stub_quantizer):
+    function = LocalEmbeddingFunction(workers=1, quantized=True)
+    function.embed_array(["text"])
+    function.shutdown()
+    restarted = LocalEmbeddingFunction(workers=1, quantized=True)
+    restarted.embed_array(["text"])
+    restarted.shutdown()
+
+    assert stub_quantizer == [("model.onnx", "QInt8")]
+    assert StubEncoder.model_paths == [str(stub_model / "model_int8.onnx")] * 2
+    assert LocalEmbeddingFunction(quantized=True).get_config()["quantized"] is True
+
+
+def test_int8_falls_back_to_the_float32_model_without_onnx(stub_model, monkeypatch):
+    monkeypatch.setitem(sys.modules, "onnxruntime.quantization", None)  # Import fails
+    assert ensure_model_files(quantized=True) == str(stub_model / "model.onnx")
+    assert ensure_model_files(quantized=False) == str(stub_model / "model.onnx")
@@ -0,0 +1,75 @@
+"""Local extractive summarization (ai/extractive.py)."""
+
+import pytest
+
+from ai.extractive import ExtractiveSummarizer, parse_desired_length
+
+
+@pytest.mark.parametrize("desired_length, expected", [
+    ("three bullet points", (3, True)),
+    ("5 key points", (5, True)),
+    ("a single line", (1, True)),
+    ("2 sentences", (2, False)),
+    ("one sentence", (1, False)),
+    ("a short paragraph", (3, False)),
+    ("brief", (3, False)),
+    ("one paragraph", (4, False)),
+    ("two paragraphs", (8, False)),
+    ("", (4, False)),
+    (None, (4, False)),
+    ("as long as you like", (4, False)),
+])
+def test_parse_desired_length(desired_length, expected):
+    assert parse_desired_length(desired_length) == expected
+
+
+SENTENCES = [
+    "Indexes make reads faster in most databases.",
+    "Indexes make database reads a lot faster.",  # Near-duplicate of the first
+    "Reads, mostly.",  # Central but a fragment
+    "Writes get slower with every index you add.",
+    "Measure the workload before adding one.",
+]
+VECTORS = {
+    SENTENCES[0]: [1.0, 0.0, 0.0],
+    SENTENCES[1]: [1.0, 0.05, 0.0],
+    SENTENCES[2]: [1.0, 0.02, 0.0],
+    SENTENCES[3]: [0.6, 0.8, 0.0],
+    SENTENCES[4]: [0.5, 0.5, 0.7],
+}
+
+
+def embed(sentences):
+    return [VECTORS[sentence] for sentence in sentences]
+
+
+def test_select_skips_near_duplicates_and_fragments():
+    selected = ExtractiveSummarizer(embed_texts=embed).select(SENTENCES, 3)
+    assert selected == sorted(selected)
+    assert len({0, 1} & set(selected)) == 1
+    assert set(selected) - {0, 1} == {3, 4}
+
+
+def test_fragments_rank_below_every_full_sentence():
+    """Without the redundancy check the duplicates are both kept, and the fragment is still last."""
+    selected = ExtractiveSummarizer(embed_texts=embed, redundancy_threshold=1.01).select(SENTENCES, 4)
+    assert selected == [0, 1, 3, 4]
+
+
+def test_summarize_formats_bullets_in_original_order():
+    content = "\n".join(["# Indexes", *SENTENCES[:2], "- " + SENTENCES[3], "1. " + SENTENCES[4]])
+    summary = ExtractiveSummarizer(embed_texts=embed).summarize(content, "three bullet points")
+    assert summary.splitlines()[1:] == [f"- {SENTENCES[3]}", f"- {SENTENCES[4]}"]
+    assert summary.splitlines()[0] in (f"- {SENTENCES[0]}", f"- {SENTENCES[1]}")
+
+
+def test_short_content_is_returned_whole():
+    content = "Indexes speed up reads. They slow down writes."
+    assert ExtractiveSummarizer().summarize(content, "one paragraph") == content
+
+
+def test_tfidf_vectors_pick_the_central_sentences():
+    content = ("Caching stores query results in memory. A cache in memory avoids repeated query work. "
+               "My cat likes the sofa. Invalidate cached query results when the data changes.")
+    summary = ExtractiveSummarizer().summarize(content, "2 sentences")
+    assert "cat" not in summary and summary.startswith("Caching stores")
@@ -0,0 +1,40 @@
+"""Bounded parallel fan-out (ai/fanout.py)."""
+
+import threading
+import time
+
+import pytest
+
+from ai.fanout import fan_out
+from ai.resilience import DeadlineExceededError, action_deadline
+
+
+def test_results_keep_the_order_of_items():
+    assert fan_out(lambda item: time.sleep(0.01 * (3 - item)) or item * 2, [0, 1, 2], max_workers=3) == [0, 2, 4]
+
+
+def test_deadline_is_raised_without_waiting_for_running_calls():
+    started = time.monotonic()
+    with action_deadline("summarize", seconds=0.2):
+        with pytest.raises(DeadlineExceededError):
+            fan_out(lambda item: time.sleep(2), [1, 2], max_workers=2)
+    assert time.monotonic() - started < 1.0
+
+
+def test_first_failure_is_raised_and_queued_calls_are_cancelled():
+    calls = []
+    lock = threading.Lock()
+
+    def call(item):
+        with lock:
+            calls.append(item)
+        if item == 0:
+            raise ValueError("bad item")
+        time.sleep(0.5)
+
+    started = time.monotonic()
+    with pytest.raises(ValueError, match="bad item"):
+        fan_out(call, range(10), max_workers=2)
+    assert time.monotonic() - started < 0.4
+    time.sleep(0.6)
+    assert len(calls) < 10
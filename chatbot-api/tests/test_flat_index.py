@@ -0,0 +1,172 @@
+"""Segmented memory-mapped flat index (ai/flat_index.py)."""
+
+import json
+import os
+
+import numpy as np
+import pytest
+
+from ai.flat_index import FlatCollection, Segment
+
+
+def vectors(count, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(count, dim)).astype(np.float32)
+
+
+def add_posts(collection, start, count, seed=0):
+    ids = [f"post-{i}" for i in range(start, start + count)]
+    collection.upsert(ids=ids, documents=[f"doc {i}" for i in range(start, start + count)],
+                      metadatas=[{"title": f"Post {i}", "n": i} for i in range(start, start + count)],
+                      embeddings=vectors(count, seed=seed))
+    return ids
+
+
+def exact_top_k(collection, query, k):
+    everything = collection.get(include=["embeddings"])
+    distances = ((everything["embeddings"] - query) ** 2).sum(axis=1)
+    return [everything["ids"][i] for i in np.argsort(distances)[:k]]
+
+
+@pytest.fixture(params=["float16", "int8"])
+def collection(request, tmp_path):
+    return FlatCollection(str(tmp_path), dtype=request.param, background_compaction=False)
+
+
+def test_writes_append_segments(collection):
+    add_posts(collection, 0, 50)
+    first = set(os.listdir(collection.directory))
+    add_posts(collection, 50, 5, seed=1)
+    collection.delete(["post-3"])
+    assert collection.count() == 54
+    assert collection.stats()["segments"] == 3
+    # Earlier segments are never rewritten
+    assert first - {"manifest.json"} <= set(os.listdir(collection.directory))
+
+
+def test_upsert_supersedes_and_delete_tombstones(collection):
+    add_posts(collection, 0, 10)
+    collection.upsert(ids=["post-1"], documents=["new doc"], metadatas=[{"title": "New"}],
+                      embeddings=vectors(1, seed=5))
+    collection.delete(["post-2", "missing"])
+    assert collection.count() == 9
+    assert collection.get(ids=["post-1", "post-2"])["documents"] == ["new doc"]
+    assert collection.stats()["dead_rows"] == 2
+    query = vectors(1, seed=5)[0]
+    assert collection.query(query_embeddings=[query], n_results=1)["ids"] == [["post-1"]]
+
+
+def test_add_skips_existing_ids(collection):
+    add_posts(collection, 0, 3)
+    collection.add(ids=["post-0"], documents=["other"], embeddings=vectors(1, seed=9))
+    assert collection.get(ids=["post-0"])["documents"] == ["doc 0"]
+
+
+def test_update_merges_metadata(collection):
+    add_posts(collection, 0, 3)
+    before = collection.get(ids=["post-1"], include=["embeddings"])["embeddings"]
+    collection.update(ids=["post-1", "missing"], metadatas=[{"duplicate_of": "post-0", "n": None}, {"x": 1}])
+    record = collection.get(ids=["post-1"], include=["metadatas", "documents", "embeddings"])
+    assert record["metadatas"] == [{"title": "Post 1", "duplicate_of": "post-0"}]
+    assert record["documents"] == ["doc 1"]
+    assert np.array_equal(record["embeddings"], before)
+
+
+def test_query_matches_exact_search_across_segments(collection):
+    for batch in range(4):
+        add_posts(collection, batch * 25, 25, seed=batch)
+    collection.delete([f"post-{i}" for i in range(0, 100, 7)])
+    for seed in range(5):
+        query = vectors(1, seed=100 + seed)[0]
+        result = collection.query(query_embeddings=[query], n_results=5)
+        assert result["ids"][0] == exact_top_k(collection, query, 5)
+        assert result["distances"][0] == sorted(result["distances"][0])
+
+
+def test_compaction_keeps_live_rows_only(collection):
+    for batch in range(4):
+        add_posts(collection, batch * 10, 10, seed=batch)
+    collection.update(ids=["post-4"], metadatas=[{"flag": True}])
+    collection.delete(["post-0", "post-11"])
+    before = collection.get(include=["documents", "metadatas", "embeddings"])
+    query = vectors(1, seed=42)[0]
+    expected = collection.query(query_embeddings=[query], n_results=5)
+
+    assert collection.compact()
+    assert collection.stats() == {"segments": 1, "live_rows": 38, "dead_rows": 0, "dtype": collection.dtype}
+    after = collection.get(include=["documents", "metadatas", "embeddings"])
+    assert after["ids"] == before["ids"]
+    assert after["metadatas"] == before["metadatas"]
+    assert np.array_equal(after["embeddings"], before["embeddings"])
+    result = collection.query(query_embeddings=[query], n_results=5)
+    assert result["ids"] == expected["ids"]
+    assert result["distances"][0] == pytest.approx(expected["distances"][0], rel=1e-5)
+    assert not collection.compact()
+    assert len([name for name in os.listdir(collection.directory) if name.startswith("records.")]) == 1
+
+
+def test_records_are_mapped_and_read_only_for_returned_rows(collection, monkeypatch):
+    add_posts(collection, 0, 200)
+    segment = collection._state.segments[0]
+    assert isinstance(segment.vectors, np.memmap) and isinstance(segment.sq_norms, np.memmap)
+    assert segment.legacy_records is None and segment.lines is not None
+
+    parsed = []
+    records = Segment.records
+    monkeypatch.setattr(Segment, "records", lambda self, rows: parsed.extend(rows) or records(self, rows))
+    result = collection.query(query_embeddings=vectors(1, seed=7), n_results=3)
+    assert len(parsed) == 3
+    assert result["metadatas"][0][0]["title"] == f"Post {result['ids'][0][0].split('-')[1]}"
+
+    parsed.clear()
+    assert collection.query(query_embeddings=vectors(1, seed=7), n_results=3, include=["distances"])["ids"]
+    assert len(collection.get(include=["embeddings"])["ids"]) == 200
+    assert parsed == []
+
+
+def test_background_compaction(tmp_path):
+    collection = FlatCollection(str(tmp_path), max_segments=3)
+    for batch in range(5):
+        add_posts(collection, batch * 4, 4, seed=batch)
+    collection.wait_for_compaction(timeout=10)
+    assert collection.stats()["segments"] <= 3
+    assert collection.count() == 20
+
+
+def test_other_instances_see_writes(collection, tmp_path):
+    add_posts(collection, 0, 5)
+    reader = FlatCollection(str(tmp_path), dtype=collection.dtype, background_compaction=False)
+    assert reader.count() == 5
+    add_posts(collection, 5, 5, seed=1)
+    collection.delete(["post-0"])
+    assert reader.count() == 9
+    collection.compact()
+    assert reader.get(ids=["post-0", "post-9"])["ids"] == ["post-9"]
+
+
+def test_reads_indexes_written_before_segments(tmp_path):
+    """Indexes from before segments (one matrix per generation) open as a single segment."""
+    directory = tmp_path / "blog_posts"
+    directory.mkdir()
+    stored = vectors(3).astype(np.float16)
+    restored = stored.astype(np.float32)
+    np.save(directory / "vectors.4.npy", stored)
+    np.save(directory / "norms.4.npy", np.einsum("ij,ij->i", restored, restored))
+    (directory / "records.4.json").write_text(json.dumps(
+        [{"id": f"post-{i}", "document": f"doc {i}", "metadata": {}} for i in range(3)]))
+    (directory / "manifest.json").write_text(json.dumps({"generation": 4, "count": 3, "dim": 8, "dtype": "float16"}))
+
+    collection = FlatCollection(str(tmp_path), background_compaction=False)
+    assert collection.count() == 3
+    collection.delete(["post-1"])
+    assert collection.get()["ids"] == ["post-0", "post-2"]
+    collection.update(ids=["post-0"], metadatas=[{"title": "Updated"}])
+    assert collection.compact()
+    result = collection.get()
+    assert dict(zip(result["ids"], result["metadatas"])) == {"post-0": {"title": "Updated"}, "post-2": {}}
+    assert collection._state.segments[0].legacy_records is None
+
+
+def test_dimension_mismatch_is_rejected(collection):
+    add_posts(collection, 0, 2)
+    with pytest.raises(ValueError):
+        collection.upsert(ids=["x"], embeddings=np.zeros((1, 4), dtype=np.float32))
@@ -0,0 +1,69 @@
+"""ef_search autotuning against a p95 latency target (ai/hnsw.py)."""
+
+from ai.hnsw import EfSearchAutotuner, create_autotuner
+
+
+def make_tuner(applied, **kwargs):
+    options = dict(ef_search=100, target_p95_ms=10.0, min_ef=20, max_ef=200, window=20, adjust_every=10)
+    options.update(kwargs)
+    return EfSearchAutotuner(applied.append, **options)
+
+
+def record(tuner, milliseconds, count):
+    for _ in range(count):
+        tuner.record(milliseconds / 1000.0)
+
+
+def test_lowers_ef_search_when_p95_is_over_target():
+    applied = []
+    tuner = make_tuner(applied)
+    record(tuner, 20.0, 9)
+    assert applied == []  # Waits for a full window of samples
+    record(tuner, 20.0, 1)
+    assert applied == [80] and tuner.ef_search == 80
+    assert tuner.stats()["lowered"] == 1 and tuner.stats()["last_p95_ms"] == 20.0
+
+
+def test_raises_ef_search_with_headroom_and_holds_near_target():
+    applied = []
+    tuner = make_tuner(applied)
+    record(tuner, 2.0, 10)
+    assert applied == [126]
+    record(tuner, 8.0, 10)  # Under target but above the headroom: leave it
+    assert applied == [126] and tuner.stats()["raised"] == 1
+
+
+def test_stays_within_bounds():
+    applied = []
+    tuner = make_tuner(applied, ef_search=25)
+    record(tuner, 50.0, 30)
+    assert applied == [20] and tuner.ef_search == 20
+
+    tuner = make_tuner(applied, ef_search=190)
+    record(tuner, 1.0, 30)
+    assert applied[-1] == 200 and tuner.ef_search == 200
+
+
+def test_old_samples_are_dropped_after_an_adjustment():
+    applied = []
+    tuner = make_tuner(applied, window=100)
+    record(tuner, 20.0, 10)
+    record(tuner, 8.0, 10)
+    # Only latencies measured at the new ef_search count, so p95 is 8ms: no further change
+    assert applied == [80]
+
+
+def test_failed_apply_keeps_the_current_setting():
+    def apply(ef_search):
+        raise RuntimeError("collection is being rebuilt")
+
+    tuner = EfSearchAutotuner(apply, ef_search=100, target_p95_ms=10.0, adjust_every=5)
+    record(tuner, 20.0, 5)
+    assert tuner.ef_search == 100 and tuner.stats()["errors"] == 1
+
+
+def test_disabled_without_a_target(monkeypatch):
+    monkeypatch.delenv("HNSW_TARGET_P95_MS", raising=False)
+    assert create_autotuner(lambda ef_search: None, 100) is None
+    monkeypatch.setenv("HNSW_TARGET_P95_MS", "15")
+    assert create_autotuner(lambda ef_search: None, 100).target_p95 == 0.015
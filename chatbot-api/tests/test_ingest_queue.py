@@ -0,0 +1,93 @@
+"""Write-behind ingest queue (ai/ingest_queue.py): coalescing and out-of-order events."""
+
+import pytest
+
+from ai.ingest_queue import WriteBehindQueue
+
+
+class RecordingKnowledgeBase:
+    def __init__(self):
+        self.posts = {}
+        self.writes = []
+        self.fail = False
+
+    def upsert_blog_posts(self, posts):
+        if self.fail:
+            raise RuntimeError("vector store unavailable")
+        self.writes.append(("upsert", [post["post_id"] for post in posts]))
+        self.posts.update({post["post_id"]: post for post in posts})
+
+    def delete_blog_posts(self, post_ids):
+        self.writes.append(("delete", list(post_ids)))
+        for post_id in post_ids:
+            self.posts.pop(post_id, None)
+
+
+def post(title):
+    return {"title": title, "content": f"{title} body", "author": "a"}
+
+
+@pytest.fixture
+def knowledge_base():
+    return RecordingKnowledgeBase()
+
+
+@pytest.fixture
+def queue(knowledge_base, tmp_path):
+    return WriteBehindQueue(knowledge_base, db_path=str(tmp_path / "queue.db"), debounce_seconds=60)
+
+
+def test_updates_are_coalesced_into_one_write(queue, knowledge_base):
+    for version in range(5):
+        queue.enqueue("updated", "p1", post(f"v{version}"), source_updated_at=100 + version)
+    assert queue.flush() == 0  # Still inside the debounce window
+    assert queue.flush(force=True) == 1
+    assert knowledge_base.writes == [("upsert", ["p1"])]
+    assert knowledge_base.posts["p1"]["title"] == "v4"
+    assert queue.stats()["coalescing_ratio"] == 5.0
+
+
+def test_older_pending_event_is_ignored(queue, knowledge_base):
+    assert queue.enqueue("updated", "p1", post("new"), source_updated_at=200)
+    assert not queue.enqueue("updated", "p1", post("old"), source_updated_at=100)
+    queue.flush(force=True)
+    assert knowledge_base.posts["p1"]["title"] == "new"
+    assert queue.stats()["events_stale"] == 1
+
+
+def test_stale_event_after_flush_is_ignored(queue, knowledge_base):
+    queue.enqueue("updated", "p1", post("new"), source_updated_at=200)
+    queue.flush(force=True)
+    assert not queue.enqueue("updated", "p1", post("old"), source_updated_at=100)
+    assert queue.flush(force=True) == 0
+    assert knowledge_base.posts["p1"]["title"] == "new"
+
+
+def test_untimestamped_delete_is_not_undone_by_a_late_update(queue, knowledge_base):
+    queue.enqueue("created", "p1", post("first"), source_updated_at=100)
+    queue.flush(force=True)
+    queue.enqueue("deleted", "p1")
+    assert not queue.enqueue("updated", "p1", post("late"), source_updated_at=150)
+    queue.flush(force=True)
+    assert "p1" not in knowledge_base.posts
+    # Also once the delete itself has been applied
+    assert not queue.enqueue("updated", "p1", post("later"), source_updated_at=160)
+
+
+def test_failed_batch_stays_queued(queue, knowledge_base):
+    queue.enqueue("updated", "p1", post("v1"), source_updated_at=100)
+    knowledge_base.fail = True
+    assert queue.flush(force=True) == 0
+    assert queue.stats()["pending_posts"] == 1
+    assert queue.flush() == 0  # Not due again until the debounce window and backoff pass
+    knowledge_base.fail = False
+    assert queue.flush(force=True) == 1
+    assert knowledge_base.posts["p1"]["title"] == "v1"
+    assert queue.stats()["failures"] == 1
+
+
+def test_pending_events_survive_restart(queue, knowledge_base, tmp_path):
+    queue.enqueue("updated", "p1", post("v1"), source_updated_at=100)
+    restarted = WriteBehindQueue(knowledge_base, db_path=str(tmp_path / "queue.db"))
+    assert restarted.flush(force=True) == 1
+    assert not restarted.enqueue("updated", "p1", post("v0"), source_updated_at=50)
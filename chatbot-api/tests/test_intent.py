@@ -0,0 +1,155 @@
+"""Pre-LLM intent gate (ai/intent.py)."""
+
+import json
+import math
+
+import pytest
+
+from ai.intent import IntentGate
+
+CONFIG = """
+settings:
+  similarity_threshold: 0.8
+  margin: 0.1
+  max_rule_words: 3
+
+greeting:
+  rules:
+    - '^(hi|hello)[!. ]*$'
+  exemplars:
+    - "greeting exemplar"
+  response: "Hello!"
+
+followup:
+  rules:
+    - '^why\\??$'
+  exemplars:
+    - "followup exemplar"
+
+off_topic:
+  exemplars:
+    - "off-topic exemplar"
+  response: "I only talk about the blog."
+
+question:
+  exemplars:
+    - "question exemplar"
+"""
+
+
+def angle(cosine):
+    """A message whose similarity to the off-topic exemplar is `cosine`, turning towards the question one."""
+    return [0.0, 0.0, cosine, math.sqrt(1 - cosine ** 2)]
+
+
+VECTORS = {
+    "greeting exemplar": [1.0, 0.0, 0.0, 0.0],
+    "followup exemplar": [0.0, 1.0, 0.0, 0.0],
+    "off-topic exemplar": [0.0, 0.0, 1.0, 0.0],
+    "question exemplar": [0.0, 0.0, 0.6, 0.8],
+    "what will the weather be like tomorrow": angle(0.98),  # 0.75 to the question exemplar
+    "is the weather relevant to database design": angle(0.9),  # 0.889 to the question exemplar
+    "tell me something vague please": [0.0, 0.0, 0.7, -0.7],  # Below the threshold
+    "can you say more about that": [0.1, 0.99, 0.0, 0.0],
+}
+
+
+class StubEmbedding:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        if self.fail:
+            raise RuntimeError("embedding backend down")
+        return [VECTORS.get(text, [0.0, 0.0, 0.0, 1.0]) for text in texts]
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / "intents.yaml"
+    path.write_text(CONFIG)
+    return str(path)
+
+
+@pytest.fixture
+def embedding():
+    return StubEmbedding()
+
+
+@pytest.fixture
+def gate(config_path, embedding, tmp_path):
+    return IntentGate(embed_texts=embedding, config_path=config_path, log_path=str(tmp_path / "log" / "intents.jsonl"))
+
+
+def test_short_messages_match_rules_without_embedding(gate, embedding):
+    decision = gate.classify("Hello!")
+    assert (decision.intent, decision.method, decision.response, decision.needs_retrieval) == \
+        ("greeting", "rule", "Hello!", False)
+    assert embedding.calls == []
+
+
+def test_rules_only_apply_to_short_messages(gate):
+    assert gate.classify("hi hi hi hi").method != "rule"
+
+
+def test_embedding_classifier_answers_confident_matches(gate, embedding):
+    decision = gate.classify("what will the weather be like tomorrow")
+    assert (decision.intent, decision.method, decision.response) == ("off_topic", "embedding", "I only talk about the blog.")
+    assert decision.confidence == pytest.approx(0.98, abs=1e-3)
+
+    gate.classify("tell me something vague please")
+    # Exemplars are embedded once, then only the messages
+    assert embedding.calls[0] == ["greeting exemplar", "followup exemplar", "off-topic exemplar", "question exemplar"]
+    assert len(embedding.calls) == 3
+
+
+def test_match_below_the_threshold_is_a_question(gate):
+    decision = gate.classify("tell me something vague please")
+    assert (decision.intent, decision.method, decision.response) == ("question", "default", None)
+    assert decision.needs_retrieval
+
+
+def test_match_without_a_margin_over_questions_is_a_question(gate):
+    """0.9 to the off-topic exemplar clears the threshold, but is within 0.1 of the question exemplar's 0.889."""
+    decision = gate.classify("is the weather relevant to database design")
+    assert (decision.intent, decision.method) == ("question", "default")
+    assert decision.confidence == pytest.approx(0.889, abs=1e-3)
+
+
+@pytest.mark.parametrize("message, method", [("why?", "rule"), ("can you say more about that", "embedding")])
+def test_followups_need_history(gate, message, method):
+    with_history = gate.classify(message, has_history=True)
+    assert (with_history.intent, with_history.method, with_history.needs_retrieval) == ("followup", method, False)
+    assert with_history.response is None
+
+    without_history = gate.classify(message, has_history=False)
+    assert (without_history.intent, without_history.method, without_history.needs_retrieval) == \
+        ("question", "default", True)
+
+
+def test_without_embeddings_unmatched_messages_are_questions(config_path):
+    gate = IntentGate(embed_texts=None, config_path=config_path, log_path=None)
+    assert gate.classify("what will the weather be like tomorrow").method == "default"
+    assert gate.classify("hi").intent == "greeting"
+
+
+def test_embedding_failure_falls_back_to_question(config_path):
+    gate = IntentGate(embed_texts=StubEmbedding(fail=True), config_path=config_path, log_path=None)
+    decision = gate.classify("what will the weather be like tomorrow")
+    assert (decision.intent, decision.method) == ("question", "error")
+
+
+def test_stats_and_log(gate, tmp_path):
+    gate.classify("hi")
+    gate.classify("what will the weather be like tomorrow")
+    gate.classify("why?", has_history=True)
+    gate.classify("tell me something vague please")
+    assert gate.stats() == {"decisions": {"greeting": 1, "off_topic": 1, "followup": 1, "question": 1},
+                            "short_circuited": 2, "total": 4}
+
+    with open(tmp_path / "log" / "intents.jsonl") as f:
+        entries = [json.loads(line) for line in f]
+    assert [entry["intent"] for entry in entries] == ["greeting", "off_topic", "followup", "question"]
+    assert entries[0]["message"] == "hi" and "response" not in entries[0]
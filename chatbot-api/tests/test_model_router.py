@@ -0,0 +1,74 @@
+"""Model routing and per-request usage attribution (ai/model_router.py)."""
+
+import contextvars
+import threading
+import time
+
+from crewai.llms.base_llm import BaseLLM
+
+from ai.model_router import ModelRouter, RoutedLLM, start_call_trace
+
+
+class FakeLLM(BaseLLM):
+    """Uses as many prompt tokens as the prompt has characters."""
+
+    def call(self, messages, *args, **kwargs):
+        if self.model == "broken":
+            raise ValueError("model unavailable")
+        time.sleep(0.05)
+        prompt_tokens = len(messages)
+        self._track_token_usage_internal({"prompt_tokens": prompt_tokens, "completion_tokens": 1,
+                                          "total_tokens": prompt_tokens + 1})
+        return f"{self.model}: {messages}"
+
+    def supports_function_calling(self):
+        return False
+
+    def supports_stop_words(self):
+        return True
+
+    def get_context_window_size(self):
+        return 8000
+
+
+def make_router(**route):
+    return ModelRouter({"chat": {"primary": "fast", **route}},
+                       llm_factory=lambda model, temperature, max_tokens: FakeLLM(model=model))
+
+
+def test_overlapping_calls_are_charged_their_own_usage():
+    router = make_router()
+    llm = RoutedLLM(router, "chat")
+    traces = {}
+
+    def request(prompt):
+        def run():
+            traces[prompt] = start_call_trace()
+            llm.call(prompt)
+        contextvars.copy_context().run(run)
+
+    threads = [threading.Thread(target=request, args=("x" * length,)) for length in (10, 200, 3000)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for prompt, trace in traces.items():
+        assert trace.usage["prompt_tokens"] == len(prompt)
+        assert trace.usage["total_tokens"] == len(prompt) + 1
+        assert trace.served_by == "fast"
+
+
+def test_falls_back_when_primary_fails():
+    router = make_router(primary="broken", fallback="fast")
+    trace = contextvars.copy_context().run(lambda: (start_call_trace(), RoutedLLM(router, "chat").call("hello"))[0])
+    assert trace.served_by == "fast"
+    assert trace.usage["prompt_tokens"] == 5
+
+
+def test_idle_clients_are_reused():
+    router = make_router()
+    llm = RoutedLLM(router, "chat")
+    for _ in range(3):
+        llm.call("hello")
+    assert len(router._llms) == 1
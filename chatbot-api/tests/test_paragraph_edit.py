@@ -0,0 +1,40 @@
+"""Paragraph-parallel editing (ai/paragraph_edit.py)."""
+
+import threading
+
+from ai.paragraph_edit import ParagraphEditor
+
+DRAFT = """# Remote work
+
+Remote work has changed how teams plan their week and how they share what they learned.
+
+Teh end.
+
+Thanks for reading, and let us know how your own team handles meetings across time zones."""
+
+
+class RecordingEditor:
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, paragraph, goal, context):
+        with self._lock:
+            self.calls.append((paragraph, context))
+        return paragraph.replace("Teh", "The")
+
+
+def test_short_paragraphs_are_edited_with_their_neighbours():
+    editing = RecordingEditor()
+    result = ParagraphEditor(editing, cache=None, context_chars=20).edit(DRAFT, "fix typos")
+
+    assert "The end." in result.text
+    assert result.changes == [{"paragraph": 2, "spans": [
+        {"op": "replace", "offset": 0, "original": "Teh ", "revised": "The "}]}]
+    assert result.paragraphs == 4 and result.paragraphs_edited == 3
+
+    contexts = dict(editing.calls)
+    assert "# Remote work" not in contexts  # Headings are not edited
+    assert "Remote work has changed" in contexts["Teh end."]
+    assert "Thanks for reading" in contexts["Teh end."]
+    assert "Thanks for reading" not in contexts[DRAFT.split("\n\n")[1]]
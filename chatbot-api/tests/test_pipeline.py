@@ -0,0 +1,124 @@
+"""Server-side pipelines of AI actions (ai/pipeline.py) and their streaming endpoint."""
+
+import asyncio
+import json
+
+import pytest
+
+from ai.pipeline import PipelineError, run_pipeline, validate_pipeline
+
+
+def step(step_id, action="edit", inputs=None, depends_on=None, **payload):
+    return {"id": step_id, "action": action, "payload": payload, "inputs": inputs or {}, "depends_on": depends_on or []}
+
+
+def collect(steps, run_step):
+    async def main():
+        return [event async for event in run_pipeline(steps, run_step)]
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("steps, message", [
+    ([], "at least one step"),
+    ([step(str(i)) for i in range(9)], "at most 8"),
+    ([step("a"), step("a")], "Duplicate step ids: a"),
+    ([step("a", action="delete_everything")], "unsupported action"),
+    ([step("a", depends_on=["missing"])], "unknown steps: missing"),
+    ([step("a", depends_on=["b"]), step("b", inputs={"draft_content": "a"}), step("c")], "cycle between steps: a, b"),
+])
+def test_invalid_pipelines_are_rejected(steps, message):
+    with pytest.raises(PipelineError, match=message):
+        validate_pipeline(steps)
+
+
+def test_dependencies_include_inputs_and_ordering_constraints():
+    dependencies = validate_pipeline([step("a"), step("b", inputs={"draft_content": "a"}, depends_on=["a"]),
+                                      step("c", depends_on=["b"], inputs={"content_to_summarize": "a"})])
+    assert dependencies == {"a": [], "b": ["a"], "c": ["a", "b"]}
+
+
+def test_steps_run_once_dependencies_finish_and_branches_run_concurrently():
+    running, overlaps = set(), []
+
+    async def run_step(definition, payload):
+        running.add(definition["id"])
+        if len(running) > 1:
+            overlaps.append(set(running))
+        await asyncio.sleep(0.02)
+        running.discard(definition["id"])
+        return f"{definition['id']}({payload.get('draft_content') or payload.get('content_to_summarize') or ''})"
+
+    events = collect([step("draft", action="trend_based_write"),
+                      step("edit", inputs={"draft_content": "draft"}),
+                      step("summary", action="summarize", inputs={"content_to_summarize": "draft"}),
+                      step("final", inputs={"draft_content": "edit"}, depends_on=["summary"])], run_step)
+
+    order = [event["step"] for event in events]
+    assert order[0] == "draft" and order[-1] == "final" and set(order[1:3]) == {"edit", "summary"}
+    assert {"edit", "summary"} in overlaps
+    assert all(event["status"] == "completed" for event in events)
+    assert events[-1]["response"] == "final(edit(draft()))"
+
+
+def test_failed_step_skips_its_dependents_but_not_other_branches():
+    async def run_step(definition, payload):
+        if definition["id"] == "edit":
+            raise RuntimeError("provider down")
+        return definition["id"]
+
+    events = collect([step("draft"), step("edit", inputs={"draft_content": "draft"}),
+                      step("summary", action="summarize", inputs={"content_to_summarize": "edit"}),
+                      step("final", depends_on=["summary"]), step("other")], run_step)
+    statuses = {event["step"]: event["status"] for event in events}
+    assert statuses == {"draft": "completed", "other": "completed", "edit": "failed",
+                        "summary": "skipped", "final": "skipped"}
+    errors = {event["step"]: event["error"] for event in events if "error" in event}
+    assert errors["edit"] == "provider down" and "summary" in errors["final"]
+
+
+def test_closing_the_stream_cancels_running_steps():
+    cancelled = []
+
+    async def run_step(definition, payload):
+        if definition["id"] == "fast":
+            return "done"
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(definition["id"])
+            raise
+
+    async def main():
+        stream = run_pipeline([step("fast"), step("slow")], run_step)
+        first = await stream.__anext__()
+        await stream.aclose()  # The client went away
+        await asyncio.sleep(0)
+        return first
+
+    assert asyncio.run(main())["step"] == "fast"
+    assert cancelled == ["slow"]
+
+
+def test_pipeline_endpoint_streams_ndjson(client):
+    content = "Indexes speed up reads. They slow down writes a little. Measure before adding one. " * 3
+    response = client.post("/api/v1/invoke", json={"action": "pipeline", "steps": [
+        {"id": "short", "action": "summarize", "payload": {"content_to_summarize": content, "mode": "extractive"}},
+        {"id": "shorter", "action": "summarize", "payload": {"mode": "extractive"},
+         "inputs": {"content_to_summarize": "short"}},
+    ]})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line.get("step") for line in lines] == ["short", "shorter", None]
+    assert lines[-1]["status"] == "done" and lines[-1]["completed"] == 2
+
+
+def test_pipeline_endpoint_rejects_invalid_definitions(client):
+    response = client.post("/api/v1/invoke", json={"action": "pipeline", "steps": [
+        {"id": "a", "action": "edit", "depends_on": ["a"]}]})
+    assert response.status_code == 400 and "cycle" in response.json()["detail"]
+
+
+def test_streaming_response_is_documented(client):
+    responses = client.get("/openapi.json").json()["paths"]["/api/v1/invoke"]["post"]["responses"]
+    assert set(responses["200"]["content"]) == {"application/json", "application/x-ndjson"}
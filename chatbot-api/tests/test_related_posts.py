@@ -0,0 +1,101 @@
+"""Precomputed related posts (ai/related_posts.py)."""
+
+import numpy as np
+import pytest
+
+from ai.related_posts import RelatedPostsIndex, top_k_neighbours
+
+
+def test_top_k_neighbours_matches_brute_force():
+    vectors = np.random.default_rng(3).normal(size=(50, 8)).astype(np.float32)
+    indices, scores = top_k_neighbours(vectors, k=4, block_size=16)
+
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    similarity = normalized @ normalized.T
+    np.fill_diagonal(similarity, -np.inf)
+    expected = np.argsort(-similarity, axis=1)[:, :4]
+    assert (indices == expected).all()
+    assert np.allclose(scores, np.take_along_axis(similarity, expected, axis=1), atol=1e-5)
+
+
+def test_top_k_neighbours_of_tiny_sets():
+    assert top_k_neighbours(np.ones((1, 4)), k=5)[0].shape == (1, 0)
+    indices, _ = top_k_neighbours(np.eye(3), k=5)
+    assert indices.shape == (3, 2)
+
+
+def posts(*ids):
+    return [{"post_id": post_id, "title": f"Title {post_id}", "content": f"Content of post {post_id}.",
+             "author": "a"} for post_id in ids]
+
+
+@pytest.fixture
+def setup(make_rag_system, tmp_path):
+    rag_system = make_rag_system()
+    rag_system.upsert_blog_posts(posts(*[f"p{i}" for i in range(12)]))
+    index = RelatedPostsIndex(rag_system, k=3, path=str(tmp_path / "related.json"))
+    index.rebuild()
+    return rag_system, index
+
+
+def drain(index):
+    index._drain_events(index._events.get_nowait())
+
+
+def graph_ids(index):
+    return {post_id: [neighbour for neighbour, _ in neighbours] for post_id, neighbours in index._neighbours.items()}
+
+
+def rebuilt_ids(rag_system):
+    fresh = RelatedPostsIndex(rag_system, k=3, path=None)
+    fresh.rebuild()
+    return graph_ids(fresh)
+
+
+def test_inserted_post_gets_neighbours_and_is_offered_to_theirs(setup):
+    rag_system, index = setup
+    rag_system.upsert_blog_posts(posts("new"))
+    drain(index)
+
+    expected = rebuilt_ids(rag_system)
+    assert graph_ids(index) == expected
+    # Similarity is symmetric: posts that rank the new post in their top k now list it
+    assert any("new" in neighbours for post_id, neighbours in expected.items() if post_id != "new")
+    assert index.get_related("new")[0]["title"].startswith("Title ")
+
+
+def test_deleted_post_is_removed_from_every_list(setup):
+    rag_system, index = setup
+    victim = index._neighbours["p0"][0][0]
+    rag_system.delete_blog_posts([victim])
+    drain(index)
+
+    assert index.get_related(victim) is None
+    assert all(victim not in neighbours for neighbours in graph_ids(index).values())
+    assert graph_ids(index) == rebuilt_ids(rag_system)
+
+
+def test_title_changes_are_picked_up(setup):
+    rag_system, index = setup
+    rag_system.upsert_blog_posts([{**posts("p1")[0], "metadata": {"category": "x"}}])
+    rag_system.update_blog_post("p1", title="Renamed")
+    while not index._events.empty():
+        drain(index)
+    assert any(item["title"] == "Renamed" for post_id in index._neighbours
+               for item in index.get_related(post_id) if item["post_id"] == "p1")
+
+
+def test_saved_graph_is_reused_only_while_the_knowledge_base_is_unchanged(setup, tmp_path):
+    rag_system, index = setup
+    assert RelatedPostsIndex(rag_system, k=3, path=index.path).load()
+
+    # A post deleted and another added while the service was down: same count, different posts
+    rag_system.delete_blog_posts(["p5"])
+    rag_system.upsert_blog_posts(posts("added"))
+    assert not RelatedPostsIndex(rag_system, k=3, path=index.path).load()
+
+
+def test_saved_graph_is_not_reused_after_an_edit(setup):
+    rag_system, index = setup
+    rag_system.upsert_blog_posts([{**posts("p2")[0], "content": "Completely different text."}])
+    assert not RelatedPostsIndex(rag_system, k=3, path=index.path).load()
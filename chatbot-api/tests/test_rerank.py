@@ -0,0 +1,82 @@
+"""BM25 lexical reranking and the reranking stage's caching (ai/rerank.py)."""
+
+from ai.rerank import LexicalReranker, RerankingStage
+
+DOCUMENTS = {
+    "hnsw": ("HNSW indexes", "HNSW builds a layered graph; ef_search trades HNSW recall for latency."),
+    "bm25": ("Lexical search", "BM25 ranks documents by term frequency and inverse document frequency."),
+    "bread": ("Sourdough", "A lively starter and a hot oven make good sourdough bread."),
+    "tuning": ("Index tuning", "Tune the index by measuring recall and latency on real queries."),
+}
+
+
+def result(post_id, similarity=0.5):
+    title, content = DOCUMENTS[post_id]
+    return {"post_id": post_id, "content": content, "similarity_score": similarity,
+            "metadata": {"title": title, "content_hash": f"hash-{post_id}"}}
+
+
+def test_bm25_prefers_matching_documents():
+    reranker = LexicalReranker()
+    documents = [DOCUMENTS[post_id][1] for post_id in ("bread", "hnsw", "tuning")]
+    titles = [DOCUMENTS[post_id][0] for post_id in ("bread", "hnsw", "tuning")]
+    scores = reranker.score("how does HNSW recall depend on ef_search", documents, titles)
+    assert scores[1] > scores[2] > scores[0] == 0.0
+
+
+def test_bm25_rare_terms_weigh_more():
+    reranker = LexicalReranker(title_boost=0.0, bigram_boost=0.0)
+    documents = ["index recall", "index latency", "index graph"]
+    scores = reranker.score("index recall", documents, ["", "", ""])
+    assert scores[0] > scores[1] == scores[2] > 0
+
+
+def test_stopword_only_query_scores_zero():
+    assert LexicalReranker().score("what is the", ["anything"], [""]) == [0.0]
+
+
+def test_cached_statistics_give_the_same_scores():
+    reranker = LexicalReranker()
+    documents = [DOCUMENTS[post_id][1] for post_id in DOCUMENTS]
+    titles = [DOCUMENTS[post_id][0] for post_id in DOCUMENTS]
+    keys = list(DOCUMENTS)
+    first = reranker.score("HNSW recall latency", documents, titles, keys=keys)
+    second = reranker.score("HNSW recall latency", documents, titles, keys=keys)
+    assert first == second
+    assert (reranker.cache_hits, reranker.cache_misses) == (4, 4)
+
+
+def test_order_does_not_depend_on_cache_state():
+    """A partial cache hit must rank the candidate set exactly as a cold cache does."""
+    query = "HNSW recall and latency"
+    candidates = [result(post_id) for post_id in ("bread", "tuning", "hnsw", "bm25")]
+
+    cold = RerankingStage(LexicalReranker(), latency_budget_ms=5000)
+    expected = cold.rerank(query, candidates, top_n=4)
+
+    warm = RerankingStage(LexicalReranker(), latency_budget_ms=5000)
+    warm.rerank(query, candidates[:2], top_n=2)  # Caches part of the candidate set
+    assert warm.rerank(query, candidates, top_n=4) == expected
+    assert [item["post_id"] for item in expected][0] == "hnsw"
+
+
+def test_pairwise_scores_are_cached():
+    class CountingReranker:
+        name = "counting"
+        vector_weight = 0.0
+        pairwise = True
+
+        def __init__(self):
+            self.scored = 0
+
+        def score(self, query, documents, titles, keys=None):
+            self.scored += len(documents)
+            return [float(len(document)) for document in documents]
+
+    reranker = CountingReranker()
+    stage = RerankingStage(reranker, latency_budget_ms=5000)
+    candidates = [result(post_id) for post_id in DOCUMENTS]
+    stage.rerank("query", candidates, top_n=2)
+    stage.rerank("query", candidates, top_n=2)
+    assert reranker.scored == 4
+    assert stage.stats()["cache_hit_rate"] == 0.5
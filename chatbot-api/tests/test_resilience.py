@@ -0,0 +1,168 @@
+"""Circuit breaker, retry budget and error classification (ai/resilience.py)."""
+
+import time
+
+import pytest
+
+from ai.resilience import (CircuitBreaker, CircuitOpenError, DeadlineExceededError, ResiliencePolicy,
+                           RetryBudget, action_deadline, is_transient_error)
+
+
+class ProviderError(Exception):
+    def __init__(self, status_code):
+        self.status_code = status_code
+        super().__init__(f"HTTP {status_code}")
+
+
+class Flaky:
+    """Fails with each of `errors` in turn, then answers."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def make_policy(**kwargs):
+    options = dict(timeout=5.0, max_attempts=3, backoff_base=0.001,
+                   breaker=CircuitBreaker(failure_threshold=3, recovery_timeout=60.0),
+                   retry_budget=RetryBudget(ratio=0.0, min_per_second=0.0, max_tokens=10.0))
+    options.update(kwargs)
+    return ResiliencePolicy("test", **options)
+
+
+@pytest.mark.parametrize("error, transient", [
+    (TimeoutError(), True),
+    (ConnectionError(), True),
+    (ProviderError(429), True),
+    (ProviderError(503), True),
+    (ProviderError(400), False),
+    (ProviderError(401), False),
+    (ValueError("Invalid response from LLM call"), False),
+    (type("LLMContextLengthExceededError", (Exception,), {})(), False),
+    (type("APITimeoutError", (Exception,), {})(), True),
+])
+def test_error_classification(error, transient):
+    assert is_transient_error(error) is transient
+
+
+def test_wrapped_transient_error_is_transient():
+    try:
+        try:
+            raise ConnectionError("reset")
+        except ConnectionError as e:
+            raise RuntimeError("provider call failed") from e
+    except RuntimeError as wrapped:
+        assert is_transient_error(wrapped)
+
+
+def test_breaker_opens_after_threshold_and_lets_one_probe_through():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open and not breaker.allow()
+    assert breaker.retry_after() > 0
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert not breaker.allow()  # Only one probe while half-open
+    breaker.record_failure()
+    assert breaker.is_open
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+
+
+def test_retry_budget_is_spent_and_earned_back_by_calls():
+    budget = RetryBudget(ratio=0.5, min_per_second=0.0, max_tokens=2.0)
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+    budget.record_call()
+    assert not budget.try_spend()
+    budget.record_call()
+    assert budget.try_spend()
+
+
+def test_transient_errors_are_retried():
+    policy = make_policy()
+    func = Flaky(ConnectionError("reset"), ProviderError(429))
+    assert policy.call(func) == "ok"
+    assert func.calls == 3
+    assert policy.retries == 2 and policy.failures == 2
+
+
+def test_retries_stop_when_budget_is_spent():
+    policy = make_policy(retry_budget=RetryBudget(ratio=0.0, min_per_second=0.0, max_tokens=1.0))
+    func = Flaky(ConnectionError("reset"), ConnectionError("reset"))
+    with pytest.raises(ConnectionError):
+        policy.call(func)
+    assert func.calls == 2
+
+
+@pytest.mark.parametrize("error", [ProviderError(400), ProviderError(401), ValueError("context too long")])
+def test_rejected_requests_are_not_retried_or_counted_by_the_breaker(error):
+    policy = make_policy()
+    for _ in range(5):
+        func = Flaky(error)
+        with pytest.raises(type(error)):
+            policy.call(func)
+        assert func.calls == 1
+    assert policy.breaker.state == CircuitBreaker.CLOSED
+    assert policy.retries == 0 and policy.failures == 0 and policy.rejected == 5
+
+
+def test_transient_failures_open_the_breaker():
+    policy = make_policy(max_attempts=1)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            policy.call(Flaky(ConnectionError("reset")))
+    with pytest.raises(CircuitOpenError):
+        policy.call(Flaky(ConnectionError("reset")))
+    assert policy.breaker.is_open
+    func = Flaky()
+    with pytest.raises(CircuitOpenError):
+        policy.call(func)
+    assert func.calls == 0 and policy.short_circuited == 1
+
+
+def test_hedged_rejection_is_raised_without_retry():
+    policy = make_policy(hedge_min_samples=1)
+    policy.latency.record(0.01)
+
+    def slow_rejection():
+        time.sleep(0.05)
+        raise ProviderError(400)
+
+    with pytest.raises(ProviderError):
+        policy.call(slow_rejection)
+    # The hedge was sent before the rejection arrived; the rejection isn't retried on top of it
+    assert policy.hedges == 1 and policy.retries == 0
+
+
+def test_caller_deadline_does_not_count_against_the_provider():
+    policy = make_policy(breaker=CircuitBreaker(failure_threshold=1, recovery_timeout=0.05))
+    func = Flaky()
+    with action_deadline("chat", seconds=0.001):
+        time.sleep(0.01)  # Spent waiting in a queue
+        with pytest.raises(DeadlineExceededError):
+            policy.call(func)
+    assert func.calls == 0 and policy.breaker.state == CircuitBreaker.CLOSED
+
+    # Nor does it use up the single half-open probe
+    with pytest.raises(CircuitOpenError):
+        policy.call(Flaky(ConnectionError("reset")))
+    time.sleep(0.06)
+    with action_deadline("chat", seconds=0.001):
+        time.sleep(0.01)
+        with pytest.raises(DeadlineExceededError):
+            policy.call(func)
+    assert policy.call(func) == "ok"
+    assert policy.breaker.state == CircuitBreaker.CLOSED
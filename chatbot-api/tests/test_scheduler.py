@@ -0,0 +1,101 @@
+"""Priority classes, weighted fair queuing and per-client rate limits (ai/scheduler.py)."""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from ai.scheduler import AIScheduler, RateLimitExceeded, SchedulerOverloadedError, TokenBucket
+
+
+def test_token_bucket_allows_a_burst_then_refills():
+    bucket = TokenBucket(capacity=2, refill_rate=10.0)
+    assert bucket.try_consume() == (True, 0.0)
+    assert bucket.try_consume() == (True, 0.0)
+    allowed, retry_after = bucket.try_consume()
+    assert not allowed and 0 < retry_after <= 0.1
+
+    time.sleep(0.11)
+    assert bucket.try_consume()[0]
+
+
+def test_token_bucket_caps_cost_at_capacity():
+    bucket = TokenBucket(capacity=2, refill_rate=1.0)
+    assert bucket.try_consume(5.0)[0]  # A single expensive job is allowed from a full bucket
+    assert not bucket.try_consume(1.0)[0]
+
+
+def run_jobs(scheduler, jobs, blocker_action="edit"):
+    """
+    Occupy the only worker, queue `jobs` ((action, client_id) pairs) behind it,
+    then release it and return the order the jobs ran in.
+    """
+    order = []
+    release = threading.Event()
+
+    async def main():
+        blocker = asyncio.ensure_future(scheduler.submit(blocker_action, "blocker", release.wait))
+        await asyncio.sleep(0.01)
+        waiting = [asyncio.ensure_future(scheduler.submit(action, client, order.append, f"{client}:{action}"))
+                   for action, client in jobs]
+        await asyncio.sleep(0.01)
+        assert scheduler.queue_depth() == len(jobs)
+        release.set()
+        await asyncio.gather(blocker, *waiting)
+
+    asyncio.run(main())
+    return order
+
+
+def test_higher_priority_runs_first():
+    scheduler = AIScheduler(max_concurrency=1)
+    order = run_jobs(scheduler, [("trend_based_write", "a"), ("edit", "b"), ("chat", "c")])
+    assert order == ["c:chat", "b:edit", "a:trend_based_write"]
+
+
+def test_clients_share_a_priority_class_fairly():
+    scheduler = AIScheduler(max_concurrency=1)
+    order = run_jobs(scheduler, [("edit", "a"), ("edit", "a"), ("edit", "a"), ("edit", "b")])
+    # b's single job goes ahead of a's backlog instead of waiting behind it
+    assert order == ["a:edit", "b:edit", "a:edit", "a:edit"]
+
+
+def test_client_weights_scale_their_share():
+    scheduler = AIScheduler(max_concurrency=1, client_weights={"heavy": 2.0})
+    order = run_jobs(scheduler, [("edit", "light"), ("edit", "light"), ("edit", "heavy"), ("edit", "heavy"),
+                                 ("edit", "heavy")])
+    # Twice the weight: each heavy job advances the client's virtual finish time half as far
+    assert order == ["heavy:edit", "light:edit", "heavy:edit", "heavy:edit", "light:edit"]
+
+
+def test_rate_limit_is_per_client():
+    scheduler = AIScheduler(rate_capacity=2, rate_refill_per_second=0.5)
+
+    async def main():
+        await scheduler.submit("chat", "a", lambda: None)
+        await scheduler.submit("chat", "a", lambda: None)
+        with pytest.raises(RateLimitExceeded) as error:
+            await scheduler.submit("chat", "a", lambda: None)
+        assert error.value.retry_after == 2
+        await scheduler.submit("chat", "b", lambda: None)
+
+    asyncio.run(main())
+    assert scheduler.stats()["rejected"] == 1
+
+
+def test_full_queue_is_rejected():
+    scheduler = AIScheduler(max_concurrency=1, max_queue_depth=1)
+    release = threading.Event()
+
+    async def main():
+        blocker = asyncio.ensure_future(scheduler.submit("edit", "a", release.wait))
+        await asyncio.sleep(0.01)
+        queued = asyncio.ensure_future(scheduler.submit("edit", "b", lambda: None))
+        await asyncio.sleep(0.01)
+        with pytest.raises(SchedulerOverloadedError):
+            await scheduler.submit("edit", "c", lambda: None)
+        release.set()
+        await asyncio.gather(blocker, queued)
+
+    asyncio.run(main())
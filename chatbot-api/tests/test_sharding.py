@@ -0,0 +1,77 @@
+"""Jump-hash and time sharding of the knowledge base (ai/sharding.py)."""
+
+import random
+from collections import Counter
+
+import pytest
+
+from ai.sharding import HashSharding, TimeSharding, jump_hash
+
+KEYS = [random.Random(i).getrandbits(64) for i in range(5000)]
+
+
+def test_jump_hash_stays_in_range_and_is_balanced():
+    counts = Counter(jump_hash(key, 8) for key in KEYS)
+    assert set(counts) == set(range(8))
+    expected = len(KEYS) / 8
+    assert all(abs(count - expected) < expected * 0.15 for count in counts.values())
+    assert jump_hash(KEYS[0], 1) == 0
+
+
+def test_adding_a_bucket_only_moves_keys_to_it():
+    moved = 0
+    for key in KEYS:
+        before, after = jump_hash(key, 8), jump_hash(key, 9)
+        if before != after:
+            assert after == 8
+            moved += 1
+    assert moved == pytest.approx(len(KEYS) / 9, rel=0.15)
+
+
+def test_hash_sharding_is_stable_per_post():
+    sharding = HashSharding(shards=4)
+    assert sharding.initial_shards() == ["00", "01", "02", "03"]
+    assert sharding.shard_for("post-1", None) == HashSharding(shards=4).shard_for("post-1", {"title": "x"})
+    assert {sharding.shard_for(f"post-{i}", None) for i in range(100)} == set(sharding.initial_shards())
+
+
+@pytest.mark.parametrize("period, shard", [("month", "2026-02"), ("quarter", "2026-q1"), ("year", "2026")])
+def test_time_sharding_buckets_by_created_at(period, shard):
+    assert TimeSharding(period).shard_for("post", {"created_at": "2026-02-14T10:00:00"}) == shard
+
+
+def test_time_sharding_rejects_unknown_period():
+    with pytest.raises(ValueError):
+        TimeSharding("week")
+
+
+def posts(count):
+    return [{"post_id": f"post-{i}", "title": f"Post {i}", "content": f"Notes on topic {i} and related ideas.",
+             "author": "a"} for i in range(count)]
+
+
+def test_sharded_store_routes_writes_and_merges_queries(make_rag_system):
+    rag_system = make_rag_system(sharding=HashSharding(shards=3))
+    rag_system.upsert_blog_posts(posts(30))
+
+    shards = rag_system.collection.stats()["shards"]
+    assert sorted(shards) == ["blog_posts_00", "blog_posts_01", "blog_posts_02"]
+    assert sum(shards.values()) == 30 and all(shards.values())
+    for key, shard in rag_system.collection.sorted_shards():
+        assert all(HashSharding(3).shard_for(post_id, None) == key for post_id in shard.get(include=[])["ids"])
+
+    assert rag_system.get_post_by_id("post-7")["metadata"]["title"] == "Post 7"
+    results = rag_system.collection.query(query_texts=["Notes on topic 7 and related ideas."], n_results=5)
+    assert results["ids"][0][0] == "post-7"
+    assert results["distances"][0] == sorted(results["distances"][0])
+
+
+def test_rebalance_after_adding_a_shard_moves_only_posts_the_new_shard_takes(make_rag_system):
+    make_rag_system(sharding=HashSharding(shards=3)).upsert_blog_posts(posts(60))
+
+    rag_system = make_rag_system(sharding=HashSharding(shards=4))
+    result = rag_system.rebalance_shards()
+    shards = rag_system.collection.stats()["shards"]
+    assert result["moved"] == shards["blog_posts_03"] > 0
+    assert sum(shards.values()) == 60
+    assert rag_system.rebalance_shards()["moved"] == 0
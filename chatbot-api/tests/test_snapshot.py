@@ -0,0 +1,119 @@
+"""Binary knowledge base snapshots (ai/snapshot.py)."""
+
+import json
+
+import numpy as np
+import pytest
+
+from ai.snapshot import FORMAT_VERSION, MAGIC, PREAMBLE, SnapshotError, export_snapshot, import_snapshot, read_snapshot
+
+
+class OtherEmbeddingFunction:
+    model_name = "other-model"
+
+    @staticmethod
+    def name():
+        return "other"
+
+
+@pytest.fixture
+def source(make_rag_system):
+    rag_system = make_rag_system("source")
+    rag_system.upsert_blog_posts([
+        {"post_id": f"p{i}", "title": f"Post {i}", "content": f"Content of post {i}.", "author": "a",
+         "tags": ["x"]} for i in range(5)])
+    return rag_system
+
+
+@pytest.fixture
+def snapshot_path(source, tmp_path):
+    path = str(tmp_path / "kb.snapshot")
+    export_snapshot(source.collection, path, source.embedding_function)
+    return path
+
+
+def split(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    _, version, header_length = PREAMBLE.unpack(data[:PREAMBLE.size])
+    header = json.loads(data[PREAMBLE.size:PREAMBLE.size + header_length])
+    return version, header, data[PREAMBLE.size + header_length:]
+
+
+def write(path, header, body, version=FORMAT_VERSION):
+    header_bytes = json.dumps(header).encode("utf-8")
+    with open(path, "wb") as f:
+        f.write(PREAMBLE.pack(MAGIC, version, len(header_bytes)) + header_bytes + body)
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_round_trip(source, make_rag_system, tmp_path, dtype):
+    path = str(tmp_path / "kb.snapshot")
+    export_snapshot(source.collection, path, source.embedding_function, dtype=dtype)
+    target = make_rag_system("target")
+    header = import_snapshot(target.collection, path, target.embedding_function)
+
+    assert header["count"] == 5
+    original = source.collection.get(include=["documents", "metadatas", "embeddings"])
+    restored = target.collection.get(ids=original["ids"], include=["documents", "metadatas", "embeddings"])
+    assert restored["documents"] == original["documents"]
+    assert restored["metadatas"] == original["metadatas"]
+    assert np.allclose(restored["embeddings"], original["embeddings"], atol=0.5 if dtype == "float16" else 0)
+
+
+def test_checksum_mismatch(snapshot_path):
+    version, header, body = split(snapshot_path)
+    corrupted = bytearray(body)
+    corrupted[-1] ^= 0xFF
+    write(snapshot_path, header, bytes(corrupted))
+    with pytest.raises(SnapshotError, match="Checksum mismatch in snapshot section vectors"):
+        read_snapshot(snapshot_path)
+
+
+def test_truncation(snapshot_path):
+    with open(snapshot_path, "rb") as f:
+        data = f.read()
+    with open(snapshot_path, "wb") as f:
+        f.write(data[:-10])
+    with pytest.raises(SnapshotError, match="section vectors is truncated"):
+        read_snapshot(snapshot_path)
+
+    with open(snapshot_path, "wb") as f:
+        f.write(data[:5])
+    with pytest.raises(SnapshotError, match="truncated"):
+        read_snapshot(snapshot_path)
+
+
+def test_newer_version_is_rejected(snapshot_path):
+    _, header, body = split(snapshot_path)
+    write(snapshot_path, header, body, version=FORMAT_VERSION + 1)
+    with pytest.raises(SnapshotError, match="newer than supported"):
+        read_snapshot(snapshot_path)
+
+
+@pytest.mark.parametrize("change", [
+    lambda header: header.pop("sections"),
+    lambda header: header.pop("dtype"),
+    lambda header: header.pop("count"),
+    lambda header: header.update(dtype="int4"),
+    lambda header: header.update(count="5"),
+    lambda header: header["sections"].pop("vectors"),
+    lambda header: header["sections"]["records"].pop("sha256"),
+    lambda header: header.update(dim=3),
+])
+def test_malformed_header_is_a_snapshot_error(snapshot_path, change):
+    _, header, body = split(snapshot_path)
+    change(header)
+    write(snapshot_path, header, body)
+    with pytest.raises(SnapshotError):
+        read_snapshot(snapshot_path)
+
+
+def test_embedding_model_mismatch(snapshot_path, make_rag_system):
+    target = make_rag_system("target")
+    with pytest.raises(SnapshotError, match="made with test-hash embeddings, but this store uses other:other-model"):
+        import_snapshot(target.collection, snapshot_path, OtherEmbeddingFunction())
+    assert target.collection.count() == 0
+
+    import_snapshot(target.collection, snapshot_path, OtherEmbeddingFunction(), force=True)
+    assert target.collection.count() == 5
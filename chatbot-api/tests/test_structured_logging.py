@@ -0,0 +1,103 @@
+"""Structured, sampled, non-blocking logging (ai/structured_logging.py)."""
+
+import contextvars
+import json
+import logging
+import queue
+import sys
+
+import pytest
+
+from ai.resilience import action_deadline
+from ai.structured_logging import (JsonFormatter, NonBlockingQueueHandler, RequestLogContext, SamplingFilter,
+                                   _request_log_context, parse_sample_rates, start_request_log)
+
+
+def record(level=logging.INFO, msg="hello %s", args=("world",), exc_info=None):
+    return logging.getLogger("tests.app").makeRecord("tests.app", level, __file__, 1, msg, args, exc_info)
+
+
+def in_request(func, sample, request_id="req-1"):
+    """Run `func` in a fresh context whose request drew `sample`."""
+    def run():
+        _request_log_context.set(RequestLogContext(request_id=request_id, sample=sample))
+        return func()
+    return contextvars.copy_context().run(run)
+
+
+def test_parse_sample_rates():
+    assert parse_sample_rates("DEBUG=0.1, info=0.2,,WARNING=3") == \
+        {logging.DEBUG: 0.1, logging.INFO: 0.2, logging.WARNING: 1.0}
+    with pytest.raises(ValueError, match="LOUD"):
+        parse_sample_rates("LOUD=1")
+
+
+def test_sampling_is_decided_once_per_request():
+    sampling = SamplingFilter({logging.DEBUG: 0.1, logging.INFO: 0.5})
+
+    # A request that drew 0.3 keeps all of its INFO records and none of its DEBUG records
+    kept = in_request(lambda: [sampling.filter(record()) for _ in range(5)], sample=0.3)
+    dropped = in_request(lambda: [sampling.filter(record(logging.DEBUG)) for _ in range(5)], sample=0.3)
+    assert kept == [True] * 5 and dropped == [False] * 5
+    # One that drew 0.7 drops its INFO records too
+    assert in_request(lambda: sampling.filter(record()), sample=0.7) is False
+    assert sampling.sampled_out == {"DEBUG": 5, "INFO": 1}
+
+
+def test_warnings_and_records_outside_requests_are_kept():
+    sampling = SamplingFilter({logging.INFO: 0.0, logging.WARNING: 0.0})
+    warning = record(logging.WARNING)
+    assert in_request(lambda: sampling.filter(warning), sample=0.99)
+    assert warning.request_id == "req-1"
+
+    startup = record()
+    assert contextvars.Context().run(sampling.filter, startup)
+    assert startup.request_id is None and startup.action is None
+
+
+def test_kept_records_are_tagged_with_request_and_action():
+    def log():
+        start_request_log("req-42")
+        with action_deadline("summarize"):
+            entry = record()
+            SamplingFilter({}).filter(entry)
+        return entry
+
+    entry = contextvars.copy_context().run(log)
+    assert (entry.request_id, entry.action) == ("req-42", "summarize")
+
+
+def test_json_formatter_fields():
+    entry = record()
+    entry.request_id, entry.action = "req-1", "chat"
+    data = json.loads(JsonFormatter().format(entry))
+    assert data["level"] == "INFO" and data["logger"] == "tests.app" and data["message"] == "hello world"
+    assert (data["request_id"], data["action"]) == ("req-1", "chat")
+    assert data["ts"].endswith("+00:00")
+
+    try:
+        raise ValueError("bad input")
+    except ValueError:
+        failed = record(logging.ERROR, "failed", (), sys.exc_info())
+    data = json.loads(JsonFormatter().format(failed))
+    assert "request_id" not in data and "ValueError: bad input" in data["exception"]
+
+
+def test_queue_handler_drops_records_when_full():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=2))
+    for _ in range(5):
+        handler.emit(record())
+    assert handler.queue.qsize() == 2
+    assert handler.dropped == 3
+
+
+def test_queue_handler_resolves_message_and_exception_before_queueing():
+    handler = NonBlockingQueueHandler(queue.Queue())
+    try:
+        raise KeyError("missing")
+    except KeyError:
+        handler.emit(record(logging.ERROR, "lookup of %s failed", ("post-1",), sys.exc_info()))
+    queued = handler.queue.get_nowait()
+    assert (queued.msg, queued.args, queued.exc_info) == ("lookup of post-1 failed", None, None)
+    assert "KeyError: 'missing'" in queued.exc_text
+    assert "KeyError" in json.loads(JsonFormatter().format(queued))["exception"]
@@ -0,0 +1,75 @@
+"""Parallel research for trend-based writing (ai/trend_research.py)."""
+
+import json
+
+from ai.trend_research import TrendResearcher, parse_search_results
+
+
+def result(url, score, title="Result", content="Edge AI moves inference onto devices. It cuts latency."):
+    return {"url": url, "title": title, "content": content, "score": score}
+
+
+class StubSearch:
+    """Answers each sub-query with canned results; queries containing a key in `failures` raise."""
+
+    def __init__(self, responses, failures=()):
+        self.responses = responses
+        self.failures = failures
+        self.queries = []
+
+    def __call__(self, query):
+        self.queries.append(query)
+        if any(failure in query for failure in self.failures):
+            raise ConnectionError("search provider down")
+        for key, response in self.responses.items():
+            if key in query:
+                return response
+        return {"results": []}
+
+
+def test_parse_search_results():
+    assert parse_search_results(json.dumps({"results": [result("a", 1), {"url": "no content"}]})) == [result("a", 1)]
+    assert parse_search_results([result("a", 1)]) == [result("a", 1)]
+    assert parse_search_results("Search is temporarily unavailable") == []
+
+
+def test_results_are_deduplicated_by_url_keeping_the_best_copy():
+    search = StubSearch({
+        "latest news": {"results": [result("https://www.example.com/edge?utm_source=x", 0.4, title="Low"),
+                                    result("https://other.org/b", 0.5, title="Other")]},
+        "trends": json.dumps({"results": [result("http://example.com/edge/#top", 0.9, title="High")]}),
+    })
+    researcher = TrendResearcher(search, num_queries=2)
+    brief = researcher.research("edge AI")
+
+    lines = brief.splitlines()
+    assert [line.split(" (")[0] for line in lines] == ["- High", "- Other"]
+    assert researcher.stats()["duplicates_removed"] == 1
+    assert sorted(search.queries) == sorted(researcher.subqueries("edge AI"))
+
+
+def test_failed_searches_do_not_sink_the_brief():
+    search = StubSearch({"trends": {"results": [result("https://example.com/a", 0.8, title="Kept")]}},
+                        failures=("latest news", "statistics"))
+    researcher = TrendResearcher(search, num_queries=4)
+    brief = researcher.research("edge AI")
+    assert brief.startswith("- Kept (https://example.com/a): ")
+    stats = researcher.stats()
+    assert (stats["searches"], stats["failed_searches"], stats["results"]) == (4, 2, 1)
+
+
+def test_no_results_gives_an_empty_brief():
+    researcher = TrendResearcher(StubSearch({}, failures=("edge",)))
+    assert researcher.research("edge AI") == ""
+
+
+def test_brief_is_capped_at_brief_chars():
+    results = [result(f"https://example.com/{i}", 1 - i / 100, title=f"Result {i}") for i in range(20)]
+    researcher = TrendResearcher(StubSearch({"latest news": {"results": results}}), num_queries=1, brief_chars=400)
+    brief = researcher.research("edge AI")
+
+    assert 0 < len(brief) <= 400
+    lines = brief.splitlines()
+    # Best-scored results first, whole entries only
+    assert [line.split(" (")[0] for line in lines] == [f"- Result {i}" for i in range(len(lines))]
+    assert all(line.endswith("It cuts latency.") for line in lines)
@@ -0,0 +1,100 @@
+"""Incremental ingest (BlogRAGSystem.upsert_blog_posts and update_blog_post)."""
+
+import pytest
+
+from tests.test_dedup import BASE, NEAR_COPY, duplicate_flags
+
+
+@pytest.fixture
+def rag_system(make_rag_system, monkeypatch):
+    rag_system = make_rag_system()
+    rag_system.embedded = []
+    embedding_class = type(rag_system.embedding_function)
+    embed = embedding_class.__call__
+
+    def counting(self, input):
+        rag_system.embedded.extend(input)
+        return embed(self, input)
+    monkeypatch.setattr(embedding_class, "__call__", counting)
+
+    rag_system.events = []
+    rag_system.add_listener(lambda event, post_ids: rag_system.events.append((event, sorted(post_ids))))
+    return rag_system
+
+
+def post(post_id, content="Indexes speed up reads and slow down writes.", **fields):
+    return {"post_id": post_id, "title": f"Title {post_id}", "content": content, "author": "a", **fields}
+
+
+def metadata(rag_system, post_id):
+    return rag_system.collection.get(ids=[post_id], include=["metadatas"])["metadatas"][0]
+
+
+def test_statuses_and_what_gets_embedded(rag_system):
+    assert rag_system.upsert_blog_posts([post("a"), post("b", "Caching avoids repeated work."),
+                                         post("c", "Sharding spreads data over nodes.")]) == \
+        {"a": "created", "b": "created", "c": "created"}
+    created_at = metadata(rag_system, "a")["created_at"]
+    rag_system.embedded.clear()
+    rag_system.events.clear()
+
+    statuses = rag_system.upsert_blog_posts([
+        post("a", "Indexes speed up reads. Writes pay for them."),  # New text
+        post("b", "Caching avoids repeated work.", tags=["caching"]),  # Same text, new tags
+        post("c", "Sharding spreads data over nodes."),  # Nothing changed
+    ])
+    assert statuses == {"a": "updated", "b": "metadata_updated", "c": "unchanged"}
+    assert len(rag_system.embedded) == 1 and "Writes pay for them" in rag_system.embedded[0]
+    assert rag_system.events == [("upserted", ["a"]), ("metadata_updated", ["b"])]
+
+    updated = metadata(rag_system, "a")
+    assert updated["created_at"] == created_at and "updated_at" in updated
+    assert metadata(rag_system, "b")["tags"] == "caching"
+    assert "updated_at" not in metadata(rag_system, "c")
+
+
+def test_last_occurrence_of_a_post_wins(rag_system):
+    assert rag_system.upsert_blog_posts([post("a", "First version of it."), post("a", "Second version of it.")]) == \
+        {"a": "created"}
+    assert "Second version" in rag_system.get_post_by_id("a")["content"]
+
+
+def test_update_blog_post_metadata_only(rag_system):
+    rag_system.upsert_blog_posts([post("a", tags=["db"], metadata={"category": "databases"})])
+    rag_system.embedded.clear()
+
+    assert rag_system.update_blog_post("a", metadata={"featured": True})
+    assert rag_system.embedded == []
+    stored = metadata(rag_system, "a")
+    assert (stored["featured"], stored["category"], stored["tags"], stored["title"]) == \
+        (True, "databases", "db", "Title a")
+    assert rag_system.events[-1] == ("metadata_updated", ["a"])
+
+    # Nothing new: no write at all
+    rag_system.events.clear()
+    assert rag_system.update_blog_post("a", metadata={"featured": True})
+    assert rag_system.events == []
+
+
+def test_update_blog_post_with_new_title_re_embeds(rag_system):
+    rag_system.upsert_blog_posts([post("a")])
+    rag_system.embedded.clear()
+    assert rag_system.update_blog_post("a", title="Renamed")
+    assert len(rag_system.embedded) == 1 and rag_system.embedded[0].startswith("Title: Renamed")
+    assert "Indexes speed up reads" in rag_system.get_post_by_id("a")["content"]
+
+
+def test_update_of_a_missing_post_fails(rag_system):
+    assert rag_system.update_blog_post("missing", title="x") is False
+
+
+def test_metadata_only_update_keeps_duplicate_flags(rag_system):
+    """Regression: a metadata-only update of a flagged duplicate used to drop its flags."""
+    rag_system.upsert_blog_posts([post("original", BASE), post("copy", NEAR_COPY)])
+    flags = duplicate_flags(rag_system, "copy")
+    assert flags["duplicate_of"] == "original"
+
+    assert rag_system.upsert_blog_posts([post("copy", NEAR_COPY, tags=["again"])]) == {"copy": "metadata_updated"}
+    assert duplicate_flags(rag_system, "copy") == flags
+    assert rag_system.update_blog_post("copy", metadata={"category": "x"})
+    assert duplicate_flags(rag_system, "copy") == flags
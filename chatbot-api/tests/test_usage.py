@@ -0,0 +1,131 @@
+"""Token usage ledger and budgets (ai/usage.py) and how the API applies them."""
+
+import asyncio
+
+import pytest
+
+import main
+from ai.model_router import current_call_trace
+from ai.usage import BudgetExceededError, UsageLedger
+
+
+class Result:
+    def __init__(self, **token_usage):
+        self.token_usage = token_usage
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = UsageLedger(db_path=str(tmp_path / "usage.db"), conversation_budget=100,
+                         client_budget=150, client_window_seconds=3600)
+    yield ledger
+    ledger.stop()
+
+
+def test_record_prefers_explicit_usage_over_result(ledger):
+    record = ledger.record("chat", Result(prompt_tokens=9000, completion_tokens=1000),
+                           usage={"prompt_tokens": 30, "completion_tokens": 10})
+    assert (record.prompt_tokens, record.completion_tokens, record.total_tokens) == (30, 10, 40)
+
+
+def test_record_reads_result_usage(ledger):
+    record = ledger.record("chat", Result(prompt_tokens=30, completion_tokens=10, successful_requests=1))
+    assert record.total_tokens == 40
+    assert record.successful_requests == 1
+
+
+def test_conversation_budget(ledger):
+    ledger.record("chat", None, conversation_id="conv-1", usage={"total_tokens": 60})
+    ledger.check_budget(conversation_id="conv-1")
+    ledger.record("chat", None, conversation_id="conv-1", usage={"total_tokens": 60})
+    with pytest.raises(BudgetExceededError) as excinfo:
+        ledger.check_budget(conversation_id="conv-1")
+    assert (excinfo.value.scope, excinfo.value.used, excinfo.value.limit) == ("conversation", 120, 100)
+    ledger.check_budget(conversation_id="conv-2")
+
+
+def test_client_budget_has_retry_after(ledger):
+    ledger.record("chat", None, client_id="ip:1", usage={"total_tokens": 200})
+    with pytest.raises(BudgetExceededError) as excinfo:
+        ledger.check_budget(client_id="ip:1")
+    assert excinfo.value.scope == "client"
+    assert 0 < excinfo.value.retry_after <= 3601
+    ledger.check_budget(client_id="ip:2")
+
+
+def test_budgets_survive_restart(ledger, tmp_path):
+    ledger.record("chat", None, conversation_id="conv-1", client_id="ip:1", usage={"total_tokens": 120})
+    ledger.flush()
+
+    restarted = UsageLedger(db_path=str(tmp_path / "usage.db"), conversation_budget=100, client_budget=100)
+    with pytest.raises(BudgetExceededError):
+        restarted.check_budget(conversation_id="conv-1")
+    with pytest.raises(BudgetExceededError):
+        restarted.check_budget(client_id="ip:1")
+
+
+def test_summarize_groups_persisted_usage(ledger):
+    ledger.record("chat", None, usage={"prompt_tokens": 5, "completion_tokens": 5})
+    ledger.record("chat", None, usage={"prompt_tokens": 10, "completion_tokens": 0})
+    ledger.record("edit", None, usage={"total_tokens": 3})
+    rows = {row["action"]: row for row in ledger.summarize()}
+    assert rows["chat"]["calls"] == 2
+    assert rows["chat"]["total_tokens"] == 20
+    assert rows["edit"]["total_tokens"] == 3
+
+
+def test_shared_chat_session_has_no_conversation_budget(client, monkeypatch):
+    """Every /api/ai/chat caller shares one session, so its usage must not lock everyone out."""
+    monkeypatch.setattr(main.usage_ledger, "conversation_budget", 1)
+    monkeypatch.setitem(main.usage_ledger._conversation_totals, main.DEFAULT_SESSION_ID, 1000)
+    response = client.post("/api/ai/chat", json={"message": "hello"})
+    assert response.status_code == 200
+
+
+def test_invoke_enforces_conversation_budget(client, monkeypatch):
+    monkeypatch.setattr(main.usage_ledger, "conversation_budget", 1)
+    monkeypatch.setitem(main.usage_ledger._conversation_totals, "conv-over-budget", 1000)
+    response = client.post("/api/v1/invoke", json={"action": "chat", "conversation_id": "conv-over-budget",
+                                                   "payload": {"question": "hello"}})
+    assert response.status_code == 429
+
+
+@pytest.fixture
+def app_ledger(monkeypatch, tmp_path):
+    ledger = UsageLedger(db_path=str(tmp_path / "usage.db"))
+    monkeypatch.setattr(main, "usage_ledger", ledger)
+    return ledger
+
+
+def use_tokens(total_tokens, result=None, error=None):
+    """An action whose model calls used `total_tokens`."""
+    def action():
+        current_call_trace().add("gemini/test", {"total_tokens": total_tokens})
+        if error is not None:
+            raise error
+        return result
+    return action
+
+
+def test_scheduled_actions_charge_only_the_requests_own_calls(app_ledger):
+    """CrewOutput.token_usage sums shared LLM clients; the call trace has just this request's calls."""
+    asyncio.run(main.run_scheduled("chat", "ip:1", use_tokens(15, result=Result(total_tokens=50000)),
+                                   conversation_id="conv-1"))
+    assert app_ledger.get_conversation_usage("conv-1")["total_tokens"] == 15
+
+
+def test_failed_actions_are_still_charged(app_ledger):
+    with pytest.raises(ValueError):
+        asyncio.run(main.run_scheduled("edit", "ip:1", use_tokens(40, error=ValueError("bad output")),
+                                       conversation_id="conv-2"))
+    assert app_ledger.get_conversation_usage("conv-2")["total_tokens"] == 40
+    app_ledger.conversation_budget = 30
+    with pytest.raises(BudgetExceededError):
+        app_ledger.check_budget(conversation_id="conv-2")
+
+
+def test_record_does_not_write_on_the_callers_thread(ledger, monkeypatch):
+    ledger.flush_batch_size = 1
+    monkeypatch.setattr(ledger, "flush", lambda: pytest.fail("flushed inline"))
+    ledger.record("chat", None, usage={"total_tokens": 1})
+    assert ledger._flush_requested.is_set()